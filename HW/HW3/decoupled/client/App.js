@@ -33,25 +33,6 @@ function App() {
       });
   }, []);
 
-  /**
-   * Checks if there is a winner.
-   */
-  const checkWinner = useCallback(() => {
-    console.log('Checking for a winner...');
-    axios.get(`${URL}/check_winner`)
-      .then(response => {
-        if (response.data.winner) {
-          console.log(`Player ${response.data.winner} wins!`);
-          setWinner(response.data.winner);
-        } else {
-          console.log('No winner yet.');
-        }
-      })
-      .catch(error => {
-        console.error('Error checking winner:', error);
-      });
-  }, []);
-
   /**
    * Handles the click event for a cell.
    * @param {number} index - The index of the clicked cell.
@@ -71,10 +52,14 @@ function App() {
     console.log('Making move on the server...');
     axios.post(`${URL}/move`, { index })
       .then(response => {
+        // The move response carries the winner too, so no second round trip is needed.
         console.log('Move made:', response.data.board);
         const newBoard = response.data.board;
         setBoard(newBoard);
-        checkWinner();
+        if (response.data.winner) {
+          console.log(`Player ${response.data.winner} wins!`);
+          setWinner(response.data.winner);
+        }
       })
       .catch(error => {
         // Handle error response
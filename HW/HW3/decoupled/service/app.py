@@ -1,43 +1,190 @@
+from typing import Optional
+
 from flask import Flask, jsonify, make_response, request, Response
+from flask.logging import default_handler
 from flask_cors import CORS
 
-from tictactoe.controller import get_board_state, get_winner, make_move
+from tictactoe import logger as tictactoe_logger
+from tictactoe.controller import (admit, cancel_match, create_game, DEFAULT_TOP, delete_game, get_best_move,
+                                  get_board_state, get_events, get_history, get_leaderboard, get_metrics,
+                                  get_player_stats, get_winner, LONG_POLL_TIMEOUT, make_move, make_moves,
+                                  matchmake, poll_match, restore_games, stream_events, undo_move)
+from tictactoe.logs import log_payload, queue_logging_enabled, route_through_queue
+from tictactoe.solver import DEFAULT_DEPTH
 from tictactoe.view import View
 
 app = Flask(__name__)
 CORS(app)  # This will allow the React front-end to communicate with the Flask back-end
 
+# Log requests at the package's level, in the background with the package's records
+app.logger.setLevel(tictactoe_logger.level)
+if queue_logging_enabled():
+    app.logger.removeHandler(default_handler)
+    route_through_queue(app.logger)
+
+# Bring back the games of the last run before serving any request
+restore_games()
+
 
 VIEW = View()
 
 
+# The routes that change the shared default game, which have no game id
+DEFAULT_GAME_ENDPOINTS = {'move', 'moves', 'undo'}
+
+
+@app.before_request
+def admit_request() -> Optional[Response]:
+    # Rate limit every route per client address, and per game the requests that
+    # change a game; reading one, however often, costs its players nothing.
+    game_id = None
+    if request.method != 'GET':
+        game_id = (request.view_args or {}).get('game_id')
+        if game_id is None and request.endpoint in DEFAULT_GAME_ENDPOINTS:
+            game_id = 'default'
+    return admit(request.remote_addr, game_id)
+
+
 @app.route("/tictactoe/health", methods=["GET"])
 @app.route("/tictactoe/healthcheck", methods=["GET"])
 def health_check() -> Response:
     app.logger.info('Health check')
     return make_response(jsonify({"status": "OK"}), 200)
 
+@app.route("/tictactoe/metrics", methods=["GET"])
+def metrics() -> Response:
+    return get_metrics()
+
 @app.route("/tictactoe/board", methods=["GET"])
 def board_state() -> Response:
     app.logger.info('Get board state')
-    return get_board_state()
+    return get_board_state(if_none_match=request.if_none_match, since=request.args.get('since'))
 
 @app.route("/tictactoe/check_winner", methods=["GET"])
 def check_winner() -> Response:
     app.logger.info('Checking for a winner')
     return get_winner()
 
+@app.route("/tictactoe/best_move", methods=["GET"])
+def best_move() -> Response:
+    app.logger.info('Finding the best move')
+    return get_best_move(depth=request.args.get('depth', DEFAULT_DEPTH))
+
 @app.route("/tictactoe/move", methods=["POST"])
 def move() -> Response:
     app.logger.info('Moving')
     data = request.get_json()
-    app.logger.info(data)
+    log_payload(app.logger, 'Move request', data)
     index = data['index']
-    app.logger.info(index)
     try:
-        return make_move(index)
+        return make_move(index, expected_version=data.get('expected_version'))
     except ValueError as e:
         return VIEW.error(str(e))
 
+@app.route("/tictactoe/moves", methods=["POST"])
+def moves() -> Response:
+    app.logger.info('Moving several times')
+    data = request.get_json()
+    log_payload(app.logger, 'Moves request', data)
+    return make_moves(data['moves'], expected_version=data.get('expected_version'))
+
+@app.route("/tictactoe/undo", methods=["POST"])
+def undo() -> Response:
+    app.logger.info('Undoing the last move')
+    data = request.get_json(silent=True) or {}
+    return undo_move(expected_version=data.get('expected_version'))
+
+@app.route("/tictactoe/history", methods=["GET"])
+def history() -> Response:
+    app.logger.info('Get move history')
+    return get_history()
+
+@app.route("/tictactoe/games", methods=["POST"])
+def new_game() -> Response:
+    app.logger.info('Creating a game')
+    data = request.get_json(silent=True) or {}
+    return create_game(data.get('size', 3), data.get('k'), data.get('players'))
+
+@app.route("/tictactoe/leaderboard", methods=["GET"])
+def leaderboard() -> Response:
+    app.logger.info('Get leaderboard')
+    return get_leaderboard(request.args.get('top', DEFAULT_TOP))
+
+@app.route("/tictactoe/matchmake", methods=["POST"])
+def join_matchmaking() -> Response:
+    data = request.get_json(silent=True) or {}
+    app.logger.info(f'Matchmaking {data.get("player")}')
+    return matchmake(data.get('player'), data.get('timeout', LONG_POLL_TIMEOUT))
+
+@app.route("/tictactoe/matchmake/<ticket_id>", methods=["GET"])
+def matchmaking_ticket(ticket_id: str) -> Response:
+    app.logger.info(f'Polling matchmaking ticket {ticket_id}')
+    return poll_match(ticket_id, request.args.get('timeout', LONG_POLL_TIMEOUT))
+
+@app.route("/tictactoe/matchmake/<ticket_id>", methods=["DELETE"])
+def leave_matchmaking(ticket_id: str) -> Response:
+    app.logger.info(f'Cancelling matchmaking ticket {ticket_id}')
+    return cancel_match(ticket_id)
+
+@app.route("/tictactoe/players/<name>", methods=["GET"])
+def player_stats(name: str) -> Response:
+    app.logger.info(f'Get stats of player {name}')
+    return get_player_stats(name)
+
+@app.route("/tictactoe/games/<game_id>", methods=["DELETE"])
+def remove_game(game_id: str) -> Response:
+    app.logger.info(f'Deleting game {game_id}')
+    return delete_game(game_id)
+
+@app.route("/tictactoe/games/<game_id>/board", methods=["GET"])
+def game_board_state(game_id: str) -> Response:
+    app.logger.info(f'Get board state of game {game_id}')
+    return get_board_state(game_id, request.if_none_match, request.args.get('since'))
+
+@app.route("/tictactoe/games/<game_id>/check_winner", methods=["GET"])
+def game_check_winner(game_id: str) -> Response:
+    app.logger.info(f'Checking for a winner in game {game_id}')
+    return get_winner(game_id)
+
+@app.route("/tictactoe/games/<game_id>/best_move", methods=["GET"])
+def game_best_move(game_id: str) -> Response:
+    app.logger.info(f'Finding the best move in game {game_id}')
+    return get_best_move(game_id, request.args.get('depth', DEFAULT_DEPTH))
+
+@app.route("/tictactoe/games/<game_id>/move", methods=["POST"])
+def game_move(game_id: str) -> Response:
+    app.logger.info(f'Moving in game {game_id}')
+    data = request.get_json()
+    log_payload(app.logger, 'Move request', data)
+    index = data['index']
+    return make_move(index, game_id, data.get('expected_version'))
+
+@app.route("/tictactoe/games/<game_id>/moves", methods=["POST"])
+def game_moves(game_id: str) -> Response:
+    app.logger.info(f'Moving several times in game {game_id}')
+    data = request.get_json()
+    log_payload(app.logger, 'Moves request', data)
+    return make_moves(data['moves'], game_id, data.get('expected_version'))
+
+@app.route("/tictactoe/games/<game_id>/undo", methods=["POST"])
+def game_undo(game_id: str) -> Response:
+    app.logger.info(f'Undoing the last move in game {game_id}')
+    data = request.get_json(silent=True) or {}
+    return undo_move(game_id, data.get('expected_version'))
+
+@app.route("/tictactoe/games/<game_id>/history", methods=["GET"])
+def game_history(game_id: str) -> Response:
+    app.logger.info(f'Get move history of game {game_id}')
+    return get_history(game_id)
+
+@app.route("/tictactoe/games/<game_id>/events", methods=["GET"])
+def game_events(game_id: str) -> Response:
+    since = request.args.get('since', request.headers.get('Last-Event-ID', 0))
+    if request.accept_mimetypes.best_match(["application/json", "text/event-stream"]) == "text/event-stream":
+        app.logger.info(f'Streaming events of game {game_id}')
+        return stream_events(game_id, since)
+    app.logger.info(f'Polling events of game {game_id}')
+    return get_events(game_id, since, request.args.get('timeout', LONG_POLL_TIMEOUT))
+
 if __name__ == '__main__':
     app.run(host="0.0.0.0", debug=True)
@@ -0,0 +1,206 @@
+"""
+The service as an ASGI application, for an asyncio server such as uvicorn:
+
+    uvicorn asgi:application
+
+Long polls, event streams and matchmaking spend nearly all their time waiting
+for a move or an opponent, so here they are served as coroutines: each waiting
+client holds a parked coroutine, not one of the threads the Flask app runs on,
+and the coroutine is cancelled as soon as its client disconnects.
+Every other request is handed to the Flask app in app.py on a pool of
+WSGI_THREADS threads, so both serve the same games.
+"""
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+import io
+import re
+import sys
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+from flask import Response
+from werkzeug.wrappers import Request
+
+from app import app
+from tictactoe.controller import (admit, get_events_async, LONG_POLL_TIMEOUT, matchmake_async, poll_match_async,
+                                  stream_events_async)
+
+WSGI_THREADS = 32
+
+_WSGI_POOL = ThreadPoolExecutor(WSGI_THREADS, thread_name_prefix="wsgi")
+
+
+async def game_events(request: Request, game_id: str) -> Response:
+    since = request.args.get('since', request.headers.get('Last-Event-ID', 0))
+    if request.accept_mimetypes.best_match(["application/json", "text/event-stream"]) == "text/event-stream":
+        app.logger.info(f'Streaming events of game {game_id}')
+        return await stream_events_async(game_id, since)
+    app.logger.info(f'Polling events of game {game_id}')
+    return await get_events_async(game_id, since, request.args.get('timeout', LONG_POLL_TIMEOUT))
+
+
+async def join_matchmaking(request: Request) -> Response:
+    data = request.get_json(silent=True) or {}
+    app.logger.info(f'Matchmaking {data.get("player")}')
+    return await matchmake_async(data.get('player'), data.get('timeout', LONG_POLL_TIMEOUT))
+
+
+async def matchmaking_ticket(request: Request, ticket_id: str) -> Response:
+    app.logger.info(f'Polling matchmaking ticket {ticket_id}')
+    return await poll_match_async(ticket_id, request.args.get('timeout', LONG_POLL_TIMEOUT))
+
+
+# The routes served as coroutines: method, path and handler
+ROUTES: List[Tuple[str, "re.Pattern[str]", Callable[..., Awaitable[Response]]]] = [
+    ("GET", re.compile(r"/tictactoe/games/(?P<game_id>[^/]+)/events"), game_events),
+    ("POST", re.compile(r"/tictactoe/matchmake"), join_matchmaking),
+    ("GET", re.compile(r"/tictactoe/matchmake/(?P<ticket_id>[^/]+)"), matchmaking_ticket),
+]
+
+
+async def application(scope: Dict, receive: Callable, send: Callable) -> None:
+    """
+    Serves one ASGI connection.
+
+    Parameters
+    ----------
+    scope : Dict
+        The connection scope.
+    receive : Callable
+        Awaits the next message from the client.
+    send : Callable
+        Sends a message to the client.
+    """
+    if scope["type"] == "lifespan":
+        await _lifespan(receive, send)
+        return
+    if scope["type"] != "http":
+        return
+    body = await _read_body(receive)
+    if body is None:
+        return
+    request = Request(_environ(scope, body))
+    for method, path, handler in ROUTES:
+        match = path.fullmatch(scope["path"])
+        if match is not None and scope["method"] == method:
+            await _until_disconnected(_serve(request, handler, match.groupdict(), send), receive)
+            return
+    status, headers, body = await asyncio.get_running_loop().run_in_executor(
+        _WSGI_POOL, _call_wsgi, request.environ)
+    await send({"type": "http.response.start", "status": status,
+                "headers": [(name.lower().encode("latin-1"), value.encode("latin-1")) for name, value in headers]})
+    await send({"type": "http.response.body", "body": body})
+
+
+async def _serve(request: Request, handler: Callable[..., Awaitable[Response]], args: Dict[str, str],
+                 send: Callable) -> None:
+    with app.request_context(request.environ):
+        # None of these change a game, so only the client's limit applies
+        response = admit(request.remote_addr)
+        if response is None:
+            response = await handler(request, **args)
+        # The app's after_request hooks, CORS among them, as Flask would run them
+        response = app.process_response(response)
+        await _send_response(response, send)
+
+
+async def _until_disconnected(serving: Awaitable[None], receive: Callable) -> None:
+    # Serves a request while watching for its client to go away: a long poll or
+    # event stream whose client has gone is cancelled, so it stops waiting on the
+    # game instead of waiting, and sending keep-alives, for as long as it lasts.
+    serving = asyncio.ensure_future(serving)
+    watching = asyncio.ensure_future(_wait_for_disconnect(receive))
+    try:
+        await asyncio.wait({serving, watching}, return_when=asyncio.FIRST_COMPLETED)
+    finally:
+        serving.cancel()
+        watching.cancel()
+        await asyncio.gather(watching, return_exceptions=True)
+        try:
+            await serving
+        except asyncio.CancelledError:
+            pass
+
+
+async def _wait_for_disconnect(receive: Callable) -> None:
+    while (await receive())["type"] != "http.disconnect":
+        pass
+
+
+async def _lifespan(receive: Callable, send: Callable) -> None:
+    while True:
+        message = await receive()
+        if message["type"] == "lifespan.startup":
+            await send({"type": "lifespan.startup.complete"})
+        elif message["type"] == "lifespan.shutdown":
+            await send({"type": "lifespan.shutdown.complete"})
+            return
+
+
+async def _read_body(receive: Callable) -> Optional[bytes]:
+    # The request body, or None if the client went away before sending it all.
+    chunks = []
+    while True:
+        message = await receive()
+        if message["type"] != "http.request":
+            return None
+        chunks.append(message.get("body", b""))
+        if not message.get("more_body"):
+            return b"".join(chunks)
+
+
+async def _send_response(response: Response, send: Callable) -> None:
+    await send({"type": "http.response.start", "status": response.status_code,
+                "headers": [(name.lower().encode("latin-1"), value.encode("latin-1"))
+                            for name, value in response.headers.items()]})
+    if not hasattr(response.response, "__aiter__"):
+        await send({"type": "http.response.body", "body": response.get_data()})
+        return
+    async for message in response.response:
+        await send({"type": "http.response.body", "body": message.encode(), "more_body": True})
+    await send({"type": "http.response.body", "body": b""})
+
+
+def _call_wsgi(environ: Dict) -> Tuple[int, List[Tuple[str, str]], bytes]:
+    # Runs the Flask app on a pool thread, collecting the whole response.
+    started = {}
+
+    def start_response(status, headers, exc_info=None):
+        started["status"], started["headers"] = status, headers
+
+    result = app(environ, start_response)
+    try:
+        body = b"".join(result)
+    finally:
+        if hasattr(result, "close"):
+            result.close()
+    return int(started["status"].split(" ", 1)[0]), started["headers"], body
+
+
+def _environ(scope: Dict, body: bytes) -> Dict:
+    server = scope.get("server") or ("localhost", 80)
+    client = scope.get("client") or ("", 0)
+    environ = {
+        "REQUEST_METHOD": scope["method"],
+        "SCRIPT_NAME": scope.get("root_path", "").encode().decode("latin-1"),
+        "PATH_INFO": scope["path"].encode().decode("latin-1"),
+        "QUERY_STRING": scope.get("query_string", b"").decode("latin-1"),
+        "SERVER_NAME": server[0],
+        "SERVER_PORT": str(server[1]),
+        "SERVER_PROTOCOL": f"HTTP/{scope.get('http_version', '1.1')}",
+        "REMOTE_ADDR": client[0],
+        "CONTENT_LENGTH": str(len(body)),
+        "wsgi.version": (1, 0),
+        "wsgi.url_scheme": scope.get("scheme", "http"),
+        "wsgi.input": io.BytesIO(body),
+        "wsgi.errors": sys.stderr,
+        "wsgi.multithread": True,
+        "wsgi.multiprocess": False,
+        "wsgi.run_once": False,
+    }
+    for name, value in scope.get("headers", []):
+        name, value = name.decode("latin-1").upper().replace("-", "_"), value.decode("latin-1")
+        if name == "CONTENT_LENGTH":
+            continue
+        key = name if name == "CONTENT_TYPE" else f"HTTP_{name}"
+        environ[key] = f"{environ[key]},{value}" if key in environ else value
+    return environ
@@ -0,0 +1,51 @@
+"""
+Compares polling the board whole with polling only the squares changed since
+the client's version, in response bytes and time per request, through the
+Flask test client. The client is one move behind, as a viewer polling after
+every move would be.
+
+Run from the service directory:
+
+    python -m benchmarks.bench_board_delta
+"""
+import argparse
+import logging
+import random
+import time
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-n", "--requests", type=int, default=2000)
+    args = parser.parse_args()
+
+    from app import app
+
+    for logger in (logging.getLogger("tictactoe"), logging.getLogger("werkzeug"), app.logger):
+        logger.setLevel(logging.WARNING)
+    client = app.test_client()
+    rng = random.Random(0)
+
+    print(f"{'board':<8}{'full bytes':>12}{'delta bytes':>13}{'full us':>10}{'delta us':>10}")
+    for size in (3, 9, 19):
+        game_id = client.post("/tictactoe/games", json={"size": size}).get_json()["game_id"]
+        url = f"/tictactoe/games/{game_id}/board"
+        squares = rng.sample(range(size * size), size * size)
+        # Half-fill the board; moves after a win are allowed, so a win along the way does not matter.
+        client.post(f"/tictactoe/games/{game_id}/moves", json={"moves": squares[:len(squares) // 2]})
+        client.get(f"{url}?since=0")
+        client.post(f"/tictactoe/games/{game_id}/move", json={"index": squares[len(squares) // 2]})
+        version = int(client.get(url).headers["ETag"].strip('"').rsplit("-", 1)[1])
+
+        timings = {}
+        for name, path in (("full", url), ("delta", f"{url}?since={version - 1}")):
+            start = time.perf_counter()
+            for _ in range(args.requests):
+                response = client.get(path)
+            timings[name] = ((time.perf_counter() - start) / args.requests * 1e6, len(response.data))
+        print(f"{size}x{size:<5}{timings['full'][1]:>12}{timings['delta'][1]:>13}"
+              f"{timings['full'][0]:>10.0f}{timings['delta'][0]:>10.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,56 @@
+"""
+Measures move latency as the board grows from 3x3 to 19x19.
+
+Each move only walks the lines through the square just played, so the time per
+move should stay roughly flat as N grows. A full-board scan is timed alongside
+for comparison.
+
+Run from the service directory:
+
+    python -m benchmarks.bench_board_sizes
+"""
+import argparse
+import logging
+import random
+import time
+
+from tictactoe.model import Model
+
+
+def play(size: int, k: int, games: int, seed: int, full_scan: bool) -> float:
+    """Plays random games and returns the mean time per move in microseconds."""
+    rng = random.Random(seed)
+    squares = list(range(size * size))
+    elapsed = 0.0
+    moves = 0
+    for _ in range(games):
+        rng.shuffle(squares)
+        model = Model(size, k)
+        start = time.perf_counter()
+        for index in squares:
+            model.move(index)
+            if full_scan:
+                model.set_winner()
+            moves += 1
+            if model.winner:
+                break
+        elapsed += time.perf_counter() - start
+    return elapsed / moves * 1e6
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-n", "--games", type=int, default=200)
+    args = parser.parse_args()
+    logging.getLogger("tictactoe").setLevel(logging.WARNING)
+
+    print(f"{'board':<8}{'k':>3}{'us/move':>12}{'us/move (full scan)':>22}")
+    for size in (3, 5, 7, 9, 11, 13, 15, 17, 19):
+        k = min(size, 5)
+        incremental = play(size, k, args.games, seed=size, full_scan=False)
+        full = play(size, k, max(args.games // 10, 1), seed=size, full_scan=True)
+        print(f"{f'{size}x{size}':<8}{k:>3}{incremental:>12.2f}{full:>22.2f}")
+
+
+if __name__ == "__main__":
+    main()
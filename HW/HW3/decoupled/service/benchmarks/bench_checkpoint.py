@@ -0,0 +1,86 @@
+"""
+Measures warm restarts: how long a checkpoint of every live game takes to
+write, how long an incremental one takes when a few games have changed, and
+how long a fresh process takes from starting to having every game back in its
+registry, ready for requests.
+
+Run from the service directory:
+
+    python -m benchmarks.bench_checkpoint
+    python -m benchmarks.bench_checkpoint -n 100000 -s 9
+"""
+import argparse
+import logging
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+
+from tictactoe.checkpoint import Checkpointer
+from tictactoe.model import Model
+from tictactoe.registry import GameRegistry
+
+SERVICE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Imports the app with the checkpoint, timing the import and the restore inside it.
+RESTART = """
+import time
+start = time.perf_counter()
+from app import app
+from tictactoe.controller import REGISTRY
+print(len(REGISTRY), time.perf_counter() - start)
+"""
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-n", "--games", type=int, default=100_000)
+    parser.add_argument("-s", "--size", type=int, default=3)
+    args = parser.parse_args()
+    logging.getLogger("tictactoe").setLevel(logging.WARNING)
+
+    rng = random.Random(0)
+    squares = list(range(args.size * args.size))
+    registry = GameRegistry(max_games=args.games)
+    models, next_moves = {}, {}
+    for n in range(args.games):
+        # Three moves now and a fourth later; no one can win with so few marks.
+        played = rng.sample(squares, 4)
+        model = Model(args.size)
+        model.move_many(played[:3])
+        models[f"game{n}"] = model
+        next_moves[f"game{n}"] = played[3]
+    registry.put_many(models)
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "games.db")
+        checkpointer = Checkpointer(path, registry.games)
+        start = time.perf_counter()
+        checkpointer.checkpoint()
+        full = time.perf_counter() - start
+        for game_id in rng.sample(list(models), len(models) // 100):
+            models[game_id].move(next_moves[game_id])
+        start = time.perf_counter()
+        written = checkpointer.checkpoint()
+        incremental = time.perf_counter() - start
+        checkpointer.stop()
+        megabytes = os.path.getsize(path) / 1e6
+
+        env = dict(os.environ, TICTACTOE_CHECKPOINT_PATH=path, TICTACTOE_LOG_LEVEL="WARNING")
+        start = time.perf_counter()
+        output = subprocess.run([sys.executable, "-c", RESTART], cwd=SERVICE_DIR, env=env,
+                                capture_output=True, text=True, check=True).stdout
+        restart = time.perf_counter() - start
+        restored, ready = output.split()
+
+    print(f"{args.games} games of {args.size}x{args.size}, {megabytes:.1f} MB on disk")
+    print(f"full checkpoint          {full:8.3f} s")
+    print(f"incremental, {written:>6} games {incremental:8.3f} s")
+    print(f"restart to ready         {float(ready):8.3f} s in the process, {restart:.3f} s wall "
+          f"({restored} games restored)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+"""
+Measures the move journal: how fast moves are appended, how many bytes each
+costs on disk, and how fast games are rebuilt from the journal alone and from a
+snapshot plus the journal tail.
+
+Run from the service directory:
+
+    python -m benchmarks.bench_journal
+"""
+import argparse
+import logging
+import os
+import random
+import tempfile
+import time
+
+from tictactoe.journal import Journal
+from tictactoe.model import Model
+
+
+def write(path: str, games: int, size: int, seed: int, snapshot: bool) -> int:
+    """Journals random games and returns the number of moves written."""
+    rng = random.Random(seed)
+    squares = list(range(size * size))
+    journal = Journal(path, snapshot_every=10 ** 12)
+    moves = 0
+    for n in range(games):
+        rng.shuffle(squares)
+        model = Model(size)
+        played = []
+        for index in squares:
+            played.append((index, model.player))
+            model.move(index)
+            if model.winner:
+                break
+        journal.record_moves(f"game{n}", model, played)
+        moves += len(played)
+    if snapshot:
+        journal.snapshot()
+    journal.close()
+    return moves
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-n", "--games", type=int, default=20_000)
+    args = parser.parse_args()
+    logging.getLogger("tictactoe").setLevel(logging.WARNING)
+
+    print(f"{'board':<8}{'games':>8}{'moves':>10}{'append moves/s':>16}{'bytes/move':>12}"
+          f"{'replay games/s':>16}{'replay moves/s':>16}{'snapshot games/s':>18}")
+    for size in (3, 9, 19):
+        games = max(args.games // size, 1)
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "moves.journal")
+            start = time.perf_counter()
+            moves = write(path, games, size, seed=size, snapshot=False)
+            append = moves / (time.perf_counter() - start)
+            per_move = os.path.getsize(path) / moves
+
+            start = time.perf_counter()
+            Journal(path).models()
+            replay = time.perf_counter() - start
+
+            os.remove(path)
+            write(path, games, size, seed=size, snapshot=True)
+            start = time.perf_counter()
+            Journal(path).models()
+            from_snapshot = time.perf_counter() - start
+        print(f"{f'{size}x{size}':<8}{games:>8}{moves:>10}{append:>16.0f}{per_move:>12.1f}"
+              f"{games / replay:>16.0f}{moves / replay:>16.0f}{games / from_snapshot:>18.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+"""
+Measures request throughput of POST /tictactoe/games/<id>/move with logging
+off, written synchronously on the request thread, and handed to the background
+queue listener.
+
+Each mode runs in a fresh interpreter with the logging environment variables
+set and stderr going to a file, so every log line is real I/O.
+
+Run from the service directory:
+
+    python -m benchmarks.bench_logging
+"""
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+from tictactoe.logs import LOG_LEVEL_ENV, LOG_QUEUE_ENV, PAYLOAD_SAMPLE_RATE_ENV
+
+MODES = (
+    ("off", {LOG_LEVEL_ENV: "WARNING", LOG_QUEUE_ENV: "1"}),
+    ("sync INFO", {LOG_LEVEL_ENV: "INFO", LOG_QUEUE_ENV: "0"}),
+    ("queue INFO", {LOG_LEVEL_ENV: "INFO", LOG_QUEUE_ENV: "1"}),
+    ("sync DEBUG, all payloads", {LOG_LEVEL_ENV: "DEBUG", LOG_QUEUE_ENV: "0", PAYLOAD_SAMPLE_RATE_ENV: "1"}),
+    ("queue DEBUG, 1% payloads", {LOG_LEVEL_ENV: "DEBUG", LOG_QUEUE_ENV: "1", PAYLOAD_SAMPLE_RATE_ENV: "0.01"}),
+)
+
+
+def run(requests: int) -> float:
+    """Plays 19x19 games through the test client and returns requests per second."""
+    from app import app
+
+    client = app.test_client()
+    start = time.perf_counter()
+    for i in range(requests):
+        if i % 361 == 0:
+            game_id = client.post("/tictactoe/games", json={"size": 19}).get_json()["game_id"]
+        client.post(f"/tictactoe/games/{game_id}/move", json={"index": i % 361})
+    return requests / (time.perf_counter() - start)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-n", "--requests", type=int, default=5000)
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        print(run(args.requests))
+        return
+
+    print(f"{'logging':<28}{'requests/s':>12}{'log bytes':>12}")
+    for name, env in MODES:
+        with tempfile.TemporaryFile() as log:
+            output = subprocess.run(
+                [sys.executable, "-m", "benchmarks.bench_logging", "--child", "-n", str(args.requests)],
+                env={**os.environ, **env}, stdout=subprocess.PIPE, stderr=log, text=True, check=True)
+            size = log.seek(0, os.SEEK_END)
+        print(f"{name:<28}{float(output.stdout):>12.0f}{size:>12}")
+
+
+if __name__ == "__main__":
+    main()
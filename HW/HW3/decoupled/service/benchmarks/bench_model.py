@@ -0,0 +1,98 @@
+"""
+Compares the bitboard Model against the original list-of-strings model.
+
+Run from the service directory:
+
+    python -m benchmarks.bench_model
+"""
+import argparse
+import logging
+import random
+import sys
+import time
+import tracemalloc
+from typing import List
+
+from tictactoe import Board
+from tictactoe.model import Model, WINNING_LINES
+
+
+class ListModel:
+    """The list-of-strings model that scans every line after every move."""
+
+    def __init__(self):
+        self.board = Board([""] * 9)
+        self.player = "X"
+        self.winner = None
+
+    def set_winner(self) -> None:
+        squares = self.board.squares
+        for a, b, c in WINNING_LINES:
+            if squares[a] and squares[a] == squares[b] == squares[c]:
+                self.winner = squares[a]
+                return
+
+    def move(self, index: int) -> None:
+        if self.board.squares[index]:
+            raise ValueError("Square already occupied")
+        self.board.squares[index] = self.player
+        self.player = "O" if self.player == "X" else "X"
+        self.set_winner()
+
+
+def random_games(count: int, seed: int) -> List[List[int]]:
+    rng = random.Random(seed)
+    games = []
+    for _ in range(count):
+        order = list(range(9))
+        rng.shuffle(order)
+        games.append(order)
+    return games
+
+
+def moves_per_second(model_class, games: List[List[int]]) -> float:
+    moves = 0
+    start = time.perf_counter()
+    for order in games:
+        model = model_class()
+        for index in order:
+            model.move(index)
+            moves += 1
+            if model.winner:
+                break
+    return moves / (time.perf_counter() - start)
+
+
+def bytes_per_game(model_class, count: int) -> float:
+    games = random_games(count, seed=1)
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    models = []
+    for order in games:
+        model = model_class()
+        for index in order[:5]:  # a game in progress
+            model.move(index)
+        models.append(model)
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    allocated = sum(stat.size_diff for stat in after.compare_to(before, "filename"))
+    # Subtract the list holding the models, which both variants pay for.
+    return (allocated - sys.getsizeof(models)) / count
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-n", "--games", type=int, default=100_000)
+    args = parser.parse_args()
+    logging.getLogger("tictactoe").setLevel(logging.WARNING)
+
+    games = random_games(args.games, seed=0)
+    print(f"{'model':<12}{'moves/sec':>14}{'bytes/game':>14}")
+    for name, model_class in (("list", ListModel), ("bitboard", Model)):
+        rate = moves_per_second(model_class, games)
+        size = bytes_per_game(model_class, min(args.games, 20_000))
+        print(f"{name:<12}{rate:>14,.0f}{size:>14,.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,152 @@
+"""
+Shows rate limiting holding the tail latency of well-behaved clients while an
+abusive client floods the server.
+
+The service runs in a child process behind a threaded server, once per
+scenario. Polite players play 3x3 games at a steady pace, each from its own
+loopback address; the abusive client floods moves and best-move searches on a
+large board from another address, from several connections at once and as
+fast as it can. The p50/p99 of the polite players' requests are reported with no
+abuser, with the abuser and no limits, and with the abuser and per-client and
+per-game token buckets, where its requests are mostly refused before they cost
+anything.
+
+Run from the service directory (Linux, which routes all of 127.0.0.0/8 to
+loopback):
+
+    python -m benchmarks.bench_ratelimit
+"""
+import argparse
+import http.client
+import json
+import os
+import random
+import subprocess
+import sys
+import threading
+import time
+from typing import List, Optional, Tuple
+
+ABUSER_ADDRESS = "127.0.0.66"
+
+
+def serve() -> None:
+    """Serves the app on a free port, printing the port once listening."""
+    import logging
+
+    from werkzeug.serving import make_server
+
+    from app import app
+
+    for logger in (logging.getLogger("tictactoe"), logging.getLogger("werkzeug"), app.logger):
+        logger.setLevel(logging.CRITICAL)
+    server = make_server("127.0.0.1", 0, app, threaded=True)
+    print(server.server_port, flush=True)
+    server.serve_forever()
+
+
+def request(port: int, address: str, method: str, path: str,
+            body: Optional[dict] = None) -> Tuple[int, Optional[dict]]:
+    connection = http.client.HTTPConnection("127.0.0.1", port, timeout=30, source_address=(address, 0))
+    try:
+        headers = {"Content-Type": "application/json"} if body is not None else {}
+        connection.request(method, path, body=json.dumps(body) if body is not None else None, headers=headers)
+        response = connection.getresponse()
+        payload = response.read()
+        return response.status, json.loads(payload) if response.status < 300 and payload else None
+    finally:
+        connection.close()
+
+
+def polite(port: int, address: str, seed: int, interval: float, deadline: float,
+           latencies: List[float]) -> None:
+    rng = random.Random(seed)
+    game_id = None
+    empty: List[int] = []
+    next_request = time.perf_counter() + rng.random() * interval
+    while next_request < deadline:
+        time.sleep(max(0.0, next_request - time.perf_counter()))
+        start = time.perf_counter()
+        if not empty:
+            game_id = request(port, address, "POST", "/tictactoe/games")[1]["game_id"]
+            empty = list(range(9))
+            rng.shuffle(empty)
+        else:
+            request(port, address, "POST", f"/tictactoe/games/{game_id}/move", {"index": empty.pop()})
+        latencies.append(time.perf_counter() - start)
+        next_request += interval
+
+
+def abusive(port: int, seed: int, deadline: float, counts: List[int]) -> None:
+    # Moving before each search keeps the position new, so no search is answered
+    # from the cache.
+    rng = random.Random(seed)
+    path = None
+    while time.perf_counter() < deadline:
+        if path is None:
+            status, payload = request(port, ABUSER_ADDRESS, "POST", "/tictactoe/games", {"size": 9, "k": 5})
+            if payload is not None:
+                path = f"/tictactoe/games/{payload['game_id']}"
+        else:
+            status, _ = request(port, ABUSER_ADDRESS, "POST", f"{path}/move", {"index": rng.randrange(81)})
+            if status == 200:
+                counts[0] += 1
+                status, payload = request(port, ABUSER_ADDRESS, "GET", f"{path}/best_move?depth=2")
+            elif status != 429:
+                path = None
+        counts[1 if status == 429 else 0] += 1
+
+
+def scenario(players: int, rate: float, duration: float, flooders: int, limit: float) -> dict:
+    env = dict(os.environ, TICTACTOE_CLIENT_RATE_LIMIT=str(limit), TICTACTOE_GAME_RATE_LIMIT=str(limit))
+    server = subprocess.Popen([sys.executable, "-m", "benchmarks.bench_ratelimit", "--serve"],
+                              stdout=subprocess.PIPE, env=env, text=True)
+    try:
+        port = int(server.stdout.readline())
+        deadline = time.perf_counter() + duration
+        latencies: List[List[float]] = [[] for _ in range(players)]
+        counts = [0, 0]
+        threads = [threading.Thread(target=polite, args=(port, f"127.0.0.{10 + i}", i, 1 / rate,
+                                                         deadline, latencies[i]))
+                   for i in range(players)]
+        threads += [threading.Thread(target=abusive, args=(port, i, deadline, counts))
+                    for i in range(flooders)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    finally:
+        server.terminate()
+        server.wait()
+    samples = sorted(s for player in latencies for s in player)
+    return {"requests": len(samples),
+            "p50_ms": samples[len(samples) // 2] * 1e3,
+            "p99_ms": samples[int(0.99 * len(samples))] * 1e3,
+            "abuser_served": counts[0], "abuser_refused": counts[1]}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-p", "--players", type=int, default=8)
+    parser.add_argument("-r", "--rate", type=float, default=5.0, help="requests/s per polite player")
+    parser.add_argument("-a", "--abusers", type=int, default=4, help="connections the abuser floods from")
+    parser.add_argument("-d", "--duration", type=float, default=5.0)
+    parser.add_argument("-l", "--limit", type=float, default=20.0, help="requests/s per client and per game")
+    parser.add_argument("--serve", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.serve:
+        serve()
+        return
+
+    print(f"{args.players} polite players at {args.rate:g} req/s each; "
+          f"abuser on {args.abusers} connections; limit {args.limit:g} req/s")
+    print(f"{'scenario':<24}{'requests':>10}{'p50 ms':>10}{'p99 ms':>10}{'abuser ok':>11}{'refused':>10}")
+    for name, flooders, limit in (("no abuser", 0, 0), ("abuser, no limits", args.abusers, 0),
+                                  ("abuser, token buckets", args.abusers, args.limit)):
+        result = scenario(args.players, args.rate, args.duration, flooders, limit)
+        print(f"{name:<24}{result['requests']:>10}{result['p50_ms']:>10.2f}{result['p99_ms']:>10.2f}"
+              f"{result['abuser_served']:>11}{result['abuser_refused']:>10}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,58 @@
+"""
+Compares games per second of the batched NumPy simulation against playing the
+same number of random games through Model one move at a time, and checks a
+sample of the simulated games against Model.
+
+Run from the service directory:
+
+    python -m benchmarks.bench_simulation
+"""
+import argparse
+import logging
+import random
+import time
+
+from tictactoe.model import Model
+from tictactoe.simulation import Simulation
+
+
+def play_models(size: int, k: int, games: int, seed: int) -> float:
+    """Plays random games through Model and returns games per second."""
+    rng = random.Random(seed)
+    squares = list(range(size * size))
+    start = time.perf_counter()
+    for _ in range(games):
+        rng.shuffle(squares)
+        model = Model(size, k)
+        for index in squares:
+            model.move(index)
+            if model.winner:
+                break
+    return games / (time.perf_counter() - start)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-n", "--games", type=int, default=1_000_000)
+    parser.add_argument("--policy", choices=("random", "greedy"), default="random")
+    args = parser.parse_args()
+    logging.getLogger("tictactoe").setLevel(logging.WARNING)
+
+    print(f"{'board':<8}{'k':>3}{'games':>10}{'games/s (numpy)':>18}{'games/s (Model)':>18}"
+          f"{'X':>8}{'O':>8}{'draw':>8}{'mismatches':>12}")
+    for size, k in ((3, 3), (7, 4), (19, 5)):
+        games = max(args.games // (size * size), 1)
+        simulation = Simulation(games, size, k)
+        start = time.perf_counter()
+        outcomes = simulation.run(args.policy, seed=size)
+        batched = games / (time.perf_counter() - start)
+        single = play_models(size, k, max(games // 100, 1), seed=size)
+        distribution = outcomes.distribution()
+        mismatches = simulation.verify(sample=200, seed=size)
+        print(f"{f'{size}x{size}':<8}{k:>3}{games:>10}{batched:>18.0f}{single:>18.0f}"
+              f"{distribution['X']:>8.3f}{distribution['O']:>8.3f}{distribution['draw']:>8.3f}"
+              f"{len(mismatches):>12}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,54 @@
+"""
+Measures the leaderboard with many players: how many game results can be
+counted per second, and how long a top-n query takes, compared with sorting
+every player's record as re-aggregating would.
+
+Run from the service directory:
+
+    python -m benchmarks.bench_stats
+    python -m benchmarks.bench_stats -p 1000000 -g 2000000
+"""
+import argparse
+import logging
+import random
+import time
+
+from tictactoe.stats import DRAW, PlayerStats
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-p", "--players", type=int, default=1_000_000)
+    parser.add_argument("-g", "--games", type=int, default=1_000_000)
+    parser.add_argument("-t", "--top", type=int, default=100)
+    args = parser.parse_args()
+    logging.getLogger("tictactoe").setLevel(logging.WARNING)
+
+    rng = random.Random(0)
+    names = [f"player{i}" for i in range(args.players)]
+    games = [(names[rng.randrange(args.players)], names[rng.randrange(args.players)],
+              rng.choice(("X", "O", DRAW))) for _ in range(args.games)]
+    stats = PlayerStats()
+    start = time.perf_counter()
+    for game_id, (x, o, result) in enumerate(games):
+        stats.seat(str(game_id), x, o)
+        stats.settle(str(game_id), result)
+    elapsed = time.perf_counter() - start
+    print(f"{args.games} results for {len(stats)} players: {args.games / elapsed:,.0f} games/s")
+
+    repeats = 1000
+    start = time.perf_counter()
+    for _ in range(repeats):
+        leaders = stats.top(args.top)
+    incremental = (time.perf_counter() - start) / repeats
+    start = time.perf_counter()
+    records = [stats.record(name) for name in {name for x, o, _ in games for name in (x, o)}]
+    resorted = sorted(records, key=lambda record: -record.points)[:args.top]
+    aggregate = time.perf_counter() - start
+    assert [r.points for r in leaders] == [r.points for r in resorted]
+    print(f"top {args.top}: {incremental * 1e6:,.1f} us from the buckets, "
+          f"{aggregate * 1e3:,.0f} ms by sorting every player")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,50 @@
+"""
+Measures how tournament throughput scales with the number of worker processes,
+playing the same round robin of the built-in policies with 1, 2, 4, ... workers
+up to the number of CPUs, and checks that every run gives the same results.
+
+Run from the service directory:
+
+    python -m benchmarks.bench_tournament
+    python -m benchmarks.bench_tournament -n 20000 -s 4
+"""
+import argparse
+import logging
+import os
+import time
+
+from tictactoe.tournament import POLICIES, Tournament
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-n", "--games", type=int, default=5000, help="games per pair")
+    parser.add_argument("-s", "--size", type=int, default=3)
+    parser.add_argument("-w", "--max-workers", type=int, default=os.cpu_count() or 1)
+    args = parser.parse_args()
+    logging.getLogger("tictactoe").setLevel(logging.WARNING)
+
+    counts = sorted({1, args.max_workers} | {2 ** i for i in range(1, 8) if 2 ** i < args.max_workers})
+    expected = None
+    base = None
+    print(f"{'workers':>8}{'games/s':>12}{'speedup':>10}{'first pair after':>18}")
+    for workers in counts:
+        tournament = Tournament(POLICIES, args.games, args.size, workers=workers)
+        start = time.perf_counter()
+        results = []
+        for result in tournament.run():
+            if not results:
+                first = time.perf_counter() - start
+            results.append(result)
+        rate = sum(result.games for result in results) / (time.perf_counter() - start)
+        base = base or rate
+        print(f"{workers:>8}{rate:>12,.0f}{rate / base:>9.2f}x{first:>16.2f} s")
+        results = sorted(results)
+        assert expected is None or results == expected, "results changed with the number of workers"
+        expected = results
+    for name, points in Tournament.standings(expected):
+        print(f"  {name:<8}{points:>10.1f} points")
+
+
+if __name__ == "__main__":
+    main()
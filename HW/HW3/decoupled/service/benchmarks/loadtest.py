@@ -0,0 +1,266 @@
+"""
+Load-tests the service with concurrent simulated players and compares the
+results against a stored baseline.
+
+Each player creates 3x3 games and plays them to the end, fetching the board,
+making a random move and checking for a winner every turn. Requests go through
+the Flask test client in this process by default, to a local server started in
+a background thread with --serve, or to a running server with --url. Nothing
+leaves the machine.
+
+Requests per second and the p50/p95/p99 latency of each endpoint are compared
+against benchmarks/baseline.json: the run fails, with exit status 1, if
+throughput drops or p95 latency rises by more than the tolerance. The best of
+several short runs is kept, since a single run on a busy machine can be well
+off its usual pace.
+
+Run from the service directory:
+
+    python -m benchmarks.loadtest                      # compare against the baseline
+    python -m benchmarks.loadtest --save-baseline      # record a new baseline
+    python -m benchmarks.loadtest --serve -p 32 -d 10  # through a real socket
+"""
+import argparse
+import http.client
+import json
+import logging
+import os
+import random
+import sys
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import urlsplit
+
+BASELINE_PATH = os.path.join(os.path.dirname(__file__), "baseline.json")
+DEFAULT_TOLERANCE = 0.3
+# Endpoints with fewer requests than this have too noisy a p95 to compare.
+MIN_SAMPLES = 1000
+ENDPOINTS = ("create", "board", "move", "check_winner")
+
+
+class InProcessClient:
+    """Sends requests to the app in this process."""
+
+    def __init__(self, app):
+        self.client = app.test_client()
+
+    def request(self, method: str, path: str, body: Optional[dict] = None) -> Tuple[int, Optional[dict]]:
+        response = self.client.open(path, method=method, json=body)
+        return response.status_code, response.get_json(silent=True)
+
+
+class HttpClient:
+    """Sends requests over one keep-alive HTTP connection."""
+
+    def __init__(self, url: str):
+        parts = urlsplit(url)
+        self.connection = http.client.HTTPConnection(parts.hostname, parts.port or 80, timeout=30)
+        self.prefix = parts.path.rstrip("/")
+
+    def request(self, method: str, path: str, body: Optional[dict] = None) -> Tuple[int, Optional[dict]]:
+        headers = {"Content-Type": "application/json"} if body is not None else {}
+        data = json.dumps(body) if body is not None else None
+        self.connection.request(method, self.prefix + path, body=data, headers=headers)
+        response = self.connection.getresponse()
+        payload = response.read()
+        return response.status, json.loads(payload) if payload else None
+
+
+class Player(threading.Thread):
+    """Plays games until the deadline, timing every request."""
+
+    def __init__(self, client, seed: int, deadline: float):
+        super().__init__(daemon=True)
+        self.client = client
+        self.rng = random.Random(seed)
+        self.deadline = deadline
+        self.latencies: Dict[str, List[float]] = {endpoint: [] for endpoint in ENDPOINTS}
+        self.errors = 0
+        self.games = 0
+
+    def call(self, endpoint: str, method: str, path: str, body: Optional[dict] = None) -> Optional[dict]:
+        start = time.perf_counter()
+        status, payload = self.client.request(method, path, body)
+        self.latencies[endpoint].append(time.perf_counter() - start)
+        if status >= 400:
+            self.errors += 1
+        return payload
+
+    def run(self) -> None:
+        while time.perf_counter() < self.deadline:
+            game_id = self.call("create", "POST", "/tictactoe/games")["game_id"]
+            path = f"/tictactoe/games/{game_id}"
+            while time.perf_counter() < self.deadline:
+                board = self.call("board", "GET", f"{path}/board")["board"]
+                empty = [i for i, square in enumerate(board) if not square]
+                if not empty:
+                    break
+                self.call("move", "POST", f"{path}/move", {"index": self.rng.choice(empty)})
+                if self.call("check_winner", "GET", f"{path}/check_winner")["winner"]:
+                    break
+            self.games += 1
+
+
+def percentile(samples: List[float], q: float) -> float:
+    """Returns the q-quantile of sorted samples, by the nearest-rank method."""
+    if not samples:
+        return 0.0
+    return samples[min(len(samples) - 1, int(q * len(samples)))]
+
+
+def run(make_client, players: int, duration: float, seed: int = 0) -> dict:
+    """
+    Runs the players for `duration` seconds and summarizes the results.
+
+    Parameters
+    ----------
+    make_client : Callable[[], object]
+        Returns a new client for each player.
+    players : int
+        The number of concurrent players.
+    duration : float
+        How long to play, in seconds.
+    seed : int, optional
+        Seeds the players' moves.
+
+    Returns
+    -------
+    dict
+        Requests per second, games, errors and, per endpoint, the request count
+        and p50/p95/p99 latency in milliseconds.
+    """
+    deadline = time.perf_counter() + duration
+    threads = [Player(make_client(), seed + i, deadline) for i in range(players)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    endpoints = {}
+    for endpoint in ENDPOINTS:
+        samples = sorted(s for thread in threads for s in thread.latencies[endpoint])
+        endpoints[endpoint] = {"requests": len(samples),
+                               **{f"p{int(q * 100)}_ms": round(percentile(samples, q) * 1e3, 3)
+                                  for q in (0.5, 0.95, 0.99)}}
+    requests = sum(stats["requests"] for stats in endpoints.values())
+    return {"players": players,
+            "duration_s": round(elapsed, 2),
+            "requests": requests,
+            "requests_per_s": round(requests / elapsed, 1),
+            "games": sum(thread.games for thread in threads),
+            "errors": sum(thread.errors for thread in threads),
+            "endpoints": endpoints}
+
+
+def compare(result: dict, baseline: dict, tolerance: float = DEFAULT_TOLERANCE) -> List[str]:
+    """
+    Compares a run against a baseline.
+
+    Parameters
+    ----------
+    result : dict
+        The run, from run().
+    baseline : dict
+        An earlier run.
+    tolerance : float, optional
+        The fraction by which throughput may drop, or p95 latency rise, before it
+        counts as a regression.
+
+    Returns
+    -------
+    List[str]
+        A description of each regression, or an empty list if there are none.
+    """
+    regressions = []
+    floor = baseline["requests_per_s"] * (1 - tolerance)
+    if result["requests_per_s"] < floor:
+        regressions.append(f"throughput {result['requests_per_s']} req/s is below "
+                           f"{floor:.1f} (baseline {baseline['requests_per_s']})")
+    for endpoint, stats in baseline["endpoints"].items():
+        current = result["endpoints"].get(endpoint, {"requests": 0, "p95_ms": 0.0})
+        if min(stats["requests"], current["requests"]) < MIN_SAMPLES:
+            continue
+        ceiling = stats["p95_ms"] * (1 + tolerance)
+        p95 = current["p95_ms"]
+        if p95 > ceiling:
+            regressions.append(f"{endpoint} p95 {p95} ms is above {ceiling:.3f} (baseline {stats['p95_ms']})")
+    if result["errors"]:
+        regressions.append(f"{result['errors']} requests failed")
+    return regressions
+
+
+def report(result: dict) -> None:
+    print(f"{result['players']} players, {result['duration_s']} s: {result['requests']} requests, "
+          f"{result['requests_per_s']} req/s, {result['games']} games, {result['errors']} errors")
+    print(f"{'endpoint':<14}{'requests':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    for endpoint, stats in result["endpoints"].items():
+        print(f"{endpoint:<14}{stats['requests']:>10}{stats['p50_ms']:>10.3f}"
+              f"{stats['p95_ms']:>10.3f}{stats['p99_ms']:>10.3f}")
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-p", "--players", type=int, default=8)
+    parser.add_argument("-d", "--duration", type=float, default=3.0)
+    parser.add_argument("-r", "--runs", type=int, default=3, help="keep the fastest of this many runs")
+    parser.add_argument("--url", help="load-test a running server, e.g. http://127.0.0.1:5000")
+    parser.add_argument("--serve", action="store_true", help="start a local server and load-test it")
+    parser.add_argument("--baseline", default=BASELINE_PATH)
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE)
+    args = parser.parse_args()
+
+    # Every player comes from one address, which rate limiting would throttle
+    os.environ.setdefault("TICTACTOE_CLIENT_RATE_LIMIT", "0")
+    os.environ.setdefault("TICTACTOE_GAME_RATE_LIMIT", "0")
+    from app import app
+
+    for logger in (logging.getLogger("tictactoe"), logging.getLogger("werkzeug"), app.logger):
+        logger.setLevel(logging.WARNING)
+    server = None
+    url = args.url
+    if args.serve:
+        from werkzeug.serving import make_server
+
+        server = make_server("127.0.0.1", 0, app, threaded=True)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        url = f"http://127.0.0.1:{server.server_port}"
+    make_client = (lambda: HttpClient(url)) if url else (lambda: InProcessClient(app))
+    try:
+        result = max((run(make_client, args.players, args.duration) for _ in range(args.runs)),
+                     key=lambda result: result["requests_per_s"])
+    finally:
+        if server is not None:
+            server.shutdown()
+    result["target"] = url or "test client"
+    report(result)
+
+    if args.save_baseline:
+        with open(args.baseline, "w") as fh:
+            json.dump(result, fh, indent=2)
+            fh.write("\n")
+        print(f"Saved baseline to {args.baseline}")
+        return 0
+    if not os.path.exists(args.baseline):
+        print(f"No baseline at {args.baseline}; run with --save-baseline to record one")
+        return 0
+    with open(args.baseline) as fh:
+        baseline = json.load(fh)
+    if baseline.get("target") != result["target"] or baseline.get("players") != result["players"]:
+        print(f"Warning: the baseline was recorded against {baseline.get('target')} "
+              f"with {baseline.get('players')} players")
+    regressions = compare(result, baseline, args.tolerance)
+    if regressions:
+        print("REGRESSION:")
+        for regression in regressions:
+            print(f"  {regression}")
+        return 1
+    print(f"OK: within {args.tolerance:.0%} of the baseline")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,54 @@
+import importlib.util
+import os
+from pathlib import Path
+from typing import Optional
+
+import pytest
+import redis
+
+# The tests send requests far faster than a client is allowed to; the limits
+# themselves are tested with limiters of their own.
+os.environ.setdefault("TICTACTOE_CLIENT_RATE_LIMIT", "0")
+os.environ.setdefault("TICTACTOE_GAME_RATE_LIMIT", "0")
+
+
+# The Redis-backed tests run against the stand-in Redis of the examples, which
+# redis-py talks to over a socket as it would to a real server. It is found at
+# TICTACTOE_REDIS_STANDIN, or else in the examples of the repository the service
+# sits in; where there is neither, as in the test image, those tests are skipped.
+STANDIN_ENV = "TICTACTOE_REDIS_STANDIN"
+
+
+def standin_path() -> Optional[Path]:
+    if os.environ.get(STANDIN_ENV):
+        return Path(os.environ[STANDIN_ENV])
+    for directory in Path(__file__).resolve().parents:
+        candidate = directory / "examples" / "redis" / "standin.py"
+        if candidate.exists():
+            return candidate
+    return None
+
+
+@pytest.fixture(scope="session")
+def standin():
+    path = standin_path()
+    if path is None or not path.exists():
+        pytest.skip(f"no stand-in Redis; set {STANDIN_ENV} to the path of examples/redis/standin.py")
+    spec = importlib.util.spec_from_file_location("standin", path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+@pytest.fixture
+def redis_server(standin):
+    server = standin.StandInRedis().start()
+    yield server
+    server.stop()
+
+
+@pytest.fixture
+def redis_client(redis_server):
+    client = redis.Redis(port=redis_server.port)
+    yield client
+    client.close()
@@ -0,0 +1,158 @@
+import pytest
+
+from app import app
+from tictactoe import controller
+from tictactoe import (GAME_NOT_FOUND_ERROR_MSG, INVALID_BOARD_ERROR_MSG, INVALID_MOVE_ERROR_MSG,
+                       SQUARE_OCCUPIED_ERROR_MSG)
+
+
+@pytest.fixture
+def client():
+    app.config["TESTING"] = True
+    with app.test_client() as client:
+        yield client
+
+@pytest.fixture
+def game_id(client):
+    response = client.post("/tictactoe/games")
+    assert response.status_code == 201
+    return response.get_json()["game_id"]
+
+
+def test_health_check(client):
+    response = client.get("/tictactoe/healthcheck")
+    assert response.status_code == 200
+    assert response.get_json() == {"status": "OK"}
+
+def test_game_lifecycle(client, game_id):
+    response = client.get(f"/tictactoe/games/{game_id}/board")
+    assert response.get_json() == {"board": [""] * 9}
+
+    for index in (0, 3, 1, 4, 2):
+        response = client.post(f"/tictactoe/games/{game_id}/move", json={"index": index})
+        assert response.status_code == 200
+    assert response.get_json() == {
+        "board": ["X", "X", "X", "O", "O", "", "", "", ""],
+        "winner": "X",
+        "player": "O",
+        "version": 5,
+    }
+
+    response = client.get(f"/tictactoe/games/{game_id}/check_winner")
+    assert response.get_json() == {"winner": "X"}
+
+    response = client.delete(f"/tictactoe/games/{game_id}")
+    assert response.status_code == 204
+    response = client.get(f"/tictactoe/games/{game_id}/board")
+    assert response.status_code == 404
+    assert response.get_json() == {"error": GAME_NOT_FOUND_ERROR_MSG}
+
+def test_games_are_independent(client, game_id):
+    other = client.post("/tictactoe/games").get_json()["game_id"]
+    client.post(f"/tictactoe/games/{game_id}/move", json={"index": 4})
+    response = client.get(f"/tictactoe/games/{other}/board")
+    assert response.get_json() == {"board": [""] * 9}
+
+def test_move_errors(client, game_id):
+    response = client.post(f"/tictactoe/games/{game_id}/move", json={"index": 9})
+    assert response.status_code == 400
+    assert response.get_json() == {"error": INVALID_MOVE_ERROR_MSG}
+
+    client.post(f"/tictactoe/games/{game_id}/move", json={"index": 0})
+    response = client.post(f"/tictactoe/games/{game_id}/move", json={"index": 0})
+    assert response.status_code == 400
+    assert response.get_json() == {"error": SQUARE_OCCUPIED_ERROR_MSG}
+
+    response = client.post("/tictactoe/games/nope/move", json={"index": 0})
+    assert response.status_code == 404
+
+def test_large_game(client):
+    response = client.post("/tictactoe/games", json={"size": 15, "k": 5})
+    game_id = response.get_json()["game_id"]
+    response = client.post(f"/tictactoe/games/{game_id}/move", json={"index": 224})
+    assert response.status_code == 200
+    assert len(response.get_json()["board"]) == 225
+
+def test_invalid_game_size(client):
+    response = client.post("/tictactoe/games", json={"size": 25})
+    assert response.status_code == 400
+    assert response.get_json() == {"error": INVALID_BOARD_ERROR_MSG}
+
+def test_batched_moves(client, game_id):
+    response = client.post(f"/tictactoe/games/{game_id}/moves", json={"moves": [0, 3, 1, 4]})
+    assert response.status_code == 200
+    assert response.get_json() == {
+        "board": ["X", "X", "", "O", "O", "", "", "", ""],
+        "winner": None,
+        "player": "X",
+        "version": 4,
+    }
+
+def test_batched_moves_are_atomic(client, game_id):
+    client.post(f"/tictactoe/games/{game_id}/move", json={"index": 8})
+    for moves, error in (([0, 1, 8], SQUARE_OCCUPIED_ERROR_MSG),
+                         ([0, 1, 9], INVALID_MOVE_ERROR_MSG),
+                         ([0, 0], SQUARE_OCCUPIED_ERROR_MSG),
+                         ("012", INVALID_MOVE_ERROR_MSG)):
+        response = client.post(f"/tictactoe/games/{game_id}/moves", json={"moves": moves})
+        assert response.status_code == 400
+        assert response.get_json() == {"error": error}
+    response = client.get(f"/tictactoe/games/{game_id}/board")
+    assert response.get_json() == {"board": [""] * 8 + ["X"]}
+
+def test_board_etag(client, game_id):
+    url = f"/tictactoe/games/{game_id}/board"
+    epoch = controller.STORE.get(game_id).epoch
+    response = client.get(url)
+    etag = response.headers["ETag"]
+    assert etag == f'"{epoch}-0"'
+
+    response = client.get(url, headers={"If-None-Match": etag})
+    assert response.status_code == 304
+    assert response.data == b""
+    assert response.headers["ETag"] == etag
+
+    response = client.post(f"/tictactoe/games/{game_id}/move", json={"index": 4})
+    assert response.headers["ETag"] == f'"{epoch}-1"'
+    response = client.get(url, headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.headers["ETag"] == f'"{epoch}-1"'
+    assert response.get_json() == {"board": [""] * 4 + ["X"] + [""] * 4}
+    # a tag for the same version from before the game was restored does not match
+    response = client.get(url, headers={"If-None-Match": '"1"'})
+    assert response.status_code == 200
+    response = client.get(url, headers={"If-None-Match": '"0123456789ab-1"'})
+    assert response.status_code == 200
+
+def test_board_delta(client):
+    game_id = client.post("/tictactoe/games", json={"size": 19}).get_json()["game_id"]
+    url = f"/tictactoe/games/{game_id}/board"
+    epoch = controller.STORE.get(game_id).epoch
+    client.post(f"/tictactoe/games/{game_id}/move", json={"index": 0})
+    # the first request for changes starts the game's log, so gets the whole board
+    response = client.get(f"{url}?since=0")
+    assert len(response.get_json()["board"]) == 361
+    client.post(f"/tictactoe/games/{game_id}/moves", json={"moves": [180, 360]})
+    response = client.get(f"{url}?since=1")
+    assert response.headers["ETag"] == f'"{epoch}-3"'
+    assert response.get_json() == {"version": 3, "since": 1, "delta": {"O": [180], "X": [360]}}
+    assert client.get(f"{url}?since=3").get_json()["delta"] == {}
+    assert "board" in client.get(f"{url}?since=0").get_json()
+    response = client.get(f"{url}?since=1", headers={"If-None-Match": f'"{epoch}-3"'})
+    assert response.status_code == 304
+    assert client.get(f"{url}?since=x").status_code == 400
+
+def test_board_is_serialized_once_per_version(client, game_id, monkeypatch):
+    from tictactoe import controller
+    calls = []
+    encode = controller.VIEW.encode_board_state
+    monkeypatch.setattr(controller.VIEW, "encode_board_state",
+                        lambda board: calls.append(board) or encode(board))
+    url = f"/tictactoe/games/{game_id}/board"
+    bodies = {client.get(url).data for _ in range(5)}
+    assert len(bodies) == 1
+    assert len(calls) == 1
+    client.post(f"/tictactoe/games/{game_id}/move", json={"index": 0})
+    client.get(url)
+    client.get(url)
+    assert len(calls) == 2
@@ -0,0 +1,199 @@
+import asyncio
+import json
+import threading
+import uuid
+
+from asgi import application
+from tictactoe import INVALID_TIMEOUT_ERROR_MSG
+from tictactoe.controller import MATCHMAKER, REGISTRY
+
+
+async def call(method, path, body=None, headers=(), disconnect=None):
+    # One request to the ASGI application, as an asyncio server would make it;
+    # the client goes away once `disconnect` is set.
+    path, _, query = path.partition("?")
+    scope = {"type": "http", "http_version": "1.1", "method": method, "scheme": "http", "path": path,
+             "query_string": query.encode(), "root_path": "", "client": ("127.0.0.1", 40000),
+             "server": ("testserver", 80),
+             "headers": [(b"content-type", b"application/json")]
+             + [(name.lower().encode(), value.encode()) for name, value in headers]}
+    requests = [{"type": "http.request", "body": b"" if body is None else json.dumps(body).encode()}]
+    messages = []
+
+    async def receive():
+        if requests:
+            return requests.pop()
+        await (disconnect or asyncio.Event()).wait()
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        messages.append(message)
+
+    await application(scope, receive, send)
+    if not messages:
+        return None
+    body = b"".join(message.get("body", b"") for message in messages[1:])
+    return messages[0]["status"], dict(messages[0]["headers"]), body
+
+
+def test_other_routes_are_served_by_flask():
+    async def main():
+        status, _, body = await call("POST", "/tictactoe/games", {"size": 4})
+        assert status == 201
+        game_id = json.loads(body)["game_id"]
+        status, _, body = await call("POST", f"/tictactoe/games/{game_id}/move", {"index": 5})
+        assert status == 200 and json.loads(body)["board"][5] == "X"
+        status, headers, _ = await call("GET", f"/tictactoe/games/{game_id}/board")
+        assert status == 200 and headers[b"content-type"] == b"application/json"
+        status, _, _ = await call("GET", "/tictactoe/games/missing/board")
+        assert status == 404
+
+    asyncio.run(main())
+
+
+def test_long_polls_hold_no_threads():
+    waiters = 1000
+
+    async def main():
+        _, _, body = await call("POST", "/tictactoe/games")
+        game_id = json.loads(body)["game_id"]
+        threads = threading.active_count()
+        polls = [asyncio.ensure_future(call("GET", f"/tictactoe/games/{game_id}/events?since=0&timeout=10"))
+                 for _ in range(waiters)]
+        stream = REGISTRY.get(game_id).events
+        while stream is None or sum(len(futures) for futures in stream._futures.values()) < waiters:
+            await asyncio.sleep(0.01)
+            stream = REGISTRY.get(game_id).events
+        # every poll is parked on the stream, and none holds a thread
+        assert not any(poll.done() for poll in polls)
+        assert threading.active_count() < threads + 50
+        await call("POST", f"/tictactoe/games/{game_id}/move", {"index": 4})
+        return await asyncio.gather(*polls)
+
+    for status, _, body in asyncio.run(main()):
+        assert status == 200
+        assert json.loads(body) == {"version": 1, "events": [{"version": 1, "index": 4, "player": "X"}]}
+
+
+def test_server_sent_events():
+    async def main():
+        _, _, body = await call("POST", "/tictactoe/games")
+        game_id = json.loads(body)["game_id"]
+        stream = asyncio.ensure_future(call("GET", f"/tictactoe/games/{game_id}/events",
+                                            headers=[("Accept", "text/event-stream"), ("Last-Event-ID", "0")]))
+        await asyncio.sleep(0.1)
+        await call("POST", f"/tictactoe/games/{game_id}/moves", {"moves": [0, 3, 1, 4, 2]})
+        return await asyncio.wait_for(stream, 5)
+
+    status, headers, body = asyncio.run(main())
+    assert status == 200 and headers[b"content-type"].startswith(b"text/event-stream")
+    # the game has been won, so the stream ends after the winning move
+    assert body.decode().count("event: move") == 5
+    assert body.decode().endswith('id: 5\nevent: move\ndata: {"version": 5, "index": 2, "player": "X"}\n\n')
+
+
+def test_closed_clients_stop_waiting():
+    async def main():
+        _, _, body = await call("POST", "/tictactoe/games")
+        game_id = json.loads(body)["game_id"]
+        gone = asyncio.Event()
+        stream = asyncio.ensure_future(call("GET", f"/tictactoe/games/{game_id}/events",
+                                            headers=[("Accept", "text/event-stream")], disconnect=gone))
+        poll = asyncio.ensure_future(call("GET", f"/tictactoe/games/{game_id}/events?timeout=60",
+                                          disconnect=gone))
+        queued = len(MATCHMAKER)
+        match = asyncio.ensure_future(call("POST", "/tictactoe/matchmake",
+                                           {"player": f"ann-{uuid.uuid4()}", "timeout": 60}, disconnect=gone))
+        events = REGISTRY.get(game_id).events
+        while events is None or sum(len(futures) for futures in events._futures.values()) < 2 \
+                or len(MATCHMAKER) == queued:
+            await asyncio.sleep(0.01)
+            events = REGISTRY.get(game_id).events
+        gone.set()
+        streamed, polled, matched = await asyncio.wait_for(asyncio.gather(stream, poll, match), 1)
+        # the stream had sent its headers; the others had sent nothing
+        assert streamed[0] == 200 and polled is None and matched is None
+        # the waits were cancelled, and cleaned up after themselves
+        assert sum(len(futures) for futures in events._futures.values()) == 0
+        await asyncio.sleep(0.01)
+        assert len(MATCHMAKER) == queued
+
+    asyncio.run(main())
+
+
+def test_coroutine_routes_allow_other_origins():
+    async def main():
+        origin = [("Origin", "http://localhost:3000")]
+        _, _, body = await call("POST", "/tictactoe/games")
+        game_id = json.loads(body)["game_id"]
+        # the same headers as the routes Flask serves
+        _, headers, _ = await call("GET", "/tictactoe/board", headers=origin)
+        allowed = headers[b"access-control-allow-origin"]
+        for method, path, body in (("GET", f"/tictactoe/games/{game_id}/events?timeout=0", None),
+                                   ("POST", "/tictactoe/matchmake", {"player": f"ann-{uuid.uuid4()}", "timeout": 0}),
+                                   ("GET", f"/tictactoe/matchmake/{uuid.uuid4()}?timeout=0", None)):
+            _, headers, body = await call(method, path, body, headers=origin)
+            assert headers[b"access-control-allow-origin"] == allowed, path
+            if method == "POST":
+                # leave the queue to the other tests
+                await call("DELETE", f"/tictactoe/matchmake/{json.loads(body)['ticket']}")
+
+    asyncio.run(main())
+
+
+def test_invalid_requests():
+    async def main():
+        _, _, body = await call("POST", "/tictactoe/games")
+        game_id = json.loads(body)["game_id"]
+        status, _, body = await call("GET", f"/tictactoe/games/{game_id}/events?timeout=nan")
+        assert status == 400 and json.loads(body) == {"error": INVALID_TIMEOUT_ERROR_MSG}
+        status, _, _ = await call("GET", f"/tictactoe/games/{game_id}/events?since=-1")
+        assert status == 400
+        status, _, _ = await call("GET", "/tictactoe/games/missing/events?timeout=0")
+        assert status == 404
+
+    asyncio.run(main())
+
+
+def test_matchmaking_holds_no_threads():
+    players = 1000
+    prefix = uuid.uuid4().hex
+
+    async def main():
+        threads = threading.active_count()
+        joins = []
+        for i in range(players):
+            joins.append(asyncio.ensure_future(
+                call("POST", "/tictactoe/matchmake", {"player": f"{prefix}-{i}", "timeout": 10})))
+            if i % 2 == 0:
+                # the player who waits is parked before their opponent joins
+                while len(MATCHMAKER) == 0:
+                    await asyncio.sleep(0.001)
+        assert threading.active_count() < threads + 50
+        return await asyncio.gather(*joins)
+
+    matches = [json.loads(body) for _, _, body in asyncio.run(main())]
+    games = {}
+    for match in matches:
+        assert match["status"] == "matched"
+        games.setdefault(match["game_id"], []).append(match["mark"])
+    assert len(games) == players // 2
+    assert all(sorted(marks) == ["O", "X"] for marks in games.values())
+
+
+def test_matchmaking_poll():
+    async def main():
+        status, _, body = await call("POST", "/tictactoe/matchmake",
+                                     {"player": f"ann-{uuid.uuid4()}", "timeout": 0})
+        assert status == 202
+        ticket = json.loads(body)["ticket"]
+        poll = asyncio.ensure_future(call("GET", f"/tictactoe/matchmake/{ticket}?timeout=10"))
+        await asyncio.sleep(0.05)
+        assert not poll.done()
+        await call("POST", "/tictactoe/matchmake", {"player": f"bob-{uuid.uuid4()}", "timeout": 0})
+        status, _, body = await asyncio.wait_for(poll, 5)
+        assert status == 200 and json.loads(body)["mark"] == "X"
+        status, _, _ = await call("GET", f"/tictactoe/matchmake/{uuid.uuid4()}?timeout=nan")
+        assert status == 400
+
+    asyncio.run(main())
@@ -0,0 +1,134 @@
+import os
+import subprocess
+import sys
+
+from tictactoe.checkpoint import Checkpointer, load_checkpoint, load_players
+from tictactoe.model import Model
+from tictactoe.registry import GameRegistry
+from tictactoe.stats import DRAW, PlayerStats
+
+SERVICE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def states(models):
+    return {game_id: model.to_bytes() for game_id, model in models.items()}
+
+
+def test_round_trip(tmp_path):
+    path = str(tmp_path / "games.db")
+    registry = GameRegistry()
+    registry.put("a", Model()).model.move_many([4, 0, 8])
+    registry.put("b", Model(19)).model.move_many(list(range(0, 361, 7)))
+    checkpointer = Checkpointer(path, registry.games)
+    assert checkpointer.checkpoint() == 2
+    checkpointer.stop()
+    assert states(load_checkpoint(path)) == {game_id: game.model.to_bytes()
+                                             for game_id, game in registry.games().items()}
+
+def test_only_changes_are_written(tmp_path):
+    path = str(tmp_path / "games.db")
+    registry = GameRegistry()
+    for game_id in "abc":
+        registry.put(game_id, Model())
+    checkpointer = Checkpointer(path, registry.games)
+    assert checkpointer.checkpoint() == 3
+    assert checkpointer.checkpoint() == 0
+    registry.get("a").model.move(4)
+    registry.delete("b")
+    assert checkpointer.checkpoint() == 1
+    checkpointer.stop()
+    assert states(load_checkpoint(path)) == {"a": registry.get("a").model.to_bytes(),
+                                             "c": Model().to_bytes()}
+
+def test_rows_from_an_earlier_process_are_replaced(tmp_path):
+    path = str(tmp_path / "games.db")
+    registry = GameRegistry()
+    registry.put("old", Model())
+    Checkpointer(path, registry.games).stop()
+    registry = GameRegistry()
+    registry.put_many(load_checkpoint(path))
+    registry.delete("old")
+    registry.put("new", Model())
+    Checkpointer(path, registry.games).stop()
+    assert list(load_checkpoint(path)) == ["new"]
+
+def test_put_many():
+    registry = GameRegistry(max_games=2)
+    models = {"a": Model(), "b": Model(4), "c": Model(5)}
+    registry.put_many(models)
+    assert list(registry.games()) == ["b", "c"]
+    assert registry.get("c").model is models["c"]
+    assert registry.evictions == 1
+
+def test_player_records_are_saved_with_the_games(tmp_path):
+    path = str(tmp_path / "games.db")
+    stats = PlayerStats()
+    checkpointer = Checkpointer(path, GameRegistry().games, stats=stats)
+    stats.seat("a", "ann", "bob")
+    stats.seat("b", "cat", "dan")
+    stats.settle("a", "X")
+    checkpointer.checkpoint()
+    stats.seat("c", "bob", "cat")
+    stats.settle("b", DRAW)
+    checkpointer.stop()
+    players, seats = load_players(path)
+    assert players == {"ann": (1, 0, 0, 0), "bob": (0, 1, 0, 1), "cat": (0, 0, 1, 2), "dan": (0, 0, 1, 3)}
+    assert seats == {"c": ("bob", "cat")}
+
+def test_app_restores_games_on_startup(tmp_path):
+    path = str(tmp_path / "games.db")
+    registry = GameRegistry()
+    registry.put("saved", Model()).model.move_many([0, 4])
+    Checkpointer(path, registry.games).stop()
+    env = dict(os.environ, TICTACTOE_CHECKPOINT_PATH=path, TICTACTOE_LOG_LEVEL="WARNING")
+    script = ("from app import app\n"
+              "print(app.test_client().get('/tictactoe/games/saved/board').get_json()['board'])")
+    output = subprocess.run([sys.executable, "-c", script], cwd=SERVICE_DIR, env=env,
+                            capture_output=True, text=True, check=True).stdout
+    assert output.split() == ["['X',", "'',", "'',", "'',", "'O',", "'',", "'',", "'',", "'']"]
+
+def test_history_and_undo_after_restart(tmp_path):
+    path = str(tmp_path / "games.db")
+    registry = GameRegistry()
+    registry.put("saved", Model()).model.move_many([0, 4, 8])
+    registry.put("default", Model()).model.move_many([4, 0])
+    Checkpointer(path, registry.games).stop()
+    env = dict(os.environ, TICTACTOE_CHECKPOINT_PATH=path, TICTACTOE_LOG_LEVEL="WARNING")
+    script = ("from app import app\n"
+              "client = app.test_client()\n"
+              "client.post('/tictactoe/games/saved/move', json={'index': 2})\n"
+              "print([(m['ply'], m['index'], m['player']) for m in "
+              "client.get('/tictactoe/games/saved/history').get_json()['moves']])\n"
+              "print([client.post('/tictactoe/games/saved/undo').status_code for _ in range(5)])\n"
+              "print(client.post('/tictactoe/undo').status_code, client.get('/tictactoe/board').get_json()['board'][0])\n")
+    output = subprocess.run([sys.executable, "-c", script], cwd=SERVICE_DIR, env=env,
+                            capture_output=True, text=True, check=True).stdout
+    history, undos, default = output.splitlines()
+    assert history == "[(0, 0, 'X'), (1, 4, 'O'), (2, 8, 'X'), (3, 2, 'O')]"
+    assert undos == "[200, 200, 200, 200, 400]"
+    assert default == "200 "
+
+def test_leaderboard_after_restart(tmp_path):
+    path = str(tmp_path / "games.db")
+    registry = GameRegistry()
+    registry.put("saved", Model()).model.move_many([0, 3, 1, 4])
+    stats = PlayerStats()
+    checkpointer = Checkpointer(path, registry.games, stats=stats)
+    stats.seat("saved", "ann", "bob")
+    stats.seat("gone", "cat", "dan")
+    stats.seat("won", "bob", "cat")
+    stats.settle("won", "X")
+    checkpointer.stop()
+    env = dict(os.environ, TICTACTOE_CHECKPOINT_PATH=path, TICTACTOE_LOG_LEVEL="WARNING")
+    script = ("from app import app\n"
+              "from tictactoe import controller\n"
+              "client = app.test_client()\n"
+              "print(controller.STATS.players('gone'))\n"
+              "client.post('/tictactoe/games/saved/move', json={'index': 2})\n"
+              "print([(p['name'], p['points']) for p in client.get('/tictactoe/leaderboard').get_json()['players']])\n")
+    output = subprocess.run([sys.executable, "-c", script], cwd=SERVICE_DIR, env=env,
+                            capture_output=True, text=True, check=True).stdout
+    gone, leaders = output.splitlines()
+    # seats of games that did not come back are dropped
+    assert gone == "None"
+    assert leaders == "[('bob', 2), ('ann', 2), ('cat', 0)]"
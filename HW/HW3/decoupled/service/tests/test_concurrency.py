@@ -0,0 +1,125 @@
+import random
+import sys
+import threading
+
+import pytest
+
+from app import app
+from tictactoe import VERSION_CONFLICT_ERROR_MSG, VersionConflictError
+from tictactoe.model import Model
+
+THREADS = 16
+
+
+@pytest.fixture(autouse=True)
+def frequent_switches():
+    # Switch threads as often as possible so races would actually show up.
+    interval = sys.getswitchinterval()
+    sys.setswitchinterval(1e-6)
+    yield
+    sys.setswitchinterval(interval)
+
+@pytest.fixture
+def game_id():
+    client = app.test_client()
+    return client.post("/tictactoe/games", json={"size": 19}).get_json()["game_id"]
+
+
+def run_players(target, *args):
+    errors = []
+
+    def player(seed):
+        try:
+            target(app.test_client(), seed, *args)
+        except Exception as e:  # surfaced in the main thread below
+            errors.append(e)
+
+    threads = [threading.Thread(target=player, args=(seed,)) for seed in range(THREADS)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert errors == []
+
+def final_board(game_id):
+    response = app.test_client().get(f"/tictactoe/games/{game_id}/board")
+    return response.get_json()["board"], int(response.headers["ETag"].strip('"').rsplit("-", 1)[1])
+
+
+def test_check_version():
+    model = Model()
+    model.move(0, expected_version=0)
+    with pytest.raises(VersionConflictError, match=VERSION_CONFLICT_ERROR_MSG):
+        model.move(1, expected_version=0)
+    with pytest.raises(VersionConflictError):
+        model.move_many([1, 2], expected_version=0)
+    assert model.version == 1
+
+def test_conflict_returns_409(game_id):
+    client = app.test_client()
+    client.post(f"/tictactoe/games/{game_id}/move", json={"index": 0, "expected_version": 0})
+    response = client.post(f"/tictactoe/games/{game_id}/move",
+                           json={"index": 1, "expected_version": 0})
+    assert response.status_code == 409
+    assert response.get_json() == {"error": VERSION_CONFLICT_ERROR_MSG}
+
+def test_no_lost_or_duplicated_moves(game_id):
+    # Every thread tries to claim every square; each square must be won exactly once.
+    claimed = []
+
+    def claim_all(client, seed):
+        squares = list(range(361))
+        random.Random(seed).shuffle(squares)
+        for index in squares:
+            response = client.post(f"/tictactoe/games/{game_id}/move", json={"index": index})
+            if response.status_code == 200:
+                claimed.append(index)
+            else:
+                assert response.status_code == 400
+
+    run_players(claim_all)
+    board, version = final_board(game_id)
+    assert sorted(claimed) == list(range(361))
+    assert version == 361
+    assert board.count("X") == 181 and board.count("O") == 180
+
+def test_compare_and_swap_moves(game_id):
+    # Players read the version, then move expecting it, retrying on a conflict.
+    # Every accepted move must bump the version by exactly one.
+    accepted = []
+
+    def play(client, seed):
+        rng = random.Random(seed)
+        for _ in range(15):
+            while True:
+                response = client.get(f"/tictactoe/games/{game_id}/board")
+                board = response.get_json()["board"]
+                version = int(response.headers["ETag"].strip('"').rsplit("-", 1)[1])
+                index = rng.choice([i for i, square in enumerate(board) if not square])
+                response = client.post(f"/tictactoe/games/{game_id}/move",
+                                       json={"index": index, "expected_version": version})
+                if response.status_code == 200:
+                    assert response.get_json()["version"] == version + 1
+                    accepted.append(version + 1)
+                    break
+                assert response.status_code in (400, 409)
+
+    run_players(play)
+    board, version = final_board(game_id)
+    assert sorted(accepted) == list(range(1, THREADS * 15 + 1))
+    assert version == THREADS * 15
+    assert board.count("X") + board.count("O") == version
+
+def test_games_do_not_share_a_lock():
+    client = app.test_client()
+    game_ids = [client.post("/tictactoe/games").get_json()["game_id"] for _ in range(THREADS)]
+
+    def play(client, seed):
+        for index in range(9):
+            client.post(f"/tictactoe/games/{game_ids[seed]}/move", json={"index": index})
+
+    run_players(play)
+    for game_id in game_ids:
+        board, version = final_board(game_id)
+        assert version == 9
+        assert board.count("X") == 5
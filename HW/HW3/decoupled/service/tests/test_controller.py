@@ -12,4 +12,9 @@ def test_validate_index():
     with pytest.raises(ValueError, match=INVALID_MOVE_ERROR_MSG):
         validate_index("zero")
     validate_index(0)
-    validate_index(8)
\ No newline at end of file
+    validate_index(8)
+
+def test_validate_index_large_board():
+    with pytest.raises(ValueError, match=INVALID_MOVE_ERROR_MSG):
+        validate_index(361, 19)
+    assert validate_index("360", 19) == 360
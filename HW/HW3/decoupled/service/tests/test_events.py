@@ -0,0 +1,161 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from app import app
+from tictactoe import controller, INVALID_TIMEOUT_ERROR_MSG
+from tictactoe.controller import REGISTRY
+from tictactoe.events import EventStream, MoveEvent
+from tictactoe.model import Model
+from tictactoe.store import RedisStore
+
+
+@pytest.fixture
+def model():
+    return Model()
+
+@pytest.fixture
+def stream(model):
+    return EventStream(model)
+
+@pytest.fixture
+def client():
+    app.config["TESTING"] = True
+    with app.test_client() as client:
+        yield client
+
+
+def test_moves_are_published(model, stream):
+    model.move(4)
+    model.move(0)
+    assert stream.version == 2
+    assert stream.since(0) == [MoveEvent(1, 4, "X"), MoveEvent(2, 0, "O")]
+    assert stream.since(1) == [MoveEvent(2, 0, "O")]
+    assert stream.since(2) == []
+
+def test_moves_before_attaching_are_not_kept():
+    model = Model()
+    model.move(4)
+    stream = EventStream(model)
+    assert stream.since(1) == []
+    assert stream.since(0) is None
+    model.move(0)
+    assert stream.since(1) == [MoveEvent(2, 0, "O")]
+    assert stream.since(0) is None
+
+def test_rolled_back_batch_is_not_published(model, stream):
+    model.move(8)
+    with pytest.raises(ValueError):
+        model.move_many([0, 1, 8])
+    assert stream.since(0) == [MoveEvent(1, 8, "X")]
+    model.move_many([0, 1])
+    assert stream.since(1) == [MoveEvent(2, 0, "O"), MoveEvent(3, 1, "X")]
+
+def test_wait_times_out(stream):
+    start = time.monotonic()
+    assert stream.wait(0, timeout=0.05) == []
+    assert time.monotonic() - start >= 0.05
+
+def test_many_thread_waiters(model, stream):
+    results = []
+    waiters = [threading.Thread(target=lambda: results.append(stream.wait(0, timeout=10)))
+               for _ in range(50)]
+    for waiter in waiters:
+        waiter.start()
+    model.move(3)
+    for waiter in waiters:
+        waiter.join()
+    assert results == [[MoveEvent(1, 3, "X")]] * 50
+
+def test_many_async_subscribers(model, stream):
+    # Ten thousand viewers parked on one event loop thread, woken by a move made
+    # from another thread.
+    subscribers = 10_000
+
+    async def main():
+        tasks = [asyncio.create_task(stream.wait_async(0, timeout=10)) for _ in range(subscribers)]
+        await asyncio.sleep(0)  # let every subscriber start waiting
+        assert sum(len(futures) for futures in stream._futures.values()) == subscribers
+        mover = threading.Thread(target=model.move, args=(4,))
+        mover.start()
+        results = await asyncio.gather(*tasks)
+        mover.join()
+        return results
+
+    results = asyncio.run(main())
+    assert results == [[MoveEvent(1, 4, "X")]] * subscribers
+    assert stream._futures == {}
+
+def test_async_subscriber_times_out(stream):
+    assert asyncio.run(stream.wait_async(0, timeout=0.01)) == []
+    assert all(not futures for futures in stream._futures.values())
+
+def test_long_poll(client):
+    game_id = client.post("/tictactoe/games").get_json()["game_id"]
+    client.post(f"/tictactoe/games/{game_id}/move", json={"index": 4})
+
+    response = client.get(f"/tictactoe/games/{game_id}/events?since=1&timeout=0.01")
+    assert response.get_json() == {"version": 1, "events": []}
+
+    # the stream was attached after the first move, so version 0 needs the board
+    response = client.get(f"/tictactoe/games/{game_id}/events?since=0")
+    assert response.get_json() == {"version": 1, "events": None,
+                                   "board": [""] * 4 + ["X"] + [""] * 4}
+
+    # another request thread makes a move while this one is waiting
+    timer = threading.Timer(0.05, REGISTRY.get(game_id).model.move, (0,))
+    timer.start()
+    response = client.get(f"/tictactoe/games/{game_id}/events?since=1&timeout=10")
+    timer.join()
+    assert response.get_json() == {"version": 2,
+                                   "events": [{"version": 2, "index": 0, "player": "O"}]}
+
+    response = client.get(f"/tictactoe/games/{game_id}/events?since=-1")
+    assert response.status_code == 400
+
+def test_server_sent_events(client):
+    game_id = client.post("/tictactoe/games").get_json()["game_id"]
+    client.get(f"/tictactoe/games/{game_id}/events?timeout=0")  # attach the stream
+    client.post(f"/tictactoe/games/{game_id}/moves", json={"moves": [0, 3, 1, 4, 2]})
+
+    response = client.get(f"/tictactoe/games/{game_id}/events",
+                          headers={"Accept": "text/event-stream", "Last-Event-ID": "3"})
+    assert response.mimetype == "text/event-stream"
+    # the game has been won, so the stream ends after the winning move
+    assert response.get_data(as_text=True) == (
+        'id: 4\nevent: move\ndata: {"version": 4, "index": 4, "player": "O"}\n\n'
+        'id: 5\nevent: move\ndata: {"version": 5, "index": 2, "player": "X"}\n\n'
+    )
+
+def test_invalid_timeout(client):
+    game_id = client.post("/tictactoe/games").get_json()["game_id"]
+    response = client.get(f"/tictactoe/games/{game_id}/events?timeout=nan")
+    assert response.status_code == 400
+    assert response.get_json() == {"error": INVALID_TIMEOUT_ERROR_MSG}
+
+def test_redis_games_publish_moves(client, redis_client, monkeypatch):
+    # Each lookup of a Redis game builds a new Game, so the streams are kept by game id.
+    monkeypatch.setattr(controller, "STORE", RedisStore(redis_client, ttl=60))
+    game_id = client.post("/tictactoe/games").get_json()["game_id"]
+    assert client.get(f"/tictactoe/games/{game_id}/events?since=0&timeout=0").get_json() == \
+        {"version": 0, "events": []}
+    timer = threading.Timer(0.05, app.test_client().post, (f"/tictactoe/games/{game_id}/move",),
+                            {"json": {"index": 4}})
+    timer.start()
+    response = client.get(f"/tictactoe/games/{game_id}/events?since=0&timeout=10")
+    timer.join()
+    assert response.get_json() == {"version": 1, "events": [{"version": 1, "index": 4, "player": "X"}]}
+
+    client.post(f"/tictactoe/games/{game_id}/moves", json={"moves": [0, 5, 1, 3, 2]})
+    response = client.get(f"/tictactoe/games/{game_id}/events",
+                          headers={"Accept": "text/event-stream", "Last-Event-ID": "4"})
+    # the winner is read back from Redis, so the stream ends after the winning move
+    assert response.get_data(as_text=True) == (
+        'id: 5\nevent: move\ndata: {"version": 5, "index": 3, "player": "X"}\n\n'
+        'id: 6\nevent: move\ndata: {"version": 6, "index": 2, "player": "O"}\n\n'
+    )
+    # the stream goes with the game
+    client.delete(f"/tictactoe/games/{game_id}")
+    assert game_id not in controller.STORE._streams
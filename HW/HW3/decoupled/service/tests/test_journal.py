@@ -0,0 +1,225 @@
+import os
+import threading
+import time
+
+import pytest
+
+from app import app
+from tictactoe import controller, HISTORY_UNAVAILABLE_ERROR_MSG, NOTHING_TO_UNDO_ERROR_MSG
+from tictactoe.events import EventStream, MoveEvent
+from tictactoe.journal import Journal, JOURNAL_HEADER, MoveRecord
+from tictactoe.model import Model
+from tictactoe.registry import GameRegistry
+from tictactoe.store import InMemoryStore, RedisStore
+
+
+def play(journal, game_id, squares, size=3):
+    model = Model(size)
+    moves = []
+    for square in squares:
+        moves.append((square, model.player))
+        model.move(square)
+    journal.record_moves(game_id, model, moves)
+    return model
+
+def wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+
+def rebuilt(path):
+    journal = Journal(path)
+    try:
+        return {game_id: model.to_bytes() for game_id, model in journal.models().items()}
+    finally:
+        journal.close()
+
+
+def test_history_and_undo_in_memory():
+    journal = Journal()
+    play(journal, "a", [4, 0, 8])
+    assert journal.history("a") == [MoveRecord(0, 4, "X"), MoveRecord(1, 0, "O"), MoveRecord(2, 8, "X")]
+    assert journal.record_undo("a") == MoveRecord(2, 8, "X")
+    assert journal.last_move("a") == MoveRecord(1, 0, "O")
+    journal.record_delete("a")
+    assert journal.history("a") == [] and journal.record_undo("a") is None
+
+def test_rebuild_from_file(tmp_path):
+    path = str(tmp_path / "moves.journal")
+    journal = Journal(path)
+    models = {"a": play(journal, "a", [0, 3, 1, 4, 2]), "b": play(journal, "b", list(range(0, 361, 7)), 19)}
+    play(journal, "c", [1, 2])
+    journal.record_delete("c")
+    journal.record_undo("a")
+    models["a"] = Model()
+    models["a"].move_many([0, 3, 1, 4])
+    journal.close()
+    assert rebuilt(path) == {game_id: model.to_bytes() for game_id, model in models.items()}
+
+def test_moves_are_ten_bytes(tmp_path):
+    path = str(tmp_path / "moves.journal")
+    journal = Journal(path)
+    play(journal, "a", [0], 19)
+    journal.flush()
+    size = os.path.getsize(path)
+    play(journal, "a", list(range(1, 101)), 19)
+    journal.flush()
+    journal.close()
+    assert (os.path.getsize(path) - size) == 100 * 10
+
+def test_batched_flushes(tmp_path):
+    path = str(tmp_path / "moves.journal")
+    now = [0.0]
+    journal = Journal(path, flush_bytes=1000, flush_interval=60, clock=lambda: now[0])
+    play(journal, "a", [0, 1, 2])
+    assert os.path.getsize(path) == JOURNAL_HEADER.size
+    play(journal, "b", list(range(100)), size=10)  # past flush_bytes
+    # written by the background thread, not the one recording the moves
+    wait_for(lambda: os.path.getsize(path) > JOURNAL_HEADER.size)
+    written = os.path.getsize(path)
+    play(journal, "a", [3])
+    now[0] = 61.0
+    play(journal, "a", [4])  # past flush_interval
+    wait_for(lambda: os.path.getsize(path) == written + 20)
+    journal.close()
+
+def test_snapshot_plus_tail(tmp_path):
+    path = str(tmp_path / "moves.journal")
+    journal = Journal(path, snapshot_every=50)
+    expected = {}
+    for n in range(20):
+        expected[f"game{n}"] = play(journal, f"game{n}", list(range(0, 9 * (n % 9 + 1), 9)), 9)
+    journal.flush()
+    assert os.path.exists(f"{path}.snapshot")
+    # the snapshot covers the whole journal, so the records after it start a new segment
+    assert os.path.getsize(path) == JOURNAL_HEADER.size
+    play(journal, "tail", [5, 6])
+    expected["tail"] = Model()
+    expected["tail"].move_many([5, 6])
+    journal.close()
+    assert rebuilt(path) == {game_id: model.to_bytes() for game_id, model in expected.items()}
+
+def test_stopped_before_the_next_segment(tmp_path):
+    path = str(tmp_path / "moves.journal")
+    journal = Journal(path)
+    play(journal, "a", [0, 1, 2])
+    journal.flush()
+    with open(path, "rb") as fh:
+        covered = fh.read()
+    journal.snapshot()
+    journal.close()
+    # as if the last run wrote the snapshot but stopped before starting the next segment
+    with open(path, "wb") as fh:
+        fh.write(covered)
+    journal = Journal(path)
+    assert [move.index for move in journal.history("a")] == [0, 1, 2]
+    journal.close()
+    assert os.path.getsize(path) == JOURNAL_HEADER.size
+    os.remove(f"{path}.snapshot")
+    with pytest.raises(ValueError):
+        Journal(path)
+
+def test_torn_write_is_dropped(tmp_path):
+    path = str(tmp_path / "moves.journal")
+    journal = Journal(path)
+    play(journal, "a", [0, 1, 2])
+    journal.close()
+    with open(path, "ab") as fh:
+        fh.write(b"\x02\x00\x00")  # a move record cut short
+    journal = Journal(path)
+    assert [move.index for move in journal.history("a")] == [0, 1, 2]
+    play(journal, "a", [3])
+    journal.close()
+    assert [move.index for move in Journal(path).history("a")] == [0, 1, 2, 3]
+
+
+def test_store_journals_changes_and_keeps_observer():
+    journal = Journal()
+    store = InMemoryStore(GameRegistry(), journal)
+    game = store.create()
+    stream = EventStream(game.model)
+    store.update(game, lambda model: model.move_many([4, 0]))
+    store.update(game, lambda model: model.move(8))
+    with pytest.raises(ValueError):
+        store.update(game, lambda model: model.move_many([1, 4]))
+    assert [move.index for move in store.history(game)] == [4, 0, 8]
+    assert store.undo(game).version == 4
+    assert stream.since(3) == [MoveEvent(4, 8, "")]
+    store.undo(game)
+    store.undo(game)
+    with pytest.raises(ValueError, match=NOTHING_TO_UNDO_ERROR_MSG):
+        store.undo(game)
+
+def test_undo_and_history_endpoints():
+    client = app.test_client()
+    game_id = client.post("/tictactoe/games").get_json()["game_id"]
+    client.post(f"/tictactoe/games/{game_id}/moves", json={"moves": [0, 3, 1, 4, 2]})
+    response = client.get(f"/tictactoe/games/{game_id}/history")
+    assert response.get_json()["moves"][-1] == {"ply": 4, "index": 2, "player": "X"}
+
+    response = client.post(f"/tictactoe/games/{game_id}/undo", json={"expected_version": 4})
+    assert response.status_code == 409
+    response = client.post(f"/tictactoe/games/{game_id}/undo")
+    assert response.status_code == 200
+    body = response.get_json()
+    assert body["winner"] is None and body["player"] == "X" and body["version"] == 6
+    assert len(client.get(f"/tictactoe/games/{game_id}/history").get_json()["moves"]) == 4
+    assert client.post("/tictactoe/games/missing/undo").status_code == 404
+
+def test_redis_store_has_no_history(redis_client, monkeypatch):
+    monkeypatch.setattr(controller, "STORE", RedisStore(redis_client, ttl=60))
+    client = app.test_client()
+    game_id = client.post("/tictactoe/games").get_json()["game_id"]
+    response = client.get(f"/tictactoe/games/{game_id}/history")
+    assert response.status_code == 501
+    assert response.get_json() == {"error": HISTORY_UNAVAILABLE_ERROR_MSG}
+
+def test_players_are_recorded_as_given(tmp_path):
+    path = str(tmp_path / "moves.journal")
+    journal = Journal(path, snapshot_every=3)
+    journal.record_moves("a", Model(), [(4, "O"), (0, "X")])
+    journal.record_moves("a", Model(), [(8, "O")])
+    expected = [MoveRecord(0, 4, "O"), MoveRecord(1, 0, "X"), MoveRecord(2, 8, "O")]
+    assert journal.history("a") == expected
+    journal.flush()
+    journal.record_moves("a", Model(), [(1, "X")])
+    assert journal.record_undo("a") == MoveRecord(3, 1, "X")
+    journal.close()
+    # from the snapshot and the journal after it
+    assert Journal(path).history("a") == expected
+    # from the journal alone
+    path = str(tmp_path / "alone.journal")
+    journal = Journal(path)
+    journal.record_moves("a", Model(), [(4, "O"), (0, "X"), (8, "O")])
+    journal.close()
+    assert Journal(path).history("a") == expected
+
+def test_recording_does_not_wait_for_the_disk(tmp_path, monkeypatch):
+    path = str(tmp_path / "moves.journal")
+    journal = Journal(path, snapshot_every=1)
+    play(journal, "a", [0])
+    writing, release = threading.Event(), threading.Event()
+
+    def slow_fsync(fd):
+        writing.set()
+        release.wait(5)
+    monkeypatch.setattr(os, "fsync", slow_fsync)
+    flusher = threading.Thread(target=journal.flush)
+    flusher.start()
+    assert writing.wait(5)
+    # the snapshot is being written, and moves are still recorded meanwhile
+    start = time.monotonic()
+    play(journal, "b", [4, 0])
+    assert time.monotonic() - start < 1
+    assert journal.last_move("b") == MoveRecord(1, 0, "O")
+    release.set()
+    flusher.join()
+    journal.close()
+
+def test_history_is_evicted_with_the_registry():
+    # as the controller wires them, so the history is bounded by the registry
+    journal = Journal()
+    store = InMemoryStore(GameRegistry(max_games=2, on_evict=journal.record_delete), journal)
+    games = [store.create() for _ in range(3)]
+    assert [game.game_id in journal for game in games] == [False, True, True]
@@ -0,0 +1,24 @@
+from app import app
+from benchmarks.loadtest import compare, run, InProcessClient
+
+
+def test_run_plays_full_games():
+    result = run(lambda: InProcessClient(app), players=2, duration=0.3)
+    assert result["errors"] == 0 and result["games"] >= 1
+    endpoints = result["endpoints"]
+    assert endpoints["move"]["requests"] == endpoints["check_winner"]["requests"]
+    assert result["requests"] == sum(stats["requests"] for stats in endpoints.values())
+    assert all(stats["p50_ms"] <= stats["p95_ms"] <= stats["p99_ms"] for stats in endpoints.values())
+
+def test_compare():
+    baseline = {"requests_per_s": 1000.0, "errors": 0,
+                "endpoints": {"move": {"requests": 5000, "p95_ms": 2.0},
+                              "create": {"requests": 10, "p95_ms": 2.0}}}
+    assert compare(baseline, baseline) == []
+    slower = {"requests_per_s": 600.0, "errors": 3,
+              "endpoints": {"move": {"requests": 5000, "p95_ms": 3.0},
+                            "create": {"requests": 10, "p95_ms": 30.0}}}
+    regressions = compare(slower, baseline, tolerance=0.3)
+    # too few create requests to compare their p95
+    assert len(regressions) == 3
+    assert regressions[0].startswith("throughput") and regressions[1].startswith("move p95")
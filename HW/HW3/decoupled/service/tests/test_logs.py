@@ -0,0 +1,124 @@
+import logging
+from logging.handlers import QueueHandler
+import os
+import subprocess
+import sys
+import threading
+
+import pytest
+
+from app import app
+from tictactoe import configure_logger, logger
+from tictactoe.logs import (attach_handler, DEFAULT_LOG_LEVEL, DEFAULT_PAYLOAD_SAMPLE_RATE, log_level, log_payload,
+                            payload_sample_rate, route_through_queue, start_queue_logging)
+
+SERVICE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+class EventHandler(logging.Handler):
+    def __init__(self):
+        super().__init__()
+        self.records = []
+        self.written = threading.Event()
+        self.threads = set()
+
+    def emit(self, record):
+        self.records.append(record)
+        self.threads.add(threading.current_thread())
+        self.written.set()
+
+
+@pytest.fixture
+def scratch_logger():
+    scratch = logging.getLogger("tictactoe.tests.scratch")
+    scratch.setLevel(logging.DEBUG)
+    scratch.propagate = False
+    yield scratch
+    scratch.handlers.clear()
+
+
+def test_attach_handler_once(scratch_logger):
+    handler = EventHandler()
+    assert attach_handler(scratch_logger, handler)
+    assert not attach_handler(scratch_logger, handler)
+    assert scratch_logger.handlers.count(handler) == 1
+
+def test_configure_logger_does_not_stack_handlers():
+    handlers = list(logger.handlers)
+    with app.test_request_context():
+        for _ in range(3):
+            configure_logger()
+    assert logger.handlers == handlers
+
+def test_records_are_written_in_the_background(scratch_logger):
+    handler = EventHandler()
+    scratch_logger.addHandler(handler)
+    route_through_queue(scratch_logger)
+    route_through_queue(scratch_logger)
+    queue_handlers = [h for h in scratch_logger.handlers if isinstance(h, QueueHandler)]
+    assert queue_handlers == [start_queue_logging()]
+    assert handler not in scratch_logger.handlers
+
+    scratch_logger.info("moved")
+    assert handler.written.wait(timeout=5)
+    assert handler.records[0].getMessage() == "moved"
+    assert threading.current_thread() not in handler.threads
+
+@pytest.mark.skipif(not hasattr(os, "fork"), reason="needs os.fork")
+def test_forked_children_write_their_own_records(scratch_logger, tmp_path):
+    path = tmp_path / "child.log"
+    handler = logging.FileHandler(path)
+    scratch_logger.addHandler(handler)
+    route_through_queue(scratch_logger)
+    pid = os.fork()
+    if pid == 0:
+        # the listener thread is not forked, so the record is written here or not at all
+        try:
+            scratch_logger.warning("from the child")
+            handler.flush()
+        finally:
+            os._exit(0)
+    os.waitpid(pid, 0)
+    assert "from the child" in path.read_text()
+    handler.close()
+
+def test_log_payload_is_level_gated_and_sampled(scratch_logger):
+    handler = EventHandler()
+    scratch_logger.addHandler(handler)
+    payload = {"index": 4}
+    scratch_logger.setLevel(logging.INFO)
+    log_payload(scratch_logger, "Move request", payload, rate=1.0)
+    assert handler.records == []
+
+    scratch_logger.setLevel(logging.DEBUG)
+    log_payload(scratch_logger, "Move request", payload, rate=0.0)
+    assert handler.records == []
+    log_payload(scratch_logger, "Move request", payload, rate=1.0)
+    assert [record.getMessage() for record in handler.records] == ["Move request: {'index': 4}"]
+
+def test_bad_settings_fall_back_to_the_defaults(monkeypatch):
+    handler = EventHandler()
+    logging.getLogger("tictactoe.logs").addHandler(handler)
+    try:
+        monkeypatch.setenv("TICTACTOE_LOG_LEVEL", "debug")
+        assert log_level() == "DEBUG"
+        monkeypatch.setenv("TICTACTOE_LOG_LEVEL", "LOUD")
+        assert log_level() == DEFAULT_LOG_LEVEL
+        monkeypatch.setenv("TICTACTOE_LOG_PAYLOAD_SAMPLE_RATE", "0.5")
+        assert payload_sample_rate() == 0.5
+        monkeypatch.setenv("TICTACTOE_LOG_PAYLOAD_SAMPLE_RATE", "half")
+        assert payload_sample_rate() == DEFAULT_PAYLOAD_SAMPLE_RATE
+        # reported once, not on every payload
+        assert payload_sample_rate() == DEFAULT_PAYLOAD_SAMPLE_RATE
+    finally:
+        logging.getLogger("tictactoe.logs").removeHandler(handler)
+    assert [record.levelno for record in handler.records] == [logging.WARNING] * 2
+
+def test_service_starts_with_a_bad_log_level():
+    env = dict(os.environ, TICTACTOE_LOG_LEVEL="LOUD", TICTACTOE_LOG_PAYLOAD_SAMPLE_RATE="half")
+    script = ("from app import app\n"
+              "print(app.test_client().post('/tictactoe/move', json={'index': 4}).status_code)")
+    result = subprocess.run([sys.executable, "-c", script], cwd=SERVICE_DIR, env=env,
+                            capture_output=True, text=True, check=True)
+    assert result.stdout.strip() == "200"
+    assert "TICTACTOE_LOG_LEVEL='LOUD' is not a log level" in result.stderr
@@ -0,0 +1,160 @@
+import asyncio
+import threading
+import time
+import uuid
+
+import pytest
+
+from app import app
+from tictactoe import INVALID_PLAYERS_ERROR_MSG, INVALID_TIMEOUT_ERROR_MSG, TICKET_NOT_FOUND_ERROR_MSG
+from tictactoe.matchmaking import Match, Matchmaker
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def client():
+    app.config["TESTING"] = True
+    with app.test_client() as client:
+        yield client
+
+@pytest.fixture
+def games():
+    return []
+
+@pytest.fixture
+def matchmaker(games):
+    def create_game(x, o):
+        games.append((x, o))
+        return f"game{len(games)}"
+    return Matchmaker(create_game)
+
+@pytest.fixture
+def apart(games):
+    # Everyone named "<n>-..." is rated n buckets apart, so waiters are only
+    # paired with the partner sharing their number.
+    def create_game(x, o):
+        games.append((x, o))
+        return f"game{len(games)}"
+    return Matchmaker(create_game, lambda player: 3 * int(player.split("-")[0]), bucket_width=1)
+
+
+def test_pairs_first_in_first_out(matchmaker, games):
+    first = matchmaker.join("ann")
+    assert first.match is None and len(matchmaker) == 1
+    second = matchmaker.join("bob")
+    assert games == [("ann", "bob")]
+    assert first.match == Match("game1", "X", "bob")
+    assert second.match == Match("game1", "O", "ann")
+    third = matchmaker.join("cat")
+    assert third.match is None and len(matchmaker) == 1
+
+def test_joining_twice_keeps_the_ticket(matchmaker):
+    ticket = matchmaker.join("ann")
+    assert matchmaker.join("ann") is ticket
+    assert len(matchmaker) == 1
+
+def test_cancel(matchmaker, games):
+    ticket = matchmaker.join("ann")
+    matchmaker.cancel(ticket.ticket_id)
+    assert matchmaker.join("bob").match is None
+    assert games == []
+    with pytest.raises(KeyError):
+        matchmaker.cancel(ticket.ticket_id)
+
+def test_rating_buckets(games):
+    ratings = {"ann": 0, "bob": 50, "cat": 15, "dan": 55}
+    matchmaker = Matchmaker(lambda x, o: games.append((x, o)) or "game", ratings.get, bucket_width=10)
+    for player in ratings:
+        matchmaker.join(player)
+    # cat is one bucket from ann, dan shares bob's
+    assert games == [("ann", "cat"), ("bob", "dan")]
+
+def test_expired_tickets_are_not_paired(games):
+    clock = FakeClock()
+    matchmaker = Matchmaker(lambda x, o: games.append((x, o)) or "game", ticket_ttl=10, clock=clock)
+    ticket = matchmaker.join("ann")
+    clock.now = 11
+    matchmaker.join("bob")
+    assert games == []
+    with pytest.raises(KeyError):
+        matchmaker.get(ticket.ticket_id)
+
+def test_failed_game_creation_requeues_the_opponent(games):
+    def create_game(x, o):
+        if not games:
+            games.append(None)
+            raise RuntimeError("store unavailable")
+        return "game"
+    matchmaker = Matchmaker(create_game)
+    matchmaker.join("ann")
+    with pytest.raises(RuntimeError):
+        matchmaker.join("bob")
+    assert matchmaker.join("cat").match == Match("game", "O", "ann")
+
+def test_thousands_of_waiting_coroutines(apart):
+    waiters = 5000
+
+    async def main():
+        tickets = [apart.join(f"{i}-waiter") for i in range(waiters)]
+        waiting = [asyncio.ensure_future(apart.wait_async(ticket, 10)) for ticket in tickets]
+        await asyncio.sleep(0)
+        # pair from another thread, as a request handler would
+        pairing = threading.Thread(target=lambda: [apart.join(f"{i}-partner") for i in range(waiters)])
+        start = time.perf_counter()
+        pairing.start()
+        matches = await asyncio.gather(*waiting)
+        pairing.join()
+        return matches, time.perf_counter() - start
+
+    matches, elapsed = asyncio.run(main())
+    assert [match.opponent for match in matches] == [f"{i}-partner" for i in range(waiters)]
+    assert len(apart) == 0
+    print(f"{waiters} coroutines paired in {elapsed:.3f}s")
+    assert elapsed < 10
+
+def test_wait_times_out(matchmaker):
+    ticket = matchmaker.join("ann")
+    assert matchmaker.wait(ticket, 0.01) is None
+    assert asyncio.run(matchmaker.wait_async(ticket, 0.01)) is None
+
+def test_matchmake_endpoints(client):
+    ann, bob = f"ann-{uuid.uuid4()}", f"bob-{uuid.uuid4()}"
+    response = client.post("/tictactoe/matchmake", json={"player": ann, "timeout": 0})
+    assert response.status_code == 202
+    ticket = response.get_json()["ticket"]
+    response = client.post("/tictactoe/matchmake", json={"player": bob, "timeout": 0})
+    assert response.status_code == 200
+    match = response.get_json()
+    assert match["mark"] == "O" and match["opponent"] == ann
+    response = client.get(f"/tictactoe/matchmake/{ticket}?timeout=1")
+    assert response.get_json() == {"ticket": ticket, "status": "matched", "game_id": match["game_id"],
+                                   "mark": "X", "opponent": bob}
+
+    game_id = match["game_id"]
+    client.post(f"/tictactoe/games/{game_id}/moves", json={"moves": [0, 3, 1, 4, 2]})
+    assert client.get(f"/tictactoe/players/{ann}").get_json()["wins"] == 1
+
+def test_matchmake_errors(client):
+    response = client.post("/tictactoe/matchmake", json={})
+    assert response.status_code == 400
+    assert response.get_json() == {"error": INVALID_PLAYERS_ERROR_MSG}
+    response = client.post("/tictactoe/matchmake", json={"player": "ann", "timeout": "soon"})
+    assert response.get_json() == {"error": INVALID_TIMEOUT_ERROR_MSG}
+    response = client.get(f"/tictactoe/matchmake/{uuid.uuid4()}")
+    assert response.status_code == 404
+    assert response.get_json() == {"error": TICKET_NOT_FOUND_ERROR_MSG}
+    response = client.delete(f"/tictactoe/matchmake/{uuid.uuid4()}")
+    assert response.status_code == 404
+
+def test_cancel_endpoint(client):
+    response = client.post("/tictactoe/matchmake", json={"player": f"ann-{uuid.uuid4()}", "timeout": 0})
+    ticket = response.get_json()["ticket"]
+    assert client.delete(f"/tictactoe/matchmake/{ticket}").status_code == 204
+    assert client.get(f"/tictactoe/matchmake/{ticket}").status_code == 404
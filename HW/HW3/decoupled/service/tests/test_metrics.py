@@ -0,0 +1,112 @@
+import asyncio
+import random
+import time
+
+import pytest
+from flask import make_response, Response
+
+from app import app
+from tictactoe.metrics import Histogram, Metrics
+
+
+def test_histogram_quantiles():
+    histogram = Histogram("latency", "Latency.")
+    assert histogram.quantile(0.5) is None
+    rng = random.Random(0)
+    samples = sorted(rng.uniform(0.001, 0.1) for _ in range(10_000))
+    for sample in samples:
+        histogram.observe(sample, route="move")
+    assert histogram.count(route="move") == 10_000
+    for q in (0.5, 0.95, 0.99):
+        # accurate to within a bucket, which is 1.5x wide
+        assert histogram.quantile(q, route="move") == pytest.approx(samples[int(q * 10_000)], rel=0.5)
+
+def test_timed_counts_calls_and_errors():
+    metrics = Metrics()
+
+    @metrics.timed()
+    def handler(status):
+        if status is None:
+            raise RuntimeError("boom")
+        with app.app_context():
+            return make_response("", status)
+
+    handler(200)
+    handler(404)
+    with pytest.raises(RuntimeError):
+        handler(None)
+    assert handler.__name__ == "handler"
+    assert metrics.requests.value(route="handler") == 3
+    assert metrics.errors.value(route="handler", status="404") == 1
+    assert metrics.errors.value(route="handler", status="exception") == 1
+    assert metrics.latency.count(route="handler") == 3
+
+def test_timed_streams_until_their_body_is_sent():
+    metrics = Metrics()
+
+    def body():
+        yield "a"
+        time.sleep(0.05)
+        yield "b"
+
+    async def async_body():
+        yield "a"
+        await asyncio.sleep(0.05)
+        yield "b"
+
+    @metrics.timed(route="stream")
+    def stream():
+        return Response(body())
+
+    @metrics.timed(route="stream")
+    async def stream_async():
+        return Response(async_body())
+
+    response = stream()
+    assert metrics.latency.count(route="stream") == 0
+    assert list(response.response) == ["a", "b"]
+    assert metrics.latency.count(route="stream") == 1
+
+    async def consume():
+        response = await stream_async()
+        assert metrics.latency.count(route="stream") == 1
+        return [chunk async for chunk in response.response]
+
+    assert asyncio.run(consume()) == ["a", "b"]
+    assert metrics.requests.value(route="stream") == 2
+    # the time the body took is counted, within a bucket
+    assert metrics.latency.quantile(0.5, route="stream") > 0.02
+
+def test_render():
+    metrics = Metrics(prefix="test")
+    metrics.moves.inc(3)
+    metrics.latency.observe(0.002, route="make_move")
+    metrics.gauge("games_active", "Games.", lambda: 7)
+    text = metrics.render()
+    assert "# TYPE test_request_duration_seconds histogram" in text
+    assert 'test_request_duration_seconds_bucket{route="make_move",le="+Inf"} 1' in text
+    assert 'test_request_duration_seconds_count{route="make_move"} 1' in text
+    assert 'test_request_duration_seconds_quantile{route="make_move",quantile="0.99"}' in text
+    assert "test_moves_total 3" in text
+    assert "test_games_active 7" in text
+
+
+def test_metrics_endpoint():
+    client = app.test_client()
+    game_id = client.post("/tictactoe/games").get_json()["game_id"]
+    client.post(f"/tictactoe/games/{game_id}/moves", json={"moves": [0, 1, 2]})
+    client.post(f"/tictactoe/games/{game_id}/move", json={"index": 0})
+    client.get("/tictactoe/games/missing/board")
+
+    response = client.get("/tictactoe/metrics")
+    assert response.status_code == 200
+    assert response.content_type.startswith("text/plain; version=0.0.4")
+    samples = dict(line.rsplit(" ", 1) for line in response.get_data(as_text=True).splitlines()
+                   if not line.startswith("#"))
+    assert float(samples['tictactoe_requests_total{route="make_moves"}']) >= 1
+    assert float(samples['tictactoe_errors_total{route="make_move",status="400"}']) >= 1
+    assert float(samples['tictactoe_errors_total{route="get_board_state",status="404"}']) >= 1
+    assert float(samples['tictactoe_moves_total']) >= 3
+    assert float(samples['tictactoe_games_active']) >= 1
+    assert 'tictactoe_request_duration_seconds_quantile{route="make_move",quantile="0.95"}' in samples
+    assert "tictactoe_games_evicted_total" in samples
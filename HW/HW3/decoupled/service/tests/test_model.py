@@ -1,7 +1,7 @@
 import pytest
 
-from tictactoe import Board, SQUARE_OCCUPIED_ERROR_MSG
-from tictactoe.model import Model
+from tictactoe import Board, INVALID_BOARD_ERROR_MSG, NOTHING_TO_UNDO_ERROR_MSG, SQUARE_OCCUPIED_ERROR_MSG
+from tictactoe.model import lines, Model, WINNING_LINES
 
 
 @pytest.fixture
@@ -65,4 +65,143 @@ def test_move_occupied(model):
     model.board.squares = ["X", "O", "X", "O", "X", "O", "", "", ""]
     with pytest.raises(ValueError,
                        match=SQUARE_OCCUPIED_ERROR_MSG):
-        model.move(0)
\ No newline at end of file
+        model.move(0)
+
+def test_set_winner_through_index(model):
+    model.board.squares = ["X", "X", "X", "O", "O", "", "", "", ""]
+    # square 4 is not on X's row, so only O's lines through it are checked
+    model.set_winner(4)
+    assert model.winner is None
+    model.set_winner(1)
+    assert model.winner == "X"
+
+def test_board_is_bitboards(model):
+    model.move(4)
+    model.move(0)
+    assert model.x == 1 << 4
+    assert model.o == 1 << 0
+    assert not hasattr(model, "__dict__")
+
+@pytest.mark.parametrize("size, k", [(2, None), (20, None), (5, 6), (5, 2)])
+def test_invalid_board(size, k):
+    with pytest.raises(ValueError, match=INVALID_BOARD_ERROR_MSG):
+        Model(size, k)
+
+def test_default_k():
+    assert Model(4).k == 4
+    assert Model(19).k == 5
+
+def test_large_board():
+    model = Model(19)
+    assert model.board.squares == [""] * 361
+    assert model.get_board_state().size == 19
+
+@pytest.mark.parametrize("step", [1, 19, 20, 18])
+def test_gomoku_winner(step):
+    # five in a row across, down and along both diagonals, with O playing elsewhere
+    model = Model(19, 5)
+    start = 19 * 7 + 7
+    for i in range(5):
+        model.move(start + i * step)
+        assert model.winner == ("X" if i == 4 else None)
+        if i < 4:
+            model.move(i)
+
+def test_four_is_not_five():
+    model = Model(19, 5)
+    for i in range(4):
+        model.move(21 + i)
+        model.move(100 + i)
+    assert model.winner is None
+
+def test_no_wrap_around_edges():
+    # squares 17, 18 end row 0 and 19, 20, 21 start row 1 - not a line
+    model = Model(19, 5)
+    model.board.squares = ["X" if i in (17, 18, 19, 20) else "" for i in range(361)]
+    model.set_winner()
+    assert model.winner is None
+    model.move(21)
+    assert model.winner is None
+
+def test_set_winner_full_scan_large_board():
+    model = Model(7, 4)
+    model.board.squares = ["O" if i in (6, 12, 18, 24) else "" for i in range(49)]
+    model.set_winner()
+    assert model.winner == "O"
+
+def test_move_many(model):
+    model.move_many([0, 3, 1])
+    assert model.get_board_state() == Board(["X", "X", "", "O", "", "", "", "", ""])
+    assert model.player == "O"
+    assert model.version == 3
+
+def test_move_many_rolls_back(model):
+    model.move(4)
+    with pytest.raises(ValueError, match=SQUARE_OCCUPIED_ERROR_MSG):
+        model.move_many([0, 1, 4])
+    assert model.get_board_state() == Board(["", "", "", "", "X", "", "", "", ""])
+    assert model.player == "O"
+    assert model.version == 1
+
+@pytest.mark.parametrize("size, k", [(3, 3), (8, 4), (19, 5)])
+def test_bytes_round_trip(size, k):
+    model = Model(size, k)
+    model.move_many([0, size * size - 1, size + 1])
+    packed = model.to_bytes()
+    assert len(packed) == 8 + 2 * ((size * size + 7) // 8)
+    restored = Model.from_bytes(packed)
+    for attribute in Model.__slots__:
+        assert getattr(restored, attribute) == getattr(model, attribute)
+
+def test_copy(model):
+    model.observer = lambda *event: None
+    model.move(4)
+    copy = model.copy()
+    copy.move(0)
+    assert model.get_board_state().squares[0] == ""
+    assert copy.get_board_state().squares[4] == "X"
+    assert copy.observer is None
+
+def test_undo(model):
+    events = []
+    model.observer = lambda *event: events.append(event)
+    model.move_many([0, 3, 1, 4, 2])
+    assert model.winner == "X"
+    model.undo(2)
+    assert model.winner is None
+    assert model.player == "X"
+    assert model.version == 6
+    assert model.get_board_state().squares[2] == ""
+    assert events[-1] == (6, 2, "")
+    with pytest.raises(ValueError, match=NOTHING_TO_UNDO_ERROR_MSG):
+        model.undo(1)  # X's square, but O moved last
+
+def test_changes_since():
+    model = Model(19)
+    assert model.changes_since(0) == {}
+    model.move(10)
+    assert model.changes_since(0) is None
+    model.keep_changes()
+    model.move_many([20, 30, 40])
+    model.undo(40)
+    assert model.changes_since(1) == {"O": [20], "X": [30], "": [40]}
+    assert model.changes_since(3) == {"": [40]}
+    assert model.changes_since(0) is None
+    assert model.changes_since(9) is None
+    with pytest.raises(ValueError):
+        model.move_many([50, 20])
+    assert model.changes_since(4) == {"": [40]}
+
+def test_change_log_is_bounded():
+    model = Model(19)
+    model.keep_changes(limit=3)
+    model.move_many([0, 1, 2, 3, 4])
+    assert model.changes_since(2) == {"X": [2, 4], "O": [3]}
+    assert model.changes_since(1) is None
+    assert model.copy().changes is None
+
+def test_lines():
+    assert set(lines(3, 3)) == {tuple(sorted(line)) for line in WINNING_LINES}
+    # 15 starts along each of 19 rows and columns, 15 x 15 along each diagonal
+    assert len(lines(19, 5)) == 2 * 19 * 15 + 2 * 15 * 15
+    assert (20, 40, 60, 80, 100) in lines(19, 5)
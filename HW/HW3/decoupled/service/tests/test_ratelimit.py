@@ -0,0 +1,98 @@
+import pytest
+
+from app import app
+from tictactoe import controller, RATE_LIMITED_ERROR_MSG
+from tictactoe.ratelimit import from_env, RateLimiter
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock():
+    return FakeClock()
+
+@pytest.fixture
+def client():
+    app.config["TESTING"] = True
+    with app.test_client() as client:
+        yield client
+
+
+def test_burst_then_rate(clock):
+    limiter = RateLimiter(rate=2, burst=3, clock=clock)
+    assert [limiter.acquire("a") for _ in range(3)] == [0, 0, 0]
+    assert limiter.acquire("a") == pytest.approx(0.5)
+    assert limiter.acquire("b") == 0
+    clock.now = 0.5
+    assert limiter.acquire("a") == 0
+    assert limiter.acquire("a") > 0
+    assert limiter.refused == 2
+
+def test_refilled_buckets_are_dropped(clock):
+    limiter = RateLimiter(rate=1, burst=2, clock=clock)
+    limiter.acquire("a")
+    clock.now = 1
+    limiter.acquire("b")
+    clock.now = 2.5
+    limiter.acquire("c")
+    assert len(limiter) == 2
+    clock.now = 10
+    limiter.acquire("d")
+    assert len(limiter) == 1
+
+def test_buckets_are_bounded(clock):
+    limiter = RateLimiter(rate=1, burst=1, max_buckets=100, clock=clock)
+    for n in range(1000):
+        limiter.acquire(str(n))
+    assert len(limiter) == 100
+
+def test_from_env(monkeypatch):
+    monkeypatch.setenv("LIMIT", "0")
+    assert from_env("LIMIT", 10) is None
+    monkeypatch.setenv("LIMIT", "5")
+    assert from_env("LIMIT", 10).burst == 10
+    # a bad value is logged, and the default used
+    for value in ("fast", "nan", "inf"):
+        monkeypatch.setenv("LIMIT", value)
+        assert from_env("LIMIT", 10).rate == 10
+
+def test_429_with_retry_after(client, monkeypatch):
+    monkeypatch.setattr(controller, "CLIENT_LIMITER", RateLimiter(rate=0.5, burst=2))
+    assert client.get("/tictactoe/healthcheck").status_code == 200
+    assert client.get("/tictactoe/healthcheck").status_code == 200
+    response = client.get("/tictactoe/healthcheck")
+    assert response.status_code == 429
+    assert response.get_json() == {"error": RATE_LIMITED_ERROR_MSG}
+    assert response.headers["Retry-After"] == "2"
+    # another client is not held back
+    assert client.get("/tictactoe/healthcheck", environ_base={"REMOTE_ADDR": "10.0.0.2"}).status_code == 200
+
+def test_per_game_limit(client, monkeypatch):
+    monkeypatch.setattr(controller, "GAME_LIMITER", RateLimiter(rate=0.5, burst=1))
+    first = client.post("/tictactoe/games").get_json()["game_id"]
+    second = client.post("/tictactoe/games").get_json()["game_id"]
+    assert client.post(f"/tictactoe/games/{first}/move", json={"index": 0}).status_code == 200
+    assert client.post(f"/tictactoe/games/{first}/move", json={"index": 1}).status_code == 429
+    assert client.post(f"/tictactoe/games/{second}/move", json={"index": 0}).status_code == 200
+
+def test_per_game_limit_counts_only_changes(client, monkeypatch):
+    monkeypatch.setattr(controller, "GAME_LIMITER", RateLimiter(rate=0.5, burst=1))
+    game_id = client.post("/tictactoe/games").get_json()["game_id"]
+    for _ in range(5):
+        assert client.get(f"/tictactoe/games/{game_id}/board").status_code == 200
+        assert client.get(f"/tictactoe/games/{game_id}/events?timeout=0").status_code == 200
+    assert client.post(f"/tictactoe/games/{game_id}/move", json={"index": 0}).status_code == 200
+    assert client.post(f"/tictactoe/games/{game_id}/move", json={"index": 1}).status_code == 429
+
+def test_legacy_routes_share_the_default_games_limit(client, monkeypatch):
+    monkeypatch.setattr(controller, "GAME_LIMITER", RateLimiter(rate=0.5, burst=1))
+    assert client.post("/tictactoe/undo").status_code != 429
+    assert client.post("/tictactoe/move", json={"index": 0}).status_code == 429
+    assert client.post("/tictactoe/moves", json={"moves": [0]}).status_code == 429
+    assert client.get("/tictactoe/board").status_code == 200
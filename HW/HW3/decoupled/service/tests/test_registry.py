@@ -0,0 +1,84 @@
+import pytest
+
+from tictactoe import GAME_NOT_FOUND_ERROR_MSG
+from tictactoe.model import Model
+from tictactoe.registry import GameRegistry
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock():
+    return FakeClock()
+
+@pytest.fixture
+def registry(clock):
+    return GameRegistry(ttl=10, max_games=3, clock=clock)
+
+
+def test_create_and_get(registry):
+    game = registry.create()
+    assert isinstance(game.model, Model)
+    assert registry.get(game.game_id) is game
+    assert game.game_id in registry
+    assert len(registry) == 1
+
+def test_games_are_independent(registry):
+    first = registry.create()
+    second = registry.create()
+    first.model.move(0)
+    assert second.model.get_board_state().squares[0] == ""
+
+def test_get_missing(registry):
+    with pytest.raises(KeyError, match=GAME_NOT_FOUND_ERROR_MSG):
+        registry.get("nope")
+
+def test_delete(registry):
+    game = registry.create()
+    registry.delete(game.game_id)
+    assert game.game_id not in registry
+    with pytest.raises(KeyError, match=GAME_NOT_FOUND_ERROR_MSG):
+        registry.delete(game.game_id)
+
+def test_ttl_eviction(registry, clock):
+    game = registry.create()
+    clock.now = 5
+    registry.get(game.game_id)  # touching the game resets its TTL
+    clock.now = 14
+    assert registry.get(game.game_id) is game
+    clock.now = 25
+    with pytest.raises(KeyError, match=GAME_NOT_FOUND_ERROR_MSG):
+        registry.get(game.game_id)
+    assert registry.evictions == 1
+
+def test_evict_expired(registry, clock):
+    old = registry.create()
+    clock.now = 8
+    young = registry.create()
+    clock.now = 15
+    assert registry.evict_expired() == 1
+    assert old.game_id not in registry
+    assert young.game_id in registry
+
+def test_lru_eviction(registry):
+    games = [registry.create() for _ in range(3)]
+    registry.get(games[0].game_id)  # games[1] is now the least recently used
+    newest = registry.create()
+    assert len(registry) == 3
+    assert games[1].game_id not in registry
+    assert games[0].game_id in registry
+    assert newest.game_id in registry
+    assert registry.evictions == 1
+
+def test_many_games_stay_bounded():
+    registry = GameRegistry(max_games=1000)
+    for _ in range(5000):
+        registry.create()
+    assert len(registry) == 1000
+    assert registry.evictions == 4000
@@ -0,0 +1,59 @@
+import numpy as np
+import pytest
+
+from tictactoe import INVALID_BOARD_ERROR_MSG, SQUARE_OCCUPIED_ERROR_MSG
+from tictactoe.simulation import greedy_policy, O, random_policy, Simulation, X
+
+
+def test_invalid_board():
+    with pytest.raises(ValueError, match=INVALID_BOARD_ERROR_MSG):
+        Simulation(10, size=20)
+
+def test_step_detects_wins():
+    simulation = Simulation(2)
+    # Game 0: X takes the top row. Game 1: X takes the middle row two moves later.
+    for squares in ([0, 3], [3, 1], [1, 4], [4, 2], [2, 6]):
+        simulation.step(np.array(squares))
+    assert simulation.winner.tolist() == [X, 0]
+    assert simulation.active.tolist() == [False, True]
+    simulation.step(np.array([0, 8]))  # game 0 is over, its square is ignored
+    simulation.step(np.array([0, 5]))
+    assert simulation.winner.tolist() == [X, X]
+    assert simulation.length.tolist() == [5, 7]
+    assert simulation.to_model(1).winner == "X"
+
+def test_step_rejects_occupied_squares():
+    simulation = Simulation(2)
+    simulation.step(np.array([4, 4]))
+    with pytest.raises(ValueError, match=SQUARE_OCCUPIED_ERROR_MSG):
+        simulation.step(np.array([0, 4]))
+
+def test_completing():
+    simulation = Simulation(1, size=5, k=4)
+    for square in (0, 20, 1, 21, 2):
+        simulation.step(np.array([square]))
+    assert np.flatnonzero(simulation.completing(X)[0]).tolist() == [3]
+    assert not simulation.completing(O).any()
+
+@pytest.mark.parametrize("size, k, policy", [(3, 3, "random"), (3, 3, "greedy"),
+                                             (6, 4, "random"), (9, 5, "greedy")])
+def test_agrees_with_model(size, k, policy):
+    simulation = Simulation(2000, size, k)
+    outcomes = simulation.run(policy, seed=size)
+    assert outcomes.games == 2000 and outcomes.lengths.sum() == 2000
+    assert simulation.verify(sample=200, seed=k) == []
+
+def test_random_play_outcomes():
+    # Random play on 3x3 is known exactly: X wins 58.5%, O 28.8%, draws 12.7%.
+    distribution = Simulation(100_000).run(seed=0).distribution()
+    assert distribution["X"] == pytest.approx(0.585, abs=0.01)
+    assert distribution["O"] == pytest.approx(0.288, abs=0.01)
+    assert distribution["draw"] == pytest.approx(0.127, abs=0.01)
+
+def test_greedy_beats_random():
+    def x_greedy(simulation, rng):
+        policy = greedy_policy if simulation.player == X else random_policy
+        return policy(simulation, rng)
+
+    outcomes = Simulation(20_000).run(x_greedy, seed=1)
+    assert outcomes.distribution()["X"] > 0.8
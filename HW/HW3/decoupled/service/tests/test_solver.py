@@ -0,0 +1,144 @@
+import itertools
+import os
+import subprocess
+import sys
+import time
+
+from app import app
+from tictactoe import INVALID_DEPTH_ERROR_MSG
+from tictactoe import solver
+from tictactoe.model import Model, WIN_MASKS
+from tictactoe.solver import best_move, canonical, perfect_play_table, Searcher, Solution, TranspositionTable
+
+SERVICE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def play(moves, size=3, k=None):
+    model = Model(size, k)
+    model.move_many(moves)
+    return model
+
+def exhaustive(mover, other):
+    # Plain minimax over the 3x3 board, without tables or symmetries.
+    best = -2
+    for index in range(9):
+        if (mover | other) >> index & 1:
+            continue
+        played = mover | 1 << index
+        if any(played & mask == mask for mask in WIN_MASKS):
+            return 1
+        value = 0 if played | other == solver.FULL_3X3 else -exhaustive(other, played)
+        best = max(best, value)
+    return best
+
+
+def test_symmetries():
+    assert len(set(solver.SYMMETRIES)) == 8
+    for perm, inverse in zip(solver.SYMMETRIES, solver.INVERSES):
+        assert [inverse[perm[i]] for i in range(9)] == list(range(9))
+    # The four corners fold to the same position, as do the four edges.
+    assert len({canonical(0, 1 << corner)[0] for corner in (0, 2, 6, 8)}) == 1
+    assert len({canonical(0, 1 << edge)[0] for edge in (1, 3, 5, 7)}) == 1
+
+def test_perfect_play_table():
+    table = perfect_play_table()
+    assert len(table) == 627
+    assert perfect_play_table() is table
+
+def test_table_is_built_at_startup():
+    script = ("from app import app\n"
+              "from tictactoe.solver import perfect_play_table\n"
+              "print(perfect_play_table.cache_info().currsize)")
+    output = subprocess.run([sys.executable, "-c", script], cwd=SERVICE_DIR,
+                            env=dict(os.environ, TICTACTOE_LOG_LEVEL="WARNING"),
+                            capture_output=True, text=True, check=True).stdout
+    assert output.strip() == "1"
+
+def test_empty_board_is_a_draw():
+    assert best_move(Model()) == Solution(0, 0.0, True)
+
+def test_takes_a_win_and_blocks_a_loss():
+    # X: 0, 1; O: 3, 4 and X to move: X wins at 2.
+    assert best_move(play([0, 3, 1, 4])) == Solution(2, 1.0, True)
+    # X: 0, 1; O: 4 and O to move: O must block at 2.
+    assert best_move(play([0, 4, 1])).move == 2
+
+def test_table_agrees_with_exhaustive_search():
+    for moves in itertools.permutations(range(9), 3):
+        model = play(moves)
+        solution = best_move(model)
+        mover, other = (model.x, model.o) if model.player == "X" else (model.o, model.x)
+        assert solution.value == exhaustive(mover, other)
+        # The suggested move must be worth as much as the position.
+        after = play(moves + (solution.move,))
+        if after.winner is None:
+            assert -best_move(after).value == solution.value
+
+def test_finished_game():
+    assert best_move(play([0, 3, 1, 4, 2])) == Solution(None, -1.0, True)
+
+def test_small_board_is_solved():
+    solution = best_move(Model(4, 3), depth=6)
+    assert solution.exact and solution.value == 1.0
+
+def test_large_board_finds_wins_and_blocks():
+    # X has three in a row on row 9 with both ends open, and O is scattered.
+    x_moves, o_moves = [180, 181, 182], [0, 40, 80]
+    model = play([square for pair in zip(x_moves, o_moves) for square in pair], size=19)
+    solution = best_move(model)
+    assert solution.move in (179, 183) and solution.value == 1.0
+    # With four in a row open at both ends, O to move cannot stop X.
+    model.move_many([183, 120, 300])
+    assert model.player == "O"
+    assert best_move(model).value == -1.0
+
+def test_search_is_bounded():
+    table = TranspositionTable(max_entries=2)
+    for key in range(3):
+        table.put((key, 0), (1, 0.0, TranspositionTable.EXACT, None, False))
+    assert len(table) == 2 and table.get((0, 0)) is None
+
+    searcher = Searcher(9, 5, max_entries=100)
+    searcher.search(0, 0, 4)
+    assert len(searcher.table) <= 100
+
+
+def test_search_does_not_depend_on_history():
+    # Bounds left in the table by earlier searches once read as exact values.
+    history = [(256, 32, 9), (64, 16, 9), (0, 64, 3), (0, 0, 3), (256, 8, 9), (256, 1, 9), (96, 392, 9),
+               (0, 256, 9), (0, 0, 9), (4, 80, 9), (64, 2, 9), (256, 66, 9), (1, 80, 3), (0, 64, 9),
+               (80, 288, 3), (128, 80, 9), (32, 80, 9)]
+    searcher = Searcher(3, 3)
+    for position in history:
+        assert searcher.search(*position) == Searcher(3, 3).search(*position)
+    assert searcher.search(32, 80, 9).value == -1.0
+
+    searcher = Searcher(4, 3)
+    positions = [(1 << 5, 1 << 6, 2), (1 << 5 | 1 << 9, 1 << 6 | 1 << 10, 2), (0, 1 << 5, 2)]
+    before = [searcher.search(*position) for position in positions]
+    searcher.search(0, 0, 4)
+    assert [searcher.search(*position) for position in positions] == before
+
+
+def test_search_is_timed():
+    model = play([179, 181, 161, 199, 160, 200, 182, 178, 218], size=19, k=5)
+    start = time.monotonic()
+    solution = Searcher(19, 5, time_budget=0.2).search(model.o, model.x, solver.MAX_DEPTH)
+    assert time.monotonic() - start < 1.0
+    assert solution.move is not None and not solution.exact
+    assert not model.x >> solution.move & 1 and not model.o >> solution.move & 1
+
+
+def test_best_move_endpoint():
+    client = app.test_client()
+    game_id = client.post("/tictactoe/games").get_json()["game_id"]
+    client.post(f"/tictactoe/games/{game_id}/moves", json={"moves": [0, 3, 1, 4]})
+    response = client.get(f"/tictactoe/games/{game_id}/best_move")
+    assert response.status_code == 200
+    assert response.get_json() == {"move": 2, "value": 1.0, "exact": True}
+
+    response = client.get(f"/tictactoe/games/{game_id}/best_move?depth=deep")
+    assert response.status_code == 400
+    assert response.get_json() == {"error": INVALID_DEPTH_ERROR_MSG}
+    assert client.get("/tictactoe/games/missing/best_move").status_code == 404
+    assert client.get("/tictactoe/best_move").status_code == 200
@@ -0,0 +1,131 @@
+import uuid
+
+import pytest
+
+from app import app
+from tictactoe import INVALID_PLAYERS_ERROR_MSG, INVALID_TOP_ERROR_MSG, PLAYER_NOT_FOUND_ERROR_MSG
+from tictactoe.model import Model
+from tictactoe.stats import DRAW, outcome, PlayerRecord, PlayerStats, RedisPlayerStats
+
+
+@pytest.fixture
+def client():
+    app.config["TESTING"] = True
+    with app.test_client() as client:
+        yield client
+
+@pytest.fixture(params=["memory", "redis"])
+def stats(request):
+    if request.param == "memory":
+        return PlayerStats()
+    return RedisPlayerStats(request.getfixturevalue("redis_client"), prefix=f"test:{uuid.uuid4()}:")
+
+def names(records):
+    return [record.name for record in records]
+
+
+def test_outcome():
+    model = Model()
+    assert outcome(model) is None
+    model.move_many([0, 3, 1, 4, 2])
+    assert outcome(model) == "X"
+    model = Model()
+    model.move_many([0, 1, 2, 4, 3, 5, 7, 6, 8])
+    assert outcome(model) == DRAW
+
+def test_results_are_counted_once(stats):
+    stats.seat("g1", "ann", "bob")
+    assert stats.players("g1") == ("ann", "bob")
+    assert stats.settle("g1", "O")
+    assert not stats.settle("g1", "O")
+    assert not stats.settle("unseated", "X")
+    assert stats.record("ann") == PlayerRecord("ann", 0, 1, 0)
+    assert stats.record("bob") == PlayerRecord("bob", 1, 0, 0)
+    with pytest.raises(KeyError):
+        stats.record("cat")
+
+def test_unseated_games_are_not_counted(stats):
+    stats.seat("g1", "ann", "bob")
+    stats.unseat("g1")
+    assert not stats.settle("g1", "X")
+    assert len(stats) == 0
+
+def test_ranking(stats):
+    for game_id, (x, o, result) in enumerate([("ann", "bob", "X"), ("cat", "dan", "X"),
+                                              ("bob", "cat", DRAW), ("dan", "ann", "O")]):
+        stats.seat(str(game_id), x, o)
+        stats.settle(str(game_id), result)
+    # ann 4 points, cat 3, bob 1, dan 0; ties go to whoever got there first
+    assert names(stats.top(10)) == ["ann", "cat", "bob", "dan"]
+    assert names(stats.top(2)) == ["ann", "cat"]
+    assert stats.top(1)[0].points == 4
+
+def test_ranking_matches_sorting(stats):
+    players = [f"p{i}" for i in range(50)]
+    for game in range(2000):
+        x, o = players[game * 7 % 50], players[(game * 13 + 1) % 50]
+        if x == o:
+            continue
+        stats.seat(str(game), x, o)
+        stats.settle(str(game), ("X", "O", DRAW)[game % 3])
+    records = [stats.record(name) for name in players]
+    assert [record.points for record in stats.top(50)] == sorted((r.points for r in records), reverse=True)
+
+def test_leaderboard_endpoint(client):
+    ann, bob = f"ann-{uuid.uuid4()}", f"bob-{uuid.uuid4()}"
+    game_id = client.post("/tictactoe/games", json={"players": [ann, bob]}).get_json()["game_id"]
+    client.post(f"/tictactoe/games/{game_id}/moves", json={"moves": [0, 3, 1, 4, 2]})
+    # moves after the game is settled do not count again
+    client.post(f"/tictactoe/games/{game_id}/move", json={"index": 8})
+    response = client.get(f"/tictactoe/players/{ann}")
+    assert response.get_json() == {"name": ann, "wins": 1, "losses": 0, "draws": 0, "points": 2}
+    assert client.get(f"/tictactoe/players/{bob}").get_json()["losses"] == 1
+    leaders = client.get("/tictactoe/leaderboard?top=1000").get_json()["players"]
+    assert [leader["name"] for leader in leaders].index(ann) < [leader["name"] for leader in leaders].index(bob)
+    assert leaders[0]["rank"] == 1
+
+def test_leaderboard_errors(client):
+    for top in ("x", "0", "100000"):
+        response = client.get(f"/tictactoe/leaderboard?top={top}")
+        assert response.status_code == 400
+        assert response.get_json() == {"error": INVALID_TOP_ERROR_MSG}
+    response = client.get(f"/tictactoe/players/{uuid.uuid4()}")
+    assert response.status_code == 404
+    assert response.get_json() == {"error": PLAYER_NOT_FOUND_ERROR_MSG}
+    for players in (["ann"], ["ann", "ann"], "ann", ["ann", 3]):
+        response = client.post("/tictactoe/games", json={"players": players})
+        assert response.status_code == 400
+        assert response.get_json() == {"error": INVALID_PLAYERS_ERROR_MSG}
+
+def test_records_are_saved_and_loaded():
+    stats = PlayerStats()
+    stats.keep_changes()
+    for game_id, (x, o, result) in enumerate([("ann", "bob", "X"), ("cat", "dan", "X"),
+                                              ("bob", "cat", DRAW), ("dan", "ann", "O")]):
+        stats.seat(str(game_id), x, o)
+        stats.settle(str(game_id), result)
+    stats.seat("open", "bob", "dan")
+    players, seats = stats.changes()
+    assert set(players) == {"ann", "bob", "cat", "dan"}
+    assert seats == {"0": None, "1": None, "2": None, "3": None, "open": ("bob", "dan")}
+    assert stats.changes() == ({}, {})
+
+    loaded = PlayerStats()
+    loaded.load(players, {"open": ("bob", "dan")})
+    assert loaded.top(10) == stats.top(10)
+    assert loaded.settle("open", "X")
+    stats.settle("open", "X")
+    # bob reaches 3 points after cat, so ranks behind them in both
+    assert loaded.top(10) == stats.top(10)
+    assert names(loaded.top(10)) == ["ann", "cat", "bob", "dan"]
+
+def test_redis_records_are_shared_between_workers(redis_client):
+    prefix = f"test:{uuid.uuid4()}:"
+    first, second = RedisPlayerStats(redis_client, prefix), RedisPlayerStats(redis_client, prefix)
+    first.seat("g1", "ann", "bob")
+    assert second.players("g1") == ("ann", "bob")
+    assert second.settle("g1", DRAW)
+    assert not first.settle("g1", DRAW)
+    assert first.record("ann") == PlayerRecord("ann", 0, 0, 1)
+    assert first.points("bob") == 1 and first.points("cat") == 0
+    assert len(first) == 2
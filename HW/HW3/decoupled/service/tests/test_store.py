@@ -0,0 +1,213 @@
+import threading
+
+import pytest
+import redis
+
+from app import app
+from tictactoe import controller, GAME_NOT_FOUND_ERROR_MSG, VersionConflictError
+from tictactoe.model import Model
+from tictactoe.registry import GameRegistry
+from tictactoe.store import create_store, InMemoryStore, RedisStore
+
+
+@pytest.fixture(params=["memory", "redis"])
+def store(request):
+    if request.param == "memory":
+        return InMemoryStore(GameRegistry())
+    return RedisStore(request.getfixturevalue("redis_client"), ttl=60)
+
+
+def test_create_get_delete(store):
+    game = store.create(5, 4)
+    loaded = store.get(game.game_id)
+    assert (loaded.model.size, loaded.model.k) == (5, 4)
+    store.delete(game.game_id)
+    with pytest.raises(KeyError, match=GAME_NOT_FOUND_ERROR_MSG):
+        store.get(game.game_id)
+    with pytest.raises(KeyError, match=GAME_NOT_FOUND_ERROR_MSG):
+        store.delete(game.game_id)
+
+def test_update(store):
+    game = store.create()
+    snapshot = store.update(game, lambda model: model.move(4))
+    assert snapshot.version == 1
+    assert store.get(game.game_id).model.get_board_state().squares[4] == "X"
+
+def test_failed_update_changes_nothing(store):
+    game = store.create()
+    store.update(game, lambda model: model.move(4))
+    with pytest.raises(ValueError):
+        store.update(game, lambda model: model.move_many([0, 4]))
+    assert store.get(game.game_id).model.version == 1
+
+def test_get_and_put_many(store):
+    games = [store.create() for _ in range(3)]
+    store.update(games[1], lambda model: model.move(0))
+    models = store.get_many([game.game_id for game in games] + ["missing"])
+    assert sorted(models) == sorted(game.game_id for game in games)
+    assert models[games[1].game_id].version == 1
+
+    restored = Model(4)
+    restored.move(15)
+    store.put_many({"restored": restored, games[0].game_id: restored})
+    assert store.get("restored").model.to_bytes() == restored.to_bytes()
+    assert store.get(games[0].game_id).model.size == 4
+
+def test_concurrent_updates(store):
+    game = store.create(19)
+    claimed = []
+
+    def claim(offset):
+        for index in range(offset, 361, 8):
+            store.update(store.get(game.game_id), lambda model: model.move(index))
+            claimed.append(index)
+
+    threads = [threading.Thread(target=claim, args=(offset,)) for offset in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert sorted(claimed) == list(range(361))
+    assert store.get(game.game_id).model.version == 361
+
+
+class CountingConnection(redis.Connection):
+    # Each send is one round trip: a pipeline packs all its commands into one.
+    round_trips = 0
+
+    def send_packed_command(self, command, check_health=True):
+        CountingConnection.round_trips += 1
+        super().send_packed_command(command, check_health)
+
+
+def test_redis_round_trips(redis_server):
+    client = redis.Redis(connection_pool=redis.ConnectionPool(port=redis_server.port,
+                                                              connection_class=CountingConnection))
+    store = RedisStore(client, ttl=60)
+    games = [store.create() for _ in range(50)]
+    CountingConnection.round_trips = 0
+    store.get_many([game.game_id for game in games])
+    assert CountingConnection.round_trips == 1
+    store.put_many({game.game_id: game.model for game in games})
+    assert CountingConnection.round_trips == 2
+    store.get(games[0].game_id)  # GET and EXPIRE pipelined together
+    assert CountingConnection.round_trips == 3
+
+def test_redis_refreshes_ttl(redis_client):
+    store = RedisStore(redis_client, ttl=60)
+    game = store.create()
+    key = f"tictactoe:game:{game.game_id}"
+    redis_client.expire(key, 1)
+    store.get(game.game_id)
+    assert redis_client.ttl(key) == 60
+    assert redis_client.get(key) == game.epoch.encode() + game.model.to_bytes()
+
+def test_redis_reports_expired_games(redis_client):
+    expired = []
+    store = RedisStore(redis_client, ttl=60, on_expire=expired.append)
+    games = [store.create() for _ in range(3)]
+    for game in games:
+        redis_client.delete(f"tictactoe:game:{game.game_id}")  # as if Redis expired it
+    with pytest.raises(KeyError):
+        store.get(games[0].game_id)
+    with pytest.raises(KeyError):
+        store.update(games[1], lambda model: model.move(0))
+    with pytest.raises(KeyError):
+        store.delete(games[2].game_id)
+    assert expired == [game.game_id for game in games]
+
+def test_redis_retries_on_conflict(redis_client):
+    store = RedisStore(redis_client, ttl=60)
+    game = store.create()
+    other = store.get(game.game_id)
+    calls = []
+
+    def move_after_interference(model):
+        calls.append(model.version)
+        if len(calls) == 1:
+            # another worker moves between our read and our write
+            store.update(other, lambda model: model.move(0))
+        model.move(4)
+
+    snapshot = store.update(game, move_after_interference)
+    assert calls == [0, 1]
+    assert snapshot.version == 2
+    assert snapshot.get_board_state().squares[:5] == ["X", "", "", "", "O"]
+
+def test_redis_gives_up_after_repeated_conflicts(redis_client):
+    store = RedisStore(redis_client, ttl=60)
+    game = store.create()
+    key = f"tictactoe:game:{game.game_id}"
+
+    def always_interfere(model):
+        redis_client.set(key, game.epoch.encode() + model.to_bytes())
+
+    with pytest.raises(VersionConflictError):
+        store.update(game, always_interfere)
+
+def test_app_with_redis_store(redis_client, monkeypatch):
+    monkeypatch.setattr(controller, "STORE", RedisStore(redis_client, ttl=60))
+    client = app.test_client()
+    game_id = client.post("/tictactoe/games").get_json()["game_id"]
+    assert redis_client.exists(f"tictactoe:game:{game_id}")
+    response = client.post(f"/tictactoe/games/{game_id}/moves", json={"moves": [0, 3, 1, 4, 2]})
+    assert response.get_json()["winner"] == "X"
+    response = client.get(f"/tictactoe/games/{game_id}/board")
+    assert response.headers["ETag"] == f'"{controller.STORE.get(game_id).epoch}-5"'
+    response = client.post(f"/tictactoe/games/{game_id}/move",
+                           json={"index": 8, "expected_version": 4})
+    assert response.status_code == 409
+    assert client.delete(f"/tictactoe/games/{game_id}").status_code == 204
+    assert client.get(f"/tictactoe/games/{game_id}/board").status_code == 404
+
+def test_expired_redis_games_free_their_seats(redis_server, monkeypatch):
+    monkeypatch.setenv("TICTACTOE_REDIS_URL", f"redis://127.0.0.1:{redis_server.port}/0")
+    monkeypatch.setattr(controller, "STORE", create_store(GameRegistry(), on_expire=controller.STATS.unseat))
+    client = app.test_client()
+    game_id = client.post("/tictactoe/games", json={"players": ["ann", "bob"]}).get_json()["game_id"]
+    assert controller.STATS.players(game_id) == ("ann", "bob")
+    controller.STORE.client.delete(f"tictactoe:game:{game_id}")  # as if Redis expired it
+    assert client.get(f"/tictactoe/games/{game_id}/board").status_code == 404
+    assert controller.STATS.players(game_id) is None
+
+def test_default_game_is_shared_through_redis(redis_client, monkeypatch):
+    # two workers, each with its own store over the same Redis
+    client = app.test_client()
+    monkeypatch.setattr(controller, "STORE", RedisStore(redis_client, ttl=60))
+    assert client.post("/tictactoe/move", json={"index": 4}).status_code == 200
+    monkeypatch.setattr(controller, "STORE", RedisStore(redis_client, ttl=60))
+    assert client.get("/tictactoe/board").get_json()["board"][4] == "X"
+    assert client.post("/tictactoe/move", json={"index": 0}).get_json()["player"] == "X"
+    assert redis_client.exists("tictactoe:game:default")
+
+def test_workers_agree_on_etags(redis_client, monkeypatch):
+    client = app.test_client()
+    monkeypatch.setattr(controller, "STORE", RedisStore(redis_client, ttl=60))
+    game_id = client.post("/tictactoe/games").get_json()["game_id"]
+    url = f"/tictactoe/games/{game_id}/board"
+    etag = client.post(f"/tictactoe/games/{game_id}/move", json={"index": 4}).headers["ETag"]
+    assert client.get(url).headers["ETag"] == etag
+    # another worker answers the same tag with a 304
+    monkeypatch.setattr(controller, "STORE", RedisStore(redis_client, ttl=60))
+    assert client.get(url, headers={"If-None-Match": etag}).status_code == 304
+    # a game stored again, as on a restore, gets a new epoch
+    controller.STORE.put_many({game_id: controller.STORE.get(game_id).model})
+    assert client.get(url, headers={"If-None-Match": etag}).status_code == 200
+
+def test_redis_deltas_reach_every_worker(redis_client, monkeypatch):
+    client = app.test_client()
+    monkeypatch.setattr(controller, "STORE", RedisStore(redis_client, ttl=60))
+    game_id = client.post("/tictactoe/games", json={"size": 19}).get_json()["game_id"]
+    url = f"/tictactoe/games/{game_id}/board"
+    client.post(f"/tictactoe/games/{game_id}/moves", json={"moves": [0, 180, 360]})
+    # a worker that never served the game answers from the log kept in Redis
+    monkeypatch.setattr(controller, "STORE", RedisStore(redis_client, ttl=60))
+    response = client.get(f"{url}?since=1")
+    assert response.get_json() == {"version": 3, "since": 1, "delta": {"O": [180], "X": [360]}}
+    assert client.get(f"{url}?since=0").get_json()["delta"] == {"X": [0, 360], "O": [180]}
+    assert redis_client.ttl(f"tictactoe:game:{game_id}:changes") == 60
+    # a restored game starts a new log
+    controller.STORE.put_many({game_id: controller.STORE.get(game_id).model})
+    assert "board" in client.get(f"{url}?since=2").get_json()
+    assert client.delete(f"/tictactoe/games/{game_id}").status_code == 204
+    assert not redis_client.exists(f"tictactoe:game:{game_id}:changes")
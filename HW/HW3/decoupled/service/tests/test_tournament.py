@@ -0,0 +1,61 @@
+from concurrent.futures import ProcessPoolExecutor
+import functools
+import random
+
+import pytest
+
+from tictactoe import TOO_FEW_POLICIES_ERROR_MSG
+from tictactoe.model import Model
+from tictactoe.tournament import (greedy_policy, MatchResult, play_games, POLICIES, random_policy,
+                                  solver_policy, Tournament)
+
+
+def test_greedy_policy_wins_then_blocks():
+    model = Model()
+    model.move_many([0, 3, 1])
+    # O cannot win yet, so it blocks X's row
+    assert greedy_policy(model, random.Random(0)) == 2
+    model = Model()
+    model.move_many([0, 3, 1, 4, 8])
+    # O takes the win on the middle row rather than blocking X's
+    assert greedy_policy(model, random.Random(0)) == 5
+
+def test_solver_never_loses():
+    result = play_games(("solver", solver_policy), ("random", random_policy), range(40), 3, None, 1)
+    assert result.games == 40 and result.second_wins == 0
+
+def test_chunks_add_up_to_the_whole_match():
+    args = (("greedy", greedy_policy), ("random", random_policy))
+    whole = play_games(*args, range(100), 3, None, 7)
+    halves = play_games(*args, range(50), 3, None, 7).combine(play_games(*args, range(50, 100), 3, None, 7))
+    assert whole == halves
+
+def test_round_robin_in_process():
+    tournament = Tournament(POLICIES, games=60, seed=3, workers=1, chunk_games=25)
+    results = list(tournament.run())
+    assert [(result.first, result.second) for result in results] == tournament.pairs()
+    assert all(result.games == 60 for result in results)
+    standings = Tournament.standings(results)
+    assert standings[-1][0] == "random"
+    assert sum(points for _, points in standings) == 3 * 60
+
+def test_process_pool_gives_the_same_results():
+    policies = {"random": random_policy, "greedy": greedy_policy,
+                "solver": functools.partial(solver_policy, depth=2)}
+    here = Tournament(policies, games=40, size=4, seed=5, workers=1, chunk_games=15)
+    pooled = Tournament(policies, games=40, size=4, seed=5, workers=2, chunk_games=15)
+    with ProcessPoolExecutor(2) as executor:
+        streamed = list(pooled.run(executor))
+    assert sorted(streamed) == sorted(here.run())
+
+def test_seed_changes_the_games():
+    first = list(Tournament(POLICIES, games=50, seed=1, workers=1).run())
+    second = list(Tournament(POLICIES, games=50, seed=2, workers=1).run())
+    assert first == list(Tournament(POLICIES, games=50, seed=1, workers=1).run())
+    assert first != second
+
+def test_needs_two_policies():
+    with pytest.raises(ValueError, match=TOO_FEW_POLICIES_ERROR_MSG):
+        Tournament({"random": random_policy}, games=10)
+    with pytest.raises(ValueError):
+        Tournament(POLICIES, games=10, size=2)
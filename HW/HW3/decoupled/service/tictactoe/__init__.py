@@ -1,38 +1,60 @@
 from dataclasses import dataclass
 import logging
+import math
 from typing import List
-import sys
 
 from flask import current_app, has_request_context
 
+from tictactoe.logs import attach_handler, log_level, queue_logging_enabled, route_through_queue, stream_handler
+
 
 SQUARE_OCCUPIED_ERROR_MSG = "Square already occupied"
 INVALID_MOVE_ERROR_MSG = "Invalid move"
+GAME_NOT_FOUND_ERROR_MSG = "Game not found"
+INVALID_BOARD_ERROR_MSG = "Invalid board size"
+INVALID_VERSION_ERROR_MSG = "Invalid version"
+INVALID_DEPTH_ERROR_MSG = "Invalid search depth"
+VERSION_CONFLICT_ERROR_MSG = "Game has changed since the expected version"
+NOTHING_TO_UNDO_ERROR_MSG = "No move to undo"
+HISTORY_UNAVAILABLE_ERROR_MSG = "Move history is not kept for this game"
+INVALID_PLAYERS_ERROR_MSG = "Invalid players"
+INVALID_TOP_ERROR_MSG = "Invalid number of players"
+PLAYER_NOT_FOUND_ERROR_MSG = "Player not found"
+TICKET_NOT_FOUND_ERROR_MSG = "Matchmaking ticket not found"
+INVALID_TIMEOUT_ERROR_MSG = "Invalid timeout"
+RATE_LIMITED_ERROR_MSG = "Too many requests"
+TOO_FEW_POLICIES_ERROR_MSG = "A tournament needs at least two policies"
+
+
+class VersionConflictError(ValueError):
+    """Raised when a move expects a game version other than the current one."""
 
 
 @dataclass
 class Board:
     squares: List[str]
 
+    @property
+    def size(self) -> int:
+        """The number of rows (and columns) of the board."""
+        return math.isqrt(len(self.squares))
 
-logger = logging.getLogger(__name__)
-logger.setLevel(logging.DEBUG)  # Set the desired logging level here
-
-# Create a console handler that logs to stderr
-handler = logging.StreamHandler(sys.stderr)
-handler.setLevel(logging.DEBUG)
 
-# Create a formatter with a timestamp
-formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
-
-# Add the formatter to the handler
-handler.setFormatter(formatter)
+logger = logging.getLogger(__name__)
 
-# Add the handler to the logger
-logger.addHandler(handler)
+# Log to stderr, formatted and written by a background thread unless queue logging is off
+attach_handler(logger, stream_handler())
+if queue_logging_enabled():
+    route_through_queue(logger)
+# Set once the handler is attached, so a bad level in the environment is reported through it
+logger.setLevel(log_level())
 
 def configure_logger():
-    if has_request_context():
-        app_logger = current_app.logger
-        for handler in app_logger.handlers:
-            logger.addHandler(handler)
\ No newline at end of file
+    """
+    Passes the package's records to the Flask app's handlers as well, attaching
+    each handler once however often this runs. With queue logging on, the package
+    and the app already share the background writer and nothing is attached.
+    """
+    if has_request_context() and not queue_logging_enabled():
+        for handler in current_app.logger.handlers:
+            attach_handler(logger, handler)
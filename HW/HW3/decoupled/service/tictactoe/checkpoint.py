@@ -0,0 +1,222 @@
+import atexit
+import logging
+import sqlite3
+import threading
+import time
+from typing import Callable, Dict, Optional, Tuple
+
+from tictactoe.model import Model
+from tictactoe.registry import Game
+from tictactoe.stats import PlayerStats
+
+logger = logging.getLogger(__name__)
+
+CHECKPOINT_PATH_ENV = "TICTACTOE_CHECKPOINT_PATH"
+CHECKPOINT_INTERVAL_ENV = "TICTACTOE_CHECKPOINT_INTERVAL"
+DEFAULT_INTERVAL = 5.0
+
+SCHEMA = (
+    "CREATE TABLE IF NOT EXISTS games (game_id TEXT PRIMARY KEY, state BLOB NOT NULL) WITHOUT ROWID",
+    "CREATE TABLE IF NOT EXISTS players (name TEXT PRIMARY KEY, wins INTEGER NOT NULL, losses INTEGER NOT NULL, "
+    "draws INTEGER NOT NULL, reached INTEGER NOT NULL) WITHOUT ROWID",
+    "CREATE TABLE IF NOT EXISTS seats (game_id TEXT PRIMARY KEY, x TEXT NOT NULL, o TEXT NOT NULL) WITHOUT ROWID",
+)
+
+
+def _connect(path: str) -> sqlite3.Connection:
+    connection = sqlite3.connect(path, check_same_thread=False)
+    # WAL lets the loader read while a checkpoint is being written, and NORMAL
+    # sync is safe with WAL: a crash loses at most the last checkpoint.
+    connection.execute("PRAGMA journal_mode=WAL")
+    connection.execute("PRAGMA synchronous=NORMAL")
+    for statement in SCHEMA:
+        connection.execute(statement)
+    return connection
+
+
+def load_checkpoint(path: str) -> Dict[str, Model]:
+    """
+    Loads the games saved by a Checkpointer.
+
+    Parameters
+    ----------
+    path : str
+        The SQLite file.
+
+    Returns
+    -------
+    Dict[str, Model]
+        The games by id, or an empty dict if nothing was saved.
+    """
+    start = time.perf_counter()
+    connection = _connect(path)
+    try:
+        from_bytes = Model.from_bytes
+        models = {game_id: from_bytes(state)
+                  for game_id, state in connection.execute("SELECT game_id, state FROM games")}
+    finally:
+        connection.close()
+    logger.info(f'Loaded {len(models)} games from {path} in {time.perf_counter() - start:.3f}s')
+    return models
+
+
+def load_players(path: str) -> Tuple[Dict[str, Tuple[int, int, int, int]], Dict[str, Tuple[str, str]]]:
+    """
+    Loads the player records saved by a Checkpointer, for PlayerStats.load.
+
+    Parameters
+    ----------
+    path : str
+        The SQLite file.
+
+    Returns
+    -------
+    Tuple[Dict[str, Tuple[int, int, int, int]], Dict[str, Tuple[str, str]]]
+        The wins, losses, draws and the order they reached their score in, by
+        player, and the players of each game seated.
+    """
+    connection = _connect(path)
+    try:
+        players = {name: tuple(record) for name, *record in connection.execute("SELECT * FROM players")}
+        seats = {game_id: (x, o) for game_id, x, o in connection.execute("SELECT * FROM seats")}
+    finally:
+        connection.close()
+    return players, seats
+
+
+class Checkpointer:
+    """
+    Saves every live game to a SQLite file in the background, so games survive a restart.
+
+    Each game is one row holding Model.to_bytes(). A checkpoint writes only the
+    games whose version changed since the last one and deletes the rows of games
+    that are gone, in a single transaction. Requests are never paused as a whole:
+    the checkpoint thread holds each game's own lock just long enough to copy
+    its bytes, and does the writing without any lock.
+
+    Given the player records, a checkpoint also saves the players and seats
+    changed since the last one, in the same transaction, so the leaderboard is
+    restored with the games.
+
+    Methods
+    -------
+    checkpoint() -> int:
+        Saves the games changed since the last checkpoint and returns how many.
+
+    start() -> None:
+        Starts checkpointing every `interval` seconds in a background thread.
+
+    stop() -> None:
+        Stops the background thread after a final checkpoint.
+    """
+
+    def __init__(self, path: str, games: Callable[[], Dict[str, Game]], interval: float = DEFAULT_INTERVAL,
+                 stats: Optional[PlayerStats] = None):
+        """
+        Initializes a checkpointer.
+
+        Parameters
+        ----------
+        path : str
+            The SQLite file, created if needed.
+        games : Callable[[], Dict[str, Game]]
+            Returns the live games by id.
+        interval : float, optional
+            Seconds between checkpoints.
+        stats : PlayerStats, optional
+            The player records to save with the games.
+        """
+        self.path = path
+        self.games = games
+        self.interval = interval
+        self.stats = stats
+        if stats is not None:
+            stats.keep_changes()
+        # Changes taken from the records and not yet written, kept across a failed checkpoint.
+        self._players: Dict[str, Tuple[int, int, int, int]] = {}
+        self._seats: Dict[str, Optional[Tuple[str, str]]] = {}
+        self._connection = _connect(path)
+        # The game object and version last written for each saved id. Rows left
+        # from an earlier process have no game, so they are rewritten or deleted.
+        self._saved: Dict[str, Tuple[Optional[Game], int]] = {
+            game_id: (None, -1) for game_id, in self._connection.execute("SELECT game_id FROM games")}
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def checkpoint(self) -> int:
+        """
+        Saves the games changed since the last checkpoint and deletes the ones that are gone.
+
+        Returns
+        -------
+        int
+            The number of games written.
+        """
+        with self._lock:
+            start = time.perf_counter()
+            live = self.games()
+            changed = []
+            for game_id, game in live.items():
+                saved_game, saved_version = self._saved.get(game_id, (None, -1))
+                if saved_game is game and saved_version == game.model.version:
+                    continue
+                with game.lock:
+                    version, state = game.model.version, game.model.to_bytes()
+                changed.append((game_id, game, version, state))
+            gone = [game_id for game_id in self._saved if game_id not in live]
+            if self.stats is not None:
+                players, seats = self.stats.changes()
+                self._players.update(players)
+                self._seats.update(seats)
+            with self._connection:
+                self._connection.executemany("INSERT OR REPLACE INTO games VALUES (?, ?)",
+                                             [(game_id, state) for game_id, _, _, state in changed])
+                self._connection.executemany("DELETE FROM games WHERE game_id = ?",
+                                             [(game_id,) for game_id in gone])
+                self._connection.executemany("INSERT OR REPLACE INTO players VALUES (?, ?, ?, ?, ?)",
+                                             [(name, *record) for name, record in self._players.items()])
+                self._connection.executemany("INSERT OR REPLACE INTO seats VALUES (?, ?, ?)",
+                                             [(game_id, *seats) for game_id, seats in self._seats.items()
+                                              if seats is not None])
+                self._connection.executemany("DELETE FROM seats WHERE game_id = ?",
+                                             [(game_id,) for game_id, seats in self._seats.items()
+                                              if seats is None])
+            self._players.clear()
+            self._seats.clear()
+            for game_id, game, version, _ in changed:
+                self._saved[game_id] = (game, version)
+            for game_id in gone:
+                del self._saved[game_id]
+            if changed or gone:
+                logger.info(f'Checkpointed {len(changed)} games and removed {len(gone)} '
+                            f'in {time.perf_counter() - start:.3f}s')
+            return len(changed)
+
+    def start(self) -> None:
+        """
+        Starts checkpointing every `interval` seconds in a background thread, with
+        a final checkpoint when the process exits.
+        """
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        atexit.register(self.stop)
+
+    def stop(self) -> None:
+        """
+        Stops the background thread after a final checkpoint.
+        """
+        if self._stopped.is_set():
+            return
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join()
+        self.checkpoint()
+        self._connection.close()
+
+    def _run(self) -> None:
+        while not self._stopped.wait(self.interval):
+            try:
+                self.checkpoint()
+            except sqlite3.Error as e:
+                logger.error(f'Checkpoint failed: {e}')
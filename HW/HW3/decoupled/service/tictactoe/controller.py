@@ -1,43 +1,637 @@
+import asyncio
+import gc
 import logging
+import os
+from typing import AsyncIterator, Callable, Iterator, List, Optional
 
 from flask import Response
+from werkzeug.datastructures import ETags
 
-from tictactoe import Board, configure_logger, INVALID_MOVE_ERROR_MSG
+from tictactoe import (Board, configure_logger, INVALID_BOARD_ERROR_MSG, INVALID_DEPTH_ERROR_MSG,
+                       INVALID_PLAYERS_ERROR_MSG, INVALID_TIMEOUT_ERROR_MSG, INVALID_TOP_ERROR_MSG,
+                       PLAYER_NOT_FOUND_ERROR_MSG, RATE_LIMITED_ERROR_MSG,
+                       INVALID_MOVE_ERROR_MSG, INVALID_VERSION_ERROR_MSG, VersionConflictError)
+from tictactoe import solver
+from tictactoe.checkpoint import (CHECKPOINT_INTERVAL_ENV, CHECKPOINT_PATH_ENV, Checkpointer,
+                                  DEFAULT_INTERVAL, load_checkpoint, load_players)
+from tictactoe.events import EventStream, MoveEvent
+from tictactoe.journal import Journal, JOURNAL_PATH_ENV
+from tictactoe.matchmaking import Matchmaker, Ticket
+from tictactoe.metrics import METRICS, timed
 from tictactoe.model import Model
+from tictactoe.ratelimit import (CLIENT_RATE_LIMIT_ENV, DEFAULT_CLIENT_RATE, DEFAULT_GAME_RATE, from_env,
+                                 GAME_RATE_LIMIT_ENV)
+from tictactoe.registry import Game, GameRegistry
+from tictactoe.stats import create_stats, outcome
+from tictactoe.store import create_store, GameStore, InMemoryStore
 from tictactoe.view import View
 
 
-MODEL = Model()
+# Every move made in this process is journaled, in memory only unless
+# TICTACTOE_JOURNAL_PATH is set, in which case the games in the journal are
+# rebuilt on startup. If TICTACTOE_CHECKPOINT_PATH is set, the live games are
+# also saved there in the background and reloaded on startup, before any
+# request is handled; the journal, being the more recent, wins for games in both.
+# Both are loaded by restore_games, which the app calls once it is set up.
+# Player records are kept with the games: in Redis beside them, or else saved
+# and reloaded with the checkpoint.
+CHECKPOINT_PATH = os.environ.get(CHECKPOINT_PATH_ENV)
+CHECKPOINTER = None
+JOURNAL = Journal(os.environ.get(JOURNAL_PATH_ENV))
+DEFAULT_GAME_ID = "default"
+DEFAULT_GAME = Game(DEFAULT_GAME_ID, Model())
+REGISTRY = GameRegistry(on_evict=lambda game_id: (JOURNAL.record_delete(game_id), STATS.unseat(game_id)))
+# The games under /tictactoe/games live in STORE, which is Redis if
+# TICTACTOE_REDIS_URL is set. The shared default game the legacy routes play is
+# DEFAULT_GAME, in this process, unless STORE is shared between workers: then it
+# is kept there too, under DEFAULT_GAME_ID, so every worker plays the same board.
+LOCAL_STORE = InMemoryStore(REGISTRY, JOURNAL)
+STORE = create_store(REGISTRY, JOURNAL, on_expire=lambda game_id: STATS.unseat(game_id))
+STATS = create_stats(STORE)
 VIEW = View()
 
+def restore_games() -> int:
+    """
+    Loads the games saved by an earlier process, then starts checkpointing. The
+    solver's table of every 3x3 position is built here too, so the first request
+    for a best move does not wait for it.
+
+    Games in the journal come back with their history. A game only in the
+    checkpoint is journaled as it is restored, so its history, and what can be
+    undone, start from the board it was saved with. Player records kept in this
+    process come back from the checkpoint, seated only in games that did.
+
+    Restoring allocates a few objects per game, and the garbage collector would
+    rescan all of them every few thousand, so it is paused meanwhile; the games
+    restored are then frozen out of later collections, since they stay alive.
+
+    Returns
+    -------
+    int
+        The number of games restored, counting the default game if it was.
+    """
+    global CHECKPOINTER
+    gc.disable()
+    try:
+        journaled = JOURNAL.models()
+        checkpointed = load_checkpoint(CHECKPOINT_PATH) if CHECKPOINT_PATH else {}
+        unjournaled = {game_id: model for game_id, model in checkpointed.items() if game_id not in journaled}
+        if DEFAULT_GAME_ID in unjournaled:
+            JOURNAL.record_game(DEFAULT_GAME_ID, unjournaled[DEFAULT_GAME_ID])
+            journaled[DEFAULT_GAME_ID] = unjournaled.pop(DEFAULT_GAME_ID)
+        if DEFAULT_GAME_ID in journaled:
+            with DEFAULT_GAME.lock:
+                DEFAULT_GAME.model = journaled.pop(DEFAULT_GAME_ID)
+                DEFAULT_GAME.board_cache = (-1, b"")
+            restored = 1
+        else:
+            restored = 0
+        LOCAL_STORE.put_many(unjournaled)
+        REGISTRY.put_many(journaled)
+        if CHECKPOINT_PATH and not STATS.shared:
+            players, seats = load_players(CHECKPOINT_PATH)
+            STATS.load(players, {game_id: seat for game_id, seat in seats.items() if game_id in REGISTRY})
+        solver.perfect_play_table()
+    finally:
+        gc.enable()
+    gc.freeze()
+    restored += len(journaled) + len(unjournaled)
+    logger.info(f'Restored {restored} games')
+    if CHECKPOINT_PATH and CHECKPOINTER is None:
+        CHECKPOINTER = Checkpointer(CHECKPOINT_PATH, lambda: {DEFAULT_GAME_ID: DEFAULT_GAME, **REGISTRY.games()},
+                                    float(os.environ.get(CHECKPOINT_INTERVAL_ENV, DEFAULT_INTERVAL)),
+                                    stats=None if STATS.shared else STATS)
+        CHECKPOINTER.start()
+    return restored
+
+def create_matched_game(x: str, o: str) -> str:
+    """
+    Creates a 3x3 game in the store between two players paired by matchmaking.
+
+    Parameters
+    ----------
+    x : str
+        The name of the player playing X.
+    o : str
+        The name of the player playing O.
+
+    Returns
+    -------
+    str
+        The id of the new game.
+    """
+    game = STORE.create()
+    STATS.seat(game.game_id, x, o)
+    return game.game_id
+
+# Players are paired first in, first out among those of similar points.
+MATCHMAKER = Matchmaker(create_matched_game, STATS.points)
+
+# Requests are admitted per client address and per game, at the rates (per
+# second) in TICTACTOE_CLIENT_RATE_LIMIT and TICTACTOE_GAME_RATE_LIMIT; 0 turns
+# either off.
+CLIENT_LIMITER = from_env(CLIENT_RATE_LIMIT_ENV, DEFAULT_CLIENT_RATE)
+GAME_LIMITER = from_env(GAME_RATE_LIMIT_ENV, DEFAULT_GAME_RATE)
+
+LONG_POLL_TIMEOUT = 30.0
+KEEP_ALIVE_INTERVAL = 15.0
+DEFAULT_TOP = 10
+MAX_TOP = 1000
 
 logger = logging.getLogger(__name__)
 configure_logger()
 
+METRICS.gauge("games_active", "Games held in this process's registry.", lambda: len(REGISTRY))
+METRICS.gauge("games_evicted_total", "Games evicted from this process's registry.",
+              lambda: REGISTRY.evictions, kind="counter")
+METRICS.gauge("players", "Players with a finished game.", lambda: len(STATS))
+METRICS.gauge("requests_limited_total", "Requests refused by rate limiting.",
+              lambda: sum(limiter.refused for limiter in (CLIENT_LIMITER, GAME_LIMITER) if limiter),
+              kind="counter")
+METRICS.gauge("players_waiting", "Players waiting to be paired into a game.", lambda: len(MATCHMAKER))
+
+
+def admit(client: Optional[str], game_id: Optional[str] = None) -> Optional[Response]:
+    """
+    Decides whether a request may go ahead, taking a token from the client's
+    bucket and, for a request about one game, from the game's.
+
+    Parameters
+    ----------
+    client : str, optional
+        The address of the client.
+    game_id : str, optional
+        The id of the game the request is about.
+
+    Returns
+    -------
+    Optional[Response]
+        None if the request may go ahead, or a 429 response saying when to retry.
+    """
+    wait = 0.0
+    if CLIENT_LIMITER is not None and client is not None:
+        wait = CLIENT_LIMITER.acquire(client)
+    if not wait and GAME_LIMITER is not None and game_id is not None:
+        wait = GAME_LIMITER.acquire(game_id)
+    if not wait:
+        return None
+    return VIEW.rate_limited(RATE_LIMITED_ERROR_MSG, wait)
+
+def get_game(game_id: Optional[str] = None) -> Game:
+    """
+    Returns a game.
+
+    Parameters
+    ----------
+    game_id : str, optional
+        The id of a game in the store. If None, the shared default game is used.
+
+    Returns
+    -------
+    Game
+        The game.
+
+    Raises
+    ------
+    KeyError
+        If there is no game with the given id.
+    """
+    if game_id is None:
+        return STORE.get_or_create(DEFAULT_GAME_ID) if STORE.shared else DEFAULT_GAME
+    return STORE.get(game_id)
+
+def update_game(game: Game, change: Callable[[Model], None]) -> Model:
+    """
+    Applies a change to a game atomically, in whichever store holds it.
+
+    Parameters
+    ----------
+    game : Game
+        The game, from get_game.
+    change : Callable[[Model], None]
+        Changes the model in place, raising ValueError to abandon the change.
+
+    Returns
+    -------
+    Model
+        A snapshot of the game after the change.
+    """
+    return store_of(game).update(game, change)
 
-def get_board_state() -> Response:
+def store_of(game: Game) -> GameStore:
     """
-    Retrieves the current state of the board.
+    Returns the store holding a game.
+
+    Parameters
+    ----------
+    game : Game
+        The game, from get_game.
+
+    Returns
+    -------
+    GameStore
+        LOCAL_STORE for the shared default game, and STORE for any other.
+    """
+    return LOCAL_STORE if game is DEFAULT_GAME else STORE
+
+@timed()
+def create_game(size: int = 3, k: Optional[int] = None, players: Optional[List[str]] = None) -> Response:
+    """
+    Creates a new game in the store.
+
+    Parameters
+    ----------
+    size : int, optional
+        The number of rows (and columns) of the board, from 3 to 19 (default is 3).
+    k : int, optional
+        The number of marks in a row needed to win (default is `size`, capped at 5).
+    players : List[str], optional
+        The names of the players playing X and O, whose records the result of
+        the game counts towards.
 
     Returns
     -------
     Response
-        A Flask response object containing the board state as JSON.
+        A Flask response object containing the new game id as JSON.
     """
-    pass
+    if players is not None and not (isinstance(players, list) and len(players) == 2
+                                    and all(isinstance(name, str) and name for name in players)
+                                    and players[0] != players[1]):
+        return VIEW.error(INVALID_PLAYERS_ERROR_MSG, 400)
+    try:
+        game = STORE.create(int(size), None if k is None else int(k))
+    except (TypeError, ValueError):
+        logger.error(f"Error creating game of size {size} with k={k}")
+        return VIEW.error(INVALID_BOARD_ERROR_MSG, 400)
+    if players is not None:
+        STATS.seat(game.game_id, *players)
+    return VIEW.game_created(game.game_id)
+
+@timed()
+def delete_game(game_id: str) -> Response:
+    """
+    Deletes a game from the store.
+
+    Parameters
+    ----------
+    game_id : str
+        The id of the game to delete.
+
+    Returns
+    -------
+    Response
+        A Flask response object indicating success or failure.
+    """
+    try:
+        STORE.delete(game_id)
+    except KeyError as e:
+        return VIEW.error(e.args[0], 404)
+    STATS.unseat(game_id)
+    return VIEW.game_deleted()
+
+@timed()
+def get_board_state(game_id: Optional[str] = None, if_none_match: Optional[ETags] = None,
+                    since: Optional[str] = None) -> Response:
+    """
+    Retrieves the current state of the board, or only the squares changed since
+    a version the client holds.
+
+    The game version, tagged with the game's epoch, is the ETag of the response.
+    If the client already holds the current version, the response is a 304 with no body. Otherwise the serialized
+    board is built once per version and reused for every request until the next move.
+
+    In memory, a game logs its changes from the first request for them, so that
+    request gets the whole board instead; in Redis, every game's log is kept
+    beside it. A request for a version older than the log reaches back also gets
+    the whole board.
+
+    Parameters
+    ----------
+    game_id : str, optional
+        The id of the game. If None, the shared default game is used.
+    if_none_match : ETags, optional
+        The ETags from the request's If-None-Match header.
+    since : str, optional
+        The version the client holds, to get only the squares changed since.
+
+    Returns
+    -------
+    Response
+        A Flask response object containing the board state, or the changed squares, as JSON.
+    """
+    try:
+        game = get_game(game_id)
+    except KeyError as e:
+        return VIEW.error(e.args[0], 404)
+    version = game.model.version
+    if if_none_match is not None and if_none_match.contains(VIEW.etag(game.epoch, version)):
+        return VIEW.not_modified(version, game.epoch)
+    if since is not None:
+        try:
+            since = validate_version(since)
+        except ValueError as e:
+            return VIEW.error(str(e), 400)
+        try:
+            version, delta = store_of(game).changes_since(game, since)
+        except KeyError as e:
+            return VIEW.error(e.args[0], 404)
+        if delta is not None:
+            return VIEW.board_delta(version, since, delta, game.epoch)
+    cached_version, body = game.board_cache
+    if cached_version != version:
+        with game.lock:
+            version = game.model.version
+            body = VIEW.encode_board_state(game.model.get_board_state())
+        game.board_cache = (version, body)
+    return VIEW.encoded_board_state(body, version, game.epoch)
 
-def get_winner() -> Response:
+@timed()
+def get_winner(game_id: Optional[str] = None) -> Response:
     """
     Retrieves the winner of the game, if there is one.
 
+    Parameters
+    ----------
+    game_id : str, optional
+        The id of the game. If None, the shared default game is used.
+
     Returns
     -------
     Response
         A Flask response object containing the winner as JSON.
     """
-    pass
+    try:
+        game = get_game(game_id)
+    except KeyError as e:
+        return VIEW.error(e.args[0], 404)
+    return VIEW.get_winner(game.model.get_winner())
+
+@timed()
+def get_best_move(game_id: Optional[str] = None, depth: str = solver.DEFAULT_DEPTH) -> Response:
+    """
+    Retrieves the best move for the player to move and the value of the position.
 
-def validate_index(index: str) -> int:
+    Parameters
+    ----------
+    game_id : str, optional
+        The id of the game. If None, the shared default game is used.
+    depth : str, optional
+        How many moves ahead to search boards other than 3x3, capped at
+        solver.MAX_DEPTH.
+
+    Returns
+    -------
+    Response
+        A Flask response object containing the move and value as JSON.
+    """
+    try:
+        game = get_game(game_id)
+    except KeyError as e:
+        return VIEW.error(e.args[0], 404)
+    try:
+        depth = min(max(int(depth), 1), solver.MAX_DEPTH)
+    except (TypeError, ValueError):
+        return VIEW.error(INVALID_DEPTH_ERROR_MSG, 400)
+    with game.lock:
+        model = game.model.copy()
+    return VIEW.best_move(solver.best_move(model, depth))
+
+@timed()
+def get_leaderboard(top: str = DEFAULT_TOP) -> Response:
+    """
+    Retrieves the highest ranked players.
+
+    Parameters
+    ----------
+    top : str, optional
+        The number of players, from 1 to MAX_TOP.
+
+    Returns
+    -------
+    Response
+        A Flask response object containing the players and their records as JSON.
+    """
+    try:
+        top = int(top)
+    except (TypeError, ValueError):
+        return VIEW.error(INVALID_TOP_ERROR_MSG, 400)
+    if not 1 <= top <= MAX_TOP:
+        return VIEW.error(INVALID_TOP_ERROR_MSG, 400)
+    return VIEW.leaderboard(STATS.top(top))
+
+@timed()
+def get_player_stats(name: str) -> Response:
+    """
+    Retrieves a player's wins, losses and draws.
+
+    Parameters
+    ----------
+    name : str
+        The name of the player.
+
+    Returns
+    -------
+    Response
+        A Flask response object containing the player's record as JSON.
+    """
+    try:
+        record = STATS.record(name)
+    except KeyError:
+        return VIEW.error(PLAYER_NOT_FOUND_ERROR_MSG, 404)
+    return VIEW.player_stats(record)
+
+def validate_timeout(timeout: str) -> float:
+    """
+    Validates how long a long poll may wait.
+
+    Parameters
+    ----------
+    timeout : str
+        The timeout in seconds.
+
+    Returns
+    -------
+    float
+        The timeout, capped at LONG_POLL_TIMEOUT.
+
+    Raises
+    ------
+    ValueError
+        If the timeout is not a number.
+    """
+    try:
+        timeout = float(timeout)
+    except (TypeError, ValueError):
+        raise ValueError(INVALID_TIMEOUT_ERROR_MSG)
+    if timeout != timeout:
+        raise ValueError(INVALID_TIMEOUT_ERROR_MSG)
+    return min(max(timeout, 0.0), LONG_POLL_TIMEOUT)
+
+@timed()
+def matchmake(player: str, timeout: str = LONG_POLL_TIMEOUT) -> Response:
+    """
+    Queues a player for a game against the next suitable player, long-polling
+    until they are paired or the timeout runs out. The request holds its thread
+    while it waits; matchmake_async does not.
+
+    Parameters
+    ----------
+    player : str
+        The name of the player.
+    timeout : str, optional
+        The longest to wait, in seconds, capped at LONG_POLL_TIMEOUT.
+
+    Returns
+    -------
+    Response
+        A Flask response object containing the game, the player's mark and their
+        opponent once paired, or the ticket to poll with while still waiting.
+    """
+    if not isinstance(player, str) or not player:
+        return VIEW.error(INVALID_PLAYERS_ERROR_MSG, 400)
+    try:
+        timeout = validate_timeout(timeout)
+    except ValueError as e:
+        return VIEW.error(str(e), 400)
+    ticket = MATCHMAKER.join(player)
+    MATCHMAKER.wait(ticket, timeout)
+    return VIEW.match(ticket.ticket_id, ticket.match)
+
+@timed()
+async def matchmake_async(player: str, timeout: str = LONG_POLL_TIMEOUT) -> Response:
+    """
+    Queues a player for a game as a coroutine, so a waiting player holds no
+    thread. Otherwise the same as matchmake.
+
+    Parameters
+    ----------
+    player : str
+        The name of the player.
+    timeout : str, optional
+        The longest to wait, in seconds, capped at LONG_POLL_TIMEOUT.
+
+    Returns
+    -------
+    Response
+        A Flask response object containing the game, the player's mark and their
+        opponent once paired, or the ticket to poll with while still waiting.
+    """
+    if not isinstance(player, str) or not player:
+        return VIEW.error(INVALID_PLAYERS_ERROR_MSG, 400)
+    try:
+        timeout = validate_timeout(timeout)
+    except ValueError as e:
+        return VIEW.error(str(e), 400)
+    # Pairing creates the game in the store, so it runs off the event loop.
+    joining = asyncio.get_running_loop().run_in_executor(None, MATCHMAKER.join, player)
+    try:
+        ticket = await asyncio.shield(joining)
+        await MATCHMAKER.wait_async(ticket, timeout)
+    except asyncio.CancelledError:
+        # The client has gone before learning its ticket, so no one would play it.
+        joining.add_done_callback(_leave_queue)
+        raise
+    return VIEW.match(ticket.ticket_id, ticket.match)
+
+def _leave_queue(joining: "asyncio.Future[Ticket]") -> None:
+    if joining.cancelled() or joining.exception() is not None:
+        return
+    try:
+        MATCHMAKER.cancel(joining.result().ticket_id)
+    except KeyError:
+        pass
+
+@timed()
+def poll_match(ticket_id: str, timeout: str = LONG_POLL_TIMEOUT) -> Response:
+    """
+    Long-polls a matchmaking ticket until the player is paired or the timeout
+    runs out. The request holds its thread while it waits; poll_match_async does not.
+
+    Parameters
+    ----------
+    ticket_id : str
+        The ticket from matchmake.
+    timeout : str, optional
+        The longest to wait, in seconds, capped at LONG_POLL_TIMEOUT.
+
+    Returns
+    -------
+    Response
+        A Flask response object containing the match, or the ticket if still waiting.
+    """
+    try:
+        timeout = validate_timeout(timeout)
+    except ValueError as e:
+        return VIEW.error(str(e), 400)
+    try:
+        ticket = MATCHMAKER.get(ticket_id)
+    except KeyError as e:
+        return VIEW.error(e.args[0], 404)
+    MATCHMAKER.wait(ticket, timeout)
+    return VIEW.match(ticket.ticket_id, ticket.match)
+
+@timed()
+async def poll_match_async(ticket_id: str, timeout: str = LONG_POLL_TIMEOUT) -> Response:
+    """
+    Long-polls a matchmaking ticket as a coroutine, so a waiting player holds no
+    thread. Otherwise the same as poll_match.
+
+    Parameters
+    ----------
+    ticket_id : str
+        The ticket from matchmake.
+    timeout : str, optional
+        The longest to wait, in seconds, capped at LONG_POLL_TIMEOUT.
+
+    Returns
+    -------
+    Response
+        A Flask response object containing the match, or the ticket if still waiting.
+    """
+    try:
+        timeout = validate_timeout(timeout)
+    except ValueError as e:
+        return VIEW.error(str(e), 400)
+    try:
+        ticket = MATCHMAKER.get(ticket_id)
+    except KeyError as e:
+        return VIEW.error(e.args[0], 404)
+    await MATCHMAKER.wait_async(ticket, timeout)
+    return VIEW.match(ticket.ticket_id, ticket.match)
+
+@timed()
+def cancel_match(ticket_id: str) -> Response:
+    """
+    Takes a player out of the matchmaking queue.
+
+    Parameters
+    ----------
+    ticket_id : str
+        The ticket from matchmake.
+
+    Returns
+    -------
+    Response
+        A Flask response object indicating success or failure.
+    """
+    try:
+        MATCHMAKER.cancel(ticket_id)
+    except KeyError as e:
+        return VIEW.error(e.args[0], 404)
+    return VIEW.game_deleted()
+
+def get_metrics() -> Response:
+    """
+    Retrieves the service's metrics.
+
+    Returns
+    -------
+    Response
+        A Flask response object containing the metrics in the Prometheus text format.
+    """
+    return VIEW.metrics(METRICS.render())
+
+def validate_index(index: str, size: int = 3) -> int:
     """
     Validates the provided index for a move.
 
@@ -45,6 +639,8 @@ def validate_index(index: str) -> int:
     ----------
     index : str
         The index to validate.
+    size : int, optional
+        The number of rows (and columns) of the board (default is 3).
 
     Returns
     -------
@@ -56,9 +652,17 @@ def validate_index(index: str) -> int:
     ValueError
         If the index is not a valid integer or is out of bounds.
     """
-    pass
+    try:
+        index = int(index)
+    except (TypeError, ValueError):
+        raise ValueError(INVALID_MOVE_ERROR_MSG)
+    if not 0 <= index < size * size:
+        raise ValueError(INVALID_MOVE_ERROR_MSG)
+    return index
 
-def make_move(index: str) -> Response:
+@timed()
+def make_move(index: str, game_id: Optional[str] = None,
+              expected_version: Optional[str] = None) -> Response:
     """
     Makes a move at the specified index.
 
@@ -66,6 +670,11 @@ def make_move(index: str) -> Response:
     ----------
     index : str
         The index at which to make the move.
+    game_id : str, optional
+        The id of the game. If None, the shared default game is used.
+    expected_version : str, optional
+        If given, the move is only made if the game is still at this version, and
+        a 409 is returned otherwise.
 
     Returns
     -------
@@ -73,7 +682,376 @@ def make_move(index: str) -> Response:
         A Flask response object indicating success or failure.
     """
     try:
-        pass
+        game = get_game(game_id)
+    except KeyError as e:
+        return VIEW.error(e.args[0], 404)
+    try:
+        index = validate_index(index, game.model.size)
+        if expected_version is not None:
+            expected_version = validate_version(expected_version)
+        model = update_game(game, lambda model: model.move(index, expected_version))
+    except VersionConflictError as e:
+        return VIEW.error(str(e), 409)
     except ValueError as e:
         logger.error(f"Error making move: {e}")
-        return VIEW.error(str(e), 400)
\ No newline at end of file
+        return VIEW.error(str(e), 400)
+    except KeyError as e:
+        return VIEW.error(e.args[0], 404)
+    METRICS.moves.inc()
+    record_result(game, model)
+    return move_result(game, model)
+
+@timed()
+def make_moves(indices: List[str], game_id: Optional[str] = None,
+               expected_version: Optional[str] = None) -> Response:
+    """
+    Makes several moves in order, atomically: if any index is invalid or any
+    square is occupied, none of the moves are made.
+
+    Parameters
+    ----------
+    indices : List[str]
+        The indices at which to make the moves.
+    game_id : str, optional
+        The id of the game. If None, the shared default game is used.
+    expected_version : str, optional
+        If given, the moves are only made if the game is still at this version, and
+        a 409 is returned otherwise.
+
+    Returns
+    -------
+    Response
+        A Flask response object indicating success or failure.
+    """
+    try:
+        game = get_game(game_id)
+    except KeyError as e:
+        return VIEW.error(e.args[0], 404)
+    try:
+        if not isinstance(indices, list):
+            raise ValueError(INVALID_MOVE_ERROR_MSG)
+        indices = [validate_index(index, game.model.size) for index in indices]
+        if expected_version is not None:
+            expected_version = validate_version(expected_version)
+        model = update_game(game, lambda model: model.move_many(indices, expected_version))
+    except VersionConflictError as e:
+        return VIEW.error(str(e), 409)
+    except ValueError as e:
+        logger.error(f"Error making moves: {e}")
+        return VIEW.error(str(e), 400)
+    except KeyError as e:
+        return VIEW.error(e.args[0], 404)
+    METRICS.moves.inc(len(indices))
+    record_result(game, model)
+    return move_result(game, model)
+
+@timed()
+def undo_move(game_id: Optional[str] = None, expected_version: Optional[str] = None) -> Response:
+    """
+    Takes back the last move of a game.
+
+    Parameters
+    ----------
+    game_id : str, optional
+        The id of the game. If None, the shared default game is used.
+    expected_version : str, optional
+        If given, the move is only taken back if the game is still at this version,
+        and a 409 is returned otherwise.
+
+    Returns
+    -------
+    Response
+        A Flask response object containing the game state after the undo.
+    """
+    try:
+        game = get_game(game_id)
+    except KeyError as e:
+        return VIEW.error(e.args[0], 404)
+    try:
+        if expected_version is not None:
+            expected_version = validate_version(expected_version)
+        model = store_of(game).undo(game, expected_version)
+    except VersionConflictError as e:
+        return VIEW.error(str(e), 409)
+    except ValueError as e:
+        logger.error(f"Error undoing move: {e}")
+        return VIEW.error(str(e), 400)
+    except NotImplementedError as e:
+        return VIEW.error(str(e), 501)
+    return move_result(game, model)
+
+@timed()
+def get_history(game_id: Optional[str] = None) -> Response:
+    """
+    Retrieves every move of a game, in order.
+
+    Parameters
+    ----------
+    game_id : str, optional
+        The id of the game. If None, the shared default game is used.
+
+    Returns
+    -------
+    Response
+        A Flask response object containing the moves as JSON.
+    """
+    try:
+        game = get_game(game_id)
+        moves = store_of(game).history(game)
+    except KeyError as e:
+        return VIEW.error(e.args[0], 404)
+    except NotImplementedError as e:
+        return VIEW.error(str(e), 501)
+    return VIEW.history(moves)
+
+def record_result(game: Game, model: Model) -> None:
+    """
+    Counts the result of a game towards its players' records if the move just
+    made settled it. Only the first move to settle a game is counted.
+
+    Parameters
+    ----------
+    game : Game
+        The game.
+    model : Model
+        A snapshot of the game after the move.
+    """
+    result = outcome(model)
+    if result is not None:
+        STATS.settle(game.game_id, result)
+
+def move_result(game: Game, model: Model) -> Response:
+    """
+    Builds the response to a move from the state of the game.
+
+    Parameters
+    ----------
+    game : Game
+        The game.
+    model : Model
+        A snapshot of the game after the move, so the fields all come from the
+        same version.
+
+    Returns
+    -------
+    Response
+        A Flask response object containing the board, winner, next player and version.
+    """
+    return VIEW.move_result(model.get_board_state(), model.get_winner(),
+                            model.get_current_player(), model.version, game.epoch)
+
+def get_event_stream(game: Game) -> EventStream:
+    """
+    Returns the event stream of a game, attaching one on first use.
+
+    Parameters
+    ----------
+    game : Game
+        The game.
+
+    Returns
+    -------
+    EventStream
+        The stream of the game's moves.
+    """
+    return store_of(game).events(game)
+
+def validate_version(version: str) -> int:
+    """
+    Validates a version sent by a client.
+
+    Parameters
+    ----------
+    version : str
+        The version to validate.
+
+    Returns
+    -------
+    int
+        The validated version.
+
+    Raises
+    ------
+    ValueError
+        If the version is not a non-negative integer.
+    """
+    try:
+        version = int(version)
+    except (TypeError, ValueError):
+        raise ValueError(INVALID_VERSION_ERROR_MSG)
+    if version < 0:
+        raise ValueError(INVALID_VERSION_ERROR_MSG)
+    return version
+
+@timed()
+def get_events(game_id: str, since: str, timeout: str = LONG_POLL_TIMEOUT) -> Response:
+    """
+    Long-polls for the moves made after a version.
+
+    Returns at once if there are already moves after `since`, and otherwise waits
+    for the next move or the timeout, whichever comes first. The request holds
+    its thread while it waits; get_events_async does not.
+
+    Parameters
+    ----------
+    game_id : str
+        The id of the game.
+    since : str
+        The last version the client has seen.
+    timeout : str, optional
+        The longest to wait, in seconds, capped at LONG_POLL_TIMEOUT.
+
+    Returns
+    -------
+    Response
+        A Flask response object containing the moves as JSON, or the whole board if
+        the moves after `since` are no longer kept.
+    """
+    try:
+        game = get_game(game_id)
+    except KeyError as e:
+        return VIEW.error(e.args[0], 404)
+    try:
+        since, timeout = validate_version(since), validate_timeout(timeout)
+    except ValueError as e:
+        return VIEW.error(str(e), 400)
+    stream = get_event_stream(game)
+    return _events(game, stream, stream.wait(since, timeout))
+
+@timed()
+async def get_events_async(game_id: str, since: str, timeout: str = LONG_POLL_TIMEOUT) -> Response:
+    """
+    Long-polls for the moves made after a version, as a coroutine, so a waiting
+    client holds no thread. Otherwise the same as get_events.
+
+    Parameters
+    ----------
+    game_id : str
+        The id of the game.
+    since : str
+        The last version the client has seen.
+    timeout : str, optional
+        The longest to wait, in seconds, capped at LONG_POLL_TIMEOUT.
+
+    Returns
+    -------
+    Response
+        A Flask response object containing the moves as JSON, or the whole board if
+        the moves after `since` are no longer kept.
+    """
+    loop = asyncio.get_running_loop()
+    try:
+        game = await loop.run_in_executor(None, get_game, game_id)
+    except KeyError as e:
+        return VIEW.error(e.args[0], 404)
+    try:
+        since, timeout = validate_version(since), validate_timeout(timeout)
+    except ValueError as e:
+        return VIEW.error(str(e), 400)
+    stream = await loop.run_in_executor(None, get_event_stream, game)
+    return _events(game, stream, await stream.wait_async(since, timeout))
+
+def _events(game: Game, stream: EventStream, events: Optional[List[MoveEvent]]) -> Response:
+    if events is None:
+        return VIEW.events(game.model.version, None, game.model.get_board_state())
+    return VIEW.events(stream.version, events)
+
+@timed()
+def stream_events(game_id: str, since: str) -> Response:
+    """
+    Streams the moves made after a version as Server-Sent Events.
+
+    The stream sends a comment every KEEP_ALIVE_INTERVAL seconds while idle, and
+    ends once the game has a winner, or with a `reset` event if the moves after
+    `since` are no longer kept. The stream holds its thread while it is open;
+    stream_events_async does not.
+
+    Parameters
+    ----------
+    game_id : str
+        The id of the game.
+    since : str
+        The last version the client has seen.
+
+    Returns
+    -------
+    Response
+        A streaming Flask response object.
+    """
+    try:
+        game = get_game(game_id)
+    except KeyError as e:
+        return VIEW.error(e.args[0], 404)
+    try:
+        since = validate_version(since)
+    except ValueError as e:
+        return VIEW.error(str(e), 400)
+    return VIEW.event_stream(_event_messages(game, get_event_stream(game), since))
+
+@timed()
+async def stream_events_async(game_id: str, since: str) -> Response:
+    """
+    Streams the moves made after a version as Server-Sent Events from a
+    coroutine, so an open stream holds no thread. Otherwise the same as
+    stream_events.
+
+    Parameters
+    ----------
+    game_id : str
+        The id of the game.
+    since : str
+        The last version the client has seen.
+
+    Returns
+    -------
+    Response
+        A Flask response object whose body is an asynchronous iterator of messages.
+    """
+    loop = asyncio.get_running_loop()
+    try:
+        game = await loop.run_in_executor(None, get_game, game_id)
+    except KeyError as e:
+        return VIEW.error(e.args[0], 404)
+    try:
+        since = validate_version(since)
+    except ValueError as e:
+        return VIEW.error(str(e), 400)
+    stream = await loop.run_in_executor(None, get_event_stream, game)
+    return VIEW.event_stream(_event_messages_async(game, stream, since))
+
+def _event_messages(game: Game, stream: EventStream, since: int) -> Iterator[str]:
+    try:
+        for event in stream.listen(since, KEEP_ALIVE_INTERVAL):
+            if event is None:
+                yield ": keep-alive\n\n"
+                continue
+            yield VIEW.event_message(event)
+            if event.version == stream.version and _is_over(game, event.version):
+                return
+    except LookupError:
+        yield VIEW.reset_message(stream.version)
+
+async def _event_messages_async(game: Game, stream: EventStream, since: int) -> AsyncIterator[str]:
+    loop = asyncio.get_running_loop()
+    try:
+        async for event in stream.listen_async(since, KEEP_ALIVE_INTERVAL):
+            if event is None:
+                yield ": keep-alive\n\n"
+                continue
+            yield VIEW.event_message(event)
+            if event.version == stream.version:
+                if await loop.run_in_executor(None, _is_over, game, event.version):
+                    return
+    except LookupError:
+        yield VIEW.reset_message(stream.version)
+
+def _is_over(game: Game, version: int) -> bool:
+    # Whether the game was won by the move at `version`, its latest; the moves of
+    # a batch are published after they are all applied, so the model can be ahead.
+    # A game from Redis is a copy taken when it was looked up, so it is looked up
+    # again; one no longer in the store is over too.
+    try:
+        model = STORE.get(game.game_id).model
+    except KeyError:
+        return True
+    return bool(model.winner) and model.version <= version
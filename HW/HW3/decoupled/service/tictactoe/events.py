@@ -0,0 +1,247 @@
+import asyncio
+from collections import deque
+import logging
+import threading
+from typing import AsyncIterator, Dict, Iterator, List, NamedTuple, Optional, Set
+
+from tictactoe.model import MAX_SIZE, Model
+
+logger = logging.getLogger(__name__)
+
+HISTORY_SIZE = MAX_SIZE * MAX_SIZE
+
+
+class MoveEvent(NamedTuple):
+    """
+    A move as it was applied: the game version it produced, the square and the
+    player, or an empty player if the move on that square was undone.
+    """
+    version: int
+    index: int
+    player: str
+
+
+class EventStream:
+    """
+    A class to push the moves of one game to any number of waiting viewers.
+
+    The stream registers itself as the observer of the model, keeps the most recent
+    moves, and wakes waiters whenever a move is applied. Threads wait on a shared
+    condition; asyncio tasks wait on futures that are resolved from the publishing
+    thread, so an asyncio server holds one idle coroutine per viewer, not a thread.
+
+    Attributes
+    ----------
+    version : int
+        The version of the latest move published.
+    first_version : int
+        The game version when the stream was attached; moves before it are not kept.
+
+    Methods
+    -------
+    publish(version: int, index: int, player: str) -> None:
+        Records a move and wakes every waiter.
+
+    since(version: int) -> Optional[List[MoveEvent]]:
+        Returns the moves after a version, or None if they are no longer kept.
+
+    wait(since: int, timeout: Optional[float] = None) -> Optional[List[MoveEvent]]:
+        Blocks until there are moves after a version, or the timeout runs out.
+
+    wait_async(since: int, timeout: Optional[float] = None) -> Optional[List[MoveEvent]]:
+        The coroutine version of wait.
+
+    listen(since: int, timeout: float) -> Iterator[Optional[MoveEvent]]:
+        Yields moves as they are applied, and None whenever the timeout passes without one.
+
+    listen_async(since: int, timeout: float) -> AsyncIterator[Optional[MoveEvent]]:
+        The asynchronous version of listen.
+    """
+
+    def __init__(self, model: Model, history_size: int = HISTORY_SIZE):
+        """
+        Attaches a stream to a model.
+
+        Parameters
+        ----------
+        model : Model
+            The game to publish the moves of.
+        history_size : int, optional
+            The number of recent moves kept for viewers that fall behind.
+        """
+        self.version = model.version
+        self.first_version = model.version
+        self._history: "deque[MoveEvent]" = deque(maxlen=history_size)
+        self._condition = threading.Condition()
+        self._futures: Dict[asyncio.AbstractEventLoop, Set[asyncio.Future]] = {}
+        model.observer = self.publish
+
+    def publish(self, version: int, index: int, player: str) -> None:
+        """
+        Records a move and wakes every waiter.
+
+        Parameters
+        ----------
+        version : int
+            The game version after the move.
+        index : int
+            The square played.
+        player : str
+            The player who moved.
+        """
+        with self._condition:
+            self._history.append(MoveEvent(version, index, player))
+            self.version = version
+            futures, self._futures = self._futures, {}
+            self._condition.notify_all()
+        for loop, waiting in futures.items():
+            loop.call_soon_threadsafe(_resolve, waiting)
+
+    def since(self, version: int) -> Optional[List[MoveEvent]]:
+        """
+        Returns the moves after a version.
+
+        Parameters
+        ----------
+        version : int
+            The last version the viewer has seen.
+
+        Returns
+        -------
+        Optional[List[MoveEvent]]
+            The moves in order, or None if some of them are no longer kept and the
+            viewer has to fetch the whole board instead.
+        """
+        with self._condition:
+            return self._since(version)
+
+    def wait(self, since: int, timeout: Optional[float] = None) -> Optional[List[MoveEvent]]:
+        """
+        Blocks until there are moves after a version, or the timeout runs out.
+
+        Parameters
+        ----------
+        since : int
+            The last version the viewer has seen.
+        timeout : float, optional
+            The longest to wait, in seconds. If None, waits until a move is made.
+
+        Returns
+        -------
+        Optional[List[MoveEvent]]
+            The moves after `since` (empty on timeout), or None if they are no longer kept.
+        """
+        with self._condition:
+            self._condition.wait_for(lambda: self.version > since, timeout)
+            return self._since(since)
+
+    async def wait_async(self, since: int,
+                         timeout: Optional[float] = None) -> Optional[List[MoveEvent]]:
+        """
+        Waits until there are moves after a version, or the timeout runs out,
+        without holding a thread.
+
+        Parameters
+        ----------
+        since : int
+            The last version the viewer has seen.
+        timeout : float, optional
+            The longest to wait, in seconds. If None, waits until a move is made.
+
+        Returns
+        -------
+        Optional[List[MoveEvent]]
+            The moves after `since` (empty on timeout), or None if they are no longer kept.
+        """
+        loop = asyncio.get_running_loop()
+        with self._condition:
+            if self.version > since:
+                return self._since(since)
+            future = loop.create_future()
+            self._futures.setdefault(loop, set()).add(future)
+        try:
+            await asyncio.wait_for(future, timeout)
+        except asyncio.TimeoutError:
+            pass
+        finally:
+            # Also when the waiter is cancelled, such as when its client goes away
+            with self._condition:
+                self._futures.get(loop, set()).discard(future)
+        return self.since(since)
+
+    def listen(self, since: int, timeout: float) -> Iterator[Optional[MoveEvent]]:
+        """
+        Yields moves as they are applied.
+
+        Parameters
+        ----------
+        since : int
+            The last version the viewer has seen.
+        timeout : float
+            Seconds to wait for a move before yielding None, so the caller can send
+            a keep-alive or stop.
+
+        Yields
+        ------
+        Optional[MoveEvent]
+            The next move, or None if the timeout passed without one.
+
+        Raises
+        ------
+        LookupError
+            If the moves after `since` are no longer kept.
+        """
+        while True:
+            events = self.wait(since, timeout)
+            if events is None:
+                raise LookupError(f"Moves after version {since} are no longer kept")
+            if not events:
+                yield None
+            for event in events:
+                since = event.version
+                yield event
+
+    async def listen_async(self, since: int, timeout: float) -> AsyncIterator[Optional[MoveEvent]]:
+        """
+        Yields moves as they are applied, without holding a thread.
+
+        Parameters
+        ----------
+        since : int
+            The last version the viewer has seen.
+        timeout : float
+            Seconds to wait for a move before yielding None, so the caller can send
+            a keep-alive or stop.
+
+        Yields
+        ------
+        Optional[MoveEvent]
+            The next move, or None if the timeout passed without one.
+
+        Raises
+        ------
+        LookupError
+            If the moves after `since` are no longer kept.
+        """
+        while True:
+            events = await self.wait_async(since, timeout)
+            if events is None:
+                raise LookupError(f"Moves after version {since} are no longer kept")
+            if not events:
+                yield None
+            for event in events:
+                since = event.version
+                yield event
+
+    def _since(self, version: int) -> Optional[List[MoveEvent]]:
+        if version >= self.version:
+            return []
+        if not self._history or version + 1 < self._history[0].version:
+            return None
+        return [event for event in self._history if event.version > version]
+
+
+def _resolve(futures: Set[asyncio.Future]) -> None:
+    for future in futures:
+        if not future.done():
+            future.set_result(None)
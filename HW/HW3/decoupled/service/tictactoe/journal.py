@@ -0,0 +1,540 @@
+import atexit
+import logging
+import os
+import struct
+import threading
+import time
+from typing import Callable, Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+from tictactoe.model import Model
+
+logger = logging.getLogger(__name__)
+
+JOURNAL_PATH_ENV = "TICTACTOE_JOURNAL_PATH"
+MAGIC = b"TTTJ\x02"
+SNAPSHOT_MAGIC = b"TTTS\x03"
+FLUSH_BYTES = 64 * 1024
+FLUSH_INTERVAL = 1.0
+SNAPSHOT_EVERY = 100_000
+
+# Every record starts with its type and the game's handle, a number given to each
+# game id the first time it is seen so that moves need not repeat the id.
+GAME, MOVE, UNDO, DELETE = 1, 2, 3, 4
+RECORD = struct.Struct("<BI")
+GAME_RECORD = struct.Struct("<BBB")  # size, k and the length of the id that follows
+MOVE_RECORD = struct.Struct("<HHB")  # ply, square and player (0 for 'X', 1 for 'O')
+UNDO_RECORD = struct.Struct("<H")    # the ply taken back
+PLAYERS = ("X", "O")
+
+# The journal starts a new segment after each snapshot. A segment starts with the
+# magic bytes and its number, and the snapshot names the segment and the offset
+# in it that its records continue from.
+JOURNAL_HEADER = struct.Struct(f"<{len(MAGIC)}sQ")  # magic, segment
+
+# A snapshot holds the segment and offset it hands over to and the game count,
+# then for each game its handle, size, k and id, its squares in the order they
+# were played and the player of each, 0 for 'X' and 1 for 'O'.
+SNAPSHOT_HEADER = struct.Struct("<QQII")  # segment, offset, next handle, game count
+SNAPSHOT_GAME = struct.Struct("<IBBBH")  # handle, size, k, id length, move count
+
+
+class MoveRecord(NamedTuple):
+    """A move in a game's history: its ply (0 for the first move), the square and the player."""
+    ply: int
+    index: int
+    player: str
+
+
+class GameHistory:
+    """
+    The moves of one game, in order.
+    """
+
+    __slots__ = ("handle", "size", "k", "squares", "players")
+
+    def __init__(self, handle: int, size: int, k: int):
+        self.handle = handle
+        self.size = size
+        self.k = k
+        self.squares: List[int] = []
+        self.players = bytearray()
+
+    def model(self) -> Model:
+        """
+        Rebuilds the game by replaying its moves.
+
+        Returns
+        -------
+        Model
+            The game, with one version per move.
+        """
+        model = Model(self.size, self.k)
+        model.move_many(self.squares)
+        return model
+
+    def moves(self) -> List[MoveRecord]:
+        return [MoveRecord(ply, index, PLAYERS[player])
+                for ply, (index, player) in enumerate(zip(self.squares, self.players))]
+
+    def append(self, index: int, player: int) -> None:
+        self.squares.append(index)
+        self.players.append(player)
+
+    def pop(self) -> MoveRecord:
+        ply = len(self.squares) - 1
+        return MoveRecord(ply, self.squares.pop(), PLAYERS[self.players.pop()])
+
+
+class Journal:
+    """
+    An append-only log of every move, with snapshots, so games can be audited,
+    replayed and undone, and rebuilt after a restart.
+
+    A move costs a 10-byte record: record type, game handle, ply, square and
+    player. Records are collected in a buffer, and a background thread writes
+    them in batches, once the buffer reaches `flush_bytes` or `flush_interval`
+    seconds after the last write, whichever comes first. Every `snapshot_every`
+    records, the whole history is written to a snapshot file and the journal
+    file is replaced by a new, empty segment, so the journal only ever holds the
+    records since the last snapshot and a restart reads the snapshot and that
+    tail. Recording only appends to the buffer, so a move
+    never waits on the disk: the writer copies what it needs while holding the
+    journal's lock, and writes and syncs after letting go of it.
+
+    Without a path nothing is written, and the journal only keeps the history in
+    memory for /history and /undo. Each game's history is at most one move per
+    square, and is kept until the game is deleted; the service deletes it when
+    its registry evicts the game.
+
+    Methods
+    -------
+    record_game(game_id: str, model: Model) -> None:
+        Starts a new history for a game, holding the moves already on its board.
+
+    record_moves(game_id: str, model: Model, moves: Iterable[Tuple[int, str]]) -> None:
+        Appends moves made in a game.
+
+    record_undo(game_id: str) -> Optional[MoveRecord]:
+        Takes back the last move of a game's history.
+
+    record_delete(game_id: str) -> None:
+        Forgets a game.
+
+    last_move(game_id: str) -> Optional[MoveRecord]:
+        Returns the last move of a game.
+
+    history(game_id: str) -> List[MoveRecord]:
+        Returns every move of a game, in order.
+
+    models() -> Dict[str, Model]:
+        Rebuilds every game.
+
+    flush() -> None:
+        Writes out the buffered records.
+
+    snapshot() -> None:
+        Writes the whole history to the snapshot file.
+
+    close() -> None:
+        Flushes and closes the journal.
+    """
+
+    def __init__(self, path: Optional[str] = None, snapshot_path: Optional[str] = None,
+                 flush_bytes: int = FLUSH_BYTES, flush_interval: float = FLUSH_INTERVAL,
+                 snapshot_every: int = SNAPSHOT_EVERY, clock: Callable[[], float] = time.monotonic):
+        """
+        Opens a journal, loading the history already in it.
+
+        Parameters
+        ----------
+        path : str, optional
+            The journal file. If None, the history is only kept in memory.
+        snapshot_path : str, optional
+            The snapshot file (default is the journal path plus '.snapshot').
+        flush_bytes : int, optional
+            The buffer size at which records are written.
+        flush_interval : float, optional
+            The longest, in seconds, records wait in the buffer.
+        snapshot_every : int, optional
+            The number of records between snapshots.
+        clock : Callable[[], float], optional
+            Returns the current time in seconds.
+        """
+        self.path = path
+        self.snapshot_path = snapshot_path or (f"{path}.snapshot" if path else None)
+        self.flush_bytes = flush_bytes
+        self.flush_interval = flush_interval
+        self.snapshot_every = snapshot_every
+        self.clock = clock
+        self._games: Dict[str, GameHistory] = {}
+        self._ids: Dict[int, str] = {}
+        self._next_handle = 0
+        self._buffer = bytearray()
+        self._lock = threading.Lock()
+        # Held while writing, so batches reach the file in the order they were taken
+        self._write_lock = threading.Lock()
+        self._file = None
+        self._segment = 0
+        self._records_since_snapshot = 0
+        self._last_flush = clock()
+        self._closed = threading.Event()
+        self._wake = threading.Event()
+        if path is not None:
+            self._open()
+
+    def __contains__(self, game_id: str) -> bool:
+        return game_id in self._games
+
+    def record_game(self, game_id: str, model: Model) -> None:
+        """
+        Starts a new history for a game, replacing any it had.
+
+        A model restored without its history gets its marks recorded as moves,
+        alternating between the players in square order, which rebuilds the same
+        board although not necessarily the order it was played in.
+
+        Parameters
+        ----------
+        game_id : str
+            The id of the game.
+        model : Model
+            The game.
+        """
+        x = [i for i in range(model.size * model.size) if model.x >> i & 1]
+        o = [i for i in range(model.size * model.size) if model.o >> i & 1]
+        order = [square for pair in zip(x, o) for square in pair] + x[len(o):]
+        with self._lock:
+            if game_id in self._games:
+                self._delete(game_id)
+            history = self._register(game_id, model.size, model.k)
+            for ply, square in enumerate(order):
+                self._move(history, square, ply % 2)
+            self._maybe_flush()
+
+    def record_moves(self, game_id: str, model: Model, moves: Iterable[Tuple[int, str]]) -> None:
+        """
+        Appends moves made in a game, registering the game if it is new.
+
+        Parameters
+        ----------
+        game_id : str
+            The id of the game.
+        model : Model
+            The game, for its size and k.
+        moves : Iterable[Tuple[int, str]]
+            The squares played and by whom ('X' or 'O'), in order.
+        """
+        with self._lock:
+            history = self._games.get(game_id)
+            if history is None:
+                history = self._register(game_id, model.size, model.k)
+            for index, player in moves:
+                self._move(history, index, PLAYERS.index(player))
+            self._maybe_flush()
+
+    def record_undo(self, game_id: str) -> Optional[MoveRecord]:
+        """
+        Takes back the last move of a game's history.
+
+        Parameters
+        ----------
+        game_id : str
+            The id of the game.
+
+        Returns
+        -------
+        Optional[MoveRecord]
+            The move taken back, or None if the game has no moves.
+        """
+        with self._lock:
+            history = self._games.get(game_id)
+            if history is None or not history.squares:
+                return None
+            move = history.pop()
+            self._append(RECORD.pack(UNDO, history.handle) + UNDO_RECORD.pack(move.ply))
+            self._maybe_flush()
+            return move
+
+    def record_delete(self, game_id: str) -> None:
+        """
+        Forgets a game.
+
+        Parameters
+        ----------
+        game_id : str
+            The id of the game.
+        """
+        with self._lock:
+            if game_id in self._games:
+                self._delete(game_id)
+                self._maybe_flush()
+
+    def last_move(self, game_id: str) -> Optional[MoveRecord]:
+        """
+        Returns the last move of a game.
+
+        Parameters
+        ----------
+        game_id : str
+            The id of the game.
+
+        Returns
+        -------
+        Optional[MoveRecord]
+            The last move, or None if the game has no moves.
+        """
+        with self._lock:
+            history = self._games.get(game_id)
+            if history is None or not history.squares:
+                return None
+            ply = len(history.squares) - 1
+            return MoveRecord(ply, history.squares[ply], PLAYERS[history.players[ply]])
+
+    def history(self, game_id: str) -> List[MoveRecord]:
+        """
+        Returns every move of a game, in order.
+
+        Parameters
+        ----------
+        game_id : str
+            The id of the game.
+
+        Returns
+        -------
+        List[MoveRecord]
+            The moves, or an empty list if none were recorded.
+        """
+        with self._lock:
+            history = self._games.get(game_id)
+            return history.moves() if history is not None else []
+
+    def models(self) -> Dict[str, Model]:
+        """
+        Rebuilds every game in the journal.
+
+        Returns
+        -------
+        Dict[str, Model]
+            The games by id.
+        """
+        with self._lock:
+            histories = list(self._games.items())
+        return {game_id: history.model() for game_id, history in histories}
+
+    def flush(self) -> None:
+        """
+        Writes out the buffered records, and a snapshot if one is due.
+        """
+        self._flush()
+
+    def snapshot(self) -> None:
+        """
+        Writes the whole history to the snapshot file, replacing the last snapshot,
+        and starts a new journal segment.
+        """
+        self._flush(snapshot=True)
+
+    def close(self) -> None:
+        """
+        Flushes and closes the journal.
+        """
+        self._closed.set()
+        self._wake.set()
+        self._flush()
+        with self._write_lock, self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+    def _register(self, game_id: str, size: int, k: int) -> GameHistory:
+        handle = self._next_handle
+        self._next_handle += 1
+        history = self._games[game_id] = GameHistory(handle, size, k)
+        self._ids[handle] = game_id
+        encoded = game_id.encode()
+        self._append(RECORD.pack(GAME, handle) + GAME_RECORD.pack(size, k, len(encoded)) + encoded)
+        return history
+
+    def _move(self, history: GameHistory, index: int, player: int) -> None:
+        ply = len(history.squares)
+        history.append(index, player)
+        self._append(RECORD.pack(MOVE, history.handle) + MOVE_RECORD.pack(ply, index, player))
+
+    def _delete(self, game_id: str) -> None:
+        history = self._games.pop(game_id)
+        del self._ids[history.handle]
+        self._append(RECORD.pack(DELETE, history.handle))
+
+    def _append(self, record: bytes) -> None:
+        if self.path is None:
+            return
+        self._buffer += record
+        self._records_since_snapshot += 1
+
+    def _maybe_flush(self) -> None:
+        # Called with the lock held, so the writing is left to the background thread.
+        if len(self._buffer) >= self.flush_bytes or self.clock() - self._last_flush >= self.flush_interval:
+            self._wake.set()
+
+    def _flush(self, snapshot: bool = False) -> None:
+        # Takes the buffer, and a copy of the history if a snapshot is due, under
+        # the lock, then writes them without it.
+        with self._write_lock:
+            with self._lock:
+                self._last_flush = self.clock()
+                if self._file is None:
+                    return
+                data = bytes(self._buffer)
+                self._buffer.clear()
+                games = None
+                if self.snapshot_path is not None and (
+                        snapshot or self._records_since_snapshot >= self.snapshot_every):
+                    games = [(game_id, history.handle, history.size, history.k, list(history.squares),
+                              bytes(history.players)) for game_id, history in self._games.items()]
+                    next_handle = self._next_handle
+                    self._records_since_snapshot = 0
+            if data:
+                self._file.write(data)
+                self._file.flush()
+            if games is not None:
+                # The snapshot covers the whole segment, so the records after it
+                # go to a new one.
+                segment = self._segment + 1
+                self._write_snapshot(segment, next_handle, games)
+                self._start_segment(segment)
+
+    def _write_snapshot(self, segment: int, next_handle: int,
+                        games: List[Tuple[str, int, int, int, List[int], bytes]]) -> None:
+        chunks = [SNAPSHOT_MAGIC, SNAPSHOT_HEADER.pack(segment, JOURNAL_HEADER.size, next_handle, len(games))]
+        for game_id, handle, size, k, squares, players in games:
+            encoded = game_id.encode()
+            chunks.append(SNAPSHOT_GAME.pack(handle, size, k, len(encoded), len(squares)))
+            chunks.append(encoded)
+            chunks.append(struct.pack(f"<{len(squares)}H", *squares))
+            chunks.append(players)
+        temporary = f"{self.snapshot_path}.tmp"
+        with open(temporary, "wb") as fh:
+            fh.write(b"".join(chunks))
+            fh.flush()
+            os.fsync(fh.fileno())
+        os.replace(temporary, self.snapshot_path)
+        logger.info(f'Wrote a snapshot of {len(games)} games, handing over to journal segment {segment}')
+
+    def _start_segment(self, segment: int) -> None:
+        # Replaces the journal file with an empty segment, written aside and
+        # renamed so the journal file always has a whole header.
+        temporary = f"{self.path}.tmp"
+        with open(temporary, "wb") as fh:
+            fh.write(JOURNAL_HEADER.pack(MAGIC, segment))
+            fh.flush()
+            os.fsync(fh.fileno())
+        if self._file is not None:
+            self._file.close()
+        os.replace(temporary, self.path)
+        self._file = open(self.path, "ab")
+        self._segment = segment
+
+    def _open(self) -> None:
+        segment, start = self._load_snapshot()
+        on_disk = self._read_segment()
+        if on_disk is None or on_disk < segment:
+            # A new journal, or the last run stopped between writing a snapshot
+            # and starting the segment after it; the snapshot covers that one.
+            self._start_segment(segment)
+        elif on_disk > segment:
+            raise ValueError(f"{self.path} continues from a snapshot that is missing")
+        else:
+            # Only the records after the snapshot are read.
+            start = max(start, JOURNAL_HEADER.size)
+            self._segment = segment
+            self._file = open(self.path, "r+b")
+            self._file.seek(start)
+            data = self._file.read()
+            end = start + self._replay(data, 0)
+            if end < start + len(data):
+                # The last record was cut short, most likely by a crash mid-write.
+                logger.error(f'Dropping {start + len(data) - end} bytes of incomplete journal records')
+            self._file.truncate(end)
+            self._file.seek(end)
+            logger.info(f'Loaded {len(self._games)} games from the journal, '
+                        f'replaying {end - start} bytes after the snapshot')
+        threading.Thread(target=self._flush_periodically, daemon=True).start()
+        atexit.register(self.close)
+
+    def _read_segment(self) -> Optional[int]:
+        # Returns the number of the segment in the journal file, or None if there is no file.
+        if not os.path.exists(self.path):
+            return None
+        with open(self.path, "rb") as fh:
+            header = fh.read(JOURNAL_HEADER.size)
+        if len(header) < JOURNAL_HEADER.size or not header.startswith(MAGIC):
+            raise ValueError(f"{self.path} is not a move journal")
+        return JOURNAL_HEADER.unpack(header)[1]
+
+    def _load_snapshot(self) -> Tuple[int, int]:
+        # Returns the segment and offset the snapshot hands over to, (0, 0) if there is none.
+        if self.snapshot_path is None or not os.path.exists(self.snapshot_path):
+            return 0, 0
+        with open(self.snapshot_path, "rb") as fh:
+            data = fh.read()
+        if not data.startswith(SNAPSHOT_MAGIC):
+            raise ValueError(f"{self.snapshot_path} is not a journal snapshot")
+        position = len(SNAPSHOT_MAGIC)
+        segment, offset, self._next_handle, count = SNAPSHOT_HEADER.unpack_from(data, position)
+        position += SNAPSHOT_HEADER.size
+        for _ in range(count):
+            handle, size, k, id_length, moves = SNAPSHOT_GAME.unpack_from(data, position)
+            position += SNAPSHOT_GAME.size
+            game_id = data[position:position + id_length].decode()
+            position += id_length
+            history = self._games[game_id] = GameHistory(handle, size, k)
+            history.squares = list(struct.unpack_from(f"<{moves}H", data, position))
+            position += 2 * moves
+            history.players = bytearray(data[position:position + moves])
+            position += moves
+            self._ids[handle] = game_id
+        return segment, offset
+
+    def _replay(self, data: bytes, position: int) -> int:
+        # Applies the records from a position, returning where the last complete one ends.
+        end = len(data)
+        while position + RECORD.size <= end:
+            kind, handle = RECORD.unpack_from(data, position)
+            body = position + RECORD.size
+            if kind == MOVE:
+                if body + MOVE_RECORD.size > end:
+                    break
+                _, index, player = MOVE_RECORD.unpack_from(data, body)
+                self._games[self._ids[handle]].append(index, player)
+                position = body + MOVE_RECORD.size
+            elif kind == GAME:
+                if body + GAME_RECORD.size > end:
+                    break
+                size, k, id_length = GAME_RECORD.unpack_from(data, body)
+                start = body + GAME_RECORD.size
+                if start + id_length > end:
+                    break
+                game_id = data[start:start + id_length].decode()
+                self._games[game_id] = GameHistory(handle, size, k)
+                self._ids[handle] = game_id
+                self._next_handle = max(self._next_handle, handle + 1)
+                position = start + id_length
+            elif kind == UNDO:
+                if body + UNDO_RECORD.size > end:
+                    break
+                self._games[self._ids[handle]].pop()
+                position = body + UNDO_RECORD.size
+            elif kind == DELETE:
+                del self._games[self._ids.pop(handle)]
+                position = body
+            else:
+                raise ValueError(f"Unknown journal record type {kind} at offset {position}")
+        return position
+
+    def _flush_periodically(self) -> None:
+        # Writes every flush_interval seconds, or sooner when woken by _maybe_flush.
+        while not self._closed.is_set():
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            if not self._closed.is_set():
+                self.flush()
@@ -0,0 +1,214 @@
+import atexit
+import functools
+import logging
+from logging.handlers import QueueHandler, QueueListener
+import math
+import os
+import queue
+import random
+import sys
+import threading
+from typing import Any, Iterable, Optional
+
+LOG_LEVEL_ENV = "TICTACTOE_LOG_LEVEL"
+LOG_QUEUE_ENV = "TICTACTOE_LOG_QUEUE"
+PAYLOAD_SAMPLE_RATE_ENV = "TICTACTOE_LOG_PAYLOAD_SAMPLE_RATE"
+DEFAULT_LOG_LEVEL = "INFO"
+DEFAULT_PAYLOAD_SAMPLE_RATE = 0.01
+LOG_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+
+logger = logging.getLogger(__name__)
+
+_lock = threading.Lock()
+_listener: Optional[QueueListener] = None
+_queue_handler: Optional[QueueHandler] = None
+
+
+def attach_handler(logger: logging.Logger, handler: logging.Handler) -> bool:
+    """
+    Adds a handler to a logger unless it is already attached.
+
+    Parameters
+    ----------
+    logger : logging.Logger
+        The logger.
+    handler : logging.Handler
+        The handler to add.
+
+    Returns
+    -------
+    bool
+        True if the handler was added, False if it was already there.
+    """
+    if handler in logger.handlers:
+        return False
+    logger.addHandler(handler)
+    return True
+
+
+def stream_handler() -> logging.Handler:
+    """
+    Returns a handler writing formatted records to stderr.
+    """
+    handler = logging.StreamHandler(sys.stderr)
+    handler.setFormatter(logging.Formatter(LOG_FORMAT))
+    return handler
+
+
+def log_level() -> str:
+    """
+    Returns the level named by TICTACTOE_LOG_LEVEL, or DEFAULT_LOG_LEVEL if it is
+    unset. A name logging does not know is logged and the default used instead,
+    so a typo in the environment doesn't keep the service from starting.
+    """
+    value = os.environ.get(LOG_LEVEL_ENV)
+    if value is None:
+        return DEFAULT_LOG_LEVEL
+    if not isinstance(logging.getLevelName(value.upper()), int):
+        logger.warning(f'{LOG_LEVEL_ENV}={value!r} is not a log level; using {DEFAULT_LOG_LEVEL}')
+        return DEFAULT_LOG_LEVEL
+    return value.upper()
+
+
+def payload_sample_rate() -> float:
+    """
+    Returns the fraction of payloads logged, from TICTACTOE_LOG_PAYLOAD_SAMPLE_RATE,
+    or DEFAULT_PAYLOAD_SAMPLE_RATE if it is unset. A value that is not a number
+    is logged, once, and the default used instead.
+    """
+    return _parse_rate(os.environ.get(PAYLOAD_SAMPLE_RATE_ENV))
+
+
+@functools.lru_cache(maxsize=8)
+def _parse_rate(value: Optional[str]) -> float:
+    # Cached by value, so a bad one is reported once rather than on every request.
+    if value is None:
+        return DEFAULT_PAYLOAD_SAMPLE_RATE
+    try:
+        rate = float(value)
+    except ValueError:
+        rate = math.nan
+    if not math.isfinite(rate):
+        logger.warning(f'{PAYLOAD_SAMPLE_RATE_ENV}={value!r} is not a sample rate; '
+                       f'using {DEFAULT_PAYLOAD_SAMPLE_RATE}')
+        return DEFAULT_PAYLOAD_SAMPLE_RATE
+    return rate
+
+
+def queue_logging_enabled() -> bool:
+    """
+    Returns whether records are handed to a background thread, which is the
+    default unless TICTACTOE_LOG_QUEUE is set to 0.
+    """
+    return os.environ.get(LOG_QUEUE_ENV, "1") != "0"
+
+
+def start_queue_logging(handlers: Iterable[logging.Handler] = ()) -> QueueHandler:
+    """
+    Starts the background thread that formats and writes log records, once per process.
+
+    Loggers that should not block on I/O get the returned QueueHandler instead of
+    their own handlers: logging a record then only puts it on an unbounded queue,
+    and the listener thread passes it on to the real handlers.
+
+    Parameters
+    ----------
+    handlers : Iterable[logging.Handler], optional
+        Handlers for the listener to write to, added to any it already has.
+
+    Returns
+    -------
+    QueueHandler
+        The handler that puts records on the queue, the same on every call.
+    """
+    global _listener, _queue_handler
+    with _lock:
+        if _listener is None:
+            records: queue.SimpleQueue = queue.SimpleQueue()
+            _queue_handler = QueueHandler(records)
+            _listener = QueueListener(records, respect_handler_level=True)
+            _listener.start()
+            atexit.register(stop_queue_logging)
+        for handler in handlers:
+            if handler not in _listener.handlers and handler is not _queue_handler:
+                _listener.handlers += (handler,)
+        return _queue_handler
+
+
+def stop_queue_logging() -> None:
+    """
+    Writes out any queued records and stops the background thread.
+    """
+    global _listener, _queue_handler
+    with _lock:
+        if _listener is not None:
+            _listener.stop()
+        _listener = None
+        _queue_handler = None
+
+
+def route_through_queue(logger: logging.Logger) -> None:
+    """
+    Moves a logger's handlers to the background thread and attaches the queue in
+    their place. Calling it again for the same logger changes nothing.
+
+    Parameters
+    ----------
+    logger : logging.Logger
+        The logger whose records should be written in the background.
+    """
+    handlers = [handler for handler in logger.handlers if not isinstance(handler, QueueHandler)]
+    queue_handler = start_queue_logging(handlers)
+    for handler in handlers:
+        logger.removeHandler(handler)
+    attach_handler(logger, queue_handler)
+
+
+def _log_directly_after_fork() -> None:
+    # A forked child inherits the queue but not the listener thread, so records
+    # queued there would never be written: its loggers write to the listener's
+    # handlers themselves instead, as the listener would have.
+    global _lock, _listener, _queue_handler
+    _lock = threading.Lock()
+    if _listener is None:
+        return
+    handlers, queue_handler = _listener.handlers, _queue_handler
+    _listener = _queue_handler = None
+    loggers = [logging.getLogger()] + [logger for logger in logging.Logger.manager.loggerDict.values()
+                                       if isinstance(logger, logging.Logger)]
+    for logger in loggers:
+        if queue_handler in logger.handlers:
+            logger.removeHandler(queue_handler)
+            for handler in handlers:
+                attach_handler(logger, handler)
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_log_directly_after_fork)
+
+
+def log_payload(logger: logging.Logger, message: str, payload: Any, rate: Optional[float] = None) -> None:
+    """
+    Logs a request payload at DEBUG level for a random sample of calls.
+
+    Nothing is formatted unless DEBUG is enabled and the call is sampled, so the
+    cost on the request path is one level check and, at DEBUG, one random number.
+
+    Parameters
+    ----------
+    logger : logging.Logger
+        The logger to log to.
+    message : str
+        What the payload is.
+    payload : Any
+        The payload, formatted only if it is logged.
+    rate : float, optional
+        The fraction of calls to log; defaults to TICTACTOE_LOG_PAYLOAD_SAMPLE_RATE,
+        or 1%.
+    """
+    if not logger.isEnabledFor(logging.DEBUG):
+        return
+    if rate is None:
+        rate = payload_sample_rate()
+    if rate >= 1 or random.random() < rate:
+        logger.debug('%s: %r', message, payload)
@@ -0,0 +1,326 @@
+import asyncio
+from collections import OrderedDict
+import logging
+import threading
+import time
+from typing import Callable, Dict, List, NamedTuple, Optional, Tuple
+import uuid
+
+from tictactoe import TICKET_NOT_FOUND_ERROR_MSG
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BUCKET_WIDTH = 10
+TICKET_TTL_SECONDS = 60.0
+
+
+class Match(NamedTuple):
+    """The game a waiting player was paired into, their mark and their opponent."""
+    game_id: str
+    mark: str
+    opponent: str
+
+
+class Ticket:
+    """
+    A player's place in the matchmaking queue.
+
+    Attributes
+    ----------
+    ticket_id : str
+        The id the player polls with.
+    player : str
+        The name of the player.
+    bucket : int
+        The rating bucket the player waits in.
+    joined : float
+        The clock reading when the player joined.
+    deadline : float
+        The clock reading after which the ticket is dropped unless polled again.
+    match : Optional[Match]
+        The game the player was paired into, once there is one.
+    """
+
+    __slots__ = ("ticket_id", "player", "bucket", "joined", "deadline", "match", "_event", "_futures")
+
+    def __init__(self, player: str, bucket: int, now: float, ttl: float):
+        self.ticket_id = str(uuid.uuid4())
+        self.player = player
+        self.bucket = bucket
+        self.joined = now
+        self.deadline = now + ttl
+        self.match: Optional[Match] = None
+        self._event = threading.Event()
+        self._futures: List[Tuple[asyncio.AbstractEventLoop, asyncio.Future]] = []
+
+
+class Matchmaker:
+    """
+    A queue that pairs waiting players into new games.
+
+    Players wait in first-in, first-out order in buckets of similar rating, and
+    a player joining is paired with whoever has waited longest in their own
+    bucket, or failing that in a neighbouring one, so pairing is O(1). Each bucket
+    is an OrderedDict of tickets, so a ticket can also leave from the middle in
+    O(1) when it is cancelled or expires.
+
+    A waiting player is a ticket and nothing more: threads wait on the ticket's
+    own event, so a pairing wakes only the two players concerned, and asyncio
+    tasks wait on futures resolved from the pairing thread, so an asyncio server
+    holds one idle coroutine per waiter, not a thread. A ticket not polled for
+    `ticket_ttl` seconds is dropped, so players who gave up are not paired.
+
+    Methods
+    -------
+    join(player: str) -> Ticket:
+        Queues a player, pairing them at once if someone suitable is waiting.
+
+    get(ticket_id: str) -> Ticket:
+        Returns a ticket and keeps it from expiring.
+
+    cancel(ticket_id: str) -> None:
+        Takes a waiting player out of the queue.
+
+    wait(ticket: Ticket, timeout: Optional[float] = None) -> Optional[Match]:
+        Blocks until the player is paired, or the timeout runs out.
+
+    wait_async(ticket: Ticket, timeout: Optional[float] = None) -> Optional[Match]:
+        The coroutine version of wait.
+    """
+
+    def __init__(self, create_game: Callable[[str, str], str], rating: Optional[Callable[[str], int]] = None,
+                 bucket_width: int = DEFAULT_BUCKET_WIDTH, ticket_ttl: float = TICKET_TTL_SECONDS,
+                 clock: Callable[[], float] = time.monotonic):
+        """
+        Initializes the queue.
+
+        Parameters
+        ----------
+        create_game : Callable[[str, str], str]
+            Creates a game between the players playing X and O and returns its id.
+        rating : Callable[[str], int], optional
+            Returns a player's rating. If None, everyone waits in one bucket.
+        bucket_width : int, optional
+            The range of ratings in each bucket.
+        ticket_ttl : float, optional
+            Seconds a ticket is kept after it was last polled.
+        clock : Callable[[], float], optional
+            Returns the current time in seconds.
+        """
+        self.create_game = create_game
+        self.rating = rating
+        self.bucket_width = bucket_width
+        self.ticket_ttl = ticket_ttl
+        self.clock = clock
+        self._queues: Dict[int, "OrderedDict[str, Ticket]"] = {}
+        # every ticket, least recently polled first
+        self._tickets: "OrderedDict[str, Ticket]" = OrderedDict()
+        self._waiting: Dict[str, Ticket] = {}
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        """Returns the number of players waiting."""
+        return len(self._waiting)
+
+    def join(self, player: str) -> Ticket:
+        """
+        Queues a player, pairing them at once if someone suitable is waiting. The
+        player who waited plays X. A player already waiting keeps their ticket.
+
+        Parameters
+        ----------
+        player : str
+            The name of the player.
+
+        Returns
+        -------
+        Ticket
+            The player's ticket, with its match set if they were paired.
+        """
+        bucket = self.rating(player) // self.bucket_width if self.rating is not None else 0
+        now = self.clock()
+        with self._lock:
+            self._expire(now)
+            ticket = self._waiting.get(player)
+            if ticket is not None:
+                self._touch(ticket, now)
+                return ticket
+            ticket = Ticket(player, bucket, now, self.ticket_ttl)
+            self._tickets[ticket.ticket_id] = ticket
+            opponent = self._pop_opponent(bucket, now)
+            if opponent is None:
+                self._queues.setdefault(bucket, OrderedDict())[ticket.ticket_id] = ticket
+                self._waiting[player] = ticket
+                return ticket
+        try:
+            game_id = self.create_game(opponent.player, player)
+        except Exception:
+            # Put the opponent back at the front and let this player try again.
+            with self._lock:
+                queue = self._queues.setdefault(opponent.bucket, OrderedDict())
+                queue[opponent.ticket_id] = opponent
+                queue.move_to_end(opponent.ticket_id, last=False)
+                self._waiting[opponent.player] = opponent
+                self._tickets.pop(ticket.ticket_id, None)
+            raise
+        logger.info(f'Paired {opponent.player} and {player} in game {game_id}')
+        ticket.match = Match(game_id, "O", opponent.player)
+        opponent.match = Match(game_id, "X", player)
+        ticket._event.set()
+        self._wake(opponent)
+        return ticket
+
+    def get(self, ticket_id: str) -> Ticket:
+        """
+        Returns a ticket and keeps it from expiring for another `ticket_ttl` seconds.
+
+        Parameters
+        ----------
+        ticket_id : str
+            The id of the ticket.
+
+        Returns
+        -------
+        Ticket
+            The ticket.
+
+        Raises
+        ------
+        KeyError
+            If there is no such ticket, or it expired.
+        """
+        now = self.clock()
+        with self._lock:
+            self._expire(now)
+            ticket = self._tickets.get(ticket_id)
+            if ticket is None:
+                raise KeyError(TICKET_NOT_FOUND_ERROR_MSG)
+            self._touch(ticket, now)
+            return ticket
+
+    def cancel(self, ticket_id: str) -> None:
+        """
+        Takes a player out of the queue. A ticket already paired stays paired.
+
+        Parameters
+        ----------
+        ticket_id : str
+            The id of the ticket.
+
+        Raises
+        ------
+        KeyError
+            If there is no such ticket.
+        """
+        with self._lock:
+            ticket = self._tickets.pop(ticket_id, None)
+            if ticket is None:
+                raise KeyError(TICKET_NOT_FOUND_ERROR_MSG)
+            self._unqueue(ticket)
+
+    def wait(self, ticket: Ticket, timeout: Optional[float] = None) -> Optional[Match]:
+        """
+        Blocks until the player is paired, or the timeout runs out.
+
+        Parameters
+        ----------
+        ticket : Ticket
+            The player's ticket, from join or get.
+        timeout : float, optional
+            The longest to wait, in seconds. If None, waits until paired.
+
+        Returns
+        -------
+        Optional[Match]
+            The match, or None on timeout.
+        """
+        self._extend(ticket, timeout)
+        ticket._event.wait(timeout)
+        return ticket.match
+
+    async def wait_async(self, ticket: Ticket, timeout: Optional[float] = None) -> Optional[Match]:
+        """
+        Waits until the player is paired, or the timeout runs out, without holding a thread.
+
+        Parameters
+        ----------
+        ticket : Ticket
+            The player's ticket, from join or get.
+        timeout : float, optional
+            The longest to wait, in seconds. If None, waits until paired.
+
+        Returns
+        -------
+        Optional[Match]
+            The match, or None on timeout.
+        """
+        loop = asyncio.get_running_loop()
+        self._extend(ticket, timeout)
+        with self._lock:
+            if ticket.match is not None:
+                return ticket.match
+            future = loop.create_future()
+            ticket._futures.append((loop, future))
+        try:
+            await asyncio.wait_for(future, timeout)
+        except asyncio.TimeoutError:
+            pass
+        finally:
+            # on a timeout, or when the waiting coroutine is cancelled
+            with self._lock:
+                ticket._futures = [(l, f) for l, f in ticket._futures if f is not future]
+        return ticket.match
+
+    def _pop_opponent(self, bucket: int, now: float) -> Optional[Ticket]:
+        for candidate in (bucket, bucket - 1, bucket + 1):
+            queue = self._queues.get(candidate)
+            while queue:
+                _, opponent = queue.popitem(last=False)
+                del self._waiting[opponent.player]
+                if not queue:
+                    del self._queues[candidate]
+                if opponent.deadline > now:
+                    return opponent
+                self._tickets.pop(opponent.ticket_id, None)
+        return None
+
+    def _unqueue(self, ticket: Ticket) -> None:
+        queue = self._queues.get(ticket.bucket)
+        if queue is not None and queue.pop(ticket.ticket_id, None) is not None:
+            del self._waiting[ticket.player]
+            if not queue:
+                del self._queues[ticket.bucket]
+
+    def _touch(self, ticket: Ticket, now: float, wait: float = 0.0) -> None:
+        ticket.deadline = max(ticket.deadline, now + wait + self.ticket_ttl)
+        self._tickets.move_to_end(ticket.ticket_id)
+
+    def _extend(self, ticket: Ticket, timeout: Optional[float]) -> None:
+        # A ticket is not dropped while its player is waiting on it.
+        now = self.clock()
+        with self._lock:
+            if ticket.ticket_id in self._tickets:
+                self._touch(ticket, now, float("inf") if timeout is None else timeout)
+
+    def _expire(self, now: float) -> None:
+        # Tickets are kept in the order they were last polled, so the expired ones
+        # are normally at the front. One waiting out a long poll can hold a few
+        # back until it is polled again, and pairing skips those.
+        while self._tickets:
+            ticket = next(iter(self._tickets.values()))
+            if ticket.deadline > now:
+                break
+            del self._tickets[ticket.ticket_id]
+            self._unqueue(ticket)
+
+    def _wake(self, ticket: Ticket) -> None:
+        ticket._event.set()
+        with self._lock:
+            futures, ticket._futures = ticket._futures, []
+        for loop, future in futures:
+            loop.call_soon_threadsafe(_resolve, future)
+
+
+def _resolve(future: asyncio.Future) -> None:
+    if not future.done():
+        future.set_result(None)
@@ -0,0 +1,315 @@
+from bisect import bisect_left
+import functools
+import inspect
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+# Upper bounds of the latency buckets in seconds, about 1.5x apart from 50us to 10s.
+LATENCY_BUCKETS = tuple(round(5e-5 * 1.5 ** i, 7) for i in range(31))
+QUANTILES = (0.5, 0.95, 0.99)
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+Labels = Tuple[Tuple[str, str], ...]
+
+
+def _format_labels(labels: Labels) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{name}="{value}"' for name, value in labels) + "}"
+
+
+class Counter:
+    """
+    A count that only goes up, kept separately for each set of label values.
+    """
+
+    def __init__(self, name: str, help: str):
+        self.name = name
+        self.help = help
+        self._values: Dict[Labels, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, **labels: str) -> None:
+        self.inc_labels(tuple(sorted(labels.items())), amount)
+
+    def inc_labels(self, labels: Labels, amount: float = 1) -> None:
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def value(self, **labels: str) -> float:
+        return self._values.get(tuple(sorted(labels.items())), 0)
+
+    def render(self) -> List[str]:
+        with self._lock:
+            values = sorted(self._values.items())
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        for labels, value in values:
+            lines.append(f"{self.name}{_format_labels(labels)} {value:g}")
+        return lines
+
+
+class Gauge:
+    """
+    A value read from a function when the metrics are rendered, such as the number
+    of games held.
+    """
+
+    def __init__(self, name: str, help: str, read: Callable[[], float], kind: str = "gauge"):
+        self.name = name
+        self.help = help
+        self.read = read
+        self.kind = kind
+
+    def render(self) -> List[str]:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}",
+                f"{self.name} {self.read():g}"]
+
+
+class Histogram:
+    """
+    Latencies counted into fixed buckets, kept separately for each set of label values.
+
+    Recording an observation is a bisect and two additions under a lock, with no
+    samples kept, so quantiles are estimated from the buckets: each is accurate to
+    within one bucket, about 50%, interpolated linearly inside the bucket.
+    """
+
+    def __init__(self, name: str, help: str, buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.buckets = buckets
+        # for each set of labels: the count per bucket (plus one past the last), and the sum
+        self._series: Dict[Labels, Tuple[List[int], List[float]]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels: str) -> None:
+        self.observe_labels(tuple(sorted(labels.items())), value)
+
+    def observe_labels(self, labels: Labels, value: float) -> None:
+        i = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = ([0] * (len(self.buckets) + 1), [0.0])
+            series[0][i] += 1
+            series[1][0] += value
+
+    def count(self, **labels: str) -> int:
+        with self._lock:
+            series = self._series.get(tuple(sorted(labels.items())))
+            return sum(series[0]) if series else 0
+
+    def quantile(self, q: float, **labels: str) -> Optional[float]:
+        """
+        Estimates a quantile of the observations.
+
+        Parameters
+        ----------
+        q : float
+            The quantile, between 0 and 1.
+
+        Returns
+        -------
+        Optional[float]
+            The estimate, or None if nothing has been observed.
+        """
+        with self._lock:
+            series = self._series.get(tuple(sorted(labels.items())))
+            if not series:
+                return None
+            counts = list(series[0])
+        return self._quantile(counts, q)
+
+    def _quantile(self, counts: List[int], q: float) -> Optional[float]:
+        total = sum(counts)
+        if not total:
+            return None
+        rank = q * total
+        seen = 0
+        for i, count in enumerate(counts):
+            if count and seen + count >= rank:
+                lower = self.buckets[i - 1] if i > 0 else 0.0
+                upper = self.buckets[i] if i < len(self.buckets) else self.buckets[-1]
+                return lower + (upper - lower) * (rank - seen) / count
+            seen += count
+        return self.buckets[-1]
+
+    def render(self) -> List[str]:
+        with self._lock:
+            series = sorted((labels, list(counts), total[0])
+                            for labels, (counts, total) in self._series.items())
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        for labels, counts, total in series:
+            cumulative = 0
+            for bound, count in zip(self.buckets, counts):
+                cumulative += count
+                lines.append(f"{self.name}_bucket{_format_labels(labels + (('le', f'{bound:g}'),))} {cumulative}")
+            cumulative += counts[-1]
+            lines.append(f"{self.name}_bucket{_format_labels(labels + (('le', '+Inf'),))} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(labels)} {total:.6f}")
+            lines.append(f"{self.name}_count{_format_labels(labels)} {cumulative}")
+        # Prometheus can compute quantiles from the buckets itself; these estimates
+        # are for reading the page directly.
+        lines.append(f"# HELP {self.name}_quantile Estimated quantiles of {self.name}.")
+        lines.append(f"# TYPE {self.name}_quantile gauge")
+        for labels, counts, _ in series:
+            for q in QUANTILES:
+                lines.append(f"{self.name}_quantile{_format_labels(labels + (('quantile', f'{q:g}'),))} "
+                             f"{self._quantile(counts, q):.6f}")
+        return lines
+
+
+class Metrics:
+    """
+    The service's metrics, rendered together in the Prometheus text format.
+
+    Attributes
+    ----------
+    requests : Counter
+        Calls per route.
+    errors : Counter
+        Calls per route and status that returned an error status or raised.
+    latency : Histogram
+        Seconds per call, per route.
+    moves : Counter
+        Moves applied to games.
+
+    Methods
+    -------
+    timed(route: Optional[str] = None) -> Callable:
+        A decorator recording the calls, errors and latency of a function.
+
+    gauge(name: str, help: str, read: Callable[[], float], kind: str = "gauge") -> None:
+        Adds a value read when the metrics are rendered.
+
+    render() -> str:
+        Returns every metric in the Prometheus text format.
+    """
+
+    def __init__(self, prefix: str = "tictactoe"):
+        self.prefix = prefix
+        self.requests = Counter(f"{prefix}_requests_total", "Requests handled, by route.")
+        self.errors = Counter(f"{prefix}_errors_total", "Requests that failed, by route and status.")
+        self.latency = Histogram(f"{prefix}_request_duration_seconds", "Time spent handling requests, by route.")
+        self.moves = Counter(f"{prefix}_moves_total", "Moves applied to games.")
+        self._gauges: List[Gauge] = []
+
+    def gauge(self, name: str, help: str, read: Callable[[], float], kind: str = "gauge") -> None:
+        """
+        Adds a value read when the metrics are rendered.
+
+        Parameters
+        ----------
+        name : str
+            The metric name, without the prefix.
+        help : str
+            What the value means.
+        read : Callable[[], float]
+            Returns the current value.
+        kind : str, optional
+            'gauge', or 'counter' for a value that only goes up.
+        """
+        self._gauges.append(Gauge(f"{self.prefix}_{name}", help, read, kind))
+
+    def timed(self, route: Optional[str] = None) -> Callable:
+        """
+        A decorator recording the calls, errors and latency of a function.
+
+        A call is an error if it raises, counted with status 'exception', or
+        returns a response with a status code of 400 or more. A coroutine
+        function is timed until its coroutine finishes, and a call returning a
+        streamed response until its body has been sent.
+
+        Parameters
+        ----------
+        route : str, optional
+            The route label; defaults to the name of the function.
+
+        Returns
+        -------
+        Callable
+            The decorator.
+        """
+        def decorator(function: Callable) -> Callable:
+            name = route or function.__name__
+            labels = (("route", name),)
+
+            def record(start: float, result) -> None:
+                self.latency.observe_labels(labels, time.perf_counter() - start)
+                self.requests.inc_labels(labels)
+                status = getattr(result, "status_code", None)
+                if status is not None and status >= 400:
+                    self.errors.inc(route=name, status=str(status))
+
+            def finish(start: float, result) -> None:
+                # A streamed body is produced only as it is sent, after the call
+                # has returned, so it is recorded once the body is done.
+                body = getattr(result, "response", None)
+                if inspect.isasyncgen(body):
+                    async def timed_body():
+                        try:
+                            async for chunk in body:
+                                yield chunk
+                        finally:
+                            record(start, result)
+
+                    result.response = timed_body()
+                elif inspect.isgenerator(body):
+                    def timed_body():
+                        try:
+                            yield from body
+                        finally:
+                            record(start, result)
+
+                    result.response = timed_body()
+                else:
+                    record(start, result)
+
+            if inspect.iscoroutinefunction(function):
+                @functools.wraps(function)
+                async def async_wrapper(*args, **kwargs):
+                    start = time.perf_counter()
+                    try:
+                        result = await function(*args, **kwargs)
+                    except Exception:
+                        self.errors.inc(route=name, status="exception")
+                        record(start, None)
+                        raise
+                    finish(start, result)
+                    return result
+
+                return async_wrapper
+
+            @functools.wraps(function)
+            def wrapper(*args, **kwargs):
+                start = time.perf_counter()
+                try:
+                    result = function(*args, **kwargs)
+                except Exception:
+                    self.errors.inc(route=name, status="exception")
+                    record(start, None)
+                    raise
+                finish(start, result)
+                return result
+
+            return wrapper
+        return decorator
+
+    def render(self) -> str:
+        """
+        Returns every metric in the Prometheus text format.
+
+        Returns
+        -------
+        str
+            The metrics, one sample per line.
+        """
+        lines = []
+        for metric in (self.requests, self.errors, self.latency, self.moves, *self._gauges):
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+METRICS = Metrics()
+timed = METRICS.timed
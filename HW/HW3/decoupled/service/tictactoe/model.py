@@ -1,22 +1,194 @@
+from collections import deque
+import functools
 import logging
-from typing import Optional
+import struct
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
 
-from tictactoe import Board, SQUARE_OCCUPIED_ERROR_MSG
+from tictactoe import (Board, INVALID_BOARD_ERROR_MSG, NOTHING_TO_UNDO_ERROR_MSG, SQUARE_OCCUPIED_ERROR_MSG,
+                       VERSION_CONFLICT_ERROR_MSG, VersionConflictError)
 
 logger = logging.getLogger(__name__)
 
+MIN_SIZE = 3
+MAX_SIZE = 19  # gomoku
+DEFAULT_K = 5
+CHANGE_LOG_SIZE = MAX_SIZE * MAX_SIZE
+
+# Row and column steps of the four directions a line can run in: across, down
+# and the two diagonals.
+DIRECTIONS = ((0, 1), (1, 0), (1, 1), (1, -1))
+
+WINNING_LINES = (
+    (0, 1, 2), (3, 4, 5), (6, 7, 8),  # rows
+    (0, 3, 6), (1, 4, 7), (2, 5, 8),  # columns
+    (0, 4, 8), (2, 4, 6),             # diagonals
+)
+
+# size, k, player, winner and version, followed by the two bitboards
+HEADER = struct.Struct("<BBBBI")
+PLAYERS = ("X", "O")
+WINNERS = (None, "X", "O")
+
+# On the classic 3x3 board, each line as a 9-bit mask, and for every square the masks
+# of the lines through it, so a move only has to check the two to four lines it can
+# complete.
+WIN_MASKS = tuple(sum(1 << i for i in line) for line in WINNING_LINES)
+MASKS_THROUGH = tuple(tuple(mask for mask in WIN_MASKS if mask >> i & 1) for i in range(9))
+
+
+def to_bits(squares: List[str], player: str) -> int:
+    """
+    Packs the squares held by a player into a bitboard.
+
+    Parameters
+    ----------
+    squares : List[str]
+        The board as a list of 'X', 'O' or ''.
+    player : str
+        The player whose squares to pack.
+
+    Returns
+    -------
+    int
+        A bitboard with bit i set if the player holds square i.
+    """
+    bits = 0
+    for i, square in enumerate(squares):
+        if square == player:
+            bits |= 1 << i
+    return bits
+
+
+def wins_through(bits: int, index: int, size: int, k: int) -> bool:
+    """
+    Checks whether a player has k in a row through a square, walking at most
+    k - 1 squares each way in each of the four directions.
+
+    Parameters
+    ----------
+    bits : int
+        The bitboard of the player.
+    index : int
+        The square the line must pass through.
+    size : int
+        The number of rows (and columns) of the board.
+    k : int
+        The number of marks in a row needed to win.
+
+    Returns
+    -------
+    bool
+        True if the player has a winning line through the square.
+    """
+    row, col = divmod(index, size)
+    for d_row, d_col in DIRECTIONS:
+        count = 1
+        for sign in (1, -1):
+            r, c = row + sign * d_row, col + sign * d_col
+            while count < k and 0 <= r < size and 0 <= c < size and bits >> (r * size + c) & 1:
+                count += 1
+                r += sign * d_row
+                c += sign * d_col
+        if count >= k:
+            return True
+    return False
+
+
+@functools.lru_cache(maxsize=None)
+def lines(size: int, k: int) -> Tuple[Tuple[int, ...], ...]:
+    """
+    Lists every line of k squares on a board, in any of the four directions.
+
+    Parameters
+    ----------
+    size : int
+        The number of rows (and columns) of the board.
+    k : int
+        The number of squares in a line.
+
+    Returns
+    -------
+    Tuple[Tuple[int, ...], ...]
+        The indices of the squares of each line, from its first square on.
+    """
+    found = []
+    for row in range(size):
+        for col in range(size):
+            for d_row, d_col in DIRECTIONS:
+                end_row, end_col = row + (k - 1) * d_row, col + (k - 1) * d_col
+                if 0 <= end_row < size and 0 <= end_col < size:
+                    found.append(tuple((row + i * d_row) * size + col + i * d_col for i in range(k)))
+    return tuple(found)
+
+
+class BoardView(Board):
+    """
+    A live Board view over the bitboards of a Model.
+
+    Reading `squares` unpacks the bitboards into a new list, and assigning a list to
+    `squares` packs it back into the model. Changing an element of the returned list
+    does not change the model.
+    """
+
+    __slots__ = ("_model",)
+
+    def __init__(self, model: "Model"):
+        self._model = model
+
+    @property
+    def squares(self) -> List[str]:
+        x, o = self._model.x, self._model.o
+        return ["X" if x >> i & 1 else "O" if o >> i & 1 else ""
+                for i in range(self._model.size * self._model.size)]
+
+    @squares.setter
+    def squares(self, squares: List[str]) -> None:
+        self._model.x = to_bits(squares, "X")
+        self._model.o = to_bits(squares, "O")
+        self._model.version += 1
+        # The whole board changed, so no delta spans this version.
+        if self._model.changes is not None:
+            self._model.changes.clear()
+
+
 class Model:
     """
     A class to represent the model for the Tic Tac Toe game.
 
+    The board is `size` x `size` squares, numbered row by row, and a player wins
+    with `k` in a row. It is stored as two bitboards, one per player, so a classic
+    game costs tens of bytes. A win check only looks at the lines through the square
+    just played: a few mask comparisons on 3x3, and otherwise a walk of at most
+    k - 1 squares each way in the four directions, so a move costs O(k) whatever
+    the board size.
+
+    The model does no locking of its own; callers that share a game between
+    threads hold the game's lock around moves (see Game in tictactoe.registry).
+
     Attributes
     ----------
     board : Board
-        The current state of the Tic Tac Toe board.
+        The current state of the Tic Tac Toe board, as a live view over the bitboards.
+    size : int
+        The number of rows (and columns) of the board.
+    k : int
+        The number of marks in a row needed to win.
+    x : int
+        The bitboard of the squares held by 'X'.
+    o : int
+        The bitboard of the squares held by 'O'.
     player : str
         The current player ('X' or 'O').
     winner : Optional[str]
         The winner of the game (if any).
+    version : int
+        The number of changes made to the game state, starting at 0.
+    observer : Optional[Callable[[int, int, str], None]]
+        Called with the new version, the square and the player after every move,
+        and with an empty player after a move is undone.
+    changes : Optional[deque]
+        The most recent changes as (version, square, player) tuples, with an empty
+        player for a square cleared by an undo, or None until keep_changes is called.
 
     Methods
     -------
@@ -26,24 +198,79 @@ class Model:
     change_player() -> None:
         Switches the current player.
 
-    set_winner() -> None:
+    set_winner(index: Optional[int] = None) -> None:
         Checks for a winner and sets the winner attribute if there is one.
 
     get_winner() -> Optional[str]:
         Returns the winner of the game (if any).
 
-    get_board_state() -> list[str]:
+    get_board_state() -> Board:
         Returns a copy of the current board state.
 
-    move(index: int) -> None:
+    move(index: int, expected_version: Optional[int] = None) -> None:
         Makes a move at the specified index, changes the player, and checks for a winner.
+
+    move_many(indices: Iterable[int], expected_version: Optional[int] = None) -> None:
+        Makes several moves in order, either all of them or none.
+
+    undo(index: int, expected_version: Optional[int] = None) -> None:
+        Takes back the last move, which was made at the specified index.
+
+    check_version(expected_version: Optional[int]) -> None:
+        Raises VersionConflictError if the game is not at the expected version.
+
+    keep_changes(limit: int = CHANGE_LOG_SIZE) -> None:
+        Starts logging the squares changed by each move and undo.
+
+    changes_since(version: int) -> Optional[Dict[str, List[int]]]:
+        Returns the squares changed after a version, grouped by their new mark.
+
+    copy() -> Model:
+        Returns a copy of the game state, without the observer.
+
+    to_bytes() -> bytes:
+        Packs the game state into a compact byte string.
+
+    from_bytes(data: bytes) -> Model:
+        Unpacks a game state packed by to_bytes.
     """
 
-    def __init__(self):
+    __slots__ = ("size", "k", "x", "o", "player", "winner", "version", "observer", "changes")
+
+    def __init__(self, size: int = 3, k: Optional[int] = None):
         """
         Initializes the Model with an empty board and sets the starting player to 'X'.
+
+        Parameters
+        ----------
+        size : int, optional
+            The number of rows (and columns), from 3 to 19 (default is 3).
+        k : int, optional
+            The number of marks in a row needed to win, from 3 to `size`
+            (default is `size`, capped at 5).
+
+        Raises
+        ------
+        ValueError
+            If the size or k is out of range.
         """
-        pass
+        if k is None:
+            k = min(size, DEFAULT_K)
+        if not MIN_SIZE <= size <= MAX_SIZE or not MIN_SIZE <= k <= size:
+            raise ValueError(INVALID_BOARD_ERROR_MSG)
+        self.size = size
+        self.k = k
+        self.x = 0
+        self.o = 0
+        self.player = "X"
+        self.winner = None
+        self.version = 0
+        self.observer = None
+        self.changes = None
+
+    @property
+    def board(self) -> Board:
+        return BoardView(self)
 
     def get_current_player(self) -> str:
         """
@@ -54,19 +281,51 @@ class Model:
         str
             The current player ('X' or 'O').
         """
-        pass
+        return self.player
 
     def change_player(self) -> None:
         """
         Switches the current player from 'X' to 'O' or from 'O' to 'X'.
         """
-        pass
+        self.player = "O" if self.player == "X" else "X"
 
-    def set_winner(self) -> None:
+    def set_winner(self, index: Optional[int] = None) -> None:
         """
         Checks for a winner and sets the winner attribute if there is one.
+
+        Parameters
+        ----------
+        index : int, optional
+            The square that was just played. If given, only the lines through it
+            are checked; otherwise every line is checked for both players.
         """
-        pass
+        if self.size == 3 and self.k == 3:
+            self._set_winner_from_masks(index)
+            return
+        if index is None:
+            squares = [i for i in range(self.size * self.size) if (self.x | self.o) >> i & 1]
+        else:
+            squares = [index]
+        for square in squares:
+            player, bits = ("X", self.x) if self.x >> square & 1 else ("O", self.o)
+            if wins_through(bits, square, self.size, self.k):
+                self.winner = player
+                logger.info(f'Player {self.winner} wins')
+                return
+
+    def _set_winner_from_masks(self, index: Optional[int]) -> None:
+        if index is None:
+            candidates = (("X", self.x, WIN_MASKS), ("O", self.o, WIN_MASKS))
+        elif self.x >> index & 1:
+            candidates = (("X", self.x, MASKS_THROUGH[index]),)
+        else:
+            candidates = (("O", self.o, MASKS_THROUGH[index]),)
+        for player, bits, masks in candidates:
+            for mask in masks:
+                if bits & mask == mask:
+                    self.winner = player
+                    logger.info(f'Player {self.winner} wins')
+                    return
 
     def get_winner(self) -> Optional[str]:
         """
@@ -77,20 +336,38 @@ class Model:
         Optional[str]
             The winner of the game, or None if there is no winner yet.
         """
-        pass
+        return self.winner
 
-    def get_board_state(self) -> list[str]:
+    def get_board_state(self) -> Board:
         """
         Returns a copy of the current board state.
 
         Returns
         -------
-        list[str]
+        Board
             A copy of the current board state.
         """
-        pass
+        return Board(self.board.squares)
+
+    def check_version(self, expected_version: Optional[int]) -> None:
+        """
+        Checks that the game is at the version a client based its move on.
 
-    def move(self, index: int) -> None:
+        Parameters
+        ----------
+        expected_version : Optional[int]
+            The version the client expects, or None to skip the check.
+
+        Raises
+        ------
+        VersionConflictError
+            If the game has moved on from the expected version.
+        """
+        if expected_version is not None and expected_version != self.version:
+            logger.error(f'Expected version {expected_version} but game is at {self.version}')
+            raise VersionConflictError(VERSION_CONFLICT_ERROR_MSG)
+
+    def move(self, index: int, expected_version: Optional[int] = None) -> None:
         """
         Makes a move at the specified index, changes the player, and checks for a winner.
 
@@ -98,14 +375,217 @@ class Model:
         ----------
         index : int
             The index at which to make the move.
+        expected_version : int, optional
+            If given, the move is only made if the game is still at this version.
 
         Raises
         ------
+        VersionConflictError
+            If the game is not at the expected version.
         ValueError
             If the specified index is already occupied.
         """
-        if True:
-            pass
+        self.check_version(expected_version)
+        bit = 1 << index
+        if not (self.x | self.o) & bit:
+            player = self.player
+            if player == "X":
+                self.x |= bit
+                self.player = "O"
+            else:
+                self.o |= bit
+                self.player = "X"
+            self.version += 1
+            self.set_winner(index)
+            if self.changes is not None:
+                self.changes.append((self.version, index, player))
+            if self.observer is not None:
+                self.observer(self.version, index, player)
         else:
             logger.error(f'Move failed at index {index} - square already occupied')
             raise ValueError(SQUARE_OCCUPIED_ERROR_MSG)
+
+    def move_many(self, indices: Iterable[int], expected_version: Optional[int] = None) -> None:
+        """
+        Makes several moves in order, either all of them or none.
+
+        Parameters
+        ----------
+        indices : Iterable[int]
+            The indices at which to make the moves.
+        expected_version : int, optional
+            If given, the moves are only made if the game is still at this version.
+
+        Raises
+        ------
+        VersionConflictError
+            If the game is not at the expected version.
+        ValueError
+            If any of the squares is already occupied, in which case the game is
+            left as it was before the first move.
+        """
+        self.check_version(expected_version)
+        saved = (self.x, self.o, self.player, self.winner, self.version)
+        # Hold back the observer until every move has succeeded, so a rolled back
+        # batch is never published.
+        observer, self.observer = self.observer, None
+        applied = []
+        try:
+            for index in indices:
+                applied.append((self.version + 1, index, self.player))
+                self.move(index)
+        except ValueError:
+            self.x, self.o, self.player, self.winner, self.version = saved
+            while self.changes and self.changes[-1][0] > self.version:
+                self.changes.pop()
+            raise
+        finally:
+            self.observer = observer
+        if observer is not None:
+            for version, index, player in applied:
+                observer(version, index, player)
+
+    def undo(self, index: int, expected_version: Optional[int] = None) -> None:
+        """
+        Takes back the last move, which was made at the specified index.
+
+        The model keeps no history, so the caller says which square the last move
+        was on (see tictactoe.journal). Undoing counts as a change, so the version
+        goes up, and the winner is checked again from scratch.
+
+        Parameters
+        ----------
+        index : int
+            The square of the last move.
+        expected_version : int, optional
+            If given, the move is only taken back if the game is still at this version.
+
+        Raises
+        ------
+        VersionConflictError
+            If the game is not at the expected version.
+        ValueError
+            If the square is not held by the player who moved last.
+        """
+        self.check_version(expected_version)
+        bit = 1 << index
+        player = "O" if self.player == "X" else "X"
+        bits = self.x if player == "X" else self.o
+        if not bits & bit:
+            logger.error(f'Undo failed at index {index} - not the last move')
+            raise ValueError(NOTHING_TO_UNDO_ERROR_MSG)
+        if player == "X":
+            self.x &= ~bit
+        else:
+            self.o &= ~bit
+        self.player = player
+        self.version += 1
+        self.winner = None
+        self.set_winner()
+        if self.changes is not None:
+            self.changes.append((self.version, index, ""))
+        if self.observer is not None:
+            self.observer(self.version, index, "")
+
+    def keep_changes(self, limit: int = CHANGE_LOG_SIZE) -> None:
+        """
+        Starts logging the squares changed by each move and undo, keeping the
+        most recent `limit`. Games nobody asks for changes of keep no log.
+
+        Parameters
+        ----------
+        limit : int, optional
+            The number of changes kept (default is enough to fill a 19x19 board).
+        """
+        if self.changes is None:
+            self.changes = deque(maxlen=limit)
+
+    def changes_since(self, version: int) -> Optional[Dict[str, List[int]]]:
+        """
+        Returns the squares changed after a version, grouped by their new mark.
+
+        A square changed several times is listed once, under its latest mark, so
+        applying the result to the board at `version` gives the current board.
+
+        Parameters
+        ----------
+        version : int
+            The version the board is known at.
+
+        Returns
+        -------
+        Optional[Dict[str, List[int]]]
+            The squares now holding 'X', 'O' and '' (cleared), leaving out empty
+            groups, or None if the changes after `version` are not all logged.
+        """
+        if version == self.version:
+            return {}
+        changes = self.changes
+        if changes is None or version > self.version or not changes or changes[0][0] > version + 1:
+            return None
+        latest: Dict[int, str] = {}
+        for changed, index, player in reversed(changes):
+            if changed <= version:
+                break
+            latest.setdefault(index, player)
+        grouped: Dict[str, List[int]] = {}
+        for index, player in sorted(latest.items()):
+            grouped.setdefault(player, []).append(index)
+        return grouped
+
+    def copy(self) -> "Model":
+        """
+        Returns a copy of the game state, without the observer.
+
+        Returns
+        -------
+        Model
+            The copy.
+        """
+        model = Model.__new__(Model)
+        model.size, model.k, model.x, model.o = self.size, self.k, self.x, self.o
+        model.player, model.winner, model.version = self.player, self.winner, self.version
+        model.observer = None
+        model.changes = None
+        return model
+
+    def to_bytes(self) -> bytes:
+        """
+        Packs the game state into a compact byte string: an 8-byte header and the
+        two bitboards, 12 bytes in all for a 3x3 game.
+
+        Returns
+        -------
+        bytes
+            The packed game state.
+        """
+        width = (self.size * self.size + 7) // 8
+        return (HEADER.pack(self.size, self.k, PLAYERS.index(self.player),
+                            WINNERS.index(self.winner), self.version)
+                + self.x.to_bytes(width, "little") + self.o.to_bytes(width, "little"))
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> "Model":
+        """
+        Unpacks a game state packed by to_bytes.
+
+        Parameters
+        ----------
+        data : bytes
+            The packed game state.
+
+        Returns
+        -------
+        Model
+            The game.
+        """
+        size, k, player, winner, version = HEADER.unpack_from(data)
+        width = (size * size + 7) // 8
+        model = cls.__new__(cls)
+        model.size, model.k = size, k
+        model.x = int.from_bytes(data[HEADER.size:HEADER.size + width], "little")
+        model.o = int.from_bytes(data[HEADER.size + width:HEADER.size + 2 * width], "little")
+        model.player, model.winner, model.version = PLAYERS[player], WINNERS[winner], version
+        model.observer = None
+        model.changes = None
+        return model
@@ -0,0 +1,136 @@
+from collections import OrderedDict
+import logging
+import math
+import os
+import threading
+import time
+from typing import Callable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+CLIENT_RATE_LIMIT_ENV = "TICTACTOE_CLIENT_RATE_LIMIT"
+GAME_RATE_LIMIT_ENV = "TICTACTOE_GAME_RATE_LIMIT"
+DEFAULT_CLIENT_RATE = 50.0
+DEFAULT_GAME_RATE = 20.0
+BURST_SECONDS = 2.0
+DEFAULT_MAX_BUCKETS = 100_000
+
+
+def from_env(name: str, default: float) -> Optional["RateLimiter"]:
+    """
+    Builds a limiter from an environment variable holding requests per second,
+    with a burst of BURST_SECONDS worth of requests. A value that is not a
+    number is logged and the default used instead, so a typo in the
+    environment doesn't keep the service from starting.
+
+    Parameters
+    ----------
+    name : str
+        The environment variable.
+    default : float
+        The rate if the variable is not set, or not a number.
+
+    Returns
+    -------
+    Optional[RateLimiter]
+        The limiter, or None if the rate is 0, which turns limiting off.
+    """
+    value = os.environ.get(name)
+    rate = default
+    if value is not None:
+        try:
+            rate = float(value)
+        except ValueError:
+            rate = math.nan
+        if not math.isfinite(rate):
+            logger.error(f'{name}={value!r} is not a rate in requests per second; using {default}')
+            rate = default
+    if rate <= 0:
+        return None
+    return RateLimiter(rate, max(1.0, rate * BURST_SECONDS))
+
+
+class RateLimiter:
+    """
+    Token buckets, one per key, such as a client address or a game id.
+
+    Each bucket holds up to `burst` tokens and refills at `rate` tokens per
+    second; a request takes one token, and is refused while its bucket is empty.
+    Buckets are kept in an OrderedDict in least-recently-used order, as games are
+    in GameRegistry. A bucket idle long enough to have refilled is the same as a
+    new one, so it is dropped, and the least recently used buckets are dropped
+    beyond `max_buckets`, so memory stays bounded however many clients come and go.
+
+    Methods
+    -------
+    acquire(key: str) -> float:
+        Takes a token from the key's bucket, returning 0 or the seconds until one is free.
+    """
+
+    def __init__(self, rate: float, burst: float, max_buckets: int = DEFAULT_MAX_BUCKETS,
+                 clock: Callable[[], float] = time.monotonic):
+        """
+        Initializes the limiter.
+
+        Parameters
+        ----------
+        rate : float
+            Tokens added to each bucket per second.
+        burst : float
+            The most tokens a bucket holds, so the most requests let through at once.
+        max_buckets : int, optional
+            The most buckets kept.
+        clock : Callable[[], float], optional
+            Returns the current time in seconds.
+        """
+        self.rate = rate
+        self.burst = burst
+        self.max_buckets = max_buckets
+        self.clock = clock
+        self.refused = 0
+        # tokens and the clock reading they were counted at, per key
+        self._buckets: "OrderedDict[str, List[float]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._buckets)
+
+    def acquire(self, key: str) -> float:
+        """
+        Takes a token from the key's bucket, if it has one.
+
+        Parameters
+        ----------
+        key : str
+            Whose bucket to take the token from.
+
+        Returns
+        -------
+        float
+            0 if the request may go ahead, or else the seconds until the bucket
+            has a token again.
+        """
+        now = self.clock()
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                self._evict(now)
+                bucket = self._buckets[key] = [self.burst, now]
+            else:
+                self._buckets.move_to_end(key)
+                bucket[0] = min(self.burst, bucket[0] + (now - bucket[1]) * self.rate)
+                bucket[1] = now
+            if bucket[0] >= 1:
+                bucket[0] -= 1
+                return 0.0
+            self.refused += 1
+            return (1 - bucket[0]) / self.rate
+
+    def _evict(self, now: float) -> None:
+        refill = self.burst / self.rate
+        buckets = self._buckets
+        while buckets:
+            _, last = next(iter(buckets.values()))
+            if len(buckets) < self.max_buckets and now - last < refill:
+                break
+            buckets.popitem(last=False)
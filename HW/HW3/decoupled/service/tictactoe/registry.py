@@ -0,0 +1,307 @@
+from collections import OrderedDict
+import logging
+import threading
+import time
+from typing import Callable, Dict, Optional, Tuple
+import uuid
+
+from tictactoe import GAME_NOT_FOUND_ERROR_MSG
+from tictactoe.events import EventStream
+from tictactoe.model import Model
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TTL_SECONDS = 60 * 60
+DEFAULT_MAX_GAMES = 100_000
+EPOCH_LENGTH = 12
+
+
+class Game:
+    """
+    A registry entry: one game and the bookkeeping needed to evict it.
+
+    Attributes
+    ----------
+    game_id : str
+        The id the game is registered under.
+    model : Model
+        The state of the game.
+    last_access : float
+        The clock reading of the last time the game was created or looked up.
+    board_cache : Tuple[int, bytes]
+        The model version and serialized board state at that version, reused
+        until the model version changes.
+    events : Optional[EventStream]
+        The stream of moves, attached when the first viewer subscribes.
+    epoch : str
+        A random tag, new whenever the game is created or restored, that tells
+        apart two states with the same version: the versions of a game restored
+        from a checkpoint can repeat ones served before a restart.
+    lock : threading.Lock
+        Held while reading or changing the model, so that concurrent requests
+        see and make whole moves. Each game has its own lock, so moves in
+        different games never wait on each other.
+    """
+
+    __slots__ = ("game_id", "model", "last_access", "board_cache", "events", "epoch", "lock")
+
+    def __init__(self, game_id: str, model: Model, last_access: float = 0.0, epoch: Optional[str] = None):
+        self.game_id = game_id
+        self.model = model
+        self.last_access = last_access
+        self.board_cache = (-1, b"")
+        self.events = None
+        self.epoch = new_epoch() if epoch is None else epoch
+        self.lock = threading.Lock()
+
+
+def new_epoch() -> str:
+    """
+    Returns a new random epoch for a game, EPOCH_LENGTH hex digits long.
+    """
+    return uuid.uuid4().hex[:EPOCH_LENGTH]
+
+
+class GameRegistry:
+    """
+    A class to hold many concurrent Tic Tac Toe games keyed by game id.
+
+    Games are kept in an OrderedDict in least-recently-used order, so lookups
+    are O(1) and the idle games are always at the front. A game is evicted once
+    it has not been touched for `ttl` seconds, or when the registry grows past
+    `max_games` and it is the least recently used game.
+
+    Methods
+    -------
+    create(size: int = 3, k: Optional[int] = None) -> Game:
+        Registers a new game and returns it.
+
+    put(game_id: str, model: Model) -> Game:
+        Registers an existing game under the given id and returns it.
+
+    put_many(models: Dict[str, Model]) -> None:
+        Registers many existing games at once.
+
+    get(game_id: str) -> Game:
+        Returns the game with the given id and marks it as recently used.
+
+    delete(game_id: str) -> None:
+        Removes the game with the given id.
+
+    evict_expired() -> int:
+        Removes every game whose TTL has run out and returns how many were removed.
+    """
+
+    def __init__(self, ttl: float = DEFAULT_TTL_SECONDS, max_games: int = DEFAULT_MAX_GAMES,
+                 clock: Callable[[], float] = time.monotonic,
+                 on_evict: Optional[Callable[[str], None]] = None):
+        """
+        Initializes an empty registry.
+
+        Parameters
+        ----------
+        ttl : float, optional
+            Seconds a game may sit idle before it is evicted.
+        max_games : int, optional
+            The maximum number of games held at once.
+        clock : Callable[[], float], optional
+            The time source, in seconds (default is time.monotonic).
+        on_evict : Callable[[str], None], optional
+            Called with the id of every evicted game.
+        """
+        if max_games < 1:
+            raise ValueError("max_games must be at least 1")
+        self.ttl = ttl
+        self.max_games = max_games
+        self.clock = clock
+        self.on_evict = on_evict
+        self.evictions = 0
+        self._games: "OrderedDict[str, Game]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._games)
+
+    def __contains__(self, game_id: str) -> bool:
+        with self._lock:
+            return self._lookup(game_id, self.clock()) is not None
+
+    def create(self, size: int = 3, k: Optional[int] = None) -> Game:
+        """
+        Registers a new game under a fresh id, evicting idle games to make room.
+
+        Parameters
+        ----------
+        size : int, optional
+            The number of rows (and columns) of the board (default is 3).
+        k : int, optional
+            The number of marks in a row needed to win (see Model).
+
+        Returns
+        -------
+        Game
+            The newly registered game.
+
+        Raises
+        ------
+        ValueError
+            If the size or k is out of range.
+        """
+        game = self._insert(uuid.uuid4().hex, Model(size, k))
+        logger.info(f'Created game {game.game_id}')
+        return game
+
+    def put(self, game_id: str, model: Model) -> Game:
+        """
+        Registers an existing game under the given id, replacing any game with that
+        id and evicting idle games to make room.
+
+        Parameters
+        ----------
+        game_id : str
+            The id of the game.
+        model : Model
+            The state of the game.
+
+        Returns
+        -------
+        Game
+            The registered game.
+        """
+        return self._insert(game_id, model)
+
+    def put_many(self, models: Dict[str, Model]) -> None:
+        """
+        Registers many existing games at once, as when restoring them on startup,
+        taking the lock and reading the clock only once. If there are more games
+        than fit, the ones earliest in `models` are evicted.
+
+        Parameters
+        ----------
+        models : Dict[str, Model]
+            The states of the games, by id.
+        """
+        now = self.clock()
+        with self._lock:
+            games = self._games
+            for game_id, model in models.items():
+                games.pop(game_id, None)
+                games[game_id] = Game(game_id, model, now)
+            self._evict_expired(now)
+            self._evict_overflow(self.max_games)
+
+    def get(self, game_id: str) -> Game:
+        """
+        Returns the game with the given id and marks it as recently used.
+
+        Parameters
+        ----------
+        game_id : str
+            The id of the game.
+
+        Returns
+        -------
+        Game
+            The game registered under the id.
+
+        Raises
+        ------
+        KeyError
+            If there is no such game, or it has expired.
+        """
+        with self._lock:
+            game = self._lookup(game_id, self.clock())
+        if game is None:
+            raise KeyError(GAME_NOT_FOUND_ERROR_MSG)
+        return game
+
+    def delete(self, game_id: str) -> None:
+        """
+        Removes the game with the given id.
+
+        Parameters
+        ----------
+        game_id : str
+            The id of the game.
+
+        Raises
+        ------
+        KeyError
+            If there is no such game.
+        """
+        with self._lock:
+            if self._games.pop(game_id, None) is None:
+                raise KeyError(GAME_NOT_FOUND_ERROR_MSG)
+        logger.info(f'Deleted game {game_id}')
+
+    def evict_expired(self) -> int:
+        """
+        Removes every game whose TTL has run out.
+
+        Returns
+        -------
+        int
+            The number of games removed.
+        """
+        with self._lock:
+            return self._evict_expired(self.clock())
+
+    def games(self) -> Dict[str, Game]:
+        """
+        Returns a point-in-time copy of the registered games.
+
+        Returns
+        -------
+        Dict[str, Game]
+            The games keyed by id, least recently used first.
+        """
+        with self._lock:
+            return dict(self._games)
+
+    def _insert(self, game_id: str, model: Model) -> Game:
+        now = self.clock()
+        game = Game(game_id, model, now)
+        with self._lock:
+            self._games.pop(game_id, None)
+            self._evict_expired(now)
+            self._evict_overflow(self.max_games - 1)
+            self._games[game_id] = game
+        return game
+
+    def _evict_overflow(self, limit: int) -> None:
+        while len(self._games) > limit:
+            evicted, _ = self._games.popitem(last=False)
+            self._evicted(evicted)
+            logger.info(f'Evicted least recently used game {evicted}')
+
+    def _lookup(self, game_id: str, now: float) -> Optional[Game]:
+        game = self._games.get(game_id)
+        if game is None:
+            return None
+        if now - game.last_access > self.ttl:
+            del self._games[game_id]
+            self._evicted(game_id)
+            logger.info(f'Evicted expired game {game_id}')
+            return None
+        game.last_access = now
+        self._games.move_to_end(game_id)
+        return game
+
+    def _evict_expired(self, now: float) -> int:
+        # Games are in access order, so the expired ones are all at the front.
+        evicted = 0
+        while self._games:
+            game = next(iter(self._games.values()))
+            if now - game.last_access <= self.ttl:
+                break
+            game_id, _ = self._games.popitem(last=False)
+            self._evicted(game_id)
+            evicted += 1
+        if evicted:
+            logger.info(f'Evicted {evicted} expired games')
+        return evicted
+
+    def _evicted(self, game_id: str) -> None:
+        self.evictions += 1
+        if self.on_evict is not None:
+            self.on_evict(game_id)
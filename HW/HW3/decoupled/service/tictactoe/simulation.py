@@ -0,0 +1,326 @@
+import functools
+import logging
+from typing import Callable, Dict, List, NamedTuple, Optional, Union
+
+import numpy as np
+
+from tictactoe import INVALID_BOARD_ERROR_MSG, SQUARE_OCCUPIED_ERROR_MSG
+from tictactoe.model import DEFAULT_K, lines, MAX_SIZE, MIN_SIZE, Model
+
+logger = logging.getLogger(__name__)
+
+EMPTY, X, O = 0, 1, 2
+OUTCOMES = ("X", "O", "draw")
+
+Policy = Callable[["Simulation", np.random.Generator], np.ndarray]
+
+
+class Outcomes(NamedTuple):
+    """
+    How a batch of games ended.
+
+    Attributes
+    ----------
+    x_wins : int
+        The number of games won by 'X'.
+    o_wins : int
+        The number of games won by 'O'.
+    draws : int
+        The number of games that filled the board without a winner.
+    lengths : np.ndarray
+        lengths[n] is the number of games that ended after n moves.
+    """
+    x_wins: int
+    o_wins: int
+    draws: int
+    lengths: np.ndarray
+
+    @property
+    def games(self) -> int:
+        return self.x_wins + self.o_wins + self.draws
+
+    def distribution(self) -> Dict[str, float]:
+        """
+        Returns the fraction of games ending in each outcome.
+
+        Returns
+        -------
+        Dict[str, float]
+            The fractions of games won by 'X', won by 'O' and drawn.
+        """
+        counts = (self.x_wins, self.o_wins, self.draws)
+        return {outcome: count / self.games for outcome, count in zip(OUTCOMES, counts)}
+
+    def mean_length(self) -> float:
+        return float(np.arange(len(self.lengths)) @ self.lengths) / self.games
+
+
+class Simulation:
+    """
+    Plays a batch of games side by side with array operations, one move of every
+    unfinished game per step.
+
+    The boards are one (games, squares) array of EMPTY, X or O. For every k-square
+    window on the board each player keeps a count of their marks in it, so a move
+    adds one to the counts of the windows through its square and wins if any of
+    them reaches k: the same incremental check as Model, done for every game at
+    once with fancy indexing. Every game starts with 'X', so all unfinished games
+    are on the same player's turn.
+
+    Attributes
+    ----------
+    size : int
+        The number of rows (and columns) of each board.
+    k : int
+        The number of marks in a row needed to win.
+    boards : np.ndarray
+        The (games, squares) boards.
+    counts : np.ndarray
+        counts[p - 1, g, w] is the number of marks player p has in window w of game g.
+    winner : np.ndarray
+        The winner of each game: EMPTY while there is none, otherwise X or O.
+    active : np.ndarray
+        Whether each game is still being played.
+    moves : np.ndarray
+        The squares played in each game, in order, padded with -1.
+    length : np.ndarray
+        The number of moves played in each game.
+    player : int
+        The player to move, X or O.
+    """
+
+    def __init__(self, games: int, size: int = 3, k: Optional[int] = None):
+        """
+        Initializes a batch of empty boards.
+
+        Parameters
+        ----------
+        games : int
+            The number of games to play.
+        size : int, optional
+            The number of rows (and columns) of each board (default is 3).
+        k : int, optional
+            The number of marks in a row needed to win, as for Model.
+
+        Raises
+        ------
+        ValueError
+            If the size or k is out of range.
+        """
+        if k is None:
+            k = min(size, DEFAULT_K)
+        if not MIN_SIZE <= size <= MAX_SIZE or not MIN_SIZE <= k <= size:
+            raise ValueError(INVALID_BOARD_ERROR_MSG)
+        self.size = size
+        self.k = k
+        squares = size * size
+        self.windows, self.through = _windows(size, k)
+        self.boards = np.zeros((games, squares), dtype=np.int8)
+        # The extra last window pads the rows of `through` and is kept at zero.
+        self.counts = np.zeros((2, games, len(self.windows) + 1), dtype=np.int8)
+        self.winner = np.zeros(games, dtype=np.int8)
+        self.active = np.ones(games, dtype=bool)
+        self.moves = np.full((games, squares), -1, dtype=np.int16)
+        self.length = np.zeros(games, dtype=np.int16)
+        self.player = X
+
+    @property
+    def games(self) -> int:
+        return len(self.boards)
+
+    def step(self, squares: np.ndarray) -> None:
+        """
+        Plays one move for the player to move in every unfinished game.
+
+        Parameters
+        ----------
+        squares : np.ndarray
+            The square to play in each game; entries for finished games are ignored.
+
+        Raises
+        ------
+        ValueError
+            If a square is already occupied in an unfinished game.
+        """
+        games = np.flatnonzero(self.active)
+        squares = np.asarray(squares)[games]
+        if np.any(self.boards[games, squares] != EMPTY):
+            logger.error('Simulated move failed - square already occupied')
+            raise ValueError(SQUARE_OCCUPIED_ERROR_MSG)
+        self.boards[games, squares] = self.player
+        self.moves[games, self.length[games]] = squares
+        self.length[games] += 1
+
+        counts = self.counts[self.player - 1]
+        through = self.through[squares]
+        rows = games[:, None]
+        counts[rows, through] += 1
+        counts[games, -1] = 0
+        won = (counts[rows, through] >= self.k).any(axis=1)
+        self.winner[games[won]] = self.player
+        full = self.length[games] == self.boards.shape[1]
+        self.active[games[won | full]] = False
+        self.player = O if self.player == X else X
+
+    def empty(self) -> np.ndarray:
+        """
+        Returns a (games, squares) mask of the empty squares.
+        """
+        return self.boards == EMPTY
+
+    def completing(self, player: int) -> np.ndarray:
+        """
+        Returns a (games, squares) mask of the empty squares that would win for a player.
+
+        Parameters
+        ----------
+        player : int
+            X or O.
+
+        Returns
+        -------
+        np.ndarray
+            True where the player would complete k in a row.
+        """
+        mine = self.counts[player - 1, :, :-1]
+        theirs = self.counts[2 - player, :, :-1]
+        open_windows = ((mine == self.k - 1) & (theirs == 0)).astype(np.float32)
+        return (open_windows @ self.windows > 0) & self.empty()
+
+    def run(self, policy: Union[str, Policy] = "random", seed: Optional[int] = None) -> Outcomes:
+        """
+        Plays every game to the end.
+
+        Parameters
+        ----------
+        policy : Union[str, Policy], optional
+            'random', 'greedy', or a function taking the simulation and a random
+            generator and returning the square to play in each game.
+        seed : int, optional
+            Seeds the random generator, for repeatable runs.
+
+        Returns
+        -------
+        Outcomes
+            How the games ended.
+        """
+        rng = np.random.default_rng(seed)
+        if isinstance(policy, str):
+            policy = POLICIES[policy]
+        if policy is random_policy and not self.length.any():
+            policy = _shuffled_policy(self, rng)
+        while self.active.any():
+            self.step(policy(self, rng))
+        return self.outcomes()
+
+    def outcomes(self) -> Outcomes:
+        """
+        Counts how the games ended so far.
+
+        Returns
+        -------
+        Outcomes
+            How the finished games ended.
+        """
+        finished = ~self.active
+        winners = self.winner[finished]
+        return Outcomes(int(np.count_nonzero(winners == X)), int(np.count_nonzero(winners == O)),
+                        int(np.count_nonzero(winners == EMPTY)),
+                        np.bincount(self.length[finished], minlength=self.boards.shape[1] + 1))
+
+    def to_model(self, game: int) -> Model:
+        """
+        Replays one game through Model.
+
+        Parameters
+        ----------
+        game : int
+            The index of the game.
+
+        Returns
+        -------
+        Model
+            The game as played so far.
+        """
+        model = Model(self.size, self.k)
+        model.move_many(self.moves[game, :self.length[game]].tolist())
+        return model
+
+    def verify(self, sample: int = 100, seed: Optional[int] = None) -> List[int]:
+        """
+        Replays a random sample of the games through Model and compares the results.
+
+        Parameters
+        ----------
+        sample : int, optional
+            How many games to replay.
+        seed : int, optional
+            Seeds the choice of games.
+
+        Returns
+        -------
+        List[int]
+            The games whose winner or board disagrees with Model, if any.
+        """
+        rng = np.random.default_rng(seed)
+        chosen = rng.choice(self.games, size=min(sample, self.games), replace=False)
+        mismatches = []
+        for game in chosen.tolist():
+            model = self.to_model(game)
+            winner = "XO"[self.winner[game] - 1] if self.winner[game] else None
+            squares = ["XO"[mark - 1] if mark else "" for mark in self.boards[game].tolist()]
+            if model.winner != winner or model.board.squares != squares:
+                mismatches.append(game)
+        if mismatches:
+            logger.error(f'{len(mismatches)} of {len(chosen)} simulated games disagree with Model')
+        return mismatches
+
+
+def random_policy(simulation: Simulation, rng: np.random.Generator) -> np.ndarray:
+    """
+    Plays a uniformly random empty square in every game.
+    """
+    keys = rng.random(simulation.boards.shape)
+    keys[~simulation.empty()] = -1.0
+    return keys.argmax(axis=1)
+
+
+def greedy_policy(simulation: Simulation, rng: np.random.Generator) -> np.ndarray:
+    """
+    Wins at once if possible, otherwise blocks the opponent's win, otherwise plays
+    a random empty square.
+    """
+    keys = rng.random(simulation.boards.shape)
+    opponent = O if simulation.player == X else X
+    keys[simulation.completing(opponent)] += 1.0
+    keys[simulation.completing(simulation.player)] += 2.0
+    keys[~simulation.empty()] = -1.0
+    return keys.argmax(axis=1)
+
+
+def _shuffled_policy(simulation: Simulation, rng: np.random.Generator) -> Policy:
+    # Random play from an empty board is each game's squares in a random order, so
+    # shuffle them once instead of drawing a key for every square on every move.
+    order = rng.random(simulation.boards.shape).argsort(axis=1).T
+    steps = iter(order)
+    return lambda simulation, rng: next(steps)
+
+
+POLICIES: Dict[str, Policy] = {"random": random_policy, "greedy": greedy_policy}
+
+
+@functools.lru_cache(maxsize=None)
+def _windows(size: int, k: int):
+    # Returns the (windows, squares) incidence matrix of every k-square line, and
+    # for every square the windows through it, padded with the index one past the
+    # last window.
+    squares = lines(size, k)
+    windows = np.zeros((len(squares), size * size), dtype=np.float32)
+    for w, line in enumerate(squares):
+        windows[w, line] = 1.0
+    through_lists = [np.flatnonzero(windows[:, square]) for square in range(size * size)]
+    width = max(len(ws) for ws in through_lists) + 1
+    through = np.full((size * size, width), len(squares), dtype=np.intp)
+    for square, ws in enumerate(through_lists):
+        through[square, :len(ws)] = ws
+    return windows, through
@@ -0,0 +1,383 @@
+from collections import OrderedDict
+import functools
+import logging
+import time
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+from tictactoe.model import lines, Model, WIN_MASKS, wins_through
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_DEPTH = 3
+MAX_DEPTH = 6
+SMALL_BOARD = 4
+TRANSPOSITION_TABLE_SIZE = 200_000
+# Seconds one search may take before it settles for the deepest search it
+# finished, so a deep search on a large board can't hold a request for minutes
+TIME_BUDGET = 1.0
+# Positions visited between looks at the clock
+_CLOCK_INTERVAL = 1024
+
+FULL_3X3 = (1 << 9) - 1
+
+# The 8 symmetries of the 3x3 board as permutations: square i moves to square perm[i].
+_IDENTITY = tuple(range(9))
+_ROTATE = tuple(3 * (i % 3) + 2 - i // 3 for i in range(9))
+_FLIP = tuple(3 * (i // 3) + 2 - i % 3 for i in range(9))
+
+
+def _compose(first: Tuple[int, ...], second: Tuple[int, ...]) -> Tuple[int, ...]:
+    return tuple(second[first[i]] for i in range(9))
+
+
+def _symmetries() -> List[Tuple[int, ...]]:
+    rotations = [_IDENTITY]
+    for _ in range(3):
+        rotations.append(_compose(rotations[-1], _ROTATE))
+    return rotations + [_compose(rotation, _FLIP) for rotation in rotations]
+
+
+SYMMETRIES = _symmetries()
+INVERSES = [tuple(perm.index(i) for i in range(9)) for perm in SYMMETRIES]
+
+
+class Solution(NamedTuple):
+    """
+    The answer for one position.
+
+    Attributes
+    ----------
+    move : Optional[int]
+        The best square for the player to move, or None if the game is over.
+    value : float
+        The value of the position for the player to move: 1 for a win, 0 for a
+        draw and -1 for a loss, or an estimate in between when the search stopped
+        short of the end of the game.
+    exact : bool
+        Whether the value is proven, by searching every reply to the end of the game.
+    """
+    move: Optional[int]
+    value: float
+    exact: bool
+
+
+def best_move(model: Model, depth: int = DEFAULT_DEPTH, time_budget: float = TIME_BUDGET) -> Solution:
+    """
+    Returns the best move and the value of a position.
+
+    Classic 3x3 positions are answered from a table of every reachable position,
+    solved once and folded under the 8 board symmetries. Any other position is
+    searched with alpha-beta pruning and a bounded transposition table, to the
+    end of the game where possible and otherwise `depth` moves ahead, or as
+    deep as `time_budget` seconds allow. Each search starts from an empty
+    table, so its answer depends only on the position and the depth, unless
+    the time runs out first.
+
+    Parameters
+    ----------
+    model : Model
+        The game. It is not changed.
+    depth : int, optional
+        How many moves ahead to search boards other than 3x3.
+    time_budget : float, optional
+        Seconds to search for before settling for the deepest search completed.
+
+    Returns
+    -------
+    Solution
+        The best move and the value of the position for the player to move.
+    """
+    mover, other = (model.x, model.o) if model.player == "X" else (model.o, model.x)
+    if model.winner is not None:
+        return Solution(None, 1.0 if model.winner == model.player else -1.0, True)
+    if model.size == 3 and model.k == 3 and _turn_from_counts(model.x, model.o) == model.player:
+        return _lookup(mover, other)
+    return Searcher(model.size, model.k, time_budget=time_budget).search(mover, other, depth)
+
+
+def _turn_from_counts(x: int, o: int) -> str:
+    return "X" if bin(x).count("1") == bin(o).count("1") else "O"
+
+
+def _permute(bits: int, perm: Tuple[int, ...]) -> int:
+    result = 0
+    for i in range(9):
+        if bits >> i & 1:
+            result |= 1 << perm[i]
+    return result
+
+
+def canonical(mover: int, other: int) -> Tuple[int, int]:
+    """
+    Folds a 3x3 position under the board symmetries.
+
+    Parameters
+    ----------
+    mover : int
+        The bitboard of the player to move.
+    other : int
+        The bitboard of the other player.
+
+    Returns
+    -------
+    Tuple[int, int]
+        The smallest key of the 8 symmetric positions, and the index of the
+        symmetry that produces it.
+    """
+    return min((_permute(mover, perm) | _permute(other, perm) << 9, i)
+               for i, perm in enumerate(SYMMETRIES))
+
+
+@functools.lru_cache(maxsize=None)
+def perfect_play_table() -> Dict[int, Tuple[int, Optional[int]]]:
+    """
+    Solves every reachable 3x3 position, once per process.
+
+    Returns
+    -------
+    Dict[int, Tuple[int, Optional[int]]]
+        For each canonical position key, its value for the player to move and the
+        best move in the canonical orientation.
+    """
+    table: Dict[int, Tuple[int, Optional[int]]] = {}
+
+    def solve(mover: int, other: int) -> int:
+        key, _ = canonical(mover, other)
+        if key in table:
+            return table[key][0]
+        canonical_mover, canonical_other = key & FULL_3X3, key >> 9
+        best_value, best = -2, None
+        empty = ~(canonical_mover | canonical_other) & FULL_3X3
+        for index in range(9):
+            if not empty >> index & 1:
+                continue
+            played = canonical_mover | 1 << index
+            if any(played & mask == mask for mask in WIN_MASKS):
+                value = 1
+            elif played | canonical_other == FULL_3X3:
+                value = 0
+            else:
+                value = -solve(canonical_other, played)
+            if value > best_value:
+                best_value, best = value, index
+        table[key] = (best_value, best)
+        return best_value
+
+    solve(0, 0)
+    logger.info(f'Solved {len(table)} canonical 3x3 positions')
+    return table
+
+
+def _lookup(mover: int, other: int) -> Solution:
+    if mover | other == FULL_3X3:
+        return Solution(None, 0.0, True)
+    key, symmetry = canonical(mover, other)
+    value, move = perfect_play_table()[key]
+    return Solution(INVERSES[symmetry][move], float(value), True)
+
+
+class TranspositionTable:
+    """
+    An LRU-bounded cache of searched positions.
+
+    Each entry holds the depth searched, the value found, whether the value is
+    exact or only a lower or upper bound, the best move, and whether the value
+    was proven by reaching the end of the game on every line searched.
+    """
+
+    EXACT, LOWER, UPPER = 0, 1, 2
+
+    def __init__(self, max_entries: int = TRANSPOSITION_TABLE_SIZE):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Tuple[int, int], Tuple[int, float, int, Optional[int], bool]]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: Tuple[int, int]) -> Optional[Tuple[int, float, int, Optional[int], bool]]:
+        entry = self._entries.get(key)
+        if entry is not None:
+            self._entries.move_to_end(key)
+        return entry
+
+    def put(self, key: Tuple[int, int], entry: Tuple[int, float, int, Optional[int], bool]) -> None:
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        if len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+
+class _OutOfBudget(Exception):
+    pass
+
+
+class Searcher:
+    """
+    Alpha-beta search for one board size and k.
+
+    On boards larger than 4x4 only empty squares next to a mark are tried (or the
+    center on an empty board), which keeps the branching factor small. Positions at the depth
+    limit are scored by counting the k-square windows each player could still fill.
+
+    Each search starts with an empty transposition table and searches deeper
+    one move at a time, stopping at the first depth that proves the value, at
+    `depth`, or when `time_budget` seconds have passed, in which case
+    the result of the deepest search finished is returned. A searcher keeps
+    state while it searches, so it must not run two searches at once; make one
+    per search, or per thread.
+    """
+
+    WIN = 1.0
+
+    def __init__(self, size: int, k: int, max_entries: int = TRANSPOSITION_TABLE_SIZE,
+                 time_budget: float = TIME_BUDGET):
+        self.size = size
+        self.k = k
+        self.full = (1 << size * size) - 1
+        self.max_entries = max_entries
+        self.time_budget = time_budget
+        self.table = TranspositionTable(max_entries)
+        self.nodes = 0
+        self._deadline = None
+        self._proven = True
+        self._windows = _windows(size, k)
+        left = sum(1 << (row * size) for row in range(size))
+        self._not_left = self.full & ~left
+        self._not_right = self.full & ~(left << (size - 1))
+
+    def search(self, mover: int, other: int, depth: int) -> Solution:
+        """
+        Searches a position with iterative deepening, stopping early once the
+        value is proven or the time budget runs out.
+
+        Parameters
+        ----------
+        mover : int
+            The bitboard of the player to move.
+        other : int
+            The bitboard of the other player.
+        depth : int
+            The most moves ahead to search.
+
+        Returns
+        -------
+        Solution
+            The best move and the value of the position for the player to move.
+        """
+        if mover | other == self.full:
+            return Solution(None, 0.0, True)
+        self.table = TranspositionTable(self.max_entries)
+        self.nodes = 0
+        solution = None
+        start = time.monotonic()
+        for current_depth in range(1, max(depth, 1) + 1):
+            # The first depth always finishes, so there is always a move.
+            self._deadline = None if solution is None else start + self.time_budget
+            self._proven = True
+            try:
+                value = self._negamax(mover, other, current_depth, -self.WIN, self.WIN)
+            except _OutOfBudget:
+                logger.info(f'Search stopped at depth {current_depth - 1} after {self.nodes} positions')
+                break
+            solution = Solution(self.table.get((mover, other))[3], value, self._proven)
+            if self._proven:
+                break
+        return solution
+
+    def _negamax(self, mover: int, other: int, depth: int, alpha: float, beta: float) -> float:
+        self.nodes += 1
+        if self._deadline is not None and self.nodes % _CLOCK_INTERVAL == 0 \
+                and time.monotonic() > self._deadline:
+            raise _OutOfBudget
+        key = (mover, other)
+        entry = self.table.get(key)
+        best_move = None
+        if entry is not None:
+            entry_depth, value, flag, best_move, proven = entry
+            # A bound only answers for a window it falls outside; the window is
+            # never narrowed by it, so what is stored below is always a true
+            # bound or value for the window searched.
+            if (entry_depth >= depth or proven) and (
+                    flag == TranspositionTable.EXACT
+                    or flag == TranspositionTable.LOWER and value >= beta
+                    or flag == TranspositionTable.UPPER and value <= alpha):
+                self._proven = self._proven and proven
+                return value
+        if depth == 0:
+            self._proven = False
+            return self._evaluate(mover, other)
+
+        original_alpha = alpha
+        proven_before, self._proven = self._proven, True
+        best_value = -self.WIN - 1
+        candidates, restricted = self._candidates(mover, other, best_move)
+        for index in candidates:
+            played = mover | 1 << index
+            if wins_through(played, index, self.size, self.k):
+                value = self.WIN
+            elif played | other == self.full:
+                value = 0.0
+            else:
+                value = -self._negamax(other, played, depth - 1, -beta, -alpha)
+            if value > best_value:
+                best_value, best_move = value, index
+            alpha = max(alpha, value)
+            if alpha >= beta:
+                break
+
+        if best_value <= original_alpha:
+            flag = TranspositionTable.UPPER
+        elif best_value >= beta:
+            flag = TranspositionTable.LOWER
+        else:
+            flag = TranspositionTable.EXACT
+        # A win found among the candidates is proven, but anything less is not if
+        # some squares were never tried.
+        proven = self._proven and (best_value == self.WIN or not restricted)
+        self.table.put(key, (depth, best_value, flag, best_move, proven))
+        self._proven = proven_before and proven
+        return best_value
+
+    def _candidates(self, mover: int, other: int, first: Optional[int]) -> Tuple[List[int], bool]:
+        # Returns the squares to try, best guess first, and whether any empty
+        # squares were left out.
+        occupied = mover | other
+        empty = self.full & ~occupied
+        if self.size <= SMALL_BOARD:
+            near = empty
+        elif not occupied:
+            near = 1 << ((self.size // 2) * self.size + self.size // 2)
+        else:
+            near = self._grow(occupied) & empty
+        squares = []
+        if first is not None and near >> first & 1:
+            squares.append(first)
+        rest = near & ~(1 << first) if first is not None else near
+        while rest:
+            low = rest & -rest
+            squares.append(low.bit_length() - 1)
+            rest ^= low
+        return squares, near != empty
+
+    def _grow(self, bits: int) -> int:
+        size, full = self.size, self.full
+        sideways = bits | (bits << 1 & self._not_left) | (bits >> 1 & self._not_right)
+        return (sideways | sideways << size | sideways >> size) & full
+
+    def _evaluate(self, mover: int, other: int) -> float:
+        # Windows only one player has marks in are still winnable by that player;
+        # the more marks, the more they count. Squash the total into (-1, 1).
+        score = 0.0
+        for window in self._windows:
+            mine, theirs = mover & window, other & window
+            if mine and not theirs:
+                score += 4.0 ** bin(mine).count("1")
+            elif theirs and not mine:
+                score -= 4.0 ** bin(theirs).count("1")
+        return score / (abs(score) + 4.0 ** self.k)
+
+
+@functools.lru_cache(maxsize=None)
+def _windows(size: int, k: int) -> Tuple[int, ...]:
+    # Every k-square line as a bitmask.
+    return tuple(sum(1 << square for square in line) for line in lines(size, k))
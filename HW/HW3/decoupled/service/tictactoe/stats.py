@@ -0,0 +1,494 @@
+from bisect import bisect_left
+import json
+import logging
+import threading
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple, Union
+
+from tictactoe.model import Model
+from tictactoe.store import GameStore, RedisStore
+
+logger = logging.getLogger(__name__)
+
+DRAW = "draw"
+POINTS_PER_WIN = 2
+POINTS_PER_DRAW = 1
+REDIS_STATS_PREFIX = "tictactoe:players:"
+# Ranks in Redis are points * RANK_SPAN less the order the score was reached in,
+# exact in a double for up to 2 ** 21 points.
+RANK_SPAN = 2 ** 32
+
+
+class PlayerRecord(NamedTuple):
+    """A player's results, with the points they are ranked by."""
+    name: str
+    wins: int
+    losses: int
+    draws: int
+
+    @property
+    def points(self) -> int:
+        return POINTS_PER_WIN * self.wins + POINTS_PER_DRAW * self.draws
+
+
+def outcome(model: Model) -> Optional[str]:
+    """
+    Returns how a game ended.
+
+    Parameters
+    ----------
+    model : Model
+        The game.
+
+    Returns
+    -------
+    Optional[str]
+        'X' or 'O' for the winner, 'draw' if the board is full with no winner, or
+        None if the game is still going.
+    """
+    if model.winner:
+        return model.winner
+    if model.x | model.o == (1 << model.size * model.size) - 1:
+        return DRAW
+    return None
+
+
+class PlayerStats:
+    """
+    Win, loss and draw records of players across games, and a leaderboard.
+
+    Players are seated in a game when it is created, and the game's result is
+    counted once, when the move that settles it is made. Players are ranked by
+    points, two per win and one per draw, with ties going to whoever reached the
+    score first. Rather than sorting every player for each query, the players are
+    kept in one bucket per score, in the order they reached it, and the distinct
+    scores in a sorted list: recording a result moves two players between buckets,
+    and the top n are read from the highest buckets down, so neither depends on
+    the number of players.
+
+    The records live in this process. Once keep_changes is called, as the
+    Checkpointer does, the players and seats changed since the last call to
+    changes are tracked, so they can be saved with the games and loaded back
+    into a new process with load.
+
+    Methods
+    -------
+    seat(game_id: str, x: str, o: str) -> None:
+        Records who plays X and who plays O in a game.
+
+    players(game_id: str) -> Optional[Tuple[str, str]]:
+        Returns the players of a game whose result has not been counted yet.
+
+    unseat(game_id: str) -> None:
+        Forgets the players of a game without counting a result.
+
+    settle(game_id: str, result: str) -> bool:
+        Counts the result of a game, if it has players and was not already counted.
+
+    record(name: str) -> PlayerRecord:
+        Returns a player's results.
+
+    points(name: str) -> int:
+        Returns a player's points, or 0 for a player with no results.
+
+    top(n: int) -> List[PlayerRecord]:
+        Returns the n highest ranked players, best first.
+
+    keep_changes() -> None:
+        Starts tracking the players and seats changed.
+
+    changes() -> Tuple[Dict[str, Tuple[int, int, int, int]], Dict[str, Optional[Tuple[str, str]]]]:
+        Returns the players and seats changed since the last call.
+
+    load(players: Dict[str, Tuple[int, int, int, int]], seats: Dict[str, Tuple[str, str]]) -> None:
+        Replaces the records and seats with saved ones.
+
+    Attributes
+    ----------
+    shared : bool
+        Whether every worker process sees the same records, rather than its own.
+    """
+
+    shared = False
+
+    def __init__(self):
+        # wins, losses, draws and when the player reached their score, per player
+        self._records: Dict[str, List[int]] = {}
+        # the players with each score, in the order they reached it
+        self._buckets: Dict[int, Dict[str, None]] = {}
+        # the scores with any players, in ascending order
+        self._scores: List[int] = []
+        self._seats: Dict[str, Tuple[str, str]] = {}
+        self._sequence = 0
+        # the players and seats changed since changes was last called, once kept
+        self._changed_players: Optional[set] = None
+        self._changed_seats: Optional[set] = None
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._records)
+
+    def seat(self, game_id: str, x: str, o: str) -> None:
+        """
+        Records who plays X and who plays O in a game.
+
+        Parameters
+        ----------
+        game_id : str
+            The id of the game.
+        x : str
+            The name of the player playing X.
+        o : str
+            The name of the player playing O.
+        """
+        with self._lock:
+            self._seats[game_id] = (x, o)
+            if self._changed_seats is not None:
+                self._changed_seats.add(game_id)
+
+    def players(self, game_id: str) -> Optional[Tuple[str, str]]:
+        """
+        Returns the players of a game whose result has not been counted yet.
+
+        Parameters
+        ----------
+        game_id : str
+            The id of the game.
+
+        Returns
+        -------
+        Optional[Tuple[str, str]]
+            The names of the players playing X and O, or None if the game has none.
+        """
+        return self._seats.get(game_id)
+
+    def unseat(self, game_id: str) -> None:
+        """
+        Forgets the players of a game without counting a result, as when it is deleted.
+
+        Parameters
+        ----------
+        game_id : str
+            The id of the game.
+        """
+        with self._lock:
+            if self._seats.pop(game_id, None) is not None and self._changed_seats is not None:
+                self._changed_seats.add(game_id)
+
+    def settle(self, game_id: str, result: str) -> bool:
+        """
+        Counts the result of a game. The players are unseated, so a result is
+        counted at most once per game.
+
+        Parameters
+        ----------
+        game_id : str
+            The id of the game.
+        result : str
+            'X' or 'O' for the winner, or 'draw'.
+
+        Returns
+        -------
+        bool
+            True if the result was counted, False if the game has no players or
+            its result was already counted.
+        """
+        with self._lock:
+            seats = self._seats.pop(game_id, None)
+            if seats is None:
+                return False
+            if self._changed_seats is not None:
+                self._changed_seats.add(game_id)
+            x, o = seats
+            if result == DRAW:
+                self._add(x, 0, 0, 1)
+                self._add(o, 0, 0, 1)
+            else:
+                winner, loser = (x, o) if result == "X" else (o, x)
+                self._add(winner, 1, 0, 0)
+                self._add(loser, 0, 1, 0)
+        logger.info(f'Game {game_id} between {x} and {o} ended: {result}')
+        return True
+
+    def record(self, name: str) -> PlayerRecord:
+        """
+        Returns a player's results.
+
+        Parameters
+        ----------
+        name : str
+            The name of the player.
+
+        Returns
+        -------
+        PlayerRecord
+            The player's wins, losses and draws.
+
+        Raises
+        ------
+        KeyError
+            If the player has not finished a game.
+        """
+        with self._lock:
+            record = self._records.get(name)
+            if record is None:
+                raise KeyError(name)
+            return PlayerRecord(name, *record[:3])
+
+    def points(self, name: str) -> int:
+        """
+        Returns a player's points, the score they are ranked by.
+
+        Parameters
+        ----------
+        name : str
+            The name of the player.
+
+        Returns
+        -------
+        int
+            The player's points, or 0 if they have not finished a game.
+        """
+        record = self._records.get(name)
+        if record is None:
+            return 0
+        return POINTS_PER_WIN * record[0] + POINTS_PER_DRAW * record[2]
+
+    def top(self, n: int) -> List[PlayerRecord]:
+        """
+        Returns the n highest ranked players, best first.
+
+        Parameters
+        ----------
+        n : int
+            The number of players.
+
+        Returns
+        -------
+        List[PlayerRecord]
+            At most n players, by points and then by who reached their points first.
+        """
+        leaders = []
+        with self._lock:
+            for score in reversed(self._scores):
+                for name in self._buckets[score]:
+                    if len(leaders) == n:
+                        break
+                    leaders.append(PlayerRecord(name, *self._records[name][:3]))
+                if len(leaders) == n:
+                    break
+        return leaders
+
+    def keep_changes(self) -> None:
+        """
+        Starts tracking the players and seats changed, for changes to return.
+        Records nobody saves track nothing.
+        """
+        with self._lock:
+            if self._changed_players is None:
+                self._changed_players, self._changed_seats = set(), set()
+
+    def changes(self) -> Tuple[Dict[str, Tuple[int, int, int, int]], Dict[str, Optional[Tuple[str, str]]]]:
+        """
+        Returns the players and seats changed since the last call, once keep_changes was called.
+
+        Returns
+        -------
+        Tuple[Dict[str, Tuple[int, int, int, int]], Dict[str, Optional[Tuple[str, str]]]]
+            The wins, losses, draws and the order they reached their score in,
+            by player, and the players of each game seated, or None for each game
+            settled or unseated.
+        """
+        with self._lock:
+            if self._changed_players is None:
+                return {}, {}
+            players = {name: tuple(self._records[name]) for name in self._changed_players}
+            seats = {game_id: self._seats.get(game_id) for game_id in self._changed_seats}
+            self._changed_players.clear()
+            self._changed_seats.clear()
+        return players, seats
+
+    def load(self, players: Dict[str, Tuple[int, int, int, int]], seats: Dict[str, Tuple[str, str]]) -> None:
+        """
+        Replaces the records and seats with ones saved from changes.
+
+        Parameters
+        ----------
+        players : Dict[str, Tuple[int, int, int, int]]
+            The wins, losses, draws and the order they reached their score in, by player.
+        seats : Dict[str, Tuple[str, str]]
+            The players playing X and O, by game.
+        """
+        # Players placed in the order they reached their scores keep their ranks.
+        ordered = sorted(players.items(), key=lambda player: player[1][3])
+        with self._lock:
+            self._records = {name: list(record) for name, record in ordered}
+            self._buckets = {}
+            for name, (wins, _, draws, _) in ordered:
+                self._buckets.setdefault(POINTS_PER_WIN * wins + POINTS_PER_DRAW * draws, {})[name] = None
+            self._scores = sorted(self._buckets)
+            self._seats = dict(seats)
+            self._sequence = max((record[3] for record in players.values()), default=-1) + 1
+        logger.info(f'Loaded the records of {len(players)} players and {len(seats)} seated games')
+
+    def _add(self, name: str, wins: int, losses: int, draws: int) -> None:
+        if self._changed_players is not None:
+            self._changed_players.add(name)
+        record = self._records.get(name)
+        if record is None:
+            record = self._records[name] = [0, 0, 0, 0]
+            old = None
+        else:
+            old = POINTS_PER_WIN * record[0] + POINTS_PER_DRAW * record[2]
+        record[0] += wins
+        record[1] += losses
+        record[2] += draws
+        new = POINTS_PER_WIN * record[0] + POINTS_PER_DRAW * record[2]
+        if new == old:
+            return
+        record[3] = self._sequence
+        self._sequence += 1
+        if old is not None:
+            bucket = self._buckets[old]
+            del bucket[name]
+            if not bucket:
+                del self._buckets[old]
+                del self._scores[bisect_left(self._scores, old)]
+        bucket = self._buckets.get(new)
+        if bucket is None:
+            bucket = self._buckets[new] = {}
+            self._scores.insert(bisect_left(self._scores, new), new)
+        bucket[name] = None
+
+
+class RedisPlayerStats:
+    """
+    Win, loss and draw records of players across games, and a leaderboard, kept
+    in Redis beside the games, so every worker process sees the same records and
+    they outlive the processes.
+
+    The seats are one hash of game ids, and the wins, losses and draws one hash
+    each, by player. The leaderboard is a sorted set ranking each player by
+    points * RANK_SPAN less a counter read when they reached their points, so
+    ties go to whoever reached the score first, as in PlayerStats. A result is
+    counted by the one worker whose HDEL removes the game's seats, so at most
+    once; the counts are added with HINCRBY in one transaction, and the rank
+    is only ever raised (ZADD GT), so results counted at once by several workers
+    leave the rank of the later one.
+
+    It has the same methods as PlayerStats, less those for saving records,
+    which Redis keeps itself.
+
+    Attributes
+    ----------
+    shared : bool
+        Whether every worker process sees the same records, rather than its own.
+    """
+
+    shared = True
+
+    def __init__(self, client, prefix: str = REDIS_STATS_PREFIX):
+        """
+        Initializes the records.
+
+        Parameters
+        ----------
+        client : redis.Redis
+            The client, normally the game store's.
+        prefix : str, optional
+            The prefix of every key.
+        """
+        self.client = client
+        self.prefix = prefix
+        self._seats = f"{prefix}seats"
+        self._counts = (f"{prefix}wins", f"{prefix}losses", f"{prefix}draws")
+        self._ranks = f"{prefix}ranks"
+        self._sequence = f"{prefix}sequence"
+
+    def __len__(self) -> int:
+        return self.client.zcard(self._ranks)
+
+    def seat(self, game_id: str, x: str, o: str) -> None:
+        self.client.hset(self._seats, game_id, json.dumps([x, o]))
+
+    def players(self, game_id: str) -> Optional[Tuple[str, str]]:
+        seats = self.client.hget(self._seats, game_id)
+        return tuple(json.loads(seats)) if seats is not None else None
+
+    def unseat(self, game_id: str) -> None:
+        self.client.hdel(self._seats, game_id)
+
+    def settle(self, game_id: str, result: str) -> bool:
+        with self.client.pipeline() as pipe:
+            pipe.hget(self._seats, game_id)
+            pipe.hdel(self._seats, game_id)
+            seats, removed = pipe.execute()
+        if not removed:
+            return False
+        x, o = json.loads(seats)
+        if result == DRAW:
+            changes = [(x, (0, 0, 1)), (o, (0, 0, 1))]
+        else:
+            winner, loser = (x, o) if result == "X" else (o, x)
+            changes = [(winner, (1, 0, 0)), (loser, (0, 1, 0))]
+        with self.client.pipeline() as pipe:
+            for name, amounts in changes:
+                for key, amount in zip(self._counts, amounts):
+                    pipe.hincrby(key, name, amount)
+            pipe.incr(self._sequence)
+            *counts, sequence = pipe.execute()
+        ranks = {}
+        for n, (name, _) in enumerate(changes):
+            wins, _, draws = counts[3 * n:3 * n + 3]
+            ranks[name] = (POINTS_PER_WIN * wins + POINTS_PER_DRAW * draws) * RANK_SPAN - sequence
+        self.client.zadd(self._ranks, ranks, gt=True)
+        logger.info(f'Game {game_id} between {x} and {o} ended: {result}')
+        return True
+
+    def record(self, name: str) -> PlayerRecord:
+        records = self._records([name])
+        if not records:
+            raise KeyError(name)
+        return records[0]
+
+    def points(self, name: str) -> int:
+        with self.client.pipeline(transaction=False) as pipe:
+            pipe.hget(self._counts[0], name)
+            pipe.hget(self._counts[2], name)
+            wins, draws = pipe.execute()
+        return POINTS_PER_WIN * int(wins or 0) + POINTS_PER_DRAW * int(draws or 0)
+
+    def top(self, n: int) -> List[PlayerRecord]:
+        names = [name.decode() for name in self.client.zrevrange(self._ranks, 0, n - 1)]
+        return self._records(names)
+
+    def _records(self, names: Iterable[str]) -> List[PlayerRecord]:
+        # The records of the players with any, in the order given.
+        names = list(names)
+        if not names:
+            return []
+        with self.client.pipeline() as pipe:
+            for key in self._counts:
+                pipe.hmget(key, names)
+            columns = pipe.execute()
+        return [PlayerRecord(name, *(int(count or 0) for count in counts))
+                for name, *counts in zip(names, *columns) if any(count is not None for count in counts)]
+
+
+def create_stats(store: GameStore) -> Union[PlayerStats, RedisPlayerStats]:
+    """
+    Creates the player records kept where the games are: in Redis beside a
+    RedisStore's games, and otherwise in this process.
+
+    Parameters
+    ----------
+    store : GameStore
+        The store holding the games.
+
+    Returns
+    -------
+    Union[PlayerStats, RedisPlayerStats]
+        The records.
+    """
+    if isinstance(store, RedisStore):
+        return RedisPlayerStats(store.client)
+    return PlayerStats()
@@ -0,0 +1,507 @@
+from abc import ABC, abstractmethod
+from collections import deque
+import logging
+import os
+import random
+import threading
+import time
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+import uuid
+
+from tictactoe import (GAME_NOT_FOUND_ERROR_MSG, HISTORY_UNAVAILABLE_ERROR_MSG, NOTHING_TO_UNDO_ERROR_MSG,
+                       VERSION_CONFLICT_ERROR_MSG, VersionConflictError)
+from tictactoe.events import EventStream
+from tictactoe.journal import Journal, MoveRecord
+from tictactoe.model import CHANGE_LOG_SIZE, Model
+from tictactoe.registry import DEFAULT_TTL_SECONDS, EPOCH_LENGTH, Game, GameRegistry, new_epoch
+
+logger = logging.getLogger(__name__)
+
+REDIS_URL_ENV = "TICTACTOE_REDIS_URL"
+REDIS_KEY_PREFIX = "tictactoe:game:"
+CHANGES_KEY_SUFFIX = ":changes"
+MAX_CONNECTIONS = 50
+MAX_RETRIES = 20
+# Seconds a conflicting update waits before its first retry, doubling on each
+# conflict up to RETRY_BACKOFF_LIMIT; the wait is random within that, so
+# writers that collided once do not collide again on the next try.
+RETRY_BACKOFF = 0.001
+RETRY_BACKOFF_LIMIT = 0.05
+
+
+class GameStore(ABC):
+    """
+    Where games live between requests.
+
+    Methods
+    -------
+    create(size: int = 3, k: Optional[int] = None) -> Game:
+        Stores a new game and returns it.
+
+    get(game_id: str) -> Game:
+        Returns the game with the given id.
+
+    get_many(game_ids: Iterable[str]) -> Dict[str, Model]:
+        Returns snapshots of several games at once, skipping missing ones.
+
+    put_many(models: Dict[str, Model]) -> None:
+        Stores several games at once, replacing any with the same ids.
+
+    delete(game_id: str) -> None:
+        Removes the game with the given id.
+
+    update(game: Game, change: Callable[[Model], None]) -> Model:
+        Applies a change to the stored game atomically and returns a snapshot of the result.
+
+    changes_since(game: Game, version: int) -> Tuple[int, Optional[Dict[str, List[int]]]]:
+        Returns the current version of the game and the squares changed after a version.
+
+    undo(game: Game, expected_version: Optional[int] = None) -> Model:
+        Takes back the last move of the game and returns a snapshot of the result.
+
+    history(game: Game) -> List[MoveRecord]:
+        Returns the moves of the game, in order.
+
+    events(game: Game) -> EventStream:
+        Returns the stream of the moves made in the game, attaching one on first use.
+
+    Attributes
+    ----------
+    shared : bool
+        Whether every worker process sees the same games, rather than its own.
+    """
+
+    shared = False
+
+    @abstractmethod
+    def create(self, size: int = 3, k: Optional[int] = None) -> Game:
+        pass
+
+    @abstractmethod
+    def get(self, game_id: str) -> Game:
+        pass
+
+    @abstractmethod
+    def get_many(self, game_ids: Iterable[str]) -> Dict[str, Model]:
+        pass
+
+    @abstractmethod
+    def put_many(self, models: Dict[str, Model]) -> None:
+        pass
+
+    @abstractmethod
+    def delete(self, game_id: str) -> None:
+        pass
+
+    @abstractmethod
+    def update(self, game: Game, change: Callable[[Model], None]) -> Model:
+        pass
+
+    @abstractmethod
+    def changes_since(self, game: Game, version: int) -> Tuple[int, Optional[Dict[str, List[int]]]]:
+        pass
+
+    def undo(self, game: Game, expected_version: Optional[int] = None) -> Model:
+        raise NotImplementedError(HISTORY_UNAVAILABLE_ERROR_MSG)
+
+    def history(self, game: Game) -> List[MoveRecord]:
+        raise NotImplementedError(HISTORY_UNAVAILABLE_ERROR_MSG)
+
+    @abstractmethod
+    def events(self, game: Game) -> EventStream:
+        pass
+
+
+class InMemoryStore(GameStore):
+    """
+    Keeps games in a GameRegistry inside this process.
+
+    Changes are made to the live model under the game's lock. If the store has a
+    journal, the moves of each change are appended to it under the same lock, so
+    the journal holds every game's moves in the order they were applied.
+    """
+
+    def __init__(self, registry: GameRegistry, journal: Optional[Journal] = None):
+        """
+        Initializes the store.
+
+        Parameters
+        ----------
+        registry : GameRegistry
+            The registry holding the games.
+        journal : Journal, optional
+            Where to record the moves, for history and undo.
+        """
+        self.registry = registry
+        self.journal = journal
+        self._events_lock = threading.Lock()
+
+    def create(self, size: int = 3, k: Optional[int] = None) -> Game:
+        game = self.registry.create(size, k)
+        if self.journal is not None:
+            self.journal.record_game(game.game_id, game.model)
+        return game
+
+    def get(self, game_id: str) -> Game:
+        return self.registry.get(game_id)
+
+    def get_many(self, game_ids: Iterable[str]) -> Dict[str, Model]:
+        models = {}
+        for game_id in game_ids:
+            try:
+                game = self.registry.get(game_id)
+            except KeyError:
+                continue
+            with game.lock:
+                models[game_id] = game.model.copy()
+        return models
+
+    def put_many(self, models: Dict[str, Model]) -> None:
+        # Journal the games before they can be seen, so no move is journaled ahead of them.
+        if self.journal is not None:
+            for game_id, model in models.items():
+                self.journal.record_game(game_id, model)
+        self.registry.put_many(models)
+
+    def delete(self, game_id: str) -> None:
+        self.registry.delete(game_id)
+        if self.journal is not None:
+            self.journal.record_delete(game_id)
+
+    def update(self, game: Game, change: Callable[[Model], None]) -> Model:
+        with game.lock:
+            if self.journal is None:
+                change(game.model)
+                return game.model.copy()
+            # Catch the moves on their way to the game's observer.
+            moves = []
+            observer = game.model.observer
+
+            def record(version: int, index: int, player: str) -> None:
+                moves.append((index, player))
+                if observer is not None:
+                    observer(version, index, player)
+
+            game.model.observer = record
+            try:
+                change(game.model)
+            finally:
+                game.model.observer = observer
+            self.journal.record_moves(game.game_id, game.model, moves)
+            return game.model.copy()
+
+    def changes_since(self, game: Game, version: int) -> Tuple[int, Optional[Dict[str, List[int]]]]:
+        # The live model logs its changes from the first request for them.
+        with game.lock:
+            game.model.keep_changes()
+            return game.model.version, game.model.changes_since(version)
+
+    def undo(self, game: Game, expected_version: Optional[int] = None) -> Model:
+        if self.journal is None:
+            raise NotImplementedError(HISTORY_UNAVAILABLE_ERROR_MSG)
+        with game.lock:
+            game.model.check_version(expected_version)
+            last = self.journal.last_move(game.game_id)
+            if last is None:
+                raise ValueError(NOTHING_TO_UNDO_ERROR_MSG)
+            game.model.undo(last.index)
+            self.journal.record_undo(game.game_id)
+            return game.model.copy()
+
+    def history(self, game: Game) -> List[MoveRecord]:
+        if self.journal is None:
+            raise NotImplementedError(HISTORY_UNAVAILABLE_ERROR_MSG)
+        return self.journal.history(game.game_id)
+
+    def events(self, game: Game) -> EventStream:
+        if game.events is None:
+            # Attaching the stream replaces the model's observer, so it must not happen
+            # in the middle of a change.
+            with self._events_lock, game.lock:
+                if game.events is None:
+                    game.events = EventStream(game.model)
+        return game.events
+
+
+class RedisStore(GameStore):
+    """
+    Keeps games in Redis, so several worker processes can serve the same games.
+
+    Each game is one key holding the game's epoch followed by Model.to_bytes(),
+    so every worker builds the same ETags for it, with the registry's idle TTL
+    refreshed whenever the game is read or changed. Redis evicts the least
+    recently used games itself when run with `maxmemory-policy allkeys-lru`.
+    Changes are applied with WATCH/MULTI: the game is read, changed locally and
+    written back only if no other client wrote it in the meantime, retrying
+    after a short random wait otherwise. Multi-key reads use MGET and multi-key writes one pipeline, so
+    each costs a single round trip.
+
+    The most recent CHANGE_LOG_SIZE changes of each game are kept beside it, in
+    a capped list under the game's key plus CHANGES_KEY_SUFFIX, appended in the
+    same transaction as the change, so any worker can answer a request for the
+    squares changed since a version. Unlike the in-memory store, every game
+    keeps this log from its first move.
+
+    Every get builds a new Game, so the event streams are kept here by game
+    id instead, and a change publishes its moves once it is written. Moves are
+    published to viewers only within the process that made them; a viewer
+    waiting in another process sees them when it next fetches the board. A
+    stream is dropped with its game, when it is deleted or found to have expired.
+
+    Redis expires idle games without telling anyone, so a game is known to have
+    expired only when it is next looked up and missing; on_expire is called then,
+    for whatever else the process keeps per game.
+    """
+
+    shared = True
+
+    def __init__(self, client, ttl: float = DEFAULT_TTL_SECONDS, prefix: str = REDIS_KEY_PREFIX,
+                 on_expire: Optional[Callable[[str], None]] = None):
+        """
+        Initializes the store.
+
+        Parameters
+        ----------
+        client : redis.Redis
+            The client, normally sharing a connection pool (see redis_pool).
+        ttl : float, optional
+            Seconds a game may sit idle before Redis expires it.
+        prefix : str, optional
+            The prefix of every game key.
+        on_expire : Callable[[str], None], optional
+            Called with the id of a game found to have expired.
+        """
+        self.client = client
+        self.ttl = int(ttl)
+        self.prefix = prefix
+        self.on_expire = on_expire
+        self._streams: Dict[str, EventStream] = {}
+        self._streams_lock = threading.Lock()
+
+    def create(self, size: int = 3, k: Optional[int] = None) -> Game:
+        game = Game(uuid.uuid4().hex, Model(size, k))
+        self.client.set(self._key(game.game_id), _pack(game.epoch, game.model), ex=self.ttl, nx=True)
+        logger.info(f'Created game {game.game_id}')
+        return game
+
+    def get_or_create(self, game_id: str, size: int = 3, k: Optional[int] = None) -> Game:
+        """
+        Returns the game with the given id, first storing a new one under that id
+        if there is none. Of several workers creating it at once, one succeeds
+        and the others get its game.
+
+        Parameters
+        ----------
+        game_id : str
+            The id of the game.
+        size : int, optional
+            The number of rows (and columns) of a new game.
+        k : int, optional
+            The number of marks in a row a new game needs to win.
+
+        Returns
+        -------
+        Game
+            The game.
+        """
+        try:
+            return self.get(game_id)
+        except KeyError:
+            self.client.set(self._key(game_id), _pack(new_epoch(), Model(size, k)), ex=self.ttl, nx=True)
+            return self.get(game_id)
+
+    def get(self, game_id: str) -> Game:
+        with self.client.pipeline(transaction=False) as pipe:
+            pipe.get(self._key(game_id))
+            pipe.expire(self._key(game_id), self.ttl)
+            pipe.expire(self._changes_key(game_id), self.ttl)
+            data, _, _ = pipe.execute()
+        if data is None:
+            self._expired(game_id)
+            raise KeyError(GAME_NOT_FOUND_ERROR_MSG)
+        epoch, model = _unpack(data)
+        game = Game(game_id, model, epoch=epoch)
+        game.events = self._streams.get(game_id)
+        return game
+
+    def get_many(self, game_ids: Iterable[str]) -> Dict[str, Model]:
+        game_ids = list(game_ids)
+        if not game_ids:
+            return {}
+        values = self.client.mget([self._key(game_id) for game_id in game_ids])
+        return {game_id: _unpack(data)[1]
+                for game_id, data in zip(game_ids, values) if data is not None}
+
+    def put_many(self, models: Dict[str, Model]) -> None:
+        with self.client.pipeline(transaction=False) as pipe:
+            for game_id, model in models.items():
+                pipe.set(self._key(game_id), _pack(new_epoch(), model), ex=self.ttl)
+                pipe.delete(self._changes_key(game_id))
+            pipe.execute()
+
+    def delete(self, game_id: str) -> None:
+        with self.client.pipeline(transaction=False) as pipe:
+            pipe.delete(self._key(game_id))
+            pipe.delete(self._changes_key(game_id))
+            deleted, _ = pipe.execute()
+        if not deleted:
+            self._expired(game_id)
+            raise KeyError(GAME_NOT_FOUND_ERROR_MSG)
+        self._forget(game_id)
+        logger.info(f'Deleted game {game_id}')
+
+    def update(self, game: Game, change: Callable[[Model], None]) -> Model:
+        from redis import WatchError
+
+        key = self._key(game.game_id)
+        with self.client.pipeline() as pipe:
+            for attempt in range(MAX_RETRIES):
+                try:
+                    pipe.watch(key)
+                    data = pipe.get(key)
+                    if data is None:
+                        self._expired(game.game_id)
+                        raise KeyError(GAME_NOT_FOUND_ERROR_MSG)
+                    epoch, model = _unpack(data)
+                    base = model.version
+                    # Publish the moves only once they are written, not on each retry.
+                    moves = []
+                    model.observer = lambda *move: moves.append(move)
+                    change(model)
+                    model.observer = None
+                    pipe.multi()
+                    pipe.set(key, _pack(epoch, model), ex=self.ttl)
+                    self._log_changes(pipe, game.game_id, base, model.version, moves)
+                    pipe.execute()
+                except WatchError:
+                    time.sleep(random.uniform(0, min(RETRY_BACKOFF * 2 ** attempt, RETRY_BACKOFF_LIMIT)))
+                    continue
+                game.model = model
+                game.epoch = epoch
+                stream = self._streams.get(game.game_id)
+                if stream is not None:
+                    for move in moves:
+                        stream.publish(*move)
+                return model.copy()
+        logger.error(f'Gave up updating game {game.game_id} after {MAX_RETRIES} conflicts')
+        raise VersionConflictError(VERSION_CONFLICT_ERROR_MSG)
+
+    def changes_since(self, game: Game, version: int) -> Tuple[int, Optional[Dict[str, List[int]]]]:
+        # Read the game and its log in one transaction, so they agree on the version.
+        with self.client.pipeline() as pipe:
+            pipe.get(self._key(game.game_id))
+            pipe.lrange(self._changes_key(game.game_id), 0, -1)
+            data, changes = pipe.execute()
+        if data is None:
+            self._expired(game.game_id)
+            raise KeyError(GAME_NOT_FOUND_ERROR_MSG)
+        game.epoch, game.model = _unpack(data)
+        model = game.model.copy()
+        model.changes = deque((_unpack_change(change) for change in changes), maxlen=CHANGE_LOG_SIZE)
+        return model.version, model.changes_since(version)
+
+    def events(self, game: Game) -> EventStream:
+        with self._streams_lock:
+            stream = self._streams.get(game.game_id)
+            if stream is None:
+                stream = self._streams[game.game_id] = EventStream(game.model)
+                # The stream is published to by update, not by this copy of the model.
+                game.model.observer = None
+        game.events = stream
+        return stream
+
+    def _forget(self, game_id: str) -> None:
+        with self._streams_lock:
+            self._streams.pop(game_id, None)
+
+    def _expired(self, game_id: str) -> None:
+        self._forget(game_id)
+        if self.on_expire is not None:
+            self.on_expire(game_id)
+
+    def _key(self, game_id: str) -> str:
+        return f"{self.prefix}{game_id}"
+
+    def _changes_key(self, game_id: str) -> str:
+        return f"{self.prefix}{game_id}{CHANGES_KEY_SUFFIX}"
+
+    def _log_changes(self, pipe, game_id: str, base: int, version: int, moves: List[Tuple[int, int, str]]) -> None:
+        key = self._changes_key(game_id)
+        if version != base + len(moves):
+            # The change replaced the board without logging its squares, so no
+            # delta spans it.
+            pipe.delete(key)
+            return
+        if moves:
+            pipe.rpush(key, *(_pack_change(*move) for move in moves))
+            pipe.ltrim(key, -CHANGE_LOG_SIZE, -1)
+            pipe.expire(key, self.ttl)
+
+
+def _pack(epoch: str, model: Model) -> bytes:
+    return epoch.encode("ascii") + model.to_bytes()
+
+
+def _unpack(data: bytes) -> Tuple[str, Model]:
+    return data[:EPOCH_LENGTH].decode("ascii"), Model.from_bytes(data[EPOCH_LENGTH:])
+
+
+def _pack_change(version: int, index: int, player: str) -> str:
+    return f"{version}:{index}:{player}"
+
+
+def _unpack_change(data: bytes) -> Tuple[int, int, str]:
+    version, index, player = data.decode("ascii").split(":")
+    return int(version), int(index), player
+
+
+def redis_pool(url: str, max_connections: int = MAX_CONNECTIONS):
+    """
+    Creates a connection pool to share between every client in the process,
+    instead of opening a connection per use as redis_connect does in the examples.
+
+    Parameters
+    ----------
+    url : str
+        The Redis URL, e.g. redis://localhost:6379/0.
+    max_connections : int, optional
+        The most connections the pool will open.
+
+    Returns
+    -------
+    redis.ConnectionPool
+        The pool.
+    """
+    import redis
+
+    return redis.ConnectionPool.from_url(url, max_connections=max_connections)
+
+
+def create_store(registry: GameRegistry, journal: Optional[Journal] = None,
+                 on_expire: Optional[Callable[[str], None]] = None) -> GameStore:
+    """
+    Creates the store selected by the environment: Redis if TICTACTOE_REDIS_URL
+    is set, and otherwise the in-memory registry.
+
+    Parameters
+    ----------
+    registry : GameRegistry
+        The registry to keep games in when running without Redis.
+    journal : Journal, optional
+        Where the in-memory store records moves.
+    on_expire : Callable[[str], None], optional
+        Called with the id of a Redis game found to have expired; games in the
+        registry are reported to its own on_evict instead.
+
+    Returns
+    -------
+    GameStore
+        The store.
+    """
+    url = os.environ.get(REDIS_URL_ENV)
+    if not url:
+        return InMemoryStore(registry, journal)
+    import redis
+
+    logger.info(f'Storing games in Redis at {url}')
+    return RedisStore(redis.Redis(connection_pool=redis_pool(url)), registry.ttl, on_expire=on_expire)
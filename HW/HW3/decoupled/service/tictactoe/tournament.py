@@ -0,0 +1,302 @@
+from concurrent.futures import as_completed, Executor, ProcessPoolExecutor
+import functools
+import itertools
+import logging
+import math
+import os
+import random
+from typing import Callable, Dict, Iterator, List, NamedTuple, Optional, Tuple
+
+from tictactoe import solver, TOO_FEW_POLICIES_ERROR_MSG
+from tictactoe.model import Model, wins_through
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CHUNK_GAMES = 500
+
+# A move policy picks the square to play in a game that is not over, using only
+# the random numbers it is given, so that games are the same for the same seed.
+# Policies run in worker processes and must be picklable: module-level functions,
+# or functools.partial of them.
+Policy = Callable[[Model, random.Random], int]
+
+
+def random_policy(model: Model, rng: random.Random) -> int:
+    """Plays a random empty square."""
+    taken = model.x | model.o
+    return rng.choice([i for i in range(model.size * model.size) if not taken >> i & 1])
+
+
+def greedy_policy(model: Model, rng: random.Random) -> int:
+    """Wins at once if it can, otherwise blocks the opponent's win, otherwise plays at random."""
+    taken = model.x | model.o
+    empty = [i for i in range(model.size * model.size) if not taken >> i & 1]
+    mover, other = (model.x, model.o) if model.player == "X" else (model.o, model.x)
+    for bits in (mover, other):
+        for index in empty:
+            if wins_through(bits | 1 << index, index, model.size, model.k):
+                return index
+    return rng.choice(empty)
+
+
+def solver_policy(model: Model, rng: random.Random, depth: int = solver.DEFAULT_DEPTH) -> int:
+    """
+    Plays the solver's best move, searching `depth` moves ahead on boards other than 3x3.
+
+    Each move is searched from an empty table, and without the solver's time
+    budget, so the move depends only on the position, not on the machine.
+    """
+    return solver.best_move(model, depth, math.inf).move
+
+
+POLICIES: Dict[str, Policy] = {"random": random_policy, "greedy": greedy_policy, "solver": solver_policy}
+
+
+class MatchResult(NamedTuple):
+    """
+    The games between two policies, half with each playing X.
+
+    Attributes
+    ----------
+    first : str
+        The name of the first policy.
+    second : str
+        The name of the second policy.
+    first_wins : int
+        The games won by the first policy.
+    second_wins : int
+        The games won by the second policy.
+    draws : int
+        The games that filled the board without a winner.
+    """
+    first: str
+    second: str
+    first_wins: int
+    second_wins: int
+    draws: int
+
+    @property
+    def games(self) -> int:
+        return self.first_wins + self.second_wins + self.draws
+
+    def combine(self, other: "MatchResult") -> "MatchResult":
+        """Returns the results of these games and another chunk of the same match together."""
+        return MatchResult(self.first, self.second, self.first_wins + other.first_wins,
+                           self.second_wins + other.second_wins, self.draws + other.draws)
+
+
+def play_game(x: Policy, o: Policy, size: int, k: Optional[int], rng: random.Random) -> Optional[str]:
+    """
+    Plays one game to the end.
+
+    Parameters
+    ----------
+    x : Policy
+        The policy playing X.
+    o : Policy
+        The policy playing O.
+    size : int
+        The number of rows (and columns) of the board.
+    k : int, optional
+        The number of marks in a row needed to win.
+    rng : random.Random
+        The random numbers for both policies.
+
+    Returns
+    -------
+    Optional[str]
+        'X' or 'O' for the winner, or None for a draw.
+    """
+    model = Model(size, k)
+    for _ in range(size * size):
+        model.move((x if model.player == "X" else o)(model, rng))
+        if model.winner:
+            return model.winner
+    return None
+
+
+def play_games(first: Tuple[str, Policy], second: Tuple[str, Policy], games: range,
+               size: int, k: Optional[int], seed: int) -> MatchResult:
+    """
+    Plays some of the games of a match. The first policy plays X in the even
+    numbered games and O in the odd ones, and game n is played with its own
+    random numbers, seeded by `seed` and n, so a match can be split into chunks
+    played anywhere, in any order, with the same results.
+
+    Parameters
+    ----------
+    first : Tuple[str, Policy]
+        The name and policy of the first player.
+    second : Tuple[str, Policy]
+        The name and policy of the second player.
+    games : range
+        The numbers of the games to play.
+    size : int
+        The number of rows (and columns) of the board.
+    k : int, optional
+        The number of marks in a row needed to win.
+    seed : int
+        The seed of the match.
+
+    Returns
+    -------
+    MatchResult
+        The results of these games.
+    """
+    first_name, second_name = first[0], second[0]
+    wins = {first_name: 0, second_name: 0}
+    draws = 0
+    for n in games:
+        rng = random.Random(seed * 1_000_003 + n)
+        x, o = (first, second) if n % 2 == 0 else (second, first)
+        winner = play_game(x[1], o[1], size, k, rng)
+        if winner is None:
+            draws += 1
+        else:
+            wins[(x if winner == "X" else o)[0]] += 1
+    return MatchResult(first_name, second_name, wins[first_name], wins[second_name], draws)
+
+
+def _quiet() -> None:
+    # Each game won logs at INFO; in a worker that is only noise.
+    logging.getLogger("tictactoe").setLevel(logging.WARNING)
+
+
+class Tournament:
+    """
+    A round robin between move policies, spread across a pool of processes.
+
+    Every pair of policies plays a match of `games` games, each taking X in half
+    of them. Matches are split into chunks of at most `chunk_games` games, so the
+    pool stays busy however few pairs there are, and each pair's result is
+    yielded as soon as its last chunk is in. Every game has its own seed, so the
+    results depend only on the seed, not on the number of workers or the order
+    the chunks finish in.
+
+    Methods
+    -------
+    pairs() -> List[Tuple[str, str]]:
+        Returns every pair of policy names, in a fixed order.
+
+    run(executor: Optional[Executor] = None) -> Iterator[MatchResult]:
+        Plays every match, yielding each pair's result as it completes.
+
+    standings(results: List[MatchResult]) -> List[Tuple[str, float]]:
+        Ranks the policies by points: one per win and a half per draw.
+    """
+
+    def __init__(self, policies: Dict[str, Policy], games: int, size: int = 3, k: Optional[int] = None,
+                 seed: int = 0, workers: Optional[int] = None, chunk_games: int = DEFAULT_CHUNK_GAMES):
+        """
+        Initializes a tournament.
+
+        Parameters
+        ----------
+        policies : Dict[str, Policy]
+            The policies by name, at least two.
+        games : int
+            The number of games each pair plays.
+        size : int, optional
+            The number of rows (and columns) of the board (default is 3).
+        k : int, optional
+            The number of marks in a row needed to win (default is `size`, capped at 5).
+        seed : int, optional
+            Seeds every game.
+        workers : int, optional
+            The number of processes; defaults to the number of CPUs. With 1, the
+            games are played in this process.
+        chunk_games : int, optional
+            The most games in one task sent to a worker.
+
+        Raises
+        ------
+        ValueError
+            If there are fewer than two policies, or the board is invalid.
+        """
+        if len(policies) < 2:
+            raise ValueError(TOO_FEW_POLICIES_ERROR_MSG)
+        Model(size, k)  # raises ValueError for an invalid board
+        self.policies = policies
+        self.games = games
+        self.size = size
+        self.k = k
+        self.seed = seed
+        self.workers = workers or os.cpu_count() or 1
+        self.chunk_games = chunk_games
+
+    def pairs(self) -> List[Tuple[str, str]]:
+        """Returns every pair of policy names, in a fixed order."""
+        return list(itertools.combinations(sorted(self.policies), 2))
+
+    def run(self, executor: Optional[Executor] = None) -> Iterator[MatchResult]:
+        """
+        Plays every match, yielding each pair's result as it completes.
+
+        Parameters
+        ----------
+        executor : Executor, optional
+            Where to play the games; defaults to a new pool of `workers` processes,
+            shut down when the tournament is over.
+
+        Yields
+        ------
+        MatchResult
+            The result of each pair, in the order they complete.
+        """
+        tasks = []
+        for match, (first, second) in enumerate(self.pairs()):
+            for start in range(0, self.games, self.chunk_games):
+                chunk = range(start, min(start + self.chunk_games, self.games))
+                tasks.append((match, ((first, self.policies[first]), (second, self.policies[second]),
+                                      chunk, self.size, self.k, self.seed * 1_000_003 + match)))
+        if executor is None and self.workers == 1:
+            yield from self._run_here(tasks)
+            return
+        own = executor is None
+        if own:
+            executor = ProcessPoolExecutor(self.workers, initializer=_quiet)
+        try:
+            yield from self._run_pool(executor, tasks)
+        finally:
+            if own:
+                executor.shutdown(cancel_futures=True)
+
+    @staticmethod
+    def standings(results: List[MatchResult]) -> List[Tuple[str, float]]:
+        """
+        Ranks the policies by points: one per win and a half per draw.
+
+        Parameters
+        ----------
+        results : List[MatchResult]
+            The results of the matches.
+
+        Returns
+        -------
+        List[Tuple[str, float]]
+            The policy names and their points, best first.
+        """
+        points: Dict[str, float] = {}
+        for result in results:
+            points[result.first] = points.get(result.first, 0.0) + result.first_wins + result.draws / 2
+            points[result.second] = points.get(result.second, 0.0) + result.second_wins + result.draws / 2
+        return sorted(points.items(), key=lambda item: (-item[1], item[0]))
+
+    def _run_here(self, tasks: List[Tuple[int, tuple]]) -> Iterator[MatchResult]:
+        for _, group in itertools.groupby(tasks, key=lambda task: task[0]):
+            yield functools.reduce(MatchResult.combine, (play_games(*args) for _, args in group))
+
+    def _run_pool(self, executor: Executor, tasks: List[Tuple[int, tuple]]) -> Iterator[MatchResult]:
+        futures = {executor.submit(play_games, *args): match for match, args in tasks}
+        remaining = {match: 0 for match, _ in tasks}
+        for match, _ in tasks:
+            remaining[match] += 1
+        partial: Dict[int, MatchResult] = {}
+        for future in as_completed(futures):
+            match = futures[future]
+            result = future.result()
+            partial[match] = partial[match].combine(result) if match in partial else result
+            remaining[match] -= 1
+            if not remaining[match]:
+                logger.info(f'{result.first} vs {result.second}: {partial[match]}')
+                yield partial.pop(match)
@@ -1,7 +1,16 @@
+import json
 import logging
+import math
+from typing import Dict, Iterator, List, Optional
 
-from flask import jsonify, make_response, Response
+from flask import current_app, jsonify, make_response, Response
 from tictactoe import Board
+from tictactoe.events import MoveEvent
+from tictactoe.journal import MoveRecord
+from tictactoe.matchmaking import Match
+from tictactoe.metrics import CONTENT_TYPE as METRICS_CONTENT_TYPE
+from tictactoe.solver import Solution
+from tictactoe.stats import PlayerRecord
 
 logger = logging.getLogger(__name__)
 
@@ -14,11 +23,68 @@ class View:
     board_state(board: Board) -> Response:
         Returns the current state of the board as a JSON response.
 
+    encode_board_state(board: Board) -> bytes:
+        Serializes the board state to the JSON body board_state would return.
+
+    etag(epoch: str, version: int) -> str:
+        Returns the ETag of a version of a game.
+
+    encoded_board_state(body: bytes, version: int, epoch: str) -> Response:
+        Returns an already serialized board state, tagged with its version.
+
+    not_modified(version: int, epoch: str) -> Response:
+        Returns an empty response telling the client its copy is current.
+
+    board_delta(version: int, since: int, delta: Dict[str, List[int]], epoch: str) -> Response:
+        Returns the squares changed since a version as a JSON response.
+
     get_winner(winner: str = None) -> Response:
         Returns the winner of the game as a JSON response.
 
-    error(error: str) -> Response:
+    move_result(board: Board, winner: Optional[str], player: str, version: int, epoch: str) -> Response:
+        Returns everything a client needs after a move as one JSON response.
+
+    best_move(solution: Solution) -> Response:
+        Returns the best move and the value of a position as a JSON response.
+
+    events(version: int, events: Optional[List[MoveEvent]], board: Optional[Board] = None) -> Response:
+        Returns the moves after a version as a JSON response.
+
+    event_stream(messages: Iterator[str]) -> Response:
+        Returns a Server-Sent Events response that sends messages as they are produced.
+
+    event_message(event: MoveEvent) -> str:
+        Formats a move as a Server-Sent Events message.
+
+    reset_message(version: int) -> str:
+        Formats a Server-Sent Events message telling the client to refetch the board.
+
+    error(error: str, status_code: int = 400) -> Response:
         Returns an error message as a JSON response.
+
+    rate_limited(error: str, retry_after: float) -> Response:
+        Returns a 429 error telling the client when to retry.
+
+    history(moves: List[MoveRecord]) -> Response:
+        Returns the moves of a game as a JSON response.
+
+    metrics(text: str) -> Response:
+        Returns metrics as a plain text response.
+
+    leaderboard(records: List[PlayerRecord]) -> Response:
+        Returns the highest ranked players as a JSON response.
+
+    player_stats(record: PlayerRecord) -> Response:
+        Returns a player's record as a JSON response.
+
+    match(ticket_id: str, match: Optional[Match]) -> Response:
+        Returns the game a player was paired into, or that they are still waiting.
+
+    game_created(game_id: str) -> Response:
+        Returns the id of a newly created game as a JSON response.
+
+    game_deleted() -> Response:
+        Returns an empty response for a deleted game.
     """
 
     def board_state(self, board: Board) -> Response:
@@ -35,7 +101,113 @@ class View:
         Response
             A Flask response object containing the board state.
         """
-        pass
+        return make_response(jsonify({"board": board.squares}), 200)
+
+    def encode_board_state(self, board: Board) -> bytes:
+        """
+        Serializes the board state to the JSON body board_state would return.
+
+        Parameters
+        ----------
+        board : Board
+            The current state of the Tic Tac Toe board.
+
+        Returns
+        -------
+        bytes
+            The JSON body.
+        """
+        return f"{current_app.json.dumps({'board': board.squares})}\n".encode()
+
+    def etag(self, epoch: str, version: int) -> str:
+        """
+        Returns the ETag of a version of a game.
+
+        The versions of a game restored after a restart can repeat ones served
+        before it, so the tag leads with the game's epoch, which is stored with
+        the game and changes when it is restored; every worker serving the game
+        builds the same tag, and a tag from before a restore never matches.
+
+        Parameters
+        ----------
+        epoch : str
+            The epoch of the game.
+        version : int
+            The version of the game state.
+
+        Returns
+        -------
+        str
+            The ETag, "<epoch>-<version>".
+        """
+        return f"{epoch}-{version}"
+
+    def encoded_board_state(self, body: bytes, version: int, epoch: str) -> Response:
+        """
+        Returns an already serialized board state, with its version as the ETag.
+
+        Parameters
+        ----------
+        body : bytes
+            The JSON body from encode_board_state.
+        version : int
+            The version of the game state the body was built from.
+        epoch : str
+            The epoch of the game.
+
+        Returns
+        -------
+        Response
+            A Flask response object containing the board state.
+        """
+        response = make_response(body, 200)
+        response.mimetype = "application/json"
+        response.set_etag(self.etag(epoch, version))
+        return response
+
+    def board_delta(self, version: int, since: int, delta: Dict[str, List[int]], epoch: str) -> Response:
+        """
+        Returns the squares changed since a version, with the current version as the ETag.
+
+        Parameters
+        ----------
+        version : int
+            The current version of the game state.
+        since : int
+            The version the client holds.
+        delta : Dict[str, List[int]]
+            The changed squares, grouped by their new mark, '' for cleared.
+        epoch : str
+            The epoch of the game.
+
+        Returns
+        -------
+        Response
+            A Flask response object containing the versions and the changed squares.
+        """
+        response = make_response(jsonify({"version": version, "since": since, "delta": delta}), 200)
+        response.set_etag(self.etag(epoch, version))
+        return response
+
+    def not_modified(self, version: int, epoch: str) -> Response:
+        """
+        Returns an empty response telling the client its copy of the board is current.
+
+        Parameters
+        ----------
+        version : int
+            The current version of the game state.
+        epoch : str
+            The epoch of the game.
+
+        Returns
+        -------
+        Response
+            A Flask response object with status 304 and no body.
+        """
+        response = make_response("", 304)
+        response.set_etag(self.etag(epoch, version))
+        return response
 
     def get_winner(self, winner: str = None) -> Response:
         """
@@ -51,9 +223,136 @@ class View:
         Response
             A Flask response object containing the winner.
         """
-        pass
+        return make_response(jsonify({"winner": winner}), 200)
+
+    def move_result(self, board: Board, winner: Optional[str], player: str,
+                    version: int, epoch: str) -> Response:
+        """
+        Returns everything a client needs after a move as one JSON response,
+        so it does not have to ask for the winner separately.
+
+        Parameters
+        ----------
+        board : Board
+            The state of the board after the move.
+        winner : Optional[str]
+            The winner of the game, or None if there is no winner yet.
+        player : str
+            The player to move next.
+        version : int
+            The version of the game state after the move.
+        epoch : str
+            The epoch of the game.
+
+        Returns
+        -------
+        Response
+            A Flask response object containing the board, winner, next player and version.
+        """
+        response = make_response(jsonify({
+            "board": board.squares,
+            "winner": winner,
+            "player": player,
+            "version": version,
+        }), 200)
+        response.set_etag(self.etag(epoch, version))
+        return response
+
+    def best_move(self, solution: Solution) -> Response:
+        """
+        Returns the best move and the value of a position as a JSON response.
+
+        Parameters
+        ----------
+        solution : Solution
+            The answer from the solver.
+
+        Returns
+        -------
+        Response
+            A Flask response object containing the move, value and whether the value is exact.
+        """
+        return make_response(jsonify(solution._asdict()), 200)
 
-    def error(self, error: str) -> Response:
+    def events(self, version: int, events: Optional[List[MoveEvent]],
+               board: Optional[Board] = None) -> Response:
+        """
+        Returns the moves after a version as a JSON response.
+
+        Parameters
+        ----------
+        version : int
+            The latest version of the game state.
+        events : Optional[List[MoveEvent]]
+            The moves, or None if they are no longer kept.
+        board : Board, optional
+            The whole board, sent when the moves are no longer kept.
+
+        Returns
+        -------
+        Response
+            A Flask response object containing the version and the moves, or the
+            version, null moves and the board.
+        """
+        body = {"version": version,
+                "events": None if events is None else [event._asdict() for event in events]}
+        if board is not None:
+            body["board"] = board.squares
+        return make_response(jsonify(body), 200)
+
+    def event_stream(self, messages: Iterator[str]) -> Response:
+        """
+        Returns a Server-Sent Events response that sends messages as they are produced.
+
+        Parameters
+        ----------
+        messages : Iterator[str]
+            The formatted messages.
+
+        Returns
+        -------
+        Response
+            A streaming Flask response object.
+        """
+        response = Response(messages, mimetype="text/event-stream")
+        response.headers["Cache-Control"] = "no-cache"
+        response.headers["X-Accel-Buffering"] = "no"
+        return response
+
+    def event_message(self, event: MoveEvent) -> str:
+        """
+        Formats a move as a Server-Sent Events message, with the version as its id
+        so a reconnecting client resumes from it through Last-Event-ID.
+
+        Parameters
+        ----------
+        event : MoveEvent
+            The move.
+
+        Returns
+        -------
+        str
+            The message.
+        """
+        return f"id: {event.version}\nevent: move\ndata: {json.dumps(event._asdict())}\n\n"
+
+    def reset_message(self, version: int) -> str:
+        """
+        Formats a Server-Sent Events message telling the client to refetch the board.
+
+        Parameters
+        ----------
+        version : int
+            The latest version of the game state.
+
+        Returns
+        -------
+        str
+            The message.
+        """
+        return f"id: {version}\nevent: reset\ndata: {json.dumps({'version': version})}\n\n"
+
+    def error(self, error: str, status_code: int = 400) -> Response:
         """
         Returns an error message as a JSON response.
 
@@ -61,10 +360,152 @@ class View:
         ----------
         error : str
             The error message to return.
+        status_code : int, optional
+            The HTTP status code of the response (default is 400).
 
         Returns
         -------
         Response
             A Flask response object containing the error message.
         """
-        pass
+        return make_response(jsonify({"error": error}), status_code)
+
+    def rate_limited(self, error: str, retry_after: float) -> Response:
+        """
+        Returns a 429 error telling the client when to retry.
+
+        Parameters
+        ----------
+        error : str
+            The error message.
+        retry_after : float
+            Seconds until the request would be admitted, rounded up in the
+            Retry-After header.
+
+        Returns
+        -------
+        Response
+            A Flask response object with status 429 and a Retry-After header.
+        """
+        response = self.error(error, 429)
+        response.headers["Retry-After"] = str(math.ceil(retry_after))
+        return response
+
+    def history(self, moves: List[MoveRecord]) -> Response:
+        """
+        Returns the moves of a game as a JSON response.
+
+        Parameters
+        ----------
+        moves : List[MoveRecord]
+            The moves, in order.
+
+        Returns
+        -------
+        Response
+            A Flask response object containing the moves.
+        """
+        return make_response(jsonify({"moves": [move._asdict() for move in moves]}), 200)
+
+    def metrics(self, text: str) -> Response:
+        """
+        Returns metrics as a plain text response.
+
+        Parameters
+        ----------
+        text : str
+            The metrics in the Prometheus text format.
+
+        Returns
+        -------
+        Response
+            A Flask response object containing the metrics.
+        """
+        response = make_response(text, 200)
+        response.content_type = METRICS_CONTENT_TYPE
+        return response
+
+    def leaderboard(self, records: List[PlayerRecord]) -> Response:
+        """
+        Returns the highest ranked players as a JSON response.
+
+        Parameters
+        ----------
+        records : List[PlayerRecord]
+            The players, best first.
+
+        Returns
+        -------
+        Response
+            A Flask response object containing the players, ranked from 1.
+        """
+        return make_response(jsonify({"players": [{"rank": rank, **self._record(record)}
+                                                  for rank, record in enumerate(records, 1)]}), 200)
+
+    def player_stats(self, record: PlayerRecord) -> Response:
+        """
+        Returns a player's record as a JSON response.
+
+        Parameters
+        ----------
+        record : PlayerRecord
+            The player's results.
+
+        Returns
+        -------
+        Response
+            A Flask response object containing the wins, losses, draws and points.
+        """
+        return make_response(jsonify(self._record(record)), 200)
+
+    def _record(self, record: PlayerRecord) -> dict:
+        return {**record._asdict(), "points": record.points}
+
+    def match(self, ticket_id: str, match: Optional[Match]) -> Response:
+        """
+        Returns the game a player was paired into, or that they are still waiting,
+        as a JSON response.
+
+        Parameters
+        ----------
+        ticket_id : str
+            The player's matchmaking ticket.
+        match : Optional[Match]
+            The game, the player's mark and their opponent, or None if not paired yet.
+
+        Returns
+        -------
+        Response
+            A Flask response object: 200 with the match, or 202 with the ticket to
+            poll again with.
+        """
+        if match is None:
+            return make_response(jsonify({"ticket": ticket_id, "status": "waiting"}), 202)
+        return make_response(jsonify({"ticket": ticket_id, "status": "matched", **match._asdict()}), 200)
+
+    def game_created(self, game_id: str) -> Response:
+        """
+        Returns the id of a newly created game as a JSON response.
+
+        Parameters
+        ----------
+        game_id : str
+            The id of the new game.
+
+        Returns
+        -------
+        Response
+            A Flask response object containing the game id.
+        """
+        return make_response(jsonify({"game_id": game_id}), 201)
+
+    def game_deleted(self) -> Response:
+        """
+        Returns an empty response for a deleted game.
+
+        Returns
+        -------
+        Response
+            A Flask response object with no content.
+        """
+        return make_response("", 204)
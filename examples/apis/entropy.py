@@ -0,0 +1,116 @@
+"""A pool of random numbers fetched from a remote source in large blocks, so
+callers take them from memory instead of waiting on the network.
+"""
+from collections import deque
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BLOCK_SIZE = 1000
+DEFAULT_LOW_WATER = 200
+# Seconds take() waits on a refill already under way before falling back
+DEFAULT_WAIT = 1.0
+# Seconds after a failed fetch before the source is tried again
+DEFAULT_RETRY_AFTER = 30.0
+
+
+class EntropyPool:
+    """Random numbers from a remote source, buffered in memory.
+
+    The pool fetches `block_size` numbers at a time in a background thread,
+    starting another fetch whenever it drops below `low_water`, so a steady
+    stream of takes is served from memory. When the pool runs short, take()
+    waits at most `wait` seconds for a fetch under way and makes up the rest
+    from `fallback`, a local CSPRNG, so the source being slow or down bounds how
+    long a take can last rather than failing it. After a failed fetch the
+    source is left alone for `retry_after` seconds.
+
+    Args:
+        fetch ((int) -> [number]): Fetches that many numbers from the source
+        fallback (() -> number): Makes one number locally
+        block_size (int): How many numbers to fetch at a time
+        low_water (int): Fetch more when fewer than this are left
+        wait (float): The most seconds take() waits on the source
+        retry_after (float): Seconds to leave the source alone after a failure
+    """
+
+    def __init__(self, fetch, fallback, block_size=DEFAULT_BLOCK_SIZE, low_water=DEFAULT_LOW_WATER,
+                 wait=DEFAULT_WAIT, retry_after=DEFAULT_RETRY_AFTER):
+        self.fetch = fetch
+        self.fallback = fallback
+        self.block_size = block_size
+        self.low_water = low_water
+        self.wait = wait
+        self.retry_after = retry_after
+        self.fetched = 0
+        self.fallbacks = 0
+        self.failures = 0
+        self._values = deque()
+        self._refilling = False
+        self._retry_at = 0.0
+        self._cond = threading.Condition()
+
+    def __len__(self):
+        return len(self._values)
+
+    def start(self):
+        """Starts filling the pool in the background, before the first take
+
+        Returns:
+            (EntropyPool) This pool
+        """
+        with self._cond:
+            self._refill()
+        return self
+
+    def take(self, n):
+        """Takes n numbers, from the pool where it has them and from the fallback where not
+
+        Args:
+            n (int): How many numbers
+
+        Returns:
+            ([number]) The numbers
+        """
+        with self._cond:
+            if len(self._values) < n:
+                self._refill()
+                deadline = time.monotonic() + self.wait
+                while len(self._values) < n and self._refilling:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+            taken = [self._values.popleft() for _ in range(min(n, len(self._values)))]
+            if len(self._values) < self.low_water:
+                self._refill()
+            short = n - len(taken)
+            self.fallbacks += short
+        if short:
+            taken.extend(self.fallback() for _ in range(short))
+        return taken
+
+    def _refill(self):
+        # called holding the lock
+        if self._refilling or time.monotonic() < self._retry_at:
+            return
+        self._refilling = True
+        threading.Thread(target=self._fetch, daemon=True).start()
+
+    def _fetch(self):
+        values = []
+        try:
+            values = self.fetch(self.block_size)
+        except Exception as e:
+            logger.warning(f"Could not fetch random numbers, using the local fallback: {e}")
+            with self._cond:
+                self.failures += 1
+                self._retry_at = time.monotonic() + self.retry_after
+        finally:
+            with self._cond:
+                self._values.extend(values)
+                self.fetched += len(values)
+                self._refilling = False
+                self._cond.notify_all()
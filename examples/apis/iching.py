@@ -2,8 +2,14 @@ import argparse
 from datetime import datetime
 import random
 import requests
+import secrets
 import sys
 
+from entropy import EntropyPool
+
+RANDOM_ORG = 'https://www.random.org'
+NUMBERS_PER_READING = 18
+
 
 def print_fingers(fingers):
     """Prints what's "in your hands" to stderr to make it as much like actually throwing the stalks as you can
@@ -14,41 +20,92 @@ def print_fingers(fingers):
     sys.stderr.write(' | '.join([str(finger_stalks) for finger_stalks in fingers]))
     sys.stderr.write('\n')
 
-def get_coins():
+def get_coins(num=NUMBERS_PER_READING, host=RANDOM_ORG):
     """Curls random.org to get the coin flips
 
+    Args:
+        num (int): How many flips
+        host (str): Where random.org is
+
     Returns:
         An array of coin flips
     """
-    url = 'https://www.random.org/integers/?format=plain&num=18&min=2&max=3&col=18&base=10'
-    r = requests.get(url)
-    text = r.text
-    return [int(x) for x in text.strip().split('\t')]
+    url = '{}/integers/?format=plain&num={}&min=2&max=3&col={}&base=10'.format(host, num, NUMBERS_PER_READING)
+    r = requests.get(url, timeout=10)
+    r.raise_for_status()
+    return [int(x) for x in r.text.split()]
 
-def get_stalks():
+def get_stalks(num=NUMBERS_PER_READING, host=RANDOM_ORG):
     """Curls random.org to get the number of stalks
 
+    Args:
+        num (int): How many splits
+        host (str): Where random.org is
+
     Returns:
         The array of stalk splits
     """
-    r = requests.get('https://www.random.org/decimal-fractions/?num=18&dec=2&col=18&format=plain&rnd=new')
-    text = r.text
-    return [float(x) for x in text.strip().split('\t')]
+    url = '{}/decimal-fractions/?num={}&dec=2&col={}&format=plain&rnd=new'.format(host, num, NUMBERS_PER_READING)
+    r = requests.get(url, timeout=10)
+    r.raise_for_status()
+    return [float(x) for x in r.text.split()]
+
+# The trigrams as bits, bottom line first and 1 for a solid (yang) line, in
+# the order of the rows and columns of KING_WEN_TABLE: heaven, thunder, water,
+# mountain, earth, wind, fire, lake
+TRIGRAMS = (0b111, 0b001, 0b010, 0b100, 0b000, 0b110, 0b101, 0b011)
+# The King Wen number of each hexagram, by lower trigram (row) and upper trigram (column)
+KING_WEN_TABLE = (
+    (1, 34, 5, 26, 11, 9, 14, 43),
+    (25, 51, 3, 27, 24, 42, 21, 17),
+    (6, 40, 29, 4, 7, 59, 64, 47),
+    (33, 62, 39, 52, 15, 53, 56, 31),
+    (12, 16, 8, 23, 2, 20, 35, 45),
+    (44, 32, 48, 18, 46, 57, 50, 28),
+    (13, 55, 63, 22, 36, 37, 30, 49),
+    (10, 54, 60, 41, 19, 61, 38, 58),
+)
+# The King Wen number of each hexagram by its lines as bits, bottom line first
+KING_WEN = [0] * 64
+for _row, _lower in enumerate(TRIGRAMS):
+    for _column, _upper in enumerate(TRIGRAMS):
+        KING_WEN[_lower | _upper << 3] = KING_WEN_TABLE[_row][_column]
+
+# Coin flips and stalk splits are fetched from random.org a block at a time in
+# the background, and made with the OS's CSPRNG when random.org is slow or down.
+# The stalk fallback matches random.org's two-decimal fractions, from 0.00 to 0.99
+_system_random = secrets.SystemRandom()
+COIN_POOL = EntropyPool(get_coins, lambda: _system_random.randint(2, 3))
+STALK_POOL = EntropyPool(get_stalks, lambda: _system_random.randrange(100) / 100)
 
-def throw_stalks(test):
+def size_pools(readings):
+    """Fetches only enough for a number of readings, for a run that casts no more,
+    rather than a whole block that would mostly go unused
+
+    Args:
+        readings (int): How many readings the run casts
+    """
+    for pool in (COIN_POOL, STALK_POOL):
+        pool.block_size = readings * NUMBERS_PER_READING
+        pool.low_water = 0
+
+def throw_stalks(test, splits=None):
     """Attempt to capture the spirit of the traditional yarrow stalk method. It's
     supposed to be like this, trust me
 
     Args:
-        test (Bool): If true, then don't curl random.org
+        test (Bool): If true, then don't use random.org
+        splits ([float]): Split the stalks by these 18 fractions, taken from the end, rather than random ones
 
     Returns:
         ([int]) The results of the throws
     """
-    if test:
+    if splits is not None:
+        splits = list(splits)
+    elif test:
         splits = [random.random() for _ in range(18)]
     else:
-        splits = get_stalks()
+        splits = STALK_POOL.take(NUMBERS_PER_READING)
     throws = []
     for _ in range(6):
         sys.stderr.write('\n----------\n')
@@ -99,7 +156,7 @@ def throw_coins(test):
     """Throw coins
 
     Args:
-        test (Bool): If true, then don't curl random.org
+        test (Bool): If true, then don't use random.org
 
     Returns:
         ([int]) The results of the throws
@@ -107,7 +164,7 @@ def throw_coins(test):
     if test:
         throws = [random.randint(2, 3) for _ in range(18)]
     else:
-        throws = get_coins()
+        throws = COIN_POOL.take(NUMBERS_PER_READING)
     return throws
 
 def build_lines(throws):
@@ -152,6 +209,17 @@ def format_line(throw):
         line_string = '{}   - -{}'
         return line_string.format('   ', ''), line_string.format('', '   '), False
 
+def hexagram_number(lines):
+    """The King Wen number of the primary hexagram of a reading
+
+    Args:
+        lines ([int]): The six lines, 6-9, bottom line first
+
+    Returns:
+        (int) The hexagram number, 1-64
+    """
+    return KING_WEN[sum((line % 2) << i for i, line in enumerate(lines))]
+
 def format_throws(throws):
     """Format the throws for string output
 
@@ -175,29 +243,80 @@ def format_throws(throws):
         reversed_output.insert(0, 'secondary    primary')
     return '\n'.join(['   {}'.format(line) for line in reversed(reversed_output)])
 
+def format_reading(throws, coins, test, date):
+    """Format a whole reading, with its date and method, as appended to --file
+
+    Args:
+        throws ([int]): The lines of the reading
+        coins (Bool): Whether it was thrown with the coins
+        test (Bool): Whether it was a test run
+        date (datetime): When it was thrown
+
+    Returns:
+        (str) The formatted reading
+    """
+    return '''
+----------------
+{date}
+
+{formatted_throw}
+
+{method_name}{test_run}
+'''.format(method_name='The Coins' if coins else 'The Stalks',
+           formatted_throw=format_throws(throws),
+           test_run=' (test run)' if test else '',
+           date=date.strftime('%Y-%m-%d %H:%M:%S'))
+
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser()
     parser.add_argument('-t', '--test', action='store_true')
     parser.add_argument('-c', '--coins', action='store_true', help='Throw the coins not the yarrow stalks')
     parser.add_argument('-f', '--file', help='file to append results to')
+    parser.add_argument('-n', '--count', type=int,
+                        help='cast this many readings in bulk with NumPy, one per line to stdout, '
+                             'and report the frequencies of lines and hexagrams to stderr')
+    parser.add_argument('-s', '--seed', type=int, help='seed the bulk readings')
+    parser.add_argument('-q', '--quiet', action='store_true', help='only report the frequencies of the bulk readings')
+    parser.add_argument('-j', '--journal', help='compact journal file to add results to')
+    parser.add_argument('--export', action='store_true',
+                        help='print the readings in the journal, as --file has them, instead of casting one')
+    parser.add_argument('--counts', action='store_true',
+                        help='print how often each hexagram was cast, from the journal, instead of casting one')
+    parser.add_argument('--since', type=lambda day: datetime.strptime(day, '%Y-%m-%d'),
+                        help='with --export or --counts, the first day, YYYY-MM-DD')
+    parser.add_argument('--until', type=lambda day: datetime.strptime(day, '%Y-%m-%d'),
+                        help='with --export or --counts, the day to stop before, YYYY-MM-DD')
     args = parser.parse_args()
 
-    method = throw_coins if args.coins else throw_stalks
-    throw = build_lines(method(args.test))
-    formatted_results = '''
-----------------
-{date}
+    if args.export or args.counts:
+        if not args.journal:
+            parser.error('--export and --counts read the --journal')
+        import journal
+        with journal.Journal(args.journal) as readings:
+            if args.export:
+                journal.export(readings, sys.stdout, args.since, args.until)
+            else:
+                counts = readings.hexagram_counts(args.since, args.until)
+                print('\n'.join('{:<9} {}'.format(number, count) for number, count in enumerate(counts, 1)))
+        sys.exit()
 
-{formatted_throw}
+    if args.count is not None:
+        # NumPy is only needed for bulk readings
+        import iching_bulk
+        iching_bulk.main(args.count, args.coins, args.seed, args.quiet)
+        sys.exit()
 
-{method_name}{test_run}
-'''.format(method_name='The Coins' if args.coins else 'The Stalks',
-                           formatted_throw=format_throws(throw),
-                           test_run=' (test run)' if args.test else '',
-                           date=datetime.today().strftime('%Y-%m-%d %H:%M:%S'))
+    size_pools(1)
+    method = throw_coins if args.coins else throw_stalks
+    throw = list(build_lines(method(args.test)))
+    formatted_results = format_reading(throw, args.coins, args.test, datetime.today())
 
     if args.file:
         with open(args.file, 'a') as fh:
             fh.write(formatted_results)
+    if args.journal:
+        import journal
+        with journal.Journal(args.journal) as readings:
+            readings.append(throw, args.coins, args.test)
     print(formatted_results)
@@ -0,0 +1,151 @@
+"""Casts readings in bulk with NumPy, a chunk of readings per array operation,
+following the same steps as throw_stalks, throw_coins and build_lines in
+iching.py but without tracing each step.
+"""
+import sys
+import time
+
+import numpy as np
+
+import iching
+from iching import NUMBERS_PER_READING
+
+LINES = (6, 7, 8, 9)
+DEFAULT_CHUNK = 100_000
+
+# The King Wen number of each hexagram by its lines as bits, bottom line first
+KING_WEN = np.array(iching.KING_WEN, np.uint8)
+
+
+def stalk_lines(splits):
+    """The yarrow stalk method, for many readings at once
+
+    Args:
+        splits (np.ndarray): (n, 18) fractions in [0, 1), each row the splits
+            one throw_stalks call would take, in the same order
+
+    Returns:
+        (np.ndarray) (n, 6) lines, 6-9, bottom line first
+    """
+    # throw_stalks pops its splits from the end
+    splits = splits[:, ::-1]
+    n = len(splits)
+    lines = np.empty((n, 6), np.uint8)
+    for i in range(6):
+        stalks = np.full(n, 50, np.int64)
+        line = np.zeros(n, np.int64)
+        for j in range(3):
+            stalks -= 1
+            left = (splits[:, 3 * i + j] * stalks).astype(np.int64)
+            right = stalks - left - 1
+            left_hand = left % 4
+            left_hand[left_hand == 0] = 4
+            right_hand = right % 4
+            right_hand[right_hand == 0] = 4
+            throw = 1 + left_hand + right_hand
+            line += np.where(throw > 6, 2, 3)
+            stalks += 1 - throw
+        lines[:, i] = line
+    return lines
+
+
+def coin_lines(throws):
+    """The coin method, for many readings at once
+
+    Args:
+        throws (np.ndarray): (n, 18) coin values, 2 or 3, each row the throws of one reading
+
+    Returns:
+        (np.ndarray) (n, 6) lines, 6-9, bottom line first
+    """
+    return throws.reshape(len(throws), 6, 3).sum(axis=2).astype(np.uint8)
+
+
+def hexagram_numbers(lines):
+    """The King Wen numbers of the primary hexagrams of readings
+
+    Args:
+        lines (np.ndarray): (n, 6) lines, 6-9, bottom line first
+
+    Returns:
+        (np.ndarray) (n,) hexagram numbers, 1-64
+    """
+    yang = (lines % 2).astype(np.uint8)  # 7 and 9 are solid lines
+    return KING_WEN[yang @ (1 << np.arange(6, dtype=np.uint8))]
+
+
+def cast(count, coins, rng, chunk=DEFAULT_CHUNK):
+    """Casts readings a chunk at a time
+
+    Args:
+        count (int): How many readings
+        coins (bool): Throw the coins not the yarrow stalks
+        rng (np.random.Generator): The random numbers
+        chunk (int): The most readings per array
+
+    Yields:
+        (np.ndarray) (n, 6) lines of the next n readings
+    """
+    for start in range(0, count, chunk):
+        n = min(chunk, count - start)
+        if coins:
+            yield coin_lines(rng.integers(2, 4, (n, NUMBERS_PER_READING), dtype=np.uint8))
+        else:
+            yield stalk_lines(rng.random((n, NUMBERS_PER_READING)))
+
+
+def run(count, coins, seed=None, out=None, chunk=DEFAULT_CHUNK):
+    """Casts readings, streaming each out as it's made, and counts the lines and hexagrams
+
+    Args:
+        count (int): How many readings
+        coins (bool): Throw the coins not the yarrow stalks
+        seed (int): Seeds the random numbers; fresh OS entropy if None
+        out (binary file): Gets one reading per line, six digits bottom line first; nothing if None
+        chunk (int): The most readings per array
+
+    Returns:
+        (np.ndarray, np.ndarray) The number of each line value 6-9, and of each hexagram 1-64
+    """
+    rng = np.random.default_rng(seed)
+    line_counts = np.zeros(4, np.int64)
+    hexagram_counts = np.zeros(64, np.int64)
+    for lines in cast(count, coins, rng, chunk):
+        line_counts += np.bincount(lines.ravel() - 6, minlength=4)
+        hexagram_counts += np.bincount(hexagram_numbers(lines) - 1, minlength=64)
+        if out is not None:
+            text = np.empty((len(lines), 7), np.uint8)
+            text[:, :6] = lines + ord('0')
+            text[:, 6] = ord('\n')
+            out.write(text.tobytes())
+    return line_counts, hexagram_counts
+
+
+def format_frequencies(line_counts, hexagram_counts):
+    """Format the empirical frequencies for string output
+
+    Args:
+        line_counts (np.ndarray): The number of each line value 6-9
+        hexagram_counts (np.ndarray): The number of each hexagram 1-64
+
+    Returns:
+        (str) A table of lines and one of hexagrams
+    """
+    total_lines = line_counts.sum()
+    total = hexagram_counts.sum()
+    rows = ['line  count        frequency']
+    rows += ['{}     {:<12} {:.5f}'.format(line, count, count / total_lines)
+             for line, count in zip(LINES, line_counts)]
+    rows += ['', 'hexagram  count        frequency']
+    rows += ['{:<9} {:<12} {:.5f}'.format(number, count, count / total)
+             for number, count in enumerate(hexagram_counts, 1)]
+    return '\n'.join(rows)
+
+
+def main(count, coins, seed=None, quiet=False):
+    start = time.perf_counter()
+    line_counts, hexagram_counts = run(count, coins, seed, None if quiet else sys.stdout.buffer)
+    elapsed = time.perf_counter() - start
+    sys.stderr.write(format_frequencies(line_counts, hexagram_counts) + '\n\n')
+    sys.stderr.write('{} readings by {} in {:.2f}s\n'.format(
+        count, 'The Coins' if coins else 'The Stalks', elapsed))
@@ -0,0 +1,310 @@
+"""A compact journal of readings: one fixed-width record per reading, read
+through a memory map, with an index of hexagram counts so date ranges and
+counts over years of readings don't need a full scan.
+
+The journal file is an 8-byte header, the magic b'ICHJ', a version and the
+record size, then 6-byte records, little-endian:
+
+    uint32  the time of the reading, in seconds since the epoch
+    uint16  bits 0-11: the six lines, bottom first, 2 bits each as line - 6
+            bit 12: thrown with the coins
+            bit 13: a test run
+
+Records are kept in time order, so a date range is found by binary search.
+Beside it, PATH.idx holds, for every BLOCK records, the count of each
+hexagram in all the records before, so the counts over a range take two
+lookups and a scan of at most two partial blocks.
+"""
+from datetime import datetime
+import mmap
+import os
+import struct
+import time
+from typing import NamedTuple, Tuple
+
+import iching
+
+MAGIC = b'ICHJ'
+VERSION = 1
+HEADER = struct.Struct('<4sHH')
+RECORD = struct.Struct('<IH')
+TIMESTAMP = struct.Struct('<I')
+BLOCK = 4096
+INDEX_ENTRY = struct.Struct('<64I')
+COINS_BIT = 1 << 12
+TEST_BIT = 1 << 13
+LINE_BITS = 0xFFF
+
+# The hexagram (0-63, King Wen number - 1) of each packing of six lines
+_HEXAGRAM = [iching.hexagram_number([6 + (packed >> 2 * i & 3) for i in range(6)]) - 1
+             for packed in range(1 << 12)]
+
+
+class Reading(NamedTuple):
+    """One reading in the journal"""
+    timestamp: int
+    coins: bool
+    lines: Tuple[int, ...]
+    test: bool
+
+    @property
+    def date(self):
+        return datetime.fromtimestamp(self.timestamp)
+
+
+def pack(lines, coins=False, test=False, timestamp=0):
+    """Packs a reading into a record
+
+    Args:
+        lines ([int]): The six lines, 6-9, bottom line first
+        coins (Bool): Whether it was thrown with the coins
+        test (Bool): Whether it was a test run
+        timestamp (int): When it was thrown, in seconds since the epoch
+
+    Returns:
+        (bytes) The record
+
+    Raises:
+        ValueError: If there aren't six lines of 6-9, or the time doesn't fit
+    """
+    lines = list(lines)
+    if len(lines) != 6 or any(line not in (6, 7, 8, 9) for line in lines):
+        raise ValueError('A reading is six lines of 6-9, not {}'.format(lines))
+    bits = sum(line - 6 << 2 * i for i, line in enumerate(lines))
+    if coins:
+        bits |= COINS_BIT
+    if test:
+        bits |= TEST_BIT
+    try:
+        return RECORD.pack(timestamp, bits)
+    except struct.error:
+        raise ValueError('{} is out of range for the journal'.format(timestamp))
+
+
+def unpack(timestamp, bits):
+    """The reading in a record's fields"""
+    return Reading(timestamp, bool(bits & COINS_BIT), tuple(6 + (bits >> 2 * i & 3) for i in range(6)),
+                   bool(bits & TEST_BIT))
+
+
+def to_timestamp(when):
+    """Seconds since the epoch from a datetime, or None for no bound"""
+    if when is None or isinstance(when, int):
+        return when
+    return int(when.timestamp())
+
+
+class Journal:
+    """A journal file of readings, opened for appending and queries
+
+    Args:
+        path (str): The journal file; made if it doesn't exist
+
+    Raises:
+        ValueError: If the file isn't a journal
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.index_path = path + '.idx'
+        exists = os.path.exists(path) and os.path.getsize(path) > 0
+        self._file = open(path, 'r+b' if exists else 'w+b')
+        if exists:
+            magic, version, size = HEADER.unpack(self._file.read(HEADER.size))
+            if magic != MAGIC or version != VERSION or size != RECORD.size:
+                self._file.close()
+                raise ValueError('{} is not a version {} journal'.format(path, VERSION))
+        else:
+            self._file.write(HEADER.pack(MAGIC, VERSION, RECORD.size))
+            self._file.flush()
+        # Drop the end of a record cut short by a crash mid-write
+        size = os.fstat(self._file.fileno()).st_size
+        self._count = (size - HEADER.size) // RECORD.size
+        if size != HEADER.size + self._count * RECORD.size:
+            self._file.truncate(HEADER.size + self._count * RECORD.size)
+        self._map = None
+        self._mapped = -1
+        self._load_index()
+
+    def __len__(self):
+        return self._count
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        if self._map is not None:
+            self._map.close()
+            self._map = None
+        self._file.close()
+        self._index_file.close()
+
+    def __getitem__(self, i):
+        if i < 0:
+            i += self._count
+        if not 0 <= i < self._count:
+            raise IndexError(i)
+        return unpack(*RECORD.unpack_from(self._view(), HEADER.size + i * RECORD.size))
+
+    def append(self, lines, coins=False, test=False, timestamp=None):
+        """Adds a reading
+
+        Args:
+            lines ([int]): The six lines, 6-9, bottom line first
+            coins (Bool): Whether it was thrown with the coins
+            test (Bool): Whether it was a test run
+            timestamp (int): When it was thrown, in seconds since the epoch; now if None
+        """
+        self.extend([(timestamp, coins, lines, test)])
+
+    def extend(self, readings):
+        """Adds readings, in one write
+
+        A reading dated before the last one is recorded at the time of the
+        last one, such as after the clock is set back, so the journal stays in
+        time order.
+
+        Args:
+            readings ([(int, Bool, [int], Bool)]): The timestamp (now if None),
+                coins flag, lines and test flag of each reading
+        """
+        records = []
+        last = self._last
+        for timestamp, coins, lines, test in readings:
+            if timestamp is None:
+                timestamp = int(time.time())
+            last = max(timestamp, last)
+            records.append(pack(lines, coins, test, last))
+        self._last = last
+        self._file.seek(0, os.SEEK_END)
+        self._file.write(b''.join(records))
+        self._file.flush()
+        for record in records:
+            self._tail[_HEXAGRAM[RECORD.unpack(record)[1] & LINE_BITS]] += 1
+            self._count += 1
+            if self._count % BLOCK == 0:
+                self._add_index_entry()
+        self._index_file.flush()
+
+    def find(self, start=None, end=None):
+        """Finds the readings in a time range, by binary search
+
+        Args:
+            start (datetime or int): The earliest time, inclusive; the beginning if None
+            end (datetime or int): The latest time, exclusive; the end if None
+
+        Returns:
+            (range) The positions of the readings in the range
+        """
+        start, end = to_timestamp(start), to_timestamp(end)
+        lo = 0 if start is None else self._bisect(start)
+        hi = self._count if end is None else self._bisect(end)
+        return range(lo, max(lo, hi))
+
+    def readings(self, start=None, end=None):
+        """Yields the readings in a time range, in time order
+
+        Args:
+            start (datetime or int): The earliest time, inclusive; the beginning if None
+            end (datetime or int): The latest time, exclusive; the end if None
+
+        Yields:
+            (Reading) Each reading
+        """
+        found = self.find(start, end)
+        # A block at a time, copied out of the map, so appending while the
+        # readings are read doesn't pull the map out from under them
+        for lo in range(found.start, found.stop, BLOCK):
+            hi = min(lo + BLOCK, found.stop)
+            for fields in RECORD.iter_unpack(self._view()[HEADER.size + lo * RECORD.size:
+                                                          HEADER.size + hi * RECORD.size]):
+                yield unpack(*fields)
+
+    def hexagram_counts(self, start=None, end=None):
+        """Counts the primary hexagrams of the readings in a time range, from the
+        index and at most two partial blocks, not a full scan
+
+        Args:
+            start (datetime or int): The earliest time, inclusive; the beginning if None
+            end (datetime or int): The latest time, exclusive; the end if None
+
+        Returns:
+            ([int]) The count of each hexagram, by King Wen number - 1
+        """
+        found = self.find(start, end)
+        before, through = self._counts_before(found.start), self._counts_before(found.stop)
+        return [b - a for a, b in zip(before, through)]
+
+    def _counts_before(self, position):
+        block = position // BLOCK
+        counts = list(self._index[block - 1]) if block else [0] * 64
+        self._scan(block * BLOCK, position, counts)
+        return counts
+
+    def _scan(self, lo, hi, counts):
+        view = self._view()
+        for _, bits in RECORD.iter_unpack(view[HEADER.size + lo * RECORD.size:HEADER.size + hi * RECORD.size]):
+            counts[_HEXAGRAM[bits & LINE_BITS]] += 1
+
+    def _bisect(self, timestamp):
+        view = self._view()
+        lo, hi = 0, self._count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if TIMESTAMP.unpack_from(view, HEADER.size + mid * RECORD.size)[0] < timestamp:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def _view(self):
+        # Map the file again once it has grown
+        if self._mapped != self._count:
+            if self._map is not None:
+                self._map.close()
+            self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+            self._mapped = self._count
+        return self._map
+
+    def _load_index(self):
+        # The index is rebuilt from the journal where it is behind, such as
+        # after a crash between writing the two
+        blocks = self._count // BLOCK
+        self._index_file = open(self.index_path, 'r+b' if os.path.exists(self.index_path) else 'w+b')
+        data = self._index_file.read()
+        stored = min(len(data) // INDEX_ENTRY.size, blocks)
+        self._index = [INDEX_ENTRY.unpack_from(data, k * INDEX_ENTRY.size) for k in range(stored)]
+        self._index_file.truncate(stored * INDEX_ENTRY.size)
+        self._index_file.seek(0, os.SEEK_END)
+        for k in range(stored, blocks):
+            self._tail = [0] * 64
+            self._scan(k * BLOCK, (k + 1) * BLOCK, self._tail)
+            self._add_index_entry()
+        self._index_file.flush()
+        self._tail = [0] * 64
+        self._scan(blocks * BLOCK, self._count, self._tail)
+        self._last = TIMESTAMP.unpack_from(self._view(), HEADER.size + (self._count - 1) * RECORD.size)[0] \
+            if self._count else 0
+
+    def _add_index_entry(self):
+        previous = self._index[-1] if self._index else (0,) * 64
+        entry = tuple(p + t for p, t in zip(previous, self._tail))
+        self._index.append(entry)
+        self._index_file.write(INDEX_ENTRY.pack(*entry))
+        self._tail = [0] * 64
+
+
+def export(journal, out, start=None, end=None):
+    """Writes readings out in the same text format as --file
+
+    Args:
+        journal (Journal): The journal
+        out (text file): Where to write
+        start (datetime or int): The earliest time, inclusive; the beginning if None
+        end (datetime or int): The latest time, exclusive; the end if None
+    """
+    for reading in journal.readings(start, end):
+        out.write(iching.format_reading(reading.lines, reading.coins, reading.test, reading.date))
@@ -0,0 +1,181 @@
+"""Tests for the entropy pool, against a stub of random.org served locally.
+
+Run from examples/apis:
+
+    python -m pytest -q
+"""
+import functools
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import threading
+import time
+from urllib.parse import parse_qs, urlsplit
+
+import pytest
+
+import iching
+from entropy import EntropyPool
+
+
+class StubRandomOrg(ThreadingHTTPServer):
+    """Answers like random.org's plain-text integer and decimal fraction APIs"""
+
+    daemon_threads = True
+
+    def __init__(self):
+        super().__init__(("127.0.0.1", 0), _StubHandler)
+        self.requests = []
+        self.delay = 0.0
+        self.status = 200
+
+    @property
+    def host(self):
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+
+class _StubHandler(BaseHTTPRequestHandler):
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        query = {k: v[0] for k, v in parse_qs(url.query).items()}
+        num, col = int(query["num"]), int(query["col"])
+        self.server.requests.append(num)
+        time.sleep(self.server.delay)
+        if url.path.startswith("/integers"):
+            numbers = [str(2 + i % 2) for i in range(num)]
+        else:
+            numbers = ["0.{:02d}".format(i % 100) for i in range(num)]
+        rows = ["\t".join(numbers[i:i + col]) for i in range(0, num, col)]
+        body = ("\n".join(rows) + "\n").encode()
+        self.send_response(self.server.status)
+        self.send_header("Content-Type", "text/plain")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def random_org():
+    server = StubRandomOrg()
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def fallback():
+    return -1
+
+
+def wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+
+
+def test_fetch(random_org):
+    assert iching.get_coins(4, host=random_org.host) == [2, 3, 2, 3]
+    assert iching.get_stalks(20, host=random_org.host) == [i / 100 for i in range(20)]
+
+
+def test_served_from_memory(random_org):
+    pool = EntropyPool(functools.partial(iching.get_coins, host=random_org.host), fallback,
+                       block_size=100, low_water=20).start()
+    wait_for(lambda: len(pool) == 100)
+    for _ in range(4):
+        assert len(pool.take(18)) == 18
+    assert random_org.requests == [100]
+    assert pool.fallbacks == 0
+
+
+def test_refills_below_low_water(random_org):
+    pool = EntropyPool(functools.partial(iching.get_coins, host=random_org.host), fallback,
+                       block_size=100, low_water=30).start()
+    wait_for(lambda: len(pool) == 100)
+    for _ in range(4):
+        pool.take(18)
+    # 28 left is below the low-water mark, so another block is on its way
+    wait_for(lambda: len(pool) == 128)
+    assert random_org.requests == [100, 100]
+    assert pool.fetched == 200
+
+
+def test_falls_back_when_slow(random_org):
+    random_org.delay = 1.0
+    pool = EntropyPool(functools.partial(iching.get_stalks, host=random_org.host), fallback,
+                       block_size=100, wait=0.1)
+    start = time.monotonic()
+    assert pool.take(18) == [-1] * 18
+    assert time.monotonic() - start < 0.5
+    assert pool.fallbacks == 18
+    # the fetch still lands, for later readings
+    wait_for(lambda: len(pool) == 100)
+    assert pool.take(18) == [i / 100 for i in range(18)]
+
+
+def test_falls_back_when_down(random_org):
+    random_org.status = 503
+    pool = EntropyPool(functools.partial(iching.get_coins, host=random_org.host), fallback,
+                       block_size=100, retry_after=60)
+    assert pool.take(18) == [-1] * 18
+    assert pool.failures == 1
+    # the source is left alone until retry_after has passed
+    assert pool.take(18) == [-1] * 18
+    assert random_org.requests == [100]
+
+
+def test_mixes_pool_and_fallback(random_org):
+    pool = EntropyPool(functools.partial(iching.get_coins, host=random_org.host), fallback,
+                       block_size=10, low_water=0, wait=0.5).start()
+    wait_for(lambda: len(pool) == 10)
+    random_org.status = 503
+    assert pool.take(18) == [2, 3] * 5 + [-1] * 8
+
+
+def test_readings_use_the_pools(random_org, monkeypatch):
+    coins = EntropyPool(functools.partial(iching.get_coins, host=random_org.host), fallback,
+                        block_size=36).start()
+    stalks = EntropyPool(functools.partial(iching.get_stalks, host=random_org.host), fallback,
+                         block_size=36).start()
+    monkeypatch.setattr(iching, "COIN_POOL", coins)
+    monkeypatch.setattr(iching, "STALK_POOL", stalks)
+    wait_for(lambda: len(coins) == 36 and len(stalks) == 36)
+    assert list(iching.build_lines(iching.throw_coins(False))) == [7, 8, 7, 8, 7, 8]
+    lines = list(iching.build_lines(iching.throw_stalks(False)))
+    assert len(lines) == 6 and set(lines) <= {6, 7, 8, 9}
+    assert coins.fallbacks == stalks.fallbacks == 0
+
+
+def test_one_shot_runs_fetch_one_reading(random_org, monkeypatch):
+    coins = EntropyPool(functools.partial(iching.get_coins, host=random_org.host), fallback)
+    monkeypatch.setattr(iching, "COIN_POOL", coins)
+    monkeypatch.setattr(iching, "STALK_POOL", EntropyPool(fallback, fallback))
+    iching.size_pools(1)
+    assert iching.throw_coins(False) == [2, 3] * 9
+    # and nothing is fetched for readings that will not be cast
+    time.sleep(0.1)
+    assert random_org.requests == [18]
+
+
+def test_stalk_fallback_is_a_fraction():
+    splits = [iching.STALK_POOL.fallback() for _ in range(2000)]
+    assert all(0 <= split <= 0.99 and round(split, 2) == split for split in splits)
+
+
+def test_fallbacks_are_counted_across_threads():
+    def fail(n):
+        raise OSError("down")
+    pool = EntropyPool(fail, fallback, wait=0, retry_after=60)
+
+    def take_many():
+        for _ in range(500):
+            pool.take(18)
+    threads = [threading.Thread(target=take_many) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert pool.fallbacks == 8 * 500 * 18
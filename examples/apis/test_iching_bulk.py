@@ -0,0 +1,70 @@
+"""Tests that the bulk readings follow the same steps as the scalar ones.
+
+Run from examples/apis:
+
+    python -m pytest -q
+"""
+import io
+
+import numpy as np
+
+import iching
+import iching_bulk
+
+
+def test_stalks_match_scalar(capsys):
+    splits = np.random.default_rng(7).random((2000, iching.NUMBERS_PER_READING))
+    bulk = iching_bulk.stalk_lines(splits)
+    for row, lines in zip(splits, bulk):
+        assert list(iching.build_lines(iching.throw_stalks(True, row.tolist()))) == lines.tolist()
+    capsys.readouterr()
+
+
+def test_stalk_edges_match_scalar(capsys):
+    # splits that leave nothing in one hand or the other
+    splits = np.array([[0.0] * 18, [0.999999] * 18, [0.25, 0.5, 0.75] * 6])
+    for row, lines in zip(splits, iching_bulk.stalk_lines(splits)):
+        assert list(iching.build_lines(iching.throw_stalks(True, row.tolist()))) == lines.tolist()
+    capsys.readouterr()
+
+
+def test_coins_match_scalar():
+    throws = np.random.default_rng(7).integers(2, 4, (2000, iching.NUMBERS_PER_READING))
+    for row, lines in zip(throws, iching_bulk.coin_lines(throws)):
+        assert list(iching.build_lines(row.tolist())) == lines.tolist()
+
+
+def test_hexagram_numbers():
+    assert sorted(iching_bulk.KING_WEN.tolist()) == list(range(1, 65))
+    lines = np.array([
+        [7, 9, 7, 9, 7, 7],  # all solid: The Creative
+        [8, 6, 8, 8, 6, 8],  # all broken: The Receptive
+        [7, 8, 8, 8, 7, 8],  # thunder below water: Difficulty at the Beginning
+        [7, 8, 7, 8, 7, 8],  # fire below water: After Completion
+        [8, 7, 8, 7, 8, 7],  # water below fire: Before Completion
+    ])
+    assert iching_bulk.hexagram_numbers(lines).tolist() == [1, 2, 3, 63, 64]
+
+
+def test_run_is_seeded_and_streams():
+    out = io.BytesIO()
+    line_counts, hexagram_counts = iching_bulk.run(1000, False, seed=3, out=out, chunk=300)
+    readings = out.getvalue().decode().split()
+    assert len(readings) == 1000
+    assert all(len(reading) == 6 and set(reading) <= set('6789') for reading in readings)
+    assert line_counts.tolist() == [''.join(readings).count(str(line)) for line in iching_bulk.LINES]
+    assert hexagram_counts.sum() == 1000
+
+    # the same seed casts the same readings, however they are chunked
+    again = io.BytesIO()
+    iching_bulk.run(1000, False, seed=3, out=again, chunk=1000)
+    assert again.getvalue() == out.getvalue()
+
+
+def test_coin_frequencies():
+    line_counts, hexagram_counts = iching_bulk.run(200_000, True, seed=1)
+    # three fair coins: 6 and 9 an eighth each, 7 and 8 three eighths
+    frequencies = line_counts / line_counts.sum()
+    assert np.allclose(frequencies, [1 / 8, 3 / 8, 3 / 8, 1 / 8], atol=0.005)
+    assert np.allclose(hexagram_counts / 200_000, 1 / 64, atol=0.002)
+    assert 'hexagram' in iching_bulk.format_frequencies(line_counts, hexagram_counts)
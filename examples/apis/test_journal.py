@@ -0,0 +1,148 @@
+"""Tests for the compact reading journal.
+
+Run from examples/apis:
+
+    python -m pytest -q
+"""
+from datetime import datetime
+import io
+import os
+import random
+
+import pytest
+
+import iching
+import journal
+from journal import BLOCK, Journal, RECORD
+
+DAY = 24 * 60 * 60
+START = int(datetime(2020, 1, 1).timestamp())
+
+
+def random_readings(count, seed=0, start=START, step=DAY // 3):
+    rng = random.Random(seed)
+    return [(start + i * step, rng.random() < 0.5, [rng.choice((6, 7, 8, 9)) for _ in range(6)],
+             rng.random() < 0.1)
+            for i in range(count)]
+
+
+@pytest.fixture
+def path(tmp_path):
+    return str(tmp_path / 'readings.ichj')
+
+
+def test_pack_round_trip():
+    record = journal.pack([6, 7, 8, 9, 7, 8], coins=True, test=False, timestamp=START)
+    assert len(record) == RECORD.size == 6
+    assert journal.unpack(*RECORD.unpack(record)) == (START, True, (6, 7, 8, 9, 7, 8), False)
+    with pytest.raises(ValueError):
+        journal.pack([6, 7, 8, 9, 7])
+    with pytest.raises(ValueError):
+        journal.pack([6, 7, 8, 9, 7, 10])
+    with pytest.raises(ValueError):
+        journal.pack([7] * 6, timestamp=2 ** 32)
+
+
+def test_append_and_reopen(path):
+    with Journal(path) as readings:
+        readings.append([7, 7, 7, 8, 8, 8], coins=False, test=True, timestamp=START)
+        readings.append([9, 6, 9, 6, 9, 6], coins=True, timestamp=START + 60)
+        assert readings[0] == (START, False, (7, 7, 7, 8, 8, 8), True)
+    assert os.path.getsize(path) == journal.HEADER.size + 2 * RECORD.size
+    with Journal(path) as readings:
+        assert len(readings) == 2
+        assert readings[-1] == (START + 60, True, (9, 6, 9, 6, 9, 6), False)
+        # appending goes on after what was there
+        readings.append([8] * 6, timestamp=START + 120)
+        assert [r.timestamp for r in readings.readings()] == [START, START + 60, START + 120]
+
+
+def test_not_a_journal(path):
+    with open(path, 'w') as fh:
+        fh.write('\n----------------\n2020-01-01 00:00:00\n')
+    with pytest.raises(ValueError):
+        Journal(path)
+
+
+def test_kept_in_time_order(path):
+    with Journal(path) as readings:
+        readings.append([7] * 6, timestamp=START + 100)
+        # as after the clock is set back
+        readings.append([8] * 6, timestamp=START)
+        assert readings[1].timestamp == START + 100
+
+
+def test_date_ranges(path):
+    records = random_readings(3 * BLOCK + 100)
+    with Journal(path) as readings:
+        readings.extend(records)
+        found = readings.find(datetime(2021, 1, 1), datetime(2021, 2, 1))
+        expected = [i for i, r in enumerate(records)
+                    if datetime(2021, 1, 1).timestamp() <= r[0] < datetime(2021, 2, 1).timestamp()]
+        assert list(found) == expected
+        assert [r.timestamp for r in readings.readings(datetime(2021, 1, 1), datetime(2021, 2, 1))] == \
+            [records[i][0] for i in expected]
+        assert len(list(readings.readings())) == len(records)
+        assert not readings.find(datetime(2040, 1, 1))
+        assert list(readings.find(end=START + 1)) == [0]
+
+
+def test_hexagram_counts(path):
+    records = random_readings(5 * BLOCK + 123, seed=1)
+
+    def scan(start=None, end=None):
+        counts = [0] * 64
+        for timestamp, _, lines, _ in records:
+            if (start is None or timestamp >= start) and (end is None or timestamp < end):
+                counts[iching.hexagram_number(lines) - 1] += 1
+        return counts
+
+    with Journal(path) as readings:
+        # in pieces, so blocks are completed by appends of every size
+        for i in range(0, len(records), 1000):
+            readings.extend(records[i:i + 1000])
+        assert len(readings._index) == 5
+        assert readings.hexagram_counts() == scan()
+        for start, end in ((START + 3 * DAY, START + 400 * DAY), (START + 1000 * DAY, None),
+                           (START + 5 * DAY, START + 6 * DAY)):
+            assert readings.hexagram_counts(start, end) == scan(start, end)
+
+
+def test_index_is_rebuilt(path):
+    records = random_readings(3 * BLOCK + 7, seed=2)
+    with Journal(path) as readings:
+        readings.extend(records)
+        expected = readings.hexagram_counts(START + 10 * DAY)
+    # the index lost its last entry, and a record was cut short
+    with open(path + '.idx', 'r+b') as fh:
+        fh.truncate(journal.INDEX_ENTRY.size * 2)
+    with open(path, 'ab') as fh:
+        fh.write(b'\x01\x02\x03')
+    with Journal(path) as readings:
+        assert len(readings) == len(records)
+        assert len(readings._index) == 3
+        assert readings.hexagram_counts(START + 10 * DAY) == expected
+    os.remove(path + '.idx')
+    with Journal(path) as readings:
+        assert readings.hexagram_counts(START + 10 * DAY) == expected
+
+
+def test_read_while_appending(path):
+    with Journal(path) as readings:
+        readings.extend(random_readings(2 * BLOCK))
+        seen = 0
+        for _ in readings.readings():
+            if seen % 1000 == 0:
+                readings.append([7] * 6)
+            seen += 1
+        assert seen == 2 * BLOCK
+
+
+def test_export(path):
+    with Journal(path) as readings:
+        readings.append([7, 8, 9, 6, 7, 8], coins=True, test=True, timestamp=START)
+        readings.append([7, 7, 7, 7, 7, 7], timestamp=START + DAY)
+        out = io.StringIO()
+        journal.export(readings, out, end=START + DAY)
+    assert out.getvalue() == iching.format_reading([7, 8, 9, 6, 7, 8], True, True, datetime(2020, 1, 1))
+    assert '(test run)' in out.getvalue() and 'The Coins' in out.getvalue()
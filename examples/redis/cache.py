@@ -0,0 +1,273 @@
+"""A read-through cache in front of a slow upstream: an in-process LRU first,
+then Redis, then the upstream itself.
+"""
+from collections import OrderedDict, deque
+import json
+import logging
+import threading
+import time
+
+from redis.exceptions import RedisError
+
+from utils import percentile
+
+logger = logging.getLogger(__name__)
+
+TIERS = ("local", "redis", "upstream")
+# latencies kept per tier for the percentiles
+LATENCY_SAMPLES = 10_000
+
+
+class SingleFlight:
+    """Runs at most one call per key at a time; callers arriving while a call
+    is in flight wait for it and share its result, or its exception.
+    """
+
+    def __init__(self):
+        self._calls = {}
+        self._lock = threading.Lock()
+
+    def do(self, key, fn):
+        """Calls fn, unless a call for the key is already in flight
+
+        Args:
+            key (str): What the call is for
+            fn (() -> object): Produces the value
+
+        Returns:
+            The value, from this call or the one in flight
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+        if leader:
+            return self._run(key, call, fn)
+        call.done.wait()
+        if call.error is not None:
+            raise call.error
+        return call.value
+
+    def start(self, key, fn):
+        """Calls fn in a background thread, unless a call for the key is already in flight
+
+        Args:
+            key (str): What the call is for
+            fn (() -> object): Produces the value
+
+        Returns:
+            (bool) Whether a call was started
+        """
+        with self._lock:
+            if key in self._calls:
+                return False
+            call = self._calls[key] = _Call()
+        threading.Thread(target=self._run_quietly, args=(key, call, fn), daemon=True).start()
+        return True
+
+    def _run(self, key, call, fn):
+        try:
+            call.value = fn()
+            return call.value
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+    def _run_quietly(self, key, call, fn):
+        try:
+            self._run(key, call, fn)
+        except Exception:
+            logger.exception(f"Background load of {key} failed")
+
+
+class _Call:
+    __slots__ = ("done", "value", "error")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+
+
+class ReadThroughCache:
+    """Serves values from an in-process LRU, then from Redis, and only loads
+    them from the upstream when neither has them.
+
+    Every value lives for `ttl` seconds, in Redis (SET with PX) and in the LRU,
+    which takes the expiry Redis reports, so every process sharing the Redis
+    sees the same deadline. Once less than `refresh_ahead` of the TTL is left, a
+    read still returns the cached value but starts reloading it in the
+    background, so busy keys never go cold. Loads are single-flight per key:
+    however many readers miss at once, the upstream is called once and they
+    all get its answer. Redis being down only costs its tier; reads fall
+    through to the upstream.
+
+    Args:
+        load ((str) -> object): Fetches a key's value from the upstream; the value must be JSON-serializable
+        redis (redis.Redis): The shared tier, or None for just the LRU
+        ttl (float): Seconds a value is kept
+        refresh_ahead (float): The fraction of the TTL left at which a value is reloaded in the background
+        local_size (int): The most values in the LRU
+        prefix (str): Put in front of keys in Redis
+        clock (() -> float): Returns the current time in seconds
+    """
+
+    def __init__(self, load, redis=None, ttl=300.0, refresh_ahead=0.2, local_size=1024,
+                 prefix="cache:", clock=time.monotonic):
+        self.load = load
+        self.redis = redis
+        self.ttl = ttl
+        self.refresh_ahead = refresh_ahead
+        self.local_size = local_size
+        self.prefix = prefix
+        self.clock = clock
+        self.fetches = 0
+        self.refreshes = 0
+        self.redis_errors = 0
+        self._local = OrderedDict()  # key -> (value, expiry time)
+        self._lock = threading.Lock()
+        self._flight = SingleFlight()
+        self._hits = dict.fromkeys(TIERS, 0)
+        self._misses = dict.fromkeys(TIERS, 0)
+        self._latencies = {tier: deque(maxlen=LATENCY_SAMPLES) for tier in TIERS}
+
+    def get(self, key):
+        """Returns a key's value from the nearest tier that has it
+
+        Args:
+            key (str): The key
+
+        Returns:
+            The value
+        """
+        start = time.perf_counter()
+        now = self.clock()
+        with self._lock:
+            entry = self._local.get(key)
+            if entry is not None:
+                if entry[1] > now:
+                    self._local.move_to_end(key)
+                else:
+                    del self._local[key]
+                    entry = None
+        if entry is not None:
+            self._served("local", start)
+            self._maybe_refresh(key, entry[1], now)
+            return entry[0]
+        self._missed("local")
+
+        if self.redis is not None:
+            entry = self._redis_get(key, now)
+            if entry is not None:
+                self._put_local(key, *entry)
+                self._served("redis", start)
+                self._maybe_refresh(key, entry[1], now)
+                return entry[0]
+            self._missed("redis")
+
+        value = self._flight.do(key, lambda: self._fetch(key))
+        self._served("upstream", start)
+        return value
+
+    def invalidate(self, key):
+        """Drops a key from every tier, so the next read loads it again
+
+        Args:
+            key (str): The key
+        """
+        with self._lock:
+            self._local.pop(key, None)
+        if self.redis is not None:
+            try:
+                self.redis.delete(self.prefix + key)
+            except RedisError as e:
+                with self._lock:
+                    self.redis_errors += 1
+                logger.warning(f"Could not delete {key} from Redis: {e}")
+
+    def stats(self):
+        """Reports how often each tier served a read, and how quickly
+
+        Returns:
+            ({str: dict}) Per tier: hits, misses, hit_rate, and p50_ms and p99_ms of the reads it served
+        """
+        report = {}
+        with self._lock:
+            latencies = {tier: sorted(self._latencies[tier]) for tier in TIERS}
+            counts = {tier: (self._hits[tier], self._misses[tier]) for tier in TIERS}
+            fetches, refreshes = self.fetches, self.refreshes
+        for tier in TIERS:
+            hits, misses = counts[tier]
+            report[tier] = {
+                "hits": hits,
+                "misses": misses,
+                "hit_rate": hits / (hits + misses) if hits + misses else 0.0,
+                "p50_ms": percentile(latencies[tier], 0.5) * 1e3,
+                "p99_ms": percentile(latencies[tier], 0.99) * 1e3,
+            }
+        report["upstream"]["fetches"] = fetches
+        report["upstream"]["refreshes"] = refreshes
+        return report
+
+    def _fetch(self, key):
+        value = self.load(key)
+        with self._lock:
+            self.fetches += 1
+        expiry = self.clock() + self.ttl
+        self._put_local(key, value, expiry)
+        if self.redis is not None:
+            try:
+                self.redis.set(self.prefix + key, json.dumps(value), px=int(self.ttl * 1000))
+            except RedisError as e:
+                with self._lock:
+                    self.redis_errors += 1
+                logger.warning(f"Could not write {key} to Redis: {e}")
+        return value
+
+    def _refresh(self, key):
+        with self._lock:
+            self.refreshes += 1
+        return self._fetch(key)
+
+    def _maybe_refresh(self, key, expiry, now):
+        if expiry - now < self.refresh_ahead * self.ttl:
+            self._flight.start(key, lambda: self._refresh(key))
+
+    def _redis_get(self, key, now):
+        try:
+            pipe = self.redis.pipeline(transaction=False)
+            pipe.get(self.prefix + key)
+            pipe.pttl(self.prefix + key)
+            raw, pttl = pipe.execute()
+        except RedisError as e:
+            with self._lock:
+                self.redis_errors += 1
+            logger.warning(f"Could not read {key} from Redis: {e}")
+            return None
+        if raw is None:
+            return None
+        # A key written without an expiry is given a full TTL here.
+        return json.loads(raw), now + (pttl / 1000 if pttl >= 0 else self.ttl)
+
+    def _put_local(self, key, value, expiry):
+        with self._lock:
+            self._local[key] = (value, expiry)
+            self._local.move_to_end(key)
+            while len(self._local) > self.local_size:
+                self._local.popitem(last=False)
+
+    def _served(self, tier, start):
+        elapsed = time.perf_counter() - start
+        with self._lock:
+            self._hits[tier] += 1
+            self._latencies[tier].append(elapsed)
+
+    def _missed(self, tier):
+        with self._lock:
+            self._misses[tier] += 1
+
@@ -1,49 +1,228 @@
+import argparse
 from contextlib import contextmanager
 import json
+import os
+import threading
 
 import redis
 import requests
 
-from utils import timer
+from cache import ReadThroughCache
+from utils import TIMINGS, timer
+
+# Seconds a word is cached before it is fetched again
+WORD_TTL = 300
+# Keys per MGET/MSET or pipeline round trip
+DEFAULT_BATCH = 100
+DEFAULT_MAX_CONNECTIONS = 50
+
+_pools = {}
+_pools_lock = threading.Lock()
 
 
 @timer
 def request(env):
-    try:
-        headers = {
-            'X-RapidAPI-Key': env["api_key"],
-            'X-RapidAPI-Host': env["api_host"]
-        }
-        with requests.get(env["api_url"], headers=headers) as r:
-            word = r.json()[0]["word"]
-            print(word)
-            return word
-    except Exception as e:
-        print(r)
+    headers = {
+        'X-RapidAPI-Key': env["api_key"],
+        'X-RapidAPI-Host': env["api_host"]
+    }
+    # Raise on a failed call rather than return nothing, so no failure is cached
+    with requests.get(env["api_url"], headers=headers, timeout=10) as r:
+        r.raise_for_status()
+        word = r.json()[0]["word"]
+        print(word)
+        return word
+
+def get_pool(env, max_connections=DEFAULT_MAX_CONNECTIONS):
+    """Returns the connection pool for the env's Redis, made on first use and
+    shared after, so connections are reused rather than opened per run
+
+    Args:
+        env (dict): Has redis_host and redis_port
+        max_connections (int): The most connections the pool opens, if it is new
+
+    Returns:
+        (redis.ConnectionPool) The pool
+    """
+    address = (env["redis_host"], int(env["redis_port"]))
+    with _pools_lock:
+        pool = _pools.get(address)
+        if pool is None:
+            pool = _pools[address] = redis.ConnectionPool(
+                host=address[0], port=address[1], db=0, max_connections=max_connections)
+        return pool
 
 @contextmanager
 def redis_connect(env):
-    conn = redis.Redis(host=env["redis_host"], port=env["redis_port"], db=0)
+    conn = redis.Redis(connection_pool=get_pool(env))
     try:
         yield conn
     finally:
+        # hands the connection back; the shared pool stays open
         conn.close()
 
 @timer
-def redis_write(conn, content):
-    conn.set('content', content)
+def redis_write(conn, content, key='content'):
+    conn.set(key, content)
 
 @timer
-def redis_read(conn):
-    value = conn.get('content')
-    print(value.decode("UTF-8"))
+def redis_read(conn, key='content'):
+    return conn.get(key)
+
+def _batches(items, batch_size):
+    for start in range(0, len(items), batch_size):
+        yield items[start:start + batch_size]
+
+def redis_write_many(conn, items, batch_size=DEFAULT_BATCH):
+    """Writes keys with one MSET per batch
+
+    Args:
+        conn (redis.Redis): The connection
+        items (dict): The values by key
+        batch_size (int): The most keys per MSET
+    """
+    for batch in _batches(list(items.items()), batch_size):
+        with TIMINGS.time('mset', ops=len(batch)):
+            conn.mset(dict(batch))
+
+def redis_read_many(conn, keys, batch_size=DEFAULT_BATCH):
+    """Reads keys with one MGET per batch
+
+    Args:
+        conn (redis.Redis): The connection
+        keys ([str]): The keys
+        batch_size (int): The most keys per MGET
+
+    Returns:
+        ([bytes]) The values, None for missing keys, in the order of keys
+    """
+    values = []
+    for batch in _batches(list(keys), batch_size):
+        with TIMINGS.time('mget', ops=len(batch)):
+            values.extend(conn.mget(batch))
+    return values
+
+def redis_write_pipelined(conn, items, batch_size=DEFAULT_BATCH):
+    """Writes keys with SETs sent a batch at a time in a pipeline, one round trip per batch
+
+    Args:
+        conn (redis.Redis): The connection
+        items (dict): The values by key
+        batch_size (int): The most SETs per round trip
+    """
+    pipe = conn.pipeline(transaction=False)
+    for batch in _batches(list(items.items()), batch_size):
+        with TIMINGS.time('pipelined_set', ops=len(batch)):
+            for key, value in batch:
+                pipe.set(key, value)
+            pipe.execute()
+
+def redis_read_pipelined(conn, keys, batch_size=DEFAULT_BATCH):
+    """Reads keys with GETs sent a batch at a time in a pipeline, one round trip per batch
+
+    Args:
+        conn (redis.Redis): The connection
+        keys ([str]): The keys
+        batch_size (int): The most GETs per round trip
+
+    Returns:
+        ([bytes]) The values, None for missing keys, in the order of keys
+    """
+    values = []
+    pipe = conn.pipeline(transaction=False)
+    for batch in _batches(list(keys), batch_size):
+        with TIMINGS.time('pipelined_get', ops=len(batch)):
+            for key in batch:
+                pipe.get(key)
+            values.extend(pipe.execute())
+    return values
+
+def benchmark(conn, key_counts, value_sizes, batch_size=DEFAULT_BATCH):
+    """Compares the throughput of sequential, pipelined and MGET/MSET reads and
+    writes, for each number of keys and size of value
+
+    Args:
+        conn (redis.Redis): The connection
+        key_counts ([int]): The numbers of keys to write and read
+        value_sizes ([int]): The sizes of the values, in bytes
+        batch_size (int): Keys per round trip for the pipelined and batched modes
+
+    Returns:
+        ([dict]) Per number of keys, value size and mode: ops/s and the p50/p99 of each round trip in ms
+
+    Raises:
+        RuntimeError: If the bulk reads do not return the values written
+    """
+    results = []
+    for size in value_sizes:
+        value = os.urandom(size)
+        for count in key_counts:
+            keys = [f'bench:{size}:{i}' for i in range(count)]
+            items = dict.fromkeys(keys, value)
+            TIMINGS.reset()
+            for key in keys:
+                redis_write(conn, value, key)
+            redis_write_pipelined(conn, items, batch_size)
+            redis_write_many(conn, items, batch_size)
+            for key in keys:
+                redis_read(conn, key)
+            for name, read in (('pipelined', redis_read_pipelined), ('MGET', redis_read_many)):
+                if read(conn, keys, batch_size) != [value] * count:
+                    conn.delete(*keys)
+                    raise RuntimeError(f'{name} reads of {count} keys did not return the values written')
+            for mode, name in (('sequential', 'redis_write'), ('pipelined', 'pipelined_set'),
+                               ('batched', 'mset'), ('sequential', 'redis_read'),
+                               ('pipelined', 'pipelined_get'), ('batched', 'mget')):
+                summary = TIMINGS.summary(name)
+                results.append({'keys': count, 'size': size, 'op': name, 'mode': mode,
+                                'ops_per_s': summary['ops_per_s'],
+                                'p50_ms': summary['p50_ms'], 'p99_ms': summary['p99_ms']})
+            conn.delete(*keys)
+    return results
+
+def run_benchmark(args):
+    from standin import StandInRedis
+
+    if args.use_env:
+        with open("env.json", "r") as fh:
+            env = json.load(fh)
+        server = None
+    else:
+        server = StandInRedis().start()
+        env = {"redis_host": "127.0.0.1", "redis_port": server.port}
+    try:
+        with redis_connect(env) as conn:
+            results = benchmark(conn, args.keys, args.sizes, args.batch)
+    finally:
+        if server is not None:
+            server.stop()
+    print(f"batch of {args.batch} keys per round trip; p50/p99 are per call (one key, or one batch)")
+    print(f"{'keys':>7}{'bytes':>7}  {'op':<15}{'mode':<12}{'ops/s':>10}{'p50 ms':>9}{'p99 ms':>9}")
+    for r in results:
+        print(f"{r['keys']:>7}{r['size']:>7}  {r['op']:<15}{r['mode']:<12}{r['ops_per_s']:>10.0f}"
+              f"{r['p50_ms']:>9.3f}{r['p99_ms']:>9.3f}")
 
 
 if __name__ == "__main__":
-    with open("env.json", "r") as fh:
-        env = json.load(fh)
-    content = request(env)
-    with redis_connect(env) as conn:
-        redis_write(conn, content)
-        for _ in range(10):
-            redis_read(conn)
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--bench', action='store_true',
+                        help='compare sequential, pipelined and batched throughput against a stand-in Redis')
+    parser.add_argument('--use-env', action='store_true', help='benchmark the Redis in env.json instead')
+    parser.add_argument('--keys', type=int, nargs='+', default=[100, 1000, 5000])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[16, 1024, 8192])
+    parser.add_argument('--batch', type=int, default=DEFAULT_BATCH)
+    args = parser.parse_args()
+    if args.bench:
+        run_benchmark(args)
+    else:
+        with open("env.json", "r") as fh:
+            env = json.load(fh)
+        with redis_connect(env) as conn:
+            cache = ReadThroughCache(lambda key: request(env), conn, ttl=WORD_TTL)
+            content = cache.get('word')
+            keys = [f'content:{i}' for i in range(10)]
+            redis_write_many(conn, {key: content for key in keys})
+            for value in redis_read_many(conn, keys):
+                print(value.decode("UTF-8"))
+            print(json.dumps(cache.stats(), indent=2))
+        print(TIMINGS.report())
@@ -0,0 +1,422 @@
+"""A stand-in for a Redis server, for running the examples and their tests
+without one. It speaks enough of the Redis protocol (RESP2) over TCP for
+redis-py, so the examples make real network round trips against it.
+"""
+import socketserver
+import threading
+import time
+
+
+class StandInRedis(socketserver.ThreadingTCPServer):
+    """A Redis server holding string, list, hash and sorted set keys in memory, with expiry.
+
+    Supports PING, GET, SET (with EX/PX/NX), MGET, MSET, INCR, INCRBY, RPUSH, LRANGE, LTRIM,
+    HSET, HGET, HMGET, HDEL, HINCRBY, ZADD (with NX/XX/GT/LT), ZREVRANGE, ZCARD, DEL,
+    EXISTS, EXPIRE, TTL, PTTL, FLUSHDB and FLUSHALL, transactions with WATCH, UNWATCH, MULTI, EXEC and DISCARD, and
+    answers CLIENT with OK so redis-py can connect.
+
+    Args:
+        address ((str, int)): Where to listen; port 0 picks a free one
+        clock (() -> float): Returns the current time in seconds, for expiry
+    """
+
+    daemon_threads = True
+    allow_reuse_address = True
+    # room for many clients connecting at once, as a real server has
+    request_queue_size = 512
+
+    def __init__(self, address=("127.0.0.1", 0), clock=time.monotonic):
+        super().__init__(address, _Handler)
+        self.clock = clock
+        self.data = {}  # key -> (value, expiry time or None)
+        self.writes = {}  # key -> times written, for WATCH
+        self.commands = 0
+        self.lock = threading.Lock()
+
+    @property
+    def port(self):
+        return self.server_address[1]
+
+    def start(self):
+        """Serves from a background thread
+
+        Returns:
+            (StandInRedis) This server
+        """
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+    def execute(self, args, session=None):
+        """Runs one command
+
+        Args:
+            args ([bytes]): The command name and its arguments
+            session (Session): The state of the client's connection; a fresh one if None
+
+        Returns:
+            (bytes) The encoded reply
+        """
+        name = args[0].upper().decode()
+        transaction = getattr(self, "txn_" + name.lower(), None)
+        command = getattr(self, "cmd_" + name.lower(), None)
+        if transaction is None and command is None:
+            return _error(f"unknown command '{name}'")
+        with self.lock:
+            self.commands += 1
+            if transaction is not None:
+                return transaction(session or Session(), *args[1:])
+            if session is not None and session.queued is not None:
+                session.queued.append((name, command, args[1:]))
+                return b"+QUEUED\r\n"
+            return self._run(name, command, args[1:])
+
+    def _run(self, name, command, args):
+        try:
+            return command(*args)
+        except WrongType:
+            return b"-WRONGTYPE Operation against a key holding the wrong kind of value\r\n"
+        except (TypeError, ValueError):
+            return _error(f"wrong arguments for '{name}' command")
+
+    def _live(self, key):
+        entry = self.data.get(key)
+        if entry is not None and entry[1] is not None and entry[1] <= self.clock():
+            self._delete(key)
+            return None
+        return entry
+
+    def _write(self, key, entry):
+        self.data[key] = entry
+        self.writes[key] = self.writes.get(key, 0) + 1
+
+    def _delete(self, key):
+        if self.data.pop(key, None) is None:
+            return False
+        self.writes[key] = self.writes.get(key, 0) + 1
+        return True
+
+    def txn_watch(self, session, *keys):
+        if not keys:
+            raise ValueError("no keys")
+        if session.queued is not None:
+            return _error("WATCH inside MULTI is not allowed")
+        for key in keys:
+            self._live(key)
+            session.watched.setdefault(key, self.writes.get(key, 0))
+        return b"+OK\r\n"
+
+    def txn_unwatch(self, session):
+        session.watched.clear()
+        return b"+OK\r\n"
+
+    def txn_multi(self, session):
+        if session.queued is not None:
+            return _error("MULTI calls can not be nested")
+        session.queued = []
+        return b"+OK\r\n"
+
+    def txn_discard(self, session):
+        if session.queued is None:
+            return _error("DISCARD without MULTI")
+        session.reset()
+        return b"+OK\r\n"
+
+    def txn_exec(self, session):
+        if session.queued is None:
+            return _error("EXEC without MULTI")
+        changed = any(self.writes.get(key, 0) != writes for key, writes in session.watched.items())
+        queued = session.queued
+        session.reset()
+        if changed:
+            # a watched key was written since WATCH, so nothing runs
+            return b"*-1\r\n"
+        replies = [self._run(name, command, args) for name, command, args in queued]
+        return b"*%d\r\n%s" % (len(replies), b"".join(replies))
+
+    def cmd_ping(self, message=None):
+        return b"+PONG\r\n" if message is None else _bulk(message)
+
+    def cmd_client(self, *args):
+        return b"+OK\r\n"
+
+    def cmd_get(self, key):
+        entry = self._live(key)
+        if entry is not None and not isinstance(entry[0], bytes):
+            raise WrongType(key)
+        return _bulk(None if entry is None else entry[0])
+
+    def cmd_set(self, key, value, *options):
+        expiry = None
+        options = [option.upper() for option in options]
+        only_new = b"NX" in options
+        if only_new:
+            options.remove(b"NX")
+        for option, amount in zip(options[::2], options[1::2]):
+            if option == b"EX":
+                expiry = self.clock() + int(amount)
+            elif option == b"PX":
+                expiry = self.clock() + int(amount) / 1000
+            else:
+                raise ValueError(option)
+        if len(options) % 2:
+            raise ValueError("odd options")
+        if only_new and self._live(key) is not None:
+            return _bulk(None)
+        self._write(key, (value, expiry))
+        return b"+OK\r\n"
+
+    def cmd_mget(self, *keys):
+        if not keys:
+            raise ValueError("no keys")
+        replies = [b"*%d\r\n" % len(keys)]
+        for key in keys:
+            entry = self._live(key)
+            replies.append(_bulk(None if entry is None else entry[0]))
+        return b"".join(replies)
+
+    def cmd_mset(self, *pairs):
+        if not pairs or len(pairs) % 2:
+            raise ValueError("odd arguments")
+        for key, value in zip(pairs[::2], pairs[1::2]):
+            self._write(key, (value, None))
+        return b"+OK\r\n"
+
+    def cmd_incrby(self, key, amount):
+        entry = self._live(key)
+        if entry is not None and not isinstance(entry[0], bytes):
+            raise WrongType(key)
+        value = (int(entry[0]) if entry is not None else 0) + int(amount)
+        self._write(key, (b"%d" % value, None if entry is None else entry[1]))
+        return _integer(value)
+
+    def cmd_incr(self, key):
+        return self.cmd_incrby(key, 1)
+
+    def cmd_rpush(self, key, *values):
+        if not values:
+            raise ValueError("no values")
+        entry = self._live(key)
+        items = self._typed(entry, list) + list(values)
+        # pushing keeps the key's expiry, as Redis does
+        self._write(key, (items, None if entry is None else entry[1]))
+        return _integer(len(items))
+
+    def cmd_lrange(self, key, start, stop):
+        items = self._typed(self._live(key), list)
+        start, stop = _span(len(items), int(start), int(stop))
+        replies = items[start:stop]
+        return b"*%d\r\n%s" % (len(replies), b"".join(_bulk(item) for item in replies))
+
+    def cmd_ltrim(self, key, start, stop):
+        entry = self._live(key)
+        items = self._typed(entry, list)
+        start, stop = _span(len(items), int(start), int(stop))
+        if start >= stop:
+            self._delete(key)
+        elif stop - start < len(items):
+            self._write(key, (items[start:stop], entry[1]))
+        return b"+OK\r\n"
+
+    def cmd_hset(self, key, *pairs):
+        if not pairs or len(pairs) % 2:
+            raise ValueError("odd arguments")
+        entry = self._live(key)
+        fields = dict(self._typed(entry, dict))
+        added = sum(field not in fields for field in pairs[::2])
+        fields.update(zip(pairs[::2], pairs[1::2]))
+        self._write(key, (fields, None if entry is None else entry[1]))
+        return _integer(added)
+
+    def cmd_hget(self, key, field):
+        return _bulk(self._typed(self._live(key), dict).get(field))
+
+    def cmd_hmget(self, key, *fields):
+        if not fields:
+            raise ValueError("no fields")
+        values = self._typed(self._live(key), dict)
+        return b"*%d\r\n%s" % (len(fields), b"".join(_bulk(values.get(field)) for field in fields))
+
+    def cmd_hdel(self, key, *fields):
+        if not fields:
+            raise ValueError("no fields")
+        entry = self._live(key)
+        values = self._typed(entry, dict)
+        removed = [field for field in set(fields) if field in values]
+        if removed:
+            values = {field: value for field, value in values.items() if field not in removed}
+            if values:
+                self._write(key, (values, entry[1]))
+            else:
+                self._delete(key)
+        return _integer(len(removed))
+
+    def cmd_hincrby(self, key, field, amount):
+        entry = self._live(key)
+        fields = dict(self._typed(entry, dict))
+        value = int(fields.get(field, b"0")) + int(amount)
+        fields[field] = b"%d" % value
+        self._write(key, (fields, None if entry is None else entry[1]))
+        return _integer(value)
+
+    def cmd_zadd(self, key, *args):
+        flags = set()
+        while args and args[0].upper() in (b"NX", b"XX", b"GT", b"LT"):
+            flags.add(args[0].upper())
+            args = args[1:]
+        if not args or len(args) % 2:
+            raise ValueError("odd arguments")
+        entry = self._live(key)
+        scores = _SortedSet(self._typed(entry, _SortedSet))
+        added = 0
+        for score, member in zip(args[::2], args[1::2]):
+            score = float(score)
+            old = scores.get(member)
+            if old is None:
+                if b"XX" in flags:
+                    continue
+                added += 1
+            elif (b"NX" in flags or b"GT" in flags and score <= old
+                  or b"LT" in flags and score >= old):
+                continue
+            scores[member] = score
+        self._write(key, (scores, None if entry is None else entry[1]))
+        return _integer(added)
+
+    def cmd_zrevrange(self, key, start, stop):
+        scores = self._typed(self._live(key), _SortedSet)
+        # highest score first, and members with equal scores in reverse order
+        members = sorted(scores, key=lambda member: (scores[member], member), reverse=True)
+        start, stop = _span(len(members), int(start), int(stop))
+        replies = members[start:stop]
+        return b"*%d\r\n%s" % (len(replies), b"".join(_bulk(member) for member in replies))
+
+    def cmd_zcard(self, key):
+        return _integer(len(self._typed(self._live(key), _SortedSet)))
+
+    def _typed(self, entry, kind):
+        # the value of a key holding the given kind, or an empty one for a missing key
+        if entry is None:
+            return kind()
+        if type(entry[0]) is not kind:
+            raise WrongType()
+        return entry[0]
+
+    def cmd_del(self, *keys):
+        return _integer(sum(self._delete(key) for key in keys))
+
+    def cmd_exists(self, *keys):
+        return _integer(sum(self._live(key) is not None for key in keys))
+
+    def cmd_expire(self, key, seconds):
+        entry = self._live(key)
+        if entry is None:
+            return _integer(0)
+        self._write(key, (entry[0], self.clock() + int(seconds)))
+        return _integer(1)
+
+    def cmd_pttl(self, key):
+        entry = self._live(key)
+        if entry is None:
+            return _integer(-2)
+        if entry[1] is None:
+            return _integer(-1)
+        return _integer(int((entry[1] - self.clock()) * 1000))
+
+    def cmd_ttl(self, key):
+        entry = self._live(key)
+        if entry is None:
+            return _integer(-2)
+        if entry[1] is None:
+            return _integer(-1)
+        # rounded to the nearest second, as Redis does
+        return _integer(int(entry[1] - self.clock() + 0.5))
+
+    def cmd_flushdb(self, *args):
+        for key in list(self.data):
+            self._delete(key)
+        return b"+OK\r\n"
+
+    cmd_flushall = cmd_flushdb
+
+
+class Session:
+    """The state of one client connection: the keys it watches, with how many
+    times each had been written, and the commands queued since MULTI
+    """
+
+    def __init__(self):
+        self.watched = {}
+        self.queued = None
+
+    def reset(self):
+        self.watched = {}
+        self.queued = None
+
+
+class _Handler(socketserver.StreamRequestHandler):
+    # Replies to pipelined commands go out one write each; as Redis does, send
+    # them at once rather than let Nagle hold them for the client's ACK.
+    disable_nagle_algorithm = True
+
+    def handle(self):
+        session = Session()
+        while True:
+            args = self._read_command()
+            if args is None:
+                return
+            self.wfile.write(self.server.execute(args, session))
+            self.wfile.flush()
+
+    def _read_command(self):
+        line = self.rfile.readline()
+        if not line:
+            return None
+        if not line.startswith(b"*"):
+            # an inline command, as typed into telnet
+            return line.split() or None
+        args = []
+        for _ in range(int(line[1:])):
+            length = int(self.rfile.readline()[1:])
+            args.append(self.rfile.read(length + 2)[:-2])
+        return args
+
+
+class _SortedSet(dict):
+    """The members of a sorted set and their scores"""
+
+
+class WrongType(Exception):
+    """Raised by a command given a key holding another kind of value"""
+
+
+def _span(length, start, stop):
+    # Redis ranges count negative indexes from the end and include the stop index.
+    if start < 0:
+        start = max(length + start, 0)
+    if stop < 0:
+        stop += length
+    return start, min(stop, length - 1) + 1
+
+
+def _bulk(value):
+    if value is None:
+        return b"$-1\r\n"
+    return b"$%d\r\n%s\r\n" % (len(value), value)
+
+
+def _integer(value):
+    return b":%d\r\n" % value
+
+
+def _error(message):
+    return b"-ERR %s\r\n" % message.encode()
+
+
+if __name__ == "__main__":
+    server = StandInRedis(("127.0.0.1", 6379))
+    print(f"Stand-in Redis listening on port {server.port}")
+    server.serve_forever()
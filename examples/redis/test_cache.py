@@ -0,0 +1,258 @@
+"""Tests for the read-through cache, against a stand-in Redis and a stub of the
+upstream word API served locally.
+
+Run from examples/redis:
+
+    python -m pytest -q
+"""
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import json
+import threading
+import time
+
+import pytest
+import redis
+import requests
+
+from cache import ReadThroughCache, SingleFlight
+from standin import StandInRedis
+
+
+class FakeClock:
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class StubUpstream(ThreadingHTTPServer):
+    """Answers like the random word API, counting calls, after an optional delay"""
+
+    daemon_threads = True
+
+    def __init__(self):
+        super().__init__(("127.0.0.1", 0), _StubHandler)
+        self.calls = 0
+        self.word = "first"
+        self.delay = 0.0
+        self.lock = threading.Lock()
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.server_address[1]}/word"
+
+
+class _StubHandler(BaseHTTPRequestHandler):
+
+    def do_GET(self):
+        with self.server.lock:
+            self.server.calls += 1
+        time.sleep(self.server.delay)
+        body = json.dumps([{"word": self.server.word}]).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def clock():
+    return FakeClock()
+
+
+@pytest.fixture
+def upstream():
+    server = StubUpstream()
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def redis_server(clock):
+    server = StandInRedis(clock=clock).start()
+    yield server
+    server.stop()
+
+
+@pytest.fixture
+def conn(redis_server):
+    conn = redis.Redis(port=redis_server.port)
+    yield conn
+    conn.close()
+
+
+def fetch_word(upstream):
+    def load(key):
+        with requests.get(upstream.url, timeout=10) as r:
+            r.raise_for_status()
+            return r.json()[0]["word"]
+    return load
+
+
+def wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+
+
+def test_tiers(upstream, conn, clock):
+    cache = ReadThroughCache(fetch_word(upstream), conn, ttl=60, clock=clock)
+    assert cache.get("word") == "first"
+    assert cache.get("word") == "first"
+    assert upstream.calls == 1
+
+    # another process sharing the Redis finds the word there
+    other = ReadThroughCache(fetch_word(upstream), conn, ttl=60, clock=clock)
+    assert other.get("word") == "first"
+    assert upstream.calls == 1
+
+    stats = cache.stats()
+    assert stats["local"]["hits"] == 1 and stats["local"]["misses"] == 1
+    assert stats["redis"]["misses"] == 1
+    assert stats["upstream"]["hits"] == 1 and stats["upstream"]["fetches"] == 1
+    assert other.stats()["redis"]["hit_rate"] == 1.0
+    for tier in ("local", "redis", "upstream"):
+        assert stats[tier]["p99_ms"] >= stats[tier]["p50_ms"] >= 0
+
+
+def test_ttl(upstream, conn, clock):
+    cache = ReadThroughCache(fetch_word(upstream), conn, ttl=60, refresh_ahead=0, clock=clock)
+    cache.get("word")
+    upstream.word = "second"
+    clock.now += 59
+    assert cache.get("word") == "first"
+    clock.now += 2
+    assert cache.get("word") == "second"
+    assert upstream.calls == 2
+
+
+def test_lru_is_bounded(upstream, clock):
+    cache = ReadThroughCache(fetch_word(upstream), ttl=60, local_size=2, clock=clock)
+    for key in ("a", "b", "a", "c"):
+        cache.get(key)
+    assert upstream.calls == 3
+    cache.get("a")
+    assert upstream.calls == 3
+    cache.get("b")
+    assert upstream.calls == 4
+
+
+def test_refresh_ahead(upstream, conn, clock):
+    cache = ReadThroughCache(fetch_word(upstream), conn, ttl=60, refresh_ahead=0.25, clock=clock)
+    cache.get("word")
+    upstream.word = "second"
+    clock.now += 30
+    assert cache.get("word") == "first"
+    assert upstream.calls == 1
+
+    # inside the last quarter of the TTL, readers get the old word while it reloads
+    clock.now += 20
+    assert cache.get("word") == "first"
+    wait_for(lambda: cache.refreshes == 1 and cache.fetches == 2)
+    assert cache.get("word") == "second"
+    # the reload reset the TTL in both tiers
+    clock.now += 30
+    assert cache.get("word") == "second"
+    assert conn.pttl("cache:word") == 30_000
+    assert upstream.calls == 2
+
+
+def test_single_flight(upstream, conn, clock):
+    upstream.delay = 0.2
+    cache = ReadThroughCache(fetch_word(upstream), conn, ttl=60, clock=clock)
+    barrier = threading.Barrier(100)
+    results = []
+
+    def read():
+        barrier.wait()
+        results.append(cache.get("word"))
+
+    threads = [threading.Thread(target=read) for _ in range(100)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert results == ["first"] * 100
+    assert upstream.calls == 1
+    assert sum(tier["hits"] for tier in cache.stats().values()) == 100
+
+
+def test_single_flight_shares_errors():
+    flight = SingleFlight()
+    started = threading.Event()
+    release = threading.Event()
+    calls = []
+
+    def fail():
+        calls.append(1)
+        started.set()
+        release.wait()
+        raise RuntimeError("upstream down")
+
+    errors = []
+
+    def call():
+        try:
+            flight.do("word", fail)
+        except RuntimeError as e:
+            errors.append(e)
+
+    leader = threading.Thread(target=call)
+    leader.start()
+    started.wait()
+    followers = [threading.Thread(target=call) for _ in range(10)]
+    for thread in followers:
+        thread.start()
+    time.sleep(0.05)
+    release.set()
+    for thread in [leader] + followers:
+        thread.join()
+    assert len(calls) == 1 and len(errors) == 11
+    # the failure is not remembered
+    assert flight.do("word", lambda: "ok") == "ok"
+
+
+def test_failed_load_is_not_cached(upstream, conn, clock):
+    words = iter([RuntimeError("upstream down"), "first"])
+
+    def load(key):
+        word = next(words)
+        if isinstance(word, Exception):
+            raise word
+        return word
+
+    cache = ReadThroughCache(load, conn, ttl=60, clock=clock)
+    with pytest.raises(RuntimeError):
+        cache.get("word")
+    assert cache.get("word") == "first"
+
+
+def test_redis_down(upstream, clock):
+    # nothing listens on a port just closed
+    server = StandInRedis().start()
+    port = server.port
+    server.stop()
+    conn = redis.Redis(port=port, socket_connect_timeout=0.5)
+    cache = ReadThroughCache(fetch_word(upstream), conn, ttl=60, clock=clock)
+    assert cache.get("word") == "first"
+    assert cache.get("word") == "first"
+    assert upstream.calls == 1
+    assert cache.redis_errors == 2
+
+
+def test_invalidate(upstream, conn, clock):
+    cache = ReadThroughCache(fetch_word(upstream), conn, ttl=60, clock=clock)
+    cache.get("word")
+    upstream.word = "second"
+    cache.invalidate("word")
+    assert conn.get("cache:word") is None
+    assert cache.get("word") == "second"
@@ -0,0 +1,127 @@
+"""Tests for the bulk and pipelined Redis operations and the timing utility,
+against a stand-in Redis.
+
+Run from examples/redis:
+
+    python -m pytest -q
+"""
+import pytest
+
+import redis_example
+from redis_example import (get_pool, redis_connect, redis_read, redis_read_many, redis_read_pipelined,
+                           redis_write, redis_write_many, redis_write_pipelined)
+from standin import StandInRedis
+from utils import Timings, TIMINGS, timer
+
+
+@pytest.fixture
+def env():
+    server = StandInRedis().start()
+    yield {"redis_host": "127.0.0.1", "redis_port": server.port}
+    server.stop()
+
+
+@pytest.fixture
+def conn(env):
+    TIMINGS.reset()
+    with redis_connect(env) as conn:
+        yield conn
+
+
+ITEMS = {f"key:{i}": f"value {i}".encode() for i in range(250)}
+
+
+@pytest.mark.parametrize("write", [redis_write_many, redis_write_pipelined])
+@pytest.mark.parametrize("read", [redis_read_many, redis_read_pipelined])
+def test_bulk_round_trip(conn, write, read):
+    write(conn, ITEMS, batch_size=100)
+    keys = list(ITEMS) + ["missing"]
+    assert read(conn, keys, batch_size=100) == list(ITEMS.values()) + [None]
+
+
+def test_batches_are_timed(conn):
+    redis_write_many(conn, ITEMS, batch_size=100)
+    redis_read_pipelined(conn, list(ITEMS), batch_size=100)
+    for name in ("mset", "pipelined_get"):
+        summary = TIMINGS.summary(name)
+        assert summary["calls"] == 3 and summary["ops"] == 250
+
+
+def test_sequential(conn):
+    redis_write(conn, b"hello")
+    assert redis_read(conn) == b"hello"
+    assert TIMINGS.summary("redis_write")["calls"] == 1
+    assert TIMINGS.summary("redis_read")["calls"] == 1
+
+
+def test_pool_is_shared(env):
+    with redis_connect(env) as first, redis_connect(env) as second:
+        assert first.connection_pool is second.connection_pool is get_pool(env)
+        first.set("a", "b")
+    # closing a client hands its connection back without closing the pool
+    with redis_connect(env) as conn:
+        assert conn.get("a") == b"b"
+    assert get_pool(env).max_connections == redis_example.DEFAULT_MAX_CONNECTIONS
+
+
+def test_benchmark(conn):
+    results = redis_example.benchmark(conn, [10, 30], [8], batch_size=7)
+    assert len(results) == 12
+    assert {r["mode"] for r in results} == {"sequential", "pipelined", "batched"}
+    assert all(r["ops_per_s"] > 0 for r in results)
+    # the benchmark's keys are gone
+    assert conn.exists(*[f"bench:8:{i}" for i in range(30)]) == 0
+
+
+def test_benchmark_checks_what_it_reads(conn, monkeypatch):
+    monkeypatch.setattr(redis_example, "redis_read_many", lambda conn, keys, batch_size: [None] * len(keys))
+    with pytest.raises(RuntimeError, match="MGET reads of 10 keys"):
+        redis_example.benchmark(conn, [10], [8])
+    assert conn.exists(*[f"bench:8:{i}" for i in range(10)]) == 0
+
+
+def test_timer():
+    timings = Timings()
+
+    @timer(timings=timings)
+    def one(x):
+        return x
+
+    @timer(name="many", ops=lambda keys: len(keys), timings=timings)
+    def batch(keys):
+        return keys
+
+    assert one(1) == 1 and one.__name__ == "one"
+    batch([1, 2, 3])
+    batch([4])
+    assert timings.summary("one")["calls"] == 1
+    summary = timings.summary("many")
+    assert summary["calls"] == 2 and summary["ops"] == 4
+    assert summary["max_ms"] >= summary["p99_ms"] >= summary["p50_ms"] >= 0
+    assert summary["per_op_us"] == pytest.approx(summary["total_s"] / 4 * 1e6)
+    assert "many" in timings.report()
+    assert timings.summary("never") == {"calls": 0, "ops": 0}
+
+
+def test_timer_records_failures():
+    timings = Timings()
+
+    @timer(timings=timings)
+    def fail():
+        raise RuntimeError
+
+    with pytest.raises(RuntimeError):
+        fail()
+    assert timings.summary("fail")["calls"] == 1
+
+
+def test_timings_are_bounded():
+    timings = Timings(max_samples=100)
+    for i in range(1000):
+        timings.record("op", 0.001 if i < 900 else 0.002, ops=2)
+    summary = timings.summary("op")
+    # the totals count every call, the percentiles only the last 100
+    assert summary["calls"] == 1000 and summary["ops"] == 2000
+    assert summary["total_s"] == pytest.approx(1.1)
+    assert summary["p50_ms"] == pytest.approx(2.0)
+    assert len(timings._series["op"].recent) == 100
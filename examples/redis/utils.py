@@ -0,0 +1,159 @@
+"""Timing for the examples: a decorator and a context manager that record how
+long calls take, and how many operations each covered, so batched calls can be
+compared per call and per operation.
+"""
+from collections import deque
+from contextlib import contextmanager
+import functools
+import threading
+import time
+
+# Latencies kept per name for the percentiles; counts and totals cover every call
+DEFAULT_MAX_SAMPLES = 10_000
+
+
+class _Series:
+    """The running totals of one name, and its most recent latencies"""
+
+    def __init__(self, max_samples):
+        self.calls = 0
+        self.ops = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.recent = deque(maxlen=max_samples)
+
+
+class Timings:
+    """Latency samples by name
+
+    Each sample is one call, or one batch, with the number of operations it
+    covered, so a batch of 100 GETs counts as one call and 100 ops. Calls, ops,
+    totals and the max count every sample; the percentiles are of the last
+    max_samples, so a long run holds a bounded number of them.
+
+    Args:
+        max_samples (int): How many latencies to keep per name
+    """
+
+    def __init__(self, max_samples=DEFAULT_MAX_SAMPLES):
+        self.max_samples = max_samples
+        self._series = {}  # name -> _Series
+        self._lock = threading.Lock()
+
+    def record(self, name, seconds, ops=1):
+        """Adds a sample
+
+        Args:
+            name (str): What was timed
+            seconds (float): How long it took
+            ops (int): How many operations it covered
+        """
+        with self._lock:
+            series = self._series.get(name)
+            if series is None:
+                series = self._series[name] = _Series(self.max_samples)
+            series.calls += 1
+            series.ops += ops
+            series.total += seconds
+            series.max = max(series.max, seconds)
+            series.recent.append(seconds)
+
+    @contextmanager
+    def time(self, name, ops=1):
+        """Times the body of a with statement
+
+        Args:
+            name (str): What is timed
+            ops (int): How many operations the body covers
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - start, ops)
+
+    def reset(self):
+        with self._lock:
+            self._series.clear()
+
+    def summary(self, name):
+        """Summarizes the samples of one name
+
+        Args:
+            name (str): What was timed
+
+        Returns:
+            (dict) calls, ops, total_s, ops_per_s, the p50/p95/p99/max of each
+            call in ms, and the mean time per op in us
+        """
+        with self._lock:
+            series = self._series.get(name)
+            if series is None:
+                return {"calls": 0, "ops": 0}
+            calls, ops, total, slowest = series.calls, series.ops, series.total, series.max
+            latencies = sorted(series.recent)
+        return {
+            "calls": calls,
+            "ops": ops,
+            "total_s": total,
+            "ops_per_s": ops / total if total else float("inf"),
+            "p50_ms": percentile(latencies, 0.5) * 1e3,
+            "p95_ms": percentile(latencies, 0.95) * 1e3,
+            "p99_ms": percentile(latencies, 0.99) * 1e3,
+            "max_ms": slowest * 1e3,
+            "per_op_us": total / ops * 1e6 if ops else 0.0,
+        }
+
+    def report(self):
+        """Formats a table of every name's summary
+
+        Returns:
+            (str) One line per name
+        """
+        with self._lock:
+            names = sorted(self._series)
+        lines = [f"{'name':<24}{'calls':>8}{'ops':>9}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}"
+                 f"{'max ms':>9}{'us/op':>9}{'ops/s':>11}"]
+        for name in names:
+            s = self.summary(name)
+            lines.append(f"{name:<24}{s['calls']:>8}{s['ops']:>9}{s['p50_ms']:>9.3f}{s['p95_ms']:>9.3f}"
+                         f"{s['p99_ms']:>9.3f}{s['max_ms']:>9.3f}{s['per_op_us']:>9.1f}{s['ops_per_s']:>11.0f}")
+        return "\n".join(lines)
+
+
+TIMINGS = Timings()
+
+
+def percentile(samples, q):
+    """Returns the q-quantile of sorted samples, by the nearest-rank method"""
+    if not samples:
+        return 0.0
+    return samples[min(len(samples) - 1, int(q * len(samples)))]
+
+
+def timer(fn=None, *, name=None, ops=None, timings=TIMINGS):
+    """Records how long each call of a function takes
+
+    Usable bare, as @timer, or with options, as @timer(ops=...).
+
+    Args:
+        fn (callable): The function to time
+        name (str): The name to record under; defaults to the function's
+        ops ((*args, **kwargs) -> int): Counts the operations a call covers, from its arguments; 1 if None
+        timings (Timings): Where to record
+
+    Returns:
+        The timed function
+    """
+    if fn is None:
+        return functools.partial(timer, name=name, ops=ops, timings=timings)
+    label = name or fn.__name__
+
+    @functools.wraps(fn)
+    def timed(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            timings.record(label, time.perf_counter() - start, ops(*args, **kwargs) if ops else 1)
+    return timed